@@ -11,10 +11,10 @@ from ptk.lexer import LexerError
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from dsrlib.compiler import Compiler, ICGenerator, CodeGenerator
+from dsrlib.compiler import Compiler, ICGenerator, CodeGenerator, PeepholeOptimizer, DataflowOptimizer, SlotAllocator
 
 
-def run_test(basename):
+def run_test(basename, dataflow, optimizer):
     print('!! Running %s...' % basename)
     cc = Compiler()
     with codecs.getreader('utf-8')(open('%s.gac' % basename, 'rb')) as src:
@@ -34,11 +34,12 @@ def run_test(basename):
             return False
 
         gen = ICGenerator()
-        ops = gen.generate(ast)
+        ops = dataflow.optimize(gen.generate(ast))
+        ops = SlotAllocator().allocate(ast, ops)
 
         gen = CodeGenerator()
         result = io.StringIO()
-        for instruction in gen.generate(ops):
+        for instruction in optimizer.optimize(gen.generate(ops)):
             result.write('%s\n' % str(instruction))
 
         rname = '%s.result' % basename
@@ -66,14 +67,19 @@ def main():
     success = True
     path = os.path.dirname(__file__)
     count = 0
+    dataflow = DataflowOptimizer()
+    optimizer = PeepholeOptimizer()
     for name in sorted(os.listdir(path)):
         if not name.endswith('.gac'):
             continue
         name, _ = os.path.splitext(name)
-        success = success and run_test(os.path.join(path, name))
+        success = success and run_test(os.path.join(path, name), dataflow, optimizer)
         count += 1
 
     print('Ran %d tests' % count)
+    if '-s' in sys.argv[1:]:
+        print(dataflow.report())
+        print(optimizer.report())
 
     if not success:
         sys.exit(1)
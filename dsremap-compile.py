@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+
+from dsrlib.compiler.batch import main
+
+
+if __name__ == '__main__':
+    sys.exit(main())
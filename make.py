@@ -64,6 +64,13 @@ def headers():
 
 # Generated files for Python
 
+def parsetab():
+    from dsrlib.compiler import Compiler
+    if os.path.exists(Compiler.tablesFilename):
+        os.remove(Compiler.tablesFilename)
+    Compiler() # Builds and saves the LR tables
+
+
 def resources():
     path = 'res'
     with codecs.getwriter('utf-8')(open(os.path.join(path, 'resources.qrc'), 'wb')) as fileobj:
@@ -156,7 +163,7 @@ def unittests():
 
 # Frozen
 
-@depends(resources, ext)
+@depends(resources, parsetab, ext)
 def exe():
     if platform.system() == 'Darwin':
         subprocess.run([sys.executable, 'setup.py', 'py2app'], check=True)
@@ -191,7 +198,7 @@ def exe():
 
 # Shortcuts
 
-@depends(resources, ext)
+@depends(resources, parsetab, ext)
 def prepare():
     pass
 
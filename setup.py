@@ -15,6 +15,7 @@ if platform.system() == 'Darwin':
 
     data_files = [
           ('', ['res/avrdude.conf']),
+          ('', ['src/dsrlib/compiler/parsetab.json']),
           ('', ['i18n']),
           ('configurations', glob.glob('res/configurations/*.zip')),
         ]
@@ -32,6 +33,7 @@ if platform.system() == 'Windows':
     options = {
         'include_files': [
             (r'res\avrdude.conf', r'resources\avrdude.conf'),
+            (r'src\dsrlib\compiler\parsetab.json', r'resources\parsetab.json'),
             (r'res\configurations', r'resources\configurations'),
             (r'i18n', r'resources\i18n'),
             ]
@@ -481,6 +481,9 @@ bool Host::ShouldSpoofAudio() const
 
 #define EEPROM_GET(x) do { EEPROM.get(offset, x); offset += sizeof(x); } while (false)
 
+// Action length of a linked configuration, see dsrlib.compiler.linker
+#define LINKED_ACTIONS 0xFFFF
+
 void Host::InstantiateVMs()
 {
   uint16_t offset = 0;
@@ -514,6 +517,38 @@ void Host::InstantiateVMs()
       uint16_t actionlen;
       EEPROM_GET(actionlen);
 
+      if (actionlen == LINKED_ACTIONS) {
+        // Linked configuration: entry table, then the code shared by all actions
+        uint8_t actions;
+        EEPROM_GET(actions);
+
+        uint16_t table = offset;
+        uint16_t codelen = conflen - sizeof(actionlen) - sizeof(actions) - actions * 2 * sizeof(uint16_t);
+        offset += actions * 2 * sizeof(uint16_t);
+
+        LogInfo(ACTION_SIZE, codelen);
+
+        uint8_t* bytecode = (uint8_t*)malloc(codelen);
+        for (uint16_t i = 0; i < codelen; ++i)
+          bytecode[i] = EEPROM.read(offset++);
+
+        for (uint8_t i = 0; i < actions; ++i) {
+          uint16_t entry, stacksize;
+          EEPROM.get(table, entry);
+          table += sizeof(entry);
+          EEPROM.get(table, stacksize);
+          table += sizeof(stacksize);
+
+          LogInfo(ACTION_STACKSIZE, stacksize);
+
+          // The first one frees the bytecode
+          pConfig->AddItem(new VM(bytecode, i == 0, stacksize, entry));
+          ++count;
+        }
+
+        break;
+      }
+
       LogInfo(ACTION_SIZE, actionlen);
 
       uint16_t stacksize;
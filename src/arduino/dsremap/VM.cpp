@@ -54,18 +54,29 @@ static float get_float(uint8_t* src)
 
 #endif
 
-VM::VM(uint8_t* bytecode, bool owner, uint8_t stackSize)
+VM::VM(uint8_t* bytecode, bool owner, uint8_t stackSize, uint16_t entry)
   : m_Bytecode(bytecode),
     m_SP(0),
     m_TH(0),
-    m_Offset(0),
+    m_Offset(entry),
     m_Stack((uint8_t*)malloc(stackSize)),
     m_bOwner(owner)
 {
+#ifdef VM_PROFILE
+  m_OffsetCounts = NULL;
+  m_ProfileSize = 0;
+  m_FrameCounts = NULL;
+  m_FrameCapacity = 0;
+  ResetProfile();
+#endif
 }
 
 VM::~VM()
 {
+#ifdef VM_PROFILE
+  free(m_OffsetCounts);
+  free(m_FrameCounts);
+#endif
   free(m_Stack);
   if (m_bOwner)
     free(m_Bytecode);
@@ -94,6 +105,10 @@ bool VM::Step(controller_state_t* report)
 {
   bool ret = false;
 
+#ifdef VM_PROFILE
+  uint16_t offset = m_Offset;
+#endif
+
   uint8_t opcode = LoadU8();
   switch (OPCODE_TYPE(opcode)) {
     case OPCODE_TYPE_BINARY:
@@ -112,9 +127,54 @@ bool VM::Step(controller_state_t* report)
       break;
   }
 
+#ifdef VM_PROFILE
+  Profile(offset, opcode, ret);
+#endif
+
   return ret;
 }
 
+#ifdef VM_PROFILE
+
+void VM::EnableProfile(uint16_t size)
+{
+  free(m_OffsetCounts);
+  m_OffsetCounts = (uint32_t*)calloc(size ? size : 1, sizeof(uint32_t));
+  m_ProfileSize = size;
+  ResetProfile();
+}
+
+void VM::ResetProfile()
+{
+  memset(m_OpcodeCounts, 0, sizeof(m_OpcodeCounts));
+  if (m_OffsetCounts)
+    memset(m_OffsetCounts, 0, m_ProfileSize * sizeof(uint32_t));
+  m_FrameCount = 0;
+  m_FrameSteps = 0;
+}
+
+void VM::Profile(uint16_t offset, uint8_t opcode, bool yielded)
+{
+  if (!m_OffsetCounts)
+    return;
+
+  ++m_OpcodeCounts[opcode];
+  if (offset < m_ProfileSize)
+    ++m_OffsetCounts[offset];
+
+  ++m_FrameSteps;
+  if (yielded) {
+    if (m_FrameCount == m_FrameCapacity) {
+      m_FrameCapacity = m_FrameCapacity ? 2 * m_FrameCapacity : 64;
+      m_FrameCounts = (uint32_t*)realloc(m_FrameCounts, m_FrameCapacity * sizeof(uint32_t));
+    }
+    m_FrameCounts[m_FrameCount++] = m_FrameSteps;
+    m_FrameSteps = 0;
+  }
+}
+
+#endif
+
 void VM::StepBinary(controller_state_t* report, uint8_t opcode)
 {
   uint16_t dst = (uint16_t)LoadU8() << 8;
@@ -309,10 +369,13 @@ void VM::StepStack(controller_state_t* report, uint8_t opcode)
       break;
     }
     case OPCODE_SUBTYPE_STACK_PUSHI:
-      PushS32(LoadS32());
+      PushS32(LoadImmediate(opcode));
       break;
     case OPCODE_SUBTYPE_STACK_PUSHF:
-      PushF(LoadF());
+      if (OPCODE_VARIANT(opcode) == 0)
+        PushF(LoadF());
+      else
+        PushF(LoadImmediate(opcode));
       break;
     case OPCODE_SUBTYPE_STACK_PUSH:
     {
@@ -367,14 +430,14 @@ bool VM::StepFlow(controller_state_t* report, uint8_t opcode)
 
   switch (OPCODE_SUBTYPE(opcode)) {
     case OPCODE_SUBTYPE_FLOW_JUMP:
-      m_Offset = LoadU16();
+      m_Offset = LoadTarget(OPCODE_VARIANT(opcode));
       break;
     case OPCODE_SUBTYPE_FLOW_YIELD:
       ret = true;
       break;
     case OPCODE_SUBTYPE_FLOW_CALL:
     {
-      uint16_t offset = LoadU16();
+      uint16_t offset = LoadTarget(OPCODE_VARIANT(opcode));
       PushU16(m_Offset);
       m_Offset = offset;
 
@@ -384,6 +447,8 @@ bool VM::StepFlow(controller_state_t* report, uint8_t opcode)
       m_Offset = PopU16();
       break;
     case OPCODE_SUBTYPE_FLOW_JZ:
+    case OPCODE_SUBTYPE_FLOW_JZR8:
+    case OPCODE_SUBTYPE_FLOW_JZR16:
     {
       bool jump = false;
 
@@ -446,7 +511,33 @@ bool VM::StepFlow(controller_state_t* report, uint8_t opcode)
           break;
       }
 
-      uint16_t offset = LoadU16();
+      int target = OPCODE_VARIANT_ABS16;
+      switch (OPCODE_SUBTYPE(opcode)) {
+        case OPCODE_SUBTYPE_FLOW_JZR8:
+          target = OPCODE_VARIANT_REL8;
+          break;
+        case OPCODE_SUBTYPE_FLOW_JZR16:
+          target = OPCODE_VARIANT_REL16;
+          break;
+        default:
+          break;
+      }
+
+      uint16_t offset = LoadTarget(target);
+      if (jump)
+        m_Offset = offset;
+
+      break;
+    }
+    case OPCODE_SUBTYPE_FLOW_JZCLT:
+    case OPCODE_SUBTYPE_FLOW_JZCGT:
+    case OPCODE_SUBTYPE_FLOW_JZCLTE:
+    case OPCODE_SUBTYPE_FLOW_JZCGTE:
+    case OPCODE_SUBTYPE_FLOW_JZCE:
+    case OPCODE_SUBTYPE_FLOW_JZCN:
+    {
+      bool jump = !Compare(report, opcode);
+      uint16_t offset = LoadTarget(OPCODE_VARIANT_REL8);
       if (jump)
         m_Offset = offset;
 
@@ -457,6 +548,63 @@ bool VM::StepFlow(controller_state_t* report, uint8_t opcode)
   return ret;
 }
 
+bool VM::Compare(controller_state_t* report, uint8_t opcode)
+{
+  // Evaluate the comparison as the binary instruction with the same
+  // operands would, without storing the result
+  uint8_t binop = ((OPCODE_SUBTYPE(opcode) - OPCODE_SUBTYPE_FLOW_JZCLT + OPCODE_SUBTYPE_BINARY_CLT) << 2) | OPCODE_VARIANT(opcode);
+  uint16_t addr = (uint16_t)LoadU8() << 8;
+
+  switch (ADDR_TYPE(addr)) {
+    case ADDR_TYPE_REG:
+    {
+      int index = (addr >> 8) & 0b111111;
+      switch (index) {
+        case REGINDEX_IMUX:
+        case REGINDEX_IMUY:
+        case REGINDEX_IMUZ:
+        case REGINDEX_ACCELX:
+        case REGINDEX_ACCELY:
+        case REGINDEX_ACCELZ:
+        {
+          float op1 = GetFloatRegister(report, index);
+          return BinaryOpFloat(binop, op1, LoadFloatAddr(report, binop)) != 0.0f;
+        }
+        default:
+        {
+          int32_t op1 = GetIntRegister(report, index);
+          return BinaryOpInt(binop, op1, LoadIntAddr(report, binop)) != 0;
+        }
+      }
+    }
+    case ADDR_TYPE_REGOFF:
+    {
+      addr |= LoadU8();
+      int value = addr & 0b1111111111;
+      if ((addr >> 10) & 1)
+        value = -value;
+      int offset = GetIntRegister(report, (addr >> 12) & 0b11) + value;
+
+      switch ((addr >> 11) & 1) {
+        case ADDR_VALTYPE_FLOAT:
+        {
+          float op1 = get_float(m_Stack + offset);
+          return BinaryOpFloat(binop, op1, LoadFloatAddr(report, binop)) != 0.0f;
+        }
+        default:
+        {
+          int32_t op1 = *((int32_t*)(m_Stack + offset));
+          return BinaryOpInt(binop, op1, LoadIntAddr(report, binop)) != 0;
+        }
+      }
+    }
+    default:
+      break;
+  }
+
+  return false;
+}
+
 uint8_t VM::LoadU8()
 {
   return *(m_Bytecode + m_Offset++);
@@ -469,6 +617,11 @@ uint16_t VM::LoadU16()
   return v;
 }
 
+int8_t VM::LoadS8()
+{
+  return (int8_t)LoadU8();
+}
+
 int16_t VM::LoadS16()
 {
   int16_t v = *((int16_t*)(m_Bytecode + m_Offset));
@@ -490,6 +643,42 @@ float VM::LoadF()
   return v;
 }
 
+uint16_t VM::LoadTarget(int variant)
+{
+  // Relative displacements start from the end of the instruction, which
+  // is where the target is stored
+  switch (variant) {
+    case OPCODE_VARIANT_REL8:
+    {
+      int8_t delta = LoadS8();
+      return m_Offset + delta;
+    }
+    case OPCODE_VARIANT_REL16:
+    {
+      int16_t delta = LoadS16();
+      return m_Offset + delta;
+    }
+    default:
+      break;
+  }
+
+  return LoadU16();
+}
+
+int32_t VM::LoadImmediate(uint8_t opcode)
+{
+  switch (OPCODE_VARIANT(opcode)) {
+    case OPCODE_VARIANT_C8:
+      return LoadS8();
+    case OPCODE_VARIANT_C16:
+      return LoadS16();
+    default:
+      break;
+  }
+
+  return LoadS32();
+}
+
 void VM::PushU16(uint16_t v)
 {
   *((uint16_t*)(m_Stack + m_SP)) = v;
@@ -822,7 +1011,9 @@ int32_t VM::LoadIntAddr(controller_state_t* report, uint8_t opcode)
 {
   switch (OPCODE_VARIANT(opcode)) {
     case OPCODE_VARIANT_C:
-      return LoadS32();
+    case OPCODE_VARIANT_C8:
+    case OPCODE_VARIANT_C16:
+      return LoadImmediate(opcode);
     case OPCODE_VARIANT_A:
     {
       uint16_t addr = (uint16_t)LoadU8() << 8;
@@ -858,6 +1049,9 @@ float VM::LoadFloatAddr(controller_state_t* report, uint8_t opcode)
   switch (OPCODE_VARIANT(opcode)) {
     case OPCODE_VARIANT_C:
       return LoadF();
+    case OPCODE_VARIANT_C8:
+    case OPCODE_VARIANT_C16:
+      return LoadImmediate(opcode);
     case OPCODE_VARIANT_A:
     {
       uint16_t addr = (uint16_t)LoadU8() << 8;
@@ -9,7 +9,9 @@
 class VM
 {
 public:
-  VM(uint8_t* bytecode, bool owner, uint8_t stackSize);
+  // entry is the offset of the first instruction; VMs of a linked
+  // configuration share the same bytecode.
+  VM(uint8_t* bytecode, bool owner, uint8_t stackSize, uint16_t entry = 0);
   ~VM();
 
   void Run(controller_state_t*, const IMUIntegrator*);
@@ -17,6 +19,22 @@ public:
 protected:
   bool Step(controller_state_t*);
 
+#ifdef VM_PROFILE
+  // Dispatch counters, once EnableProfile has been called: by opcode
+  // byte, by offset in the first size bytes of bytecode, and the number
+  // of instructions of each yield-to-yield frame.
+  void EnableProfile(uint16_t size);
+  void ResetProfile();
+
+  uint32_t m_OpcodeCounts[256];
+  uint32_t* m_OffsetCounts;
+  uint16_t m_ProfileSize;
+  uint32_t* m_FrameCounts;
+  uint32_t m_FrameCount;
+  uint32_t m_FrameCapacity;
+  uint32_t m_FrameSteps;
+#endif
+
   uint8_t* m_Bytecode;
 
   int16_t m_SP;
@@ -35,9 +53,12 @@ protected:
   // Code loading
   uint8_t LoadU8();
   uint16_t LoadU16();
+  int8_t LoadS8();
   int16_t LoadS16();
   int32_t LoadS32();
   float LoadF();
+  int32_t LoadImmediate(uint8_t);
+  uint16_t LoadTarget(int);
 
   // Stack
   void PushU16(uint16_t);
@@ -65,6 +86,12 @@ private:
 
   int32_t LoadIntAddr(controller_state_t*, uint8_t);
   float LoadFloatAddr(controller_state_t*, uint8_t);
+
+  bool Compare(controller_state_t*, uint8_t);
+
+#ifdef VM_PROFILE
+  void Profile(uint16_t, uint8_t, bool);
+#endif
 };
 
 #endif /* _VM_H */
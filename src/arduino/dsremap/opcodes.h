@@ -21,6 +21,14 @@
 #define OPCODE_SUBTYPE_FLOW_CALL 0x00
 #define OPCODE_SUBTYPE_FLOW_JUMP 0x03
 #define OPCODE_SUBTYPE_FLOW_JZ 0x04
+#define OPCODE_SUBTYPE_FLOW_JZCE 0x0b
+#define OPCODE_SUBTYPE_FLOW_JZCGT 0x08
+#define OPCODE_SUBTYPE_FLOW_JZCGTE 0x0a
+#define OPCODE_SUBTYPE_FLOW_JZCLT 0x07
+#define OPCODE_SUBTYPE_FLOW_JZCLTE 0x09
+#define OPCODE_SUBTYPE_FLOW_JZCN 0x0c
+#define OPCODE_SUBTYPE_FLOW_JZR16 0x06
+#define OPCODE_SUBTYPE_FLOW_JZR8 0x05
 #define OPCODE_SUBTYPE_FLOW_RET 0x01
 #define OPCODE_SUBTYPE_FLOW_YIELD 0x02
 #define OPCODE_SUBTYPE_STACK_POP 0x03
@@ -34,9 +42,14 @@
 #define OPCODE_TYPE_STACK 0x03
 #define OPCODE_TYPE_UNARY 0x01
 #define OPCODE_VARIANT_A 0x00
+#define OPCODE_VARIANT_ABS16 0x00
 #define OPCODE_VARIANT_C 0x01
+#define OPCODE_VARIANT_C16 0x03
+#define OPCODE_VARIANT_C8 0x02
 #define OPCODE_VARIANT_CF 0x02
 #define OPCODE_VARIANT_CI 0x01
+#define OPCODE_VARIANT_REL16 0x02
+#define OPCODE_VARIANT_REL8 0x01
 #define REGINDEX_ACCELX 0x1c
 #define REGINDEX_ACCELY 0x1d
 #define REGINDEX_ACCELZ 0x1e
@@ -4,3 +4,7 @@ from .preprocessor import Preprocessor, FilePreprocessor
 from .compiler import Compiler
 from .interm import ICGenerator
 from .codegen import CodeGenerator, StackSize
+from .peephole import PeepholeOptimizer
+from .dataflow import DataflowOptimizer, ControlFlowGraph
+from .slots import SlotAllocator
+from .wcet import WorstCaseAnalyzer
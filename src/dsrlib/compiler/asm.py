@@ -1,10 +1,35 @@
 #!/usr/bin/env python3
 
+import io
+import math
 import struct
 
 from .opcodes import Opcodes
 
 
+def immediateSize(addr):
+    # Integral constants that fit are encoded on 1 or 2 bytes whatever
+    # their type; the VM converts them back to float when needed.
+    value = addr.value()
+    if addr.type() == 'float':
+        if not math.isfinite(value) or value != int(value) or (value == 0.0 and math.copysign(1.0, value) < 0.0):
+            return 4
+        value = int(value)
+    if -(1 << 7) <= value < (1 << 7):
+        return 1
+    if -(1 << 15) <= value < (1 << 15):
+        return 2
+    return 4
+
+
+def immediateVariant(addr, default=Opcodes.OPCODE_VARIANT_C):
+    return {
+        1: Opcodes.OPCODE_VARIANT_C8,
+        2: Opcodes.OPCODE_VARIANT_C16,
+        4: default,
+        }[immediateSize(addr)]
+
+
 class AddrVisitor:
     def visit(self, addr):
         return getattr(self, 'visit%s' % addr.__class__.__name__)(addr)
@@ -26,8 +51,8 @@ class OpcodeVariantVisitor(AddrVisitor):
     def visitRegAddr(self, _):
         return Opcodes.OPCODE_VARIANT_A
 
-    def visitConstAddr(self, _):
-        return Opcodes.OPCODE_VARIANT_C
+    def visitConstAddr(self, addr):
+        return immediateVariant(addr)
 
 
 class AddrSuffixVisitor(OpcodeVariantVisitor):
@@ -35,10 +60,17 @@ class AddrSuffixVisitor(OpcodeVariantVisitor):
         return {
             Opcodes.OPCODE_VARIANT_A: 'A',
             Opcodes.OPCODE_VARIANT_C: 'C',
+            Opcodes.OPCODE_VARIANT_C8: 'C',
+            Opcodes.OPCODE_VARIANT_C16: 'C',
             }[super().visit(addr)]
 
 
 class AddrOpcodeVisitor(AddrVisitor):
+    # With compact=True, constants use the smallest immediate encoding
+    # (see immediateSize); JZ only knows about the 32 bits one.
+    def __init__(self, compact=False):
+        self._compact = compact
+
     def visitRegoffAddr(self, addr):
         return Opcodes.make_addr_regoff(addr.reg, addr.offset, addr.type)
 
@@ -46,6 +78,11 @@ class AddrOpcodeVisitor(AddrVisitor):
         return Opcodes.make_addr_reg(addr.reg)
 
     def visitConstAddr(self, addr):
+        size = immediateSize(addr) if self._compact else 4
+        if size == 1:
+            return struct.pack('<b', int(addr.value()))
+        if size == 2:
+            return struct.pack('<h', int(addr.value()))
         if addr.type() == 'int':
             return struct.pack('<i', addr.value())
         if addr.type() == 'float':
@@ -53,9 +90,46 @@ class AddrOpcodeVisitor(AddrVisitor):
         raise RuntimeError('Unknown type "%s"' % addr.type())
 
 
+def relaxBranches(ops):
+    # ops are instructions and labels. Branches start short; the ones that
+    # cannot reach their target are widened, which may move other targets
+    # out of reach, until nothing changes. Sizes only grow so this ends.
+    # Returns the address of each label.
+    while True:
+        addresses = {}
+        ends = []
+        offset = 0
+        for op in ops:
+            if isinstance(op, Instruction):
+                offset += op.size()
+                if isinstance(op, BranchInstruction):
+                    ends.append((op, offset))
+            else:
+                addresses[op] = offset
+
+        widened = False
+        for op, end in ends:
+            if op.short and not -(1 << 7) <= addresses[op.label] - end < (1 << 7):
+                op.short = False
+                widened = True
+        if not widened:
+            return addresses
+
+
+def patchBranches(offsets, addresses, stream, base=0):
+    # offsets is filled by Instruction.write; base is the stream position
+    # of address 0
+    for label, fixups in offsets.items():
+        for position, size in fixups:
+            stream.seek(position, io.SEEK_SET)
+            stream.write(struct.pack('<b' if size == 1 else '<h', addresses[label] + base - position - size))
+    stream.seek(0, io.SEEK_END)
+
+
 class Instruction:
     maintype = None
     subtype = None
+    span = None # Set by the code generator
 
     def __str__(self):
         raise NotImplementedError
@@ -63,6 +137,11 @@ class Instruction:
     def write(self, offsets, stream):
         raise NotImplementedError
 
+    def size(self):
+        stream = io.BytesIO()
+        self.write({}, stream)
+        return stream.tell()
+
 
 class BinaryInstruction(Instruction):
     maintype = Opcodes.OPCODE_TYPE_BINARY
@@ -79,7 +158,7 @@ class BinaryInstruction(Instruction):
     def write(self, offsets, stream):
         stream.write(Opcodes.make_opcode(self.maintype, self.subtype, OpcodeVariantVisitor().visit(self.src)))
         stream.write(AddrOpcodeVisitor().visit(self.dst))
-        stream.write(AddrOpcodeVisitor().visit(self.src))
+        stream.write(AddrOpcodeVisitor(compact=True).visit(self.src))
 
 
 class Add(BinaryInstruction):
@@ -173,20 +252,29 @@ class FlowInstruction(Instruction):
         stream.write(Opcodes.make_opcode(self.maintype, self.subtype))
 
 
-class Call(FlowInstruction):
-    subtype = Opcodes.OPCODE_SUBTYPE_FLOW_CALL
-
+class BranchInstruction(FlowInstruction): # pylint: disable=W0223
+    # The last operand is the displacement to the label, from the end of
+    # the instruction: 1 byte if short, else 2. See relaxBranches.
     def __init__(self, label):
         super().__init__()
         self.label = label
+        self.short = True
+
+    def writeTarget(self, offsets, stream):
+        offsets.setdefault(self.label, []).append((stream.tell(), 1 if self.short else 2))
+        stream.write(b'\x00' if self.short else b'\x00\x00')
+
+
+class Call(BranchInstruction):
+    subtype = Opcodes.OPCODE_SUBTYPE_FLOW_CALL
 
     def __str__(self):
         return '\tCALL\t%s' % str(self.label)
 
     def write(self, offsets, stream):
-        super().write(offsets, stream)
-        offsets.setdefault(self.label, []).append(stream.tell())
-        stream.write(struct.pack('<H', 0))
+        # Do NOT call parent
+        stream.write(Opcodes.make_opcode(self.maintype, self.subtype, Opcodes.OPCODE_VARIANT_REL8 if self.short else Opcodes.OPCODE_VARIANT_REL16))
+        self.writeTarget(offsets, stream)
 
 
 class Ret(FlowInstruction):
@@ -203,20 +291,16 @@ class Yield(FlowInstruction):
         return '\tYIELD'
 
 
-class Jump(FlowInstruction):
+class Jump(BranchInstruction):
     subtype = Opcodes.OPCODE_SUBTYPE_FLOW_JUMP
 
-    def __init__(self, label):
-        super().__init__()
-        self.label = label
-
     def __str__(self):
         return '\tJUMP\t%s' % str(self.label)
 
     def write(self, offsets, stream):
-        super().write(offsets, stream)
-        offsets.setdefault(self.label, []).append(stream.tell())
-        stream.write(struct.pack('<H', 0))
+        # Do NOT call parent
+        stream.write(Opcodes.make_opcode(self.maintype, self.subtype, Opcodes.OPCODE_VARIANT_REL8 if self.short else Opcodes.OPCODE_VARIANT_REL16))
+        self.writeTarget(offsets, stream)
 
 
 class JZVariantVisitor(AddrVisitor):
@@ -230,13 +314,14 @@ class JZVariantVisitor(AddrVisitor):
         return Opcodes.OPCODE_VARIANT_CI if addr.type() == 'int' else Opcodes.OPCODE_VARIANT_CF
 
 
-class JZ(FlowInstruction):
-    subtype = Opcodes.OPCODE_SUBTYPE_FLOW_JZ
-
+class JZ(BranchInstruction):
     def __init__(self, cond, label):
-        super().__init__()
+        super().__init__(label)
         self.cond = cond
-        self.label = label
+
+    @property
+    def subtype(self):
+        return Opcodes.OPCODE_SUBTYPE_FLOW_JZR8 if self.short else Opcodes.OPCODE_SUBTYPE_FLOW_JZR16
 
     def __str__(self):
         name = {
@@ -250,8 +335,55 @@ class JZ(FlowInstruction):
         # Do NOT call parent
         stream.write(Opcodes.make_opcode(self.maintype, self.subtype, JZVariantVisitor().visit(self.cond)))
         stream.write(AddrOpcodeVisitor().visit(self.cond))
-        offsets.setdefault(self.label, []).append(stream.tell())
-        stream.write(struct.pack('<H', 0))
+        self.writeTarget(offsets, stream)
+
+
+class CompareBranch(BranchInstruction):
+    # Jumps to the label unless op1 <op> op2; the comparison is on floats
+    # if op1 is a float.
+    SUBTYPES = {
+        '<': Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT,
+        '>': Opcodes.OPCODE_SUBTYPE_FLOW_JZCGT,
+        '<=': Opcodes.OPCODE_SUBTYPE_FLOW_JZCLTE,
+        '>=': Opcodes.OPCODE_SUBTYPE_FLOW_JZCGTE,
+        '==': Opcodes.OPCODE_SUBTYPE_FLOW_JZCE,
+        '!=': Opcodes.OPCODE_SUBTYPE_FLOW_JZCN,
+        }
+
+    NAMES = {
+        '<': 'JZCLT',
+        '>': 'JZCGT',
+        '<=': 'JZCLTE',
+        '>=': 'JZCGTE',
+        '==': 'JZCE',
+        '!=': 'JZCN',
+        }
+
+    def __init__(self, op, op1, op2, label):
+        super().__init__(label)
+        self.op = op
+        self.op1 = op1
+        self.op2 = op2
+
+    @property
+    def subtype(self):
+        return self.SUBTYPES[self.op]
+
+    def __str__(self):
+        return '\t%s%s\t%s, %s, %s' % (self.NAMES[self.op], AddrSuffixVisitor().visit(self.op2), str(self.op1), str(self.op2), str(self.label))
+
+    def write(self, offsets, stream):
+        # Do NOT call parent
+        stream.write(Opcodes.make_opcode(self.maintype, self.subtype, OpcodeVariantVisitor().visit(self.op2)))
+        stream.write(AddrOpcodeVisitor().visit(self.op1))
+        stream.write(AddrOpcodeVisitor(compact=True).visit(self.op2))
+        if not self.short:
+            # There is no long form; skip a short jump over a long one
+            stream.write(struct.pack('<b', 2))
+            stream.write(Opcodes.make_opcode(self.maintype, Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, Opcodes.OPCODE_VARIANT_REL8))
+            stream.write(struct.pack('<b', 3))
+            stream.write(Opcodes.make_opcode(self.maintype, Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, Opcodes.OPCODE_VARIANT_REL16))
+        self.writeTarget(offsets, stream)
 
 
 class StackInstruction(Instruction):
@@ -286,8 +418,10 @@ class Push(StackInstruction):
         return PushTypeVisitor().visit(self.value)
 
     def write(self, offsets, stream):
-        super().write(offsets, stream)
-        stream.write(AddrOpcodeVisitor().visit(self.value))
+        # Do NOT call parent
+        variant = 0 if self.subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSH else immediateVariant(self.value, default=0)
+        stream.write(Opcodes.make_opcode(self.maintype, self.subtype, variant))
+        stream.write(AddrOpcodeVisitor(compact=True).visit(self.value))
 
     def __str__(self):
         name = {
@@ -3,5 +3,9 @@
 from .nodes import ASTVisitor, ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMixin, ASTCallableVisitorMixin
 from .retcheck import ReturnChecker
 from .loopcheck import LoopChecker
+from .callgraph import CallGraph, CallGraphChecker
+from .inline import Inliner
+from .deadcode import DeadCodeEliminator
+from .loopbound import LoopBoundAnalyzer
 from .consteval import ConstEvaluator
 from .dump import Dumper
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+
+import collections
+
+from dsrlib.compiler.mtypes import MethodType
+
+from .nodes import ASTVisitor, ASTScopedVisitorMixin
+
+
+def resolveCallee(visitor, node):
+    # The callable a call node refers to; visitor must be scoped
+    if isinstance(node.target.type(), MethodType):
+        symbols = node.target.target.type().symbols
+    else:
+        symbols = visitor.currentTable()
+    return symbols.get(node.target.name).value
+
+
+class CallGraph(ASTScopedVisitorMixin, ASTVisitor):
+    # Functions and methods, with the calls they make
+    def __init__(self):
+        self._calls = collections.OrderedDict() # callable => [(callee, position)]
+        self._callers = [None] # Calls from states are not part of the graph
+        super().__init__()
+
+    def build(self, node):
+        self.visit(node)
+        return self
+
+    def callables(self):
+        return list(self._calls.keys())
+
+    def callees(self, func):
+        return [callee for callee, _ in self._calls.get(func, [])]
+
+    def cycles(self):
+        # Each cycle once, as the list of callables involved and the position
+        # of the call that closes it
+        result = []
+        state = {} # callable => True while on the DFS path, False when done
+        for root in self._calls:
+            if root in state:
+                continue
+            path = [root]
+            state[root] = True
+            pending = [iter(self._calls.get(root, []))]
+            while pending:
+                for callee, position in pending[-1]:
+                    if state.get(callee, None) is True:
+                        result.append((path[path.index(callee):] + [callee], position))
+                    elif callee not in state:
+                        state[callee] = True
+                        path.append(callee)
+                        pending.append(iter(self._calls.get(callee, [])))
+                        break
+                else:
+                    state[path.pop()] = False
+                    pending.pop()
+        return result
+
+    def enterCallable(self, node):
+        self._calls.setdefault(node, [])
+        self._callers.append(node)
+        try:
+            self.visit(node.body)
+        finally:
+            self._callers.pop()
+
+    def visitFunctionNode(self, node):
+        self.enterCallable(node)
+
+    def visitMethodNode(self, node):
+        self.enterCallable(node)
+
+    def visitStateMethodNode(self, node):
+        self.visit(node.body)
+
+    def visitCallNode(self, node):
+        for arg in node.args:
+            self.visit(arg)
+        if isinstance(node.target.type(), MethodType):
+            self.visit(node.target.target)
+        if self._callers[-1] is not None:
+            self._calls[self._callers[-1]].append((resolveCallee(self, node), node.position))
+
+    def visitStructNode(self, node):
+        for method in node.struct.methods:
+            self.visit(method)
+
+    def visitStateNode(self, node):
+        self.visit(node.init)
+        self.visit(node.main)
+
+    def visitCompoundStatementNode(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visitIfNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.yes)
+        self.visit(node.no)
+
+    def visitWhileNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.body)
+
+    def visitBinaryNode(self, node):
+        self.visit(node.op1)
+        self.visit(node.op2)
+
+    def visitUnaryNode(self, node):
+        self.visit(node.expr)
+
+    def visitPostfixUnaryNode(self, node):
+        self.visit(node.target)
+
+    def visitPrefixUnaryNode(self, node):
+        self.visit(node.target)
+
+    def visitAccessNode(self, node):
+        self.visit(node.target)
+
+    def visitAssignmentNode(self, node):
+        self.visit(node.target)
+        self.visit(node.expr)
+
+    def visitVariableNode(self, node):
+        self.visit(node.expr)
+
+    def visitReturnNode(self, node):
+        self.visit(node.expr)
+
+    def visitEmptyNode(self, node):
+        pass
+
+    def visitConstantNode(self, node):
+        pass
+
+    def visitIdentifierNode(self, node):
+        pass
+
+    def visitMemberNode(self, node):
+        pass
+
+    def visitArgumentNode(self, node):
+        pass
+
+    def visitContinueNode(self, node):
+        pass
+
+    def visitBreakNode(self, node):
+        pass
+
+    def visitYieldNode(self, node):
+        pass
+
+    def visitGoNode(self, node):
+        pass
+
+
+class CallGraphChecker:
+    def __init__(self, errors, warnings):
+        self._errors = errors
+        self._warnings = warnings
+
+    def check(self, node):
+        for cycle, position in CallGraph().build(node).cycles():
+            if len(cycle) == 2:
+                self._errors.append(('recursive call to "%s"' % cycle[0].name, position))
+            else:
+                self._errors.append(('call cycle: %s' % ' -> '.join([func.name for func in cycle]), position))
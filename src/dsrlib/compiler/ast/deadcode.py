@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+from .nodes import StateNode, FunctionNode, StructNode
+from .callgraph import CallGraph
+
+
+class ReferenceGraph(CallGraph):
+    # Also states, with the calls they make and the states they go to
+    def visitStateNode(self, node):
+        self._calls.setdefault(node, [])
+        self._callers.append(node)
+        try:
+            super().visitStateNode(node)
+        finally:
+            self._callers.pop()
+
+    def visitGoNode(self, node):
+        if self._callers[-1] is not None:
+            self._calls[self._callers[-1]].append((self.getSymbol(node.target).value, node.position))
+
+
+class DeadCodeEliminator:
+    # Removes the states that cannot be reached from idle, and the
+    # functions and methods they never call, directly or not. If warnings
+    # is a list, a warning naming what was removed is added to it.
+    def __init__(self, warnings=None):
+        self._warnings = warnings
+        self._removed = []
+
+    def removed(self):
+        # Display names of the removed states and callables
+        return list(self._removed)
+
+    def eliminate(self, node):
+        idle = [statement for statement in node.statements if isinstance(statement, StateNode) and statement.name == 'idle']
+        if not idle:
+            return node
+
+        graph = ReferenceGraph().build(node)
+        reachable = set()
+        pending = idle
+        while pending:
+            current = pending.pop()
+            if current not in reachable:
+                reachable.add(current)
+                pending.extend(graph.callees(current))
+
+        first = None
+        statements = []
+        for statement in node.statements:
+            if isinstance(statement, (StateNode, FunctionNode)) and statement not in reachable:
+                kind = 'state' if isinstance(statement, StateNode) else 'function'
+                self._removed.append('%s %s' % (kind, statement.name))
+                first = first or statement
+                continue
+            if isinstance(statement, StructNode):
+                methods = []
+                for method in statement.struct.methods:
+                    if method in reachable:
+                        methods.append(method)
+                    else:
+                        self._removed.append('method %s.%s' % (statement.struct.name, method.name))
+                        first = first or method
+                statement.struct.methods = methods
+            statements.append(statement)
+        node.statements = statements
+
+        if self._removed and self._warnings is not None:
+            self._warnings.append(('unreachable code removed: %s' % ', '.join(self._removed), first.position))
+        return node
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+
+import copy
+import collections
+
+from dsrlib.compiler.mtypes import MethodType
+
+from .nodes import ASTVisitor, ASTScopedVisitorMixin, ConstantNode, IdentifierNode, UnaryNode, BinaryNode, \
+     CallNode, AccessNode, AssignmentNode, PostfixUnaryNode, PrefixUnaryNode, ReturnNode, ArgumentNode, \
+     MemberNode, BuiltinVariable, FunctionNode, MethodNode, StructNode, EmptyNode
+from .callgraph import resolveCallee
+
+
+# Rough bytecode sizes used by the heuristic
+INSTRUCTION_SIZE = 7
+CALL_SIZE = 17 # Return value slot, call, stack cleanup
+ARGUMENT_SIZE = 7
+
+
+def expressionNodes(node):
+    # All nodes in an expression or expression statement
+    yield node
+    if isinstance(node, UnaryNode):
+        yield from expressionNodes(node.expr)
+    elif isinstance(node, BinaryNode):
+        yield from expressionNodes(node.op1)
+        yield from expressionNodes(node.op2)
+    elif isinstance(node, CallNode):
+        for arg in node.args:
+            yield from expressionNodes(arg)
+        yield from expressionNodes(node.target)
+    elif isinstance(node, AccessNode):
+        yield from expressionNodes(node.target)
+    elif isinstance(node, (PostfixUnaryNode, PrefixUnaryNode)):
+        yield from expressionNodes(node.target)
+    elif isinstance(node, AssignmentNode):
+        yield from expressionNodes(node.target)
+        yield from expressionNodes(node.expr)
+    elif isinstance(node, ReturnNode):
+        yield from expressionNodes(node.expr)
+
+
+def isPure(node):
+    return not any([isinstance(child, (CallNode, AssignmentNode, PostfixUnaryNode, PrefixUnaryNode)) for child in expressionNodes(node)])
+
+
+def isTrivial(node):
+    # Cheap to evaluate several times, and always gives the same value
+    if isinstance(node, UnaryNode) and node.op in ('castf', 'casti'):
+        return isTrivial(node.expr)
+    if isinstance(node, AccessNode):
+        return isTrivial(node.target)
+    return isinstance(node, (ConstantNode, IdentifierNode))
+
+
+def expressionCost(node):
+    return len([child for child in expressionNodes(node) if isinstance(child, (UnaryNode, BinaryNode, CallNode, AssignmentNode, PostfixUnaryNode, PrefixUnaryNode))])
+
+
+def bodyStatements(func):
+    # Without the implicit return at the end of void callables
+    statements = list(func.body.statements)
+    if statements and isinstance(statements[-1], ReturnNode) and isinstance(statements[-1].expr, EmptyNode):
+        statements.pop()
+    return statements
+
+
+def assignedRoot(node):
+    while isinstance(node, AccessNode):
+        node = node.target
+    return node.value if isinstance(node, IdentifierNode) else None
+
+
+class Candidate:
+    # A function or method whose body is a single statement
+    def __init__(self, func):
+        self.func = func
+        self.statement, = bodyStatements(func)
+        self.pure = isPure(self.statement)
+        self.cost = expressionCost(self.statement) + 1
+        self.uses = collections.Counter()
+        self.globals = []
+        for node in expressionNodes(self.statement):
+            if isinstance(node, IdentifierNode):
+                if isinstance(node.value, ArgumentNode):
+                    self.uses[node.value] += 1
+                elif not isinstance(node.value, (MemberNode, BuiltinVariable)):
+                    self.globals.append(node)
+
+    @staticmethod
+    def eligible(func):
+        statements = bodyStatements(func)
+        if len(statements) != 1 or func.body.symbols.size() != 0:
+            return False
+        statement = statements[0]
+        if isinstance(statement, ReturnNode):
+            if not statement.expr.isRValue():
+                return False
+        elif not isinstance(statement, (CallNode, AssignmentNode, PostfixUnaryNode, PrefixUnaryNode)):
+            return False
+        nodes = list(expressionNodes(statement))
+        if isinstance(func, MethodNode) and any([isinstance(node, CallNode) for node in nodes]):
+            return False
+        # Arguments are substituted, so they may not be assigned
+        for node in nodes:
+            if isinstance(node, AssignmentNode) and isinstance(assignedRoot(node.target), ArgumentNode):
+                return False
+            if isinstance(node, (PostfixUnaryNode, PrefixUnaryNode)) and isinstance(assignedRoot(node.target), ArgumentNode):
+                return False
+        return True
+
+    def isValue(self):
+        return isinstance(self.statement, ReturnNode)
+
+
+class Substitution(ASTVisitor): # pylint: disable=W0223
+    # Copy of an expression, with arguments and members replaced. Only ever
+    # applied to expressions (and the return statement wrapping one), so
+    # the other visit methods are left abstract.
+    def __init__(self, args, obj):
+        self._args = args
+        self._obj = obj
+
+    def visitConstantNode(self, node):
+        return node
+
+    def visitIdentifierNode(self, node):
+        if node.value in self._args:
+            return self._args[node.value]
+        if isinstance(node.value, MemberNode):
+            return AccessNode(target=self._obj, name=node.name, pos=node.position)
+        return node
+
+    def visitUnaryNode(self, node):
+        result = copy.copy(node)
+        result.expr = self.visit(node.expr)
+        return result
+
+    def visitBinaryNode(self, node):
+        result = copy.copy(node)
+        result.op1 = self.visit(node.op1)
+        result.op2 = self.visit(node.op2)
+        return result
+
+    def visitCallNode(self, node):
+        result = copy.copy(node)
+        result.args = [self.visit(arg) for arg in node.args]
+        result.target = self.visit(node.target)
+        return result
+
+    def visitAccessNode(self, node):
+        result = copy.copy(node)
+        result.target = self.visit(node.target)
+        return result
+
+    def visitPostfixUnaryNode(self, node):
+        result = copy.copy(node)
+        result.target = self.visit(node.target)
+        return result
+
+    def visitPrefixUnaryNode(self, node):
+        result = copy.copy(node)
+        result.target = self.visit(node.target)
+        return result
+
+    def visitAssignmentNode(self, node):
+        result = copy.copy(node)
+        result.target = self.visit(node.target)
+        result.expr = self.visit(node.expr)
+        return result
+
+    def visitReturnNode(self, node):
+        return self.visit(node.expr)
+
+
+class Inliner(ASTScopedVisitorMixin, ASTVisitor):
+    # Replaces calls to small functions and methods whose body is a single
+    # statement with that statement. Callables listed in a "#pragma
+    # noinline name..." are left alone; "#pragma noinline" alone disables
+    # inlining.
+    def __init__(self, maxCost=8, budget=64, enabled=True):
+        super().__init__()
+        self._maxCost = maxCost
+        self._budget = budget
+        self._enabled = enabled
+        self._excluded = set()
+        self._candidates = {} # callable => Candidate
+        self._calls = collections.Counter()
+        self._names = {}
+        self._growth = 0
+        self._inlined = collections.OrderedDict()
+
+    def stats(self):
+        # callable name => number of call sites inlined
+        return collections.OrderedDict(self._inlined)
+
+    def growth(self):
+        # Estimated bytecode growth, in bytes
+        return self._growth
+
+    def report(self):
+        lines = ['%-30s %8s' % ('callable', 'inlined')]
+        for name, count in self._inlined.items():
+            lines.append('%-30s %8d' % (name, count))
+        lines.append('%-30s %8d' % ('estimated growth', self._growth))
+        return '\n'.join(lines)
+
+    def inline(self, node, pragmas=()):
+        enabled = self._enabled
+        for text, _ in pragmas:
+            words = text.split()
+            if words and words[0] == 'noinline':
+                if len(words) == 1:
+                    enabled = False
+                self._excluded.update(words[1:])
+        if not enabled:
+            return node
+
+        for statement in node.statements:
+            if isinstance(statement, FunctionNode):
+                self._names[statement] = statement.name
+            elif isinstance(statement, StructNode):
+                for method in statement.struct.methods:
+                    self._names[method] = '%s.%s' % (statement.struct.name, method.name)
+        CallCounter(self._calls).visit(node)
+
+        self.visit(node)
+        return node
+
+    # Callables are defined before they are used, so their bodies are
+    # processed before any call to them.
+
+    def addCandidate(self, func):
+        if self._names.get(func, None) in self._excluded or not Candidate.eligible(func):
+            return
+        candidate = Candidate(func)
+        if candidate.cost <= self._maxCost or self._calls[func] == 1:
+            self._candidates[func] = candidate
+
+    def substitute(self, node, statement=False):
+        # The replacement for a call node, or None
+        func = resolveCallee(self, node)
+        candidate = self._candidates.get(func, None)
+        if candidate is None or not (statement or candidate.isValue()):
+            return None
+
+        args = {}
+        for ref, arg in zip(func.args, node.args):
+            if not (isinstance(arg, ConstantNode) or (candidate.pure and (isTrivial(arg) or (isPure(arg) and candidate.uses[ref] <= 1)))):
+                return None
+            args[ref] = arg
+
+        obj = None
+        if isinstance(node.target.type(), MethodType):
+            obj = node.target.target
+            if not isTrivial(obj):
+                return None
+
+        # Global names must mean the same thing at the call site
+        for ident in candidate.globals:
+            try:
+                if self.currentTable().get(ident.name).value is not ident.value:
+                    return None
+            except KeyError:
+                return None
+
+        growth = INSTRUCTION_SIZE * candidate.cost - CALL_SIZE - ARGUMENT_SIZE * len(node.args)
+        if self._calls[func] == 1:
+            # The function itself goes away
+            growth -= INSTRUCTION_SIZE * candidate.cost
+        if growth > 0 and self._growth + growth > self._budget:
+            return None
+        self._growth += growth
+
+        name = self._names.get(func, func.name)
+        self._inlined[name] = self._inlined.get(name, 0) + 1
+        return Substitution(args, obj).visit(candidate.statement)
+
+    def expression(self, node):
+        return self.visit(node)
+
+    def statement(self, node):
+        if isinstance(node, CallNode):
+            self.visitCallArgs(node)
+            replacement = self.substitute(node, statement=True)
+            return node if replacement is None else replacement
+        return self.visit(node)
+
+    def visitCallArgs(self, node):
+        node.args = [self.expression(arg) for arg in node.args]
+
+    def visitFunctionNode(self, node):
+        self.visit(node.body)
+        self.addCandidate(node)
+        return node
+
+    def visitMethodNode(self, node):
+        self.visit(node.body)
+        self.addCandidate(node)
+        return node
+
+    def visitStateMethodNode(self, node):
+        self.visit(node.body)
+        return node
+
+    def visitStructNode(self, node):
+        for method in node.struct.methods:
+            self.visit(method)
+        return node
+
+    def visitStateNode(self, node):
+        self.visit(node.init)
+        self.visit(node.main)
+        return node
+
+    def visitCompoundStatementNode(self, node):
+        statements = [self.statement(statement) for statement in node.statements]
+        node.statements = tuple(statements) if isinstance(node.statements, tuple) else statements
+        return node
+
+    def visitIfNode(self, node):
+        node.expr = self.expression(node.expr)
+        node.yes = self.statement(node.yes)
+        node.no = self.statement(node.no)
+        return node
+
+    def visitWhileNode(self, node):
+        node.expr = self.expression(node.expr)
+        node.body = self.statement(node.body)
+        return node
+
+    def visitCallNode(self, node):
+        self.visitCallArgs(node)
+        replacement = self.substitute(node)
+        return node if replacement is None else replacement
+
+    def visitBinaryNode(self, node):
+        node.op1 = self.expression(node.op1)
+        node.op2 = self.expression(node.op2)
+        return node
+
+    def visitUnaryNode(self, node):
+        node.expr = self.expression(node.expr)
+        return node
+
+    def visitAssignmentNode(self, node):
+        node.expr = self.expression(node.expr)
+        return node
+
+    def visitVariableNode(self, node):
+        node.expr = self.expression(node.expr)
+        return node
+
+    def visitReturnNode(self, node):
+        node.expr = self.expression(node.expr)
+        return node
+
+    def visitPostfixUnaryNode(self, node):
+        return node
+
+    def visitPrefixUnaryNode(self, node):
+        return node
+
+    def visitAccessNode(self, node):
+        return node
+
+    def visitEmptyNode(self, node):
+        return node
+
+    def visitConstantNode(self, node):
+        return node
+
+    def visitIdentifierNode(self, node):
+        return node
+
+    def visitContinueNode(self, node):
+        return node
+
+    def visitBreakNode(self, node):
+        return node
+
+    def visitYieldNode(self, node):
+        return node
+
+    def visitGoNode(self, node):
+        return node
+
+    def visitMemberNode(self, node):
+        return node
+
+    def visitArgumentNode(self, node):
+        return node
+
+
+class CallCounter(ASTScopedVisitorMixin, ASTVisitor):
+    # Number of call sites of each callable
+    def __init__(self, calls):
+        super().__init__()
+        self._calls = calls
+
+    def visitCallNode(self, node):
+        for arg in node.args:
+            self.visit(arg)
+        self._calls[resolveCallee(self, node)] += 1
+
+    def visitFunctionNode(self, node):
+        self.visit(node.body)
+
+    def visitMethodNode(self, node):
+        self.visit(node.body)
+
+    def visitStateMethodNode(self, node):
+        self.visit(node.body)
+
+    def visitStructNode(self, node):
+        for method in node.struct.methods:
+            self.visit(method)
+
+    def visitStateNode(self, node):
+        self.visit(node.init)
+        self.visit(node.main)
+
+    def visitCompoundStatementNode(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visitIfNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.yes)
+        self.visit(node.no)
+
+    def visitWhileNode(self, node):
+        self.visit(node.expr)
+        self.visit(node.body)
+
+    def visitBinaryNode(self, node):
+        self.visit(node.op1)
+        self.visit(node.op2)
+
+    def visitUnaryNode(self, node):
+        self.visit(node.expr)
+
+    def visitAssignmentNode(self, node):
+        self.visit(node.expr)
+
+    def visitVariableNode(self, node):
+        self.visit(node.expr)
+
+    def visitReturnNode(self, node):
+        self.visit(node.expr)
+
+    def visitPostfixUnaryNode(self, node):
+        pass
+
+    def visitPrefixUnaryNode(self, node):
+        pass
+
+    def visitAccessNode(self, node):
+        pass
+
+    def visitEmptyNode(self, node):
+        pass
+
+    def visitConstantNode(self, node):
+        pass
+
+    def visitIdentifierNode(self, node):
+        pass
+
+    def visitContinueNode(self, node):
+        pass
+
+    def visitBreakNode(self, node):
+        pass
+
+    def visitYieldNode(self, node):
+        pass
+
+    def visitGoNode(self, node):
+        pass
+
+    def visitMemberNode(self, node):
+        pass
+
+    def visitArgumentNode(self, node):
+        pass
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+from dsrlib.compiler.mtypes import INT
+
+from .nodes import StateNode, FunctionNode, StructNode, CompoundStatementNode, IfNode, WhileNode, VariableNode, \
+     ArgumentNode, AssignmentNode, PostfixUnaryNode, PrefixUnaryNode, BinaryNode, IdentifierNode, ConstantNode, \
+     ContinueNode, EmptyNode, StateMethodNode
+from .inline import expressionNodes, assignedRoot
+
+
+def statementNodes(node):
+    # All nodes in a statement, nested statements included
+    if isinstance(node, CompoundStatementNode):
+        for statement in node.statements:
+            yield from statementNodes(statement)
+    elif isinstance(node, IfNode):
+        yield node
+        yield from expressionNodes(node.expr)
+        yield from statementNodes(node.yes)
+        if node.no is not None:
+            yield from statementNodes(node.no)
+    elif isinstance(node, WhileNode):
+        yield node
+        yield from expressionNodes(node.expr)
+        yield from statementNodes(node.body)
+    elif isinstance(node, VariableNode):
+        yield node
+        if not isinstance(node.expr, EmptyNode):
+            yield from expressionNodes(node.expr)
+    elif node is not None:
+        yield from expressionNodes(node)
+
+
+def writes(node, var):
+    for child in statementNodes(node):
+        if isinstance(child, AssignmentNode) and assignedRoot(child.target) is var:
+            return True
+        if isinstance(child, (PostfixUnaryNode, PrefixUnaryNode)) and assignedRoot(child.target) is var:
+            return True
+    return False
+
+
+def statements(node):
+    return node.statements if isinstance(node, CompoundStatementNode) else [node]
+
+
+class LoopBoundAnalyzer:
+    # Maximum number of iterations of the while loops that count a local
+    # variable from a constant to a constant:
+    #
+    #   int i = 0;             // or i = 0;
+    #   while (i < 10) {       // <, <=, >, >=, !=, either way around
+    #     ...                  // no other write to i, no continue
+    #     i = i + 1;           // or i += 1, i++, ++i, and decrements
+    #   }
+    #
+    # The update must be a statement of the loop body itself. Other loops
+    # are not in the result.
+    FLIPPED = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '!=': '!='}
+
+    def __init__(self):
+        self._bounds = {}
+        self._globals = set()
+
+    def analyze(self, node):
+        # Returns WhileNode => bound
+        self._bounds = {}
+        self._globals = set([statement for statement in node.statements if isinstance(statement, VariableNode)])
+        for statement in node.statements:
+            if isinstance(statement, StateNode):
+                for method in (statement.init, statement.main):
+                    if isinstance(method, StateMethodNode):
+                        self._walk(method.body)
+            elif isinstance(statement, FunctionNode):
+                self._walk(statement.body)
+            elif isinstance(statement, StructNode):
+                for method in statement.struct.methods:
+                    self._walk(method.body)
+        return dict(self._bounds)
+
+    def _walk(self, node):
+        if node is None:
+            return
+        previous = []
+        for statement in statements(node):
+            if isinstance(statement, WhileNode):
+                bound = self._bound(statement, previous)
+                if bound is not None:
+                    self._bounds[statement] = bound
+                self._walk(statement.body)
+            elif isinstance(statement, IfNode):
+                self._walk(statement.yes)
+                self._walk(statement.no)
+            elif isinstance(statement, CompoundStatementNode):
+                self._walk(statement)
+            previous.append(statement)
+
+    def _bound(self, node, previous):
+        test = self._test(node.expr)
+        if test is None:
+            return None
+        var, op, limit = test
+
+        step = None
+        for statement in statements(node.body):
+            if any([isinstance(child, ContinueNode) for child in statementNodes(statement)]):
+                return None
+            if not writes(statement, var):
+                continue
+            if step is not None:
+                return None
+            step = self._step(statement, var)
+            if step is None:
+                return None
+        if not step:
+            return None
+
+        start = self._start(var, previous)
+        if start is None:
+            return None
+
+        if op == '!=':
+            if abs(step) != 1 or (limit - start) * step < 0:
+                return None
+            return abs(limit - start)
+        if op in ('<', '<=') and step > 0:
+            span = limit - start if op == '<' else limit - start + 1
+        elif op in ('>', '>=') and step < 0:
+            span = start - limit if op == '>' else start - limit + 1
+        else:
+            return None
+        return max(0, (span + abs(step) - 1) // abs(step))
+
+    def _test(self, expr):
+        # (variable, operator, constant) with the variable on the left
+        if not isinstance(expr, BinaryNode) or expr.op not in self.FLIPPED:
+            return None
+        op1, op, op2 = expr.op1, expr.op, expr.op2
+        if isinstance(op1, ConstantNode):
+            op1, op, op2 = op2, self.FLIPPED[op], op1
+        if not isinstance(op2, ConstantNode) or not isinstance(op2.value, int):
+            return None
+        if not isinstance(op1, IdentifierNode) or not self._isLocal(op1.value):
+            return None
+        return op1.value, op, op2.value
+
+    def _isLocal(self, var):
+        return isinstance(var, (VariableNode, ArgumentNode)) and var.type() == INT and var not in self._globals
+
+    def _step(self, statement, var):
+        if isinstance(statement, (PostfixUnaryNode, PrefixUnaryNode)):
+            return 1 if statement.op == '++' else -1
+        if not isinstance(statement, AssignmentNode):
+            return None
+        if statement.op in ('+=', '-='):
+            value = statement.expr
+            sign = 1 if statement.op == '+=' else -1
+        elif statement.op == '=' and isinstance(statement.expr, BinaryNode) and statement.expr.op in ('+', '-'):
+            expr = statement.expr
+            if not isinstance(expr.op1, IdentifierNode) or expr.op1.value is not var:
+                return None
+            value = expr.op2
+            sign = 1 if expr.op == '+' else -1
+        else:
+            return None
+        if not isinstance(value, ConstantNode) or not isinstance(value.value, int):
+            return None
+        return sign * value.value
+
+    def _start(self, var, previous):
+        # Constant value of var when the loop starts
+        for statement in reversed(previous):
+            if isinstance(statement, VariableNode) and statement is var:
+                return statement.expr.value if isinstance(statement.expr, ConstantNode) else None
+            if isinstance(statement, AssignmentNode) and statement.op == '=' and isinstance(statement.target, IdentifierNode) \
+                   and statement.target.value is var:
+                return statement.expr.value if isinstance(statement.expr, ConstantNode) else None
+            if writes(statement, var):
+                return None
+        return None
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+import os
+import re
+import sys
+import json
+import codecs
+import struct
+import getopt
+import zipfile
+import functools
+import collections
+import concurrent.futures
+
+from ptk.lexer import LexerError
+from ptk.parser import ParseError
+
+from .bcgen import compileBytecode, BytecodeGenError
+from .sizes import SizeReport
+from .debuginfo import DebugInfoBuilder
+from .wcet import WorstCaseAnalyzer
+
+
+# name is displayed in diagnostics, key is used for output file names
+Unit = collections.namedtuple('Unit', ['name', 'key', 'source'])
+
+
+def unitKey(name):
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'unit'
+
+
+def configurationUnits(filename, data):
+    # Only custom actions carry source code; the other ones are generated
+    # from fixed templates by the domain classes.
+    units = []
+    label = data.get('name', '') or data.get('uuid', '')
+    for index, action in enumerate(data.get('actions', [])):
+        if action.get('type') == 'custom':
+            name = '%s:%s:%d' % (filename, label, index)
+            key = '%s-%d' % (unitKey(data.get('uuid', '') or label), index)
+            units.append(Unit(name, key, action.get('code', '')))
+    return units
+
+
+def collectUnits(filename):
+    _, ext = os.path.splitext(filename)
+    if ext.lower() == '.zip':
+        with zipfile.ZipFile(filename, mode='r') as zipobj:
+            data = json.loads(zipobj.read('configuration.json').decode('utf-8'))
+        return configurationUnits(filename, data)
+    if ext.lower() == '.json':
+        with codecs.getreader('utf-8')(open(filename, 'rb')) as fileobj:
+            data = json.load(fileobj)
+        units = []
+        for configuration in data['workspace']['configurations']:
+            units.extend(configurationUnits(filename, configuration))
+        return units
+    with codecs.getreader('utf-8')(open(filename, 'rb')) as fileobj:
+        source = fileobj.read()
+    return [Unit(filename, unitKey(os.path.splitext(os.path.basename(filename))[0]), source)]
+
+
+def diagnostic(severity, msg, position):
+    return {
+        'severity': severity,
+        'message': msg,
+        'line': 0 if position is None else position.line,
+        'column': 0 if position is None else position.column,
+        }
+
+
+def compileUnit(unit, sizes=False, debug=False, budget=None):
+    # Runs in the worker processes, so everything it returns must pickle.
+    # budget is the frame budget in estimated cycles, see WorstCaseAnalyzer.
+    result = {'name': unit.name, 'key': unit.key, 'bytecode': None, 'stacksize': None, 'size': None, 'worstcase': None, 'diagnostics': []}
+    if sizes:
+        result['sizes'] = None
+    if debug:
+        result['debug'] = None
+    try:
+        report = SizeReport(unit.name) if sizes else None
+        info = DebugInfoBuilder() if debug else None
+        worstcase = WorstCaseAnalyzer(budget=budget)
+        warnings, bytecode = compileBytecode(unit.source, sizes=report, debug=info, worstcase=worstcase)
+    except (LexerError, ParseError) as exc:
+        result['diagnostics'].append(diagnostic('error', str(exc), exc.position))
+        return result
+    except BytecodeGenError as exc:
+        for msg, pos in exc.errors:
+            result['diagnostics'].append(diagnostic('error', msg, pos))
+        return result
+    except Exception as exc: # pylint: disable=W0703
+        result['diagnostics'].append(diagnostic('error', 'internal compiler error: %s' % exc, None))
+        return result
+
+    for msg, pos in warnings:
+        result['diagnostics'].append(diagnostic('warning', msg, pos))
+    data = bytecode.getvalue()
+    result['bytecode'] = data
+    result['stacksize'], = struct.unpack('<H', data[:2])
+    result['size'] = len(data) - 2
+    result['worstcase'] = worstcase.result().toJSON()
+    if sizes:
+        result['sizes'] = report.toJSON()
+    if debug:
+        result['debug'] = info.toBytes()
+    return result
+
+
+def failed(result):
+    return any([diag['severity'] == 'error' for diag in result['diagnostics']])
+
+
+class BatchCompiler:
+    def __init__(self, jobs=None, sizes=False, debug=False, budget=None):
+        self._jobs = os.cpu_count() if jobs is None else jobs
+        self._sizes = sizes
+        self._debug = debug
+        self._budget = budget
+
+    def compile(self, units):
+        # Results are in the same order as units
+        units = list(units)
+        func = functools.partial(compileUnit, sizes=self._sizes, debug=self._debug, budget=self._budget)
+        if self._jobs <= 1 or len(units) <= 1:
+            return [func(unit) for unit in units]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self._jobs) as executor:
+            return list(executor.map(func, units, chunksize=max(1, len(units) // (self._jobs * 4))))
+
+
+def usage(stream):
+    stream.write('''Usage: dsremap-compile [options] file...
+
+Compiles .gac sources, and the custom actions of workspace.json files or
+exported configuration zip files.
+
+  -j, --jobs N           Number of worker processes (default: CPU count)
+  -o, --output DIR       Write each bytecode blob to DIR/<name>.bin
+  -g, --debug            With -o, also write the debug info (instruction
+                         offset to source position) to DIR/<name>.dbg
+  -d, --diagnostics FILE Write the JSON report to FILE ("-" for stdout)
+  -s, --sizes            Print the size of the code generated for each state,
+                         function and source line, and add it to the JSON report
+  -b, --budget N         Size budget for the percentages (default: 1024)
+  -f, --frame-budget N   Reject the units that may run more than N estimated
+                         cycles between two yields, or that have loops
+                         without a provable bound
+  -q, --quiet            Do not print diagnostics on stderr
+  -h, --help             Show this message
+
+The exit code is 1 if any unit fails to compile, 2 on usage errors.
+''')
+
+
+def main(argv=None): # pylint: disable=R0912,R0914,R0915
+    try:
+        opts, args = getopt.getopt(sys.argv[1:] if argv is None else argv, 'j:o:gd:sb:f:qh', ['jobs=', 'output=', 'debug', 'diagnostics=', 'sizes', 'budget=', 'frame-budget=', 'quiet', 'help'])
+        jobs = None
+        output = None
+        debug = False
+        report = None
+        sizes = False
+        budget = 1024 # Leonardo EEPROM size
+        frameBudget = None
+        quiet = False
+        for opt, val in opts:
+            if opt in ('-j', '--jobs'):
+                jobs = int(val)
+            if opt in ('-o', '--output'):
+                output = val
+            if opt in ('-g', '--debug'):
+                debug = True
+            if opt in ('-d', '--diagnostics'):
+                report = val
+            if opt in ('-s', '--sizes'):
+                sizes = True
+            if opt in ('-b', '--budget'):
+                budget = int(val)
+            if opt in ('-f', '--frame-budget'):
+                frameBudget = int(val)
+            if opt in ('-q', '--quiet'):
+                quiet = True
+            if opt in ('-h', '--help'):
+                usage(sys.stdout)
+                return 0
+    except (getopt.GetoptError, ValueError) as exc:
+        sys.stderr.write('%s\n' % exc)
+        usage(sys.stderr)
+        return 2
+
+    if not args:
+        usage(sys.stderr)
+        return 2
+
+    units = []
+    for filename in args:
+        try:
+            units.extend(collectUnits(filename))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as exc:
+            sys.stderr.write('%s: cannot read: %s\n' % (filename, exc))
+            return 2
+
+    results = BatchCompiler(jobs=jobs, sizes=sizes, debug=debug and output is not None, budget=frameBudget).compile(units)
+
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+        for result in results:
+            if result['bytecode'] is not None:
+                with open(os.path.join(output, '%s.bin' % result['key']), 'wb') as fileobj:
+                    fileobj.write(result['bytecode'])
+                if result.get('debug', None) is not None:
+                    with open(os.path.join(output, '%s.dbg' % result['key']), 'wb') as fileobj:
+                        fileobj.write(result['debug'])
+
+    if not quiet:
+        for result in results:
+            for diag in result['diagnostics']:
+                sys.stderr.write('%s:%d:%d: %s: %s\n' % (result['name'], diag['line'], diag['column'], diag['severity'], diag['message']))
+
+    if sizes and report != '-':
+        for result in results:
+            if result['sizes'] is not None:
+                print(SizeReport.fromJSON(result['sizes']).text(budget=budget))
+
+    if report is not None:
+        data = {'units': [dict([(key, value) for key, value in result.items() if key not in ('bytecode', 'debug')]) for result in results],
+                'errors': len([result for result in results if failed(result)])}
+        if report == '-':
+            json.dump(data, sys.stdout, indent=2)
+            sys.stdout.write('\n')
+        else:
+            with codecs.getwriter('utf-8')(open(report, 'wb')) as fileobj:
+                json.dump(data, fileobj, indent=2)
+
+    return 1 if any([failed(result) for result in results]) else 0
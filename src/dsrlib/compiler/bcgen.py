@@ -2,10 +2,30 @@
 
 import io
 import struct
+import collections
 
 from .compiler import Compiler
 from .interm import ICGenerator, Label
-from .codegen import CodeGenerator, StackSize
+from .codegen import CodeGenerator, StackSize, scopeNames
+from .peephole import PeepholeOptimizer
+from .dataflow import DataflowOptimizer, ControlFlowGraph
+from .slots import SlotAllocator
+from .fusion import BranchFusion
+from .asm import relaxBranches, patchBranches
+from .ast import Inliner, DeadCodeEliminator
+from .wcet import WorstCaseAnalyzer
+
+
+_cache = None
+
+
+def setBytecodeCache(cache):
+    global _cache # pylint: disable=W0603
+    _cache = cache
+
+
+def bytecodeCache():
+    return _cache
 
 
 class BytecodeGenError(Exception):
@@ -17,35 +37,104 @@ class BytecodeGenError(Exception):
         return ', '.join([msg for msg, _ in self.errors])
 
 
-def generateBytecode(source): # pylint: disable=R0914
+def generateBytecode(source):
+    if _cache is not None:
+        cached = _cache.get(source)
+        if cached is not None:
+            warnings, data = cached
+            bytecode = io.BytesIO()
+            bytecode.write(data)
+            return warnings, bytecode
+
+    warnings, bytecode = compileBytecode(source)
+    if _cache is not None:
+        _cache.put(source, warnings, bytecode.getvalue())
+    return warnings, bytecode
+
+
+Program = collections.namedtuple('Program', ['warnings', 'ast', 'ops', 'stacksize'])
+
+
+def compileProgram(source, optimizer=None, dataflow=None, allocator=None, dumpIR=None, inliner=None, fusion=None, worstcase=None): # pylint: disable=R0913
+    # source is a string, or an iterable of lines. The instructions are not
+    # laid out yet; see writeProgram.
     comp = Compiler()
-    ppwarnings = comp.preprocess(io.StringIO(source))
-    ast, warnings, errors = comp.compile()
-    warnings += ppwarnings
+    ast, warnings, errors = comp.compileLines(io.StringIO(source) if isinstance(source, str) else source)
     if errors:
         raise BytecodeGenError(errors)
+    ast = DeadCodeEliminator(warnings).eliminate(ast)
+    ast = (Inliner() if inliner is None else inliner).inline(ast, pragmas=comp.pragmas())
+    # Callables that were inlined everywhere
+    ast = DeadCodeEliminator().eliminate(ast)
 
     gen = ICGenerator()
     ops = gen.generate(ast)
+    ops = (DataflowOptimizer() if dataflow is None else dataflow).optimize(ops)
+    ops = (BranchFusion() if fusion is None else fusion).fuse(ops)
+    if dumpIR is not None:
+        ControlFlowGraph(ops).dump(dumpIR)
+    ops = (SlotAllocator() if allocator is None else allocator).allocate(ast, ops)
 
     gen = CodeGenerator()
     ops = gen.generate(ops)
-    size = StackSize().visit(ast)
+    ops = (PeepholeOptimizer() if optimizer is None else optimizer).optimize(ops)
+
+    # Instructions per frame; see WorstCaseAnalyzer for the budget
+    errors = []
+    (WorstCaseAnalyzer() if worstcase is None else worstcase).analyze(ast, ops, warnings, errors)
+    if errors:
+        raise BytecodeGenError(errors)
+    return Program(warnings, ast, ops, StackSize().visit(ast))
 
-    bytecode = io.BytesIO()
-    bytecode.write(struct.pack('<H', size))
 
+def writeProgram(ops, stream, attribute=None):
+    # Address 0 is the current position of stream. attribute is called
+    # with each instruction and the number of bytes written for it.
+    # Returns the address of each label.
+    base = stream.tell()
+    labels = relaxBranches(ops)
     offsets = {}
-    labels = {}
     for op in ops:
-        if isinstance(op, Label):
-            labels[op] = bytecode.tell() - 2
-        else:
-            op.write(offsets, bytecode)
-
-    for label, deltas in offsets.items():
-        for delta in deltas:
-            bytecode.seek(delta, io.SEEK_SET)
-            bytecode.write(struct.pack('<H', labels[label]))
-    bytecode.seek(0, io.SEEK_END)
-    return warnings, bytecode
+        if not isinstance(op, Label):
+            start = stream.tell()
+            op.write(offsets, stream)
+            if attribute is not None:
+                attribute(op, stream.tell() - start)
+
+    patchBranches(offsets, labels, stream, base=base)
+    return labels
+
+
+def attributeSizes(sizes, ast):
+    # Size attribution for writeProgram, by state or callable and source line
+    names = scopeNames(ast)
+    def attribute(op, size):
+        scope = 'globals' if op.span is None or op.span.scope is None else names[op.span.scope]
+        line = 'other' if op.span is None or op.span.line is None else 'line %d' % op.span.line
+        sizes.child(scope).child(line).add(size)
+    return attribute
+
+
+def compileBytecode(source, optimizer=None, dataflow=None, allocator=None, dumpIR=None, sizes=None, inliner=None, fusion=None, debug=None, worstcase=None): # pylint: disable=R0913
+    program = compileProgram(source, optimizer=optimizer, dataflow=dataflow, allocator=allocator, dumpIR=dumpIR, inliner=inliner, fusion=fusion, worstcase=worstcase)
+
+    bytecode = io.BytesIO()
+    bytecode.write(struct.pack('<H', program.stacksize))
+
+    # sizes is a SizeReport that gets the size of the generated code, by
+    # state or callable and source line. debug is a DebugInfoBuilder that
+    # gets the source position of the instructions; neither changes the
+    # bytecode.
+    attributes = []
+    if sizes is not None:
+        sizes.child('header').add(2)
+        attributes.append(attributeSizes(sizes, program.ast))
+    if debug is not None:
+        attributes.append(debug.attribute(scopeNames(program.ast)))
+
+    def attribute(op, size):
+        for func in attributes:
+            func(op, size)
+
+    writeProgram(program.ops, bytecode, attribute=attribute if attributes else None)
+    return program.warnings, bytecode
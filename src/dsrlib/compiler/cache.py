@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import hashlib
+import binascii
+import tempfile
+import threading
+
+from ptk.lexer import LexerPosition
+from ptk.meta import version as ptkVersion
+
+
+def compilerFingerprint():
+    # Hash of the compiler sources; any change to the compiler invalidates
+    # the cached bytecode. When frozen the sources may not be available, in
+    # which case the caller-provided salt (application version) is all we have.
+    digest = hashlib.sha256()
+    digest.update(ptkVersion.encode('ascii'))
+    path = os.path.dirname(__file__)
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith('.py'):
+                filename = os.path.join(dirpath, name)
+                digest.update(os.path.relpath(filename, path).encode('utf-8'))
+                with open(filename, 'rb') as fileobj:
+                    digest.update(fileobj.read())
+    return digest.hexdigest()
+
+
+# Content-addressed on-disk cache of compiled bytecode. Entries are keyed
+# on the source and the compiler fingerprint; the least recently used ones
+# are evicted when the total size exceeds maxSize bytes. Used from both
+# the compile service thread and the main thread; the counters and size
+# bookkeeping are guarded by a lock, file operations rely on atomic renames.
+
+class BytecodeCache:
+    SUFFIX = '.bc'
+
+    def __init__(self, path, maxSize=4 * 1024 * 1024, salt=''):
+        self._path = path
+        self._maxSize = maxSize
+        self._fingerprint = hashlib.sha256(('%s:%s' % (compilerFingerprint(), salt)).encode('utf-8')).hexdigest()
+        self._lock = threading.RLock()
+        self._totalSize = None
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+    def path(self):
+        return self._path
+
+    def key(self, source):
+        digest = hashlib.sha256(self._fingerprint.encode('ascii'))
+        digest.update(source.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self._path, '%s%s' % (key, self.SUFFIX))
+
+    def get(self, source):
+        # Returns a (warnings, bytecode) tuple, or None if the source is not cached
+        filename = self._filename(self.key(source))
+        try:
+            with open(filename, 'rb') as fileobj:
+                data = json.loads(fileobj.read().decode('utf-8'))
+            warnings = [(msg, LexerPosition(line=line, column=column)) for msg, line, column in data['warnings']]
+            bytecode = binascii.unhexlify(data['bytecode'])
+        except (OSError, ValueError, KeyError, TypeError, binascii.Error):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(filename) # LRU
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+        return warnings, bytecode
+
+    def put(self, source, warnings, bytecode):
+        data = json.dumps({
+            'warnings': [(msg, pos.line, pos.column) for msg, pos in warnings],
+            'bytecode': binascii.hexlify(bytecode).decode('ascii'),
+            }).encode('utf-8')
+
+        filename = self._filename(self.key(source))
+        handle, tmpname = tempfile.mkstemp(dir=self._path)
+        try:
+            with os.fdopen(handle, 'wb') as fileobj:
+                fileobj.write(data)
+            os.replace(tmpname, filename)
+        except OSError:
+            if os.path.exists(tmpname):
+                os.remove(tmpname)
+            return
+
+        with self._lock:
+            if self._totalSize is not None:
+                self._totalSize += len(data)
+            self.evict()
+
+    def entries(self):
+        entries = []
+        for name in os.listdir(self._path):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self._path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def size(self):
+        with self._lock:
+            if self._totalSize is None:
+                self._totalSize = sum([size for _, size, _ in self.entries()])
+            return self._totalSize
+
+    def evict(self):
+        with self._lock:
+            if self.size() <= self._maxSize:
+                return
+
+            entries = sorted(self.entries())
+            total = sum([size for _, size, _ in entries])
+            for _, size, name in entries:
+                if total <= self._maxSize:
+                    break
+                try:
+                    os.remove(os.path.join(self._path, name))
+                except OSError:
+                    continue
+                total -= size
+            self._totalSize = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, name in self.entries():
+                try:
+                    os.remove(os.path.join(self._path, name))
+                except OSError:
+                    pass
+            self._totalSize = 0
+            self.hits = self.misses = 0
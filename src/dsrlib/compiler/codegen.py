@@ -4,7 +4,8 @@ import collections
 
 from .symbols import SymbolScope
 from .ast import ASTVisitor, ASTScopedVisitorMixin
-from .mtypes import MethodType
+from .ast.nodes import StateNode, FunctionNode, StructNode
+from .ast.callgraph import CallGraph, resolveCallee
 from .opcodes import Opcodes
 from . import asm
 
@@ -16,6 +17,22 @@ from . import asm
 
 
 class StackSize(ASTScopedVisitorMixin, ASTVisitor):
+    def __init__(self, depths=None):
+        # Callees are only walked once; depths is shared with the visitors
+        # created for them
+        self._depths = {} if depths is None else depths # callable => stack size, None while in progress
+        super().__init__()
+
+    def calleeSize(self, func):
+        if func in self._depths:
+            size = self._depths[func]
+            if size is None:
+                raise RuntimeError('recursive call to "%s"' % func.name)
+            return size
+        self._depths[func] = None
+        size = self._depths[func] = CalleeStackSize(self._depths).visit(func)
+        return size
+
     def visitEmptyNode(self, node):
         return 0
 
@@ -41,15 +58,7 @@ class StackSize(ASTScopedVisitorMixin, ASTVisitor):
         ftype = node.target.type()
         # Arguments, retval, retaddr
         size = ftype.argsize() + ftype.savesize() + node.type().size + 2
-        if isinstance(ftype, MethodType):
-            symbols = node.target.target.type().symbols
-        else:
-            symbols = self.currentTable()
-
-        func = symbols.get(node.target.name).value
-        size += CalleeStackSize().visit(func)
-
-        return size
+        return size + self.calleeSize(resolveCallee(self, node))
 
     def visitAccessNode(self, node):
         return 0
@@ -111,10 +120,37 @@ class StackSize(ASTScopedVisitorMixin, ASTVisitor):
 
 class CalleeStackSize(StackSize):
     def visitFunctionNode(self, node):
-        return StackSize().visit(node.body)
+        return StackSize(self._depths).visit(node.body)
 
     def visitMethodNode(self, node):
-        return StackSize().visit(node.body)
+        return StackSize(self._depths).visit(node.body)
+
+
+def scopeNames(ast):
+    # Display name of each state and callable
+    names = collections.OrderedDict()
+    for node in ast.statements:
+        if isinstance(node, StateNode):
+            names[node] = 'state %s' % node.name
+        elif isinstance(node, FunctionNode):
+            names[node] = 'function %s' % node.name
+        elif isinstance(node, StructNode):
+            for method in node.struct.methods:
+                names[method] = 'method %s.%s' % (node.struct.name, method.name)
+    return names
+
+
+def callableStackSizes(ast):
+    # Stack used by each function and method when called, arguments excluded
+    graph = CallGraph().build(ast)
+    sizes = StackSize()
+    return collections.OrderedDict([(func, sizes.calleeSize(func)) for func in graph.callables()])
+
+
+# Where an instruction comes from: state or callable node (None for the
+# global variables initialization), source line and column of the first
+# statement on that line
+Span = collections.namedtuple('Span', ['scope', 'line', 'column'])
 
 
 class RegoffAddr(collections.namedtuple('RegoffAddr', ['reg', 'offset', 'type'])):
@@ -221,28 +257,40 @@ class CodeGenerator:
     def __init__(self):
         self._gen = AddressGenerator()
         self._instructions = []
+        self._scope = None
+        self._line = None
+        self._column = None
 
     def generate(self, ops):
         for op in ops:
+            count = len(self._instructions)
             getattr(self, 'generate%s' % op.__class__.__name__)(op)
+            for instr in self._instructions[count:]:
+                instr.span = Span(self._scope, self._line, self._column)
         return self._instructions
 
     def _generateBinary(self, cls, dst, src):
         self._instructions.append(cls(dst, src))
 
     def generateLineSpec(self, line):
-        pass
+        self._line = line.line
+        self._column = line.column
 
     def generateLabel(self, label):
         self._instructions.append(label)
 
     def generateStateEnterLabel(self, label):
+        self._scope = label.state
         self.generateLabel(label)
         size = label.state.symbols.size()
         if size:
             self._generateBinary(asm.Add, RegAddr(Opcodes.REGINDEX_SP), ConstAddr(size))
 
+    def generateLoopLabel(self, label):
+        self.generateLabel(label)
+
     def generateCallableLabel(self, label):
+        self._scope = label.func
         self.generateLabel(label)
 
     def generateCompoundStartLabel(self, label):
@@ -363,6 +411,11 @@ class CodeGenerator:
         cond = self._gen.generate(op.symbols, op.cond)
         self._instructions.append(asm.JZ(cond, op.label))
 
+    def generateCompareIfFalse(self, op):
+        op1 = self._gen.generate(op.symbols, op.op1)
+        op2 = self._gen.generate(op.symbols, op.op2)
+        self._instructions.append(asm.CompareBranch(op.op, op1, op2, op.label))
+
     def generateGo(self, op):
         symbols = op.symbols
         while symbols.type() != SymbolScope.GLOBAL:
@@ -3,12 +3,14 @@
 # pylint: disable=invalid-name, attribute-defined-outside-init, wildcard-import, unused-wildcard-import
 
 import io
+import os
 
-from ptk.parser import production, LRParser
-from ptk.lexer import token, ReLexer
+from ptk.parser import production
+from ptk.lexer import token, ReLexer, LexerError, EOF
 
 from .preprocessor import Preprocessor
-from .ast import ConstEvaluator, ReturnChecker, LoopChecker
+from .lrtables import CachedLRParser
+from .ast import ConstEvaluator, ReturnChecker, LoopChecker, CallGraphChecker
 from .symbols import SymbolTable, SymbolScope
 
 from .mtypes import *
@@ -41,8 +43,16 @@ class SymbolTableStack:
         return self._stack.pop()
 
 
-class Parser(LRParser, ReLexer):
+class Parser(CachedLRParser, ReLexer):
+    tablesFilename = os.path.join(os.path.dirname(__file__), 'parsetab.json')
+
     def parse(self, string):
+        return self.parseLines([string])
+
+    def parseLines(self, lines):
+        # Tokens are fed to the parser as each string is lexed, so lines
+        # may be generated lazily. Positions run across strings; a token
+        # may not span two of them.
         self._symbols = SymbolTableStack()
 
         # Builtins
@@ -58,12 +68,22 @@ class Parser(LRParser, ReLexer):
         self._ast = None
 
         try:
-            super().parse(string)
+            self._lex(lines)
         except FatalError as exc:
             self._errors.append((str(exc), exc.position))
 
         return self._ast, self._warnings, self._errors
 
+    def _lex(self, lines):
+        # Same as ReLexer.parse, one string at a time
+        try:
+            for line in lines:
+                self._parse(line, 0)
+            self.new_token(EOF)
+        except LexerError:
+            self.restart_lexer()
+            raise
+
     def _addBuiltinVar(self, name):
         type_ = {
             'IMUX': FLOAT,
@@ -85,6 +105,9 @@ class Parser(LRParser, ReLexer):
         checker = LoopChecker(self._errors, self._warnings)
         checker.check(sentence)
 
+        checker = CallGraphChecker(self._errors, self._warnings)
+        checker.check(sentence)
+
         self._ast = sentence
 
     # Lexer
@@ -613,3 +636,11 @@ class Compiler(Preprocessor, Parser):
 
     def compile(self):
         return self.parse(self._preprocessed.getvalue())
+
+    def compileLines(self, src):
+        # Preprocesses and parses src, an iterable of lines, in a single
+        # pass. Returns the same as compile(), with the preprocessor
+        # warnings last.
+        ppwarnings = []
+        ast, warnings, errors = self.parseLines('%s\n' % line for line in self.preprocessLines(src, ppwarnings))
+        return ast, warnings + ppwarnings, errors
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+
+import collections
+
+from .mtypes import INT, FLOAT
+from .ast.nodes import BuiltinVariable
+from .interm import Label, LineSpec, UnaryOp, BinaryOp, Assignment, Return, IfFalse, CompareIfFalse, Jump, Argument, \
+     MethodCall, FunctionCall, Yield, Go, TempVar, Const, Member, Retval, operandKey
+
+
+INT_MIN = -2**31
+INT_MAX = 2**31 - 1
+
+
+def rootKey(operand):
+    # Writing to a member only invalidates what is known about that member,
+    # but a method call on the root may change any of them
+    if isinstance(operand, Member):
+        return operandKey(operand.root)
+    return operandKey(operand)
+
+
+def readOperands(op):
+    if isinstance(op, UnaryOp):
+        return [op.op1]
+    if isinstance(op, (BinaryOp, CompareIfFalse)):
+        return [op.op1, op.op2]
+    if isinstance(op, Assignment):
+        return [op.src]
+    if isinstance(op, IfFalse):
+        return [op.cond]
+    if isinstance(op, (Argument, MethodCall)):
+        return [op.var]
+    if isinstance(op, Return) and op.var is not None:
+        return [op.var]
+    return []
+
+
+def operandNames(op):
+    # Operands that may be replaced by an equivalent value
+    if isinstance(op, UnaryOp):
+        return ('op1',)
+    if isinstance(op, (BinaryOp, CompareIfFalse)):
+        return ('op1', 'op2')
+    if isinstance(op, Assignment):
+        return ('src',)
+    if isinstance(op, IfFalse):
+        return ('cond',)
+    if isinstance(op, Argument) or (isinstance(op, Return) and op.var is not None):
+        return ('var',)
+    return ()
+
+
+def foldConstant(op, *values):
+    # Only integer operations are folded; the VM computes floats in single
+    # precision. Division follows C truncation, so negative operands are
+    # left alone, as is anything that would overflow a 32 bits int.
+    if any([not isinstance(value, int) for value in values]):
+        return None
+
+    if len(values) == 1:
+        value, = values
+        if op == 'castf':
+            return float(value) if abs(value) < 2**24 else None
+        result = {'-': lambda: -value, '!': lambda: 0 if value else 1}.get(op, lambda: None)()
+    else:
+        val1, val2 = values
+        if op == '/':
+            if val2 <= 0 or val1 < 0:
+                return None
+            result = val1 // val2
+        else:
+            result = {
+                '+': lambda: val1 + val2,
+                '-': lambda: val1 - val2,
+                '*': lambda: val1 * val2,
+                '<': lambda: int(val1 < val2),
+                '>': lambda: int(val1 > val2),
+                '<=': lambda: int(val1 <= val2),
+                '>=': lambda: int(val1 >= val2),
+                '==': lambda: int(val1 == val2),
+                '!=': lambda: int(val1 != val2),
+                '&&': lambda: 1 if val1 and val2 else 0,
+                '||': lambda: 1 if val1 or val2 else 0,
+                }[op]()
+
+    if result is None or not INT_MIN <= result <= INT_MAX:
+        return None
+    return result
+
+
+class BasicBlock:
+    def __init__(self, index):
+        self.index = index
+        self.ops = []
+        self.successors = []
+
+    def __str__(self):
+        return 'block_%d' % self.index
+
+    def terminator(self):
+        for op in reversed(self.ops):
+            if not isinstance(op, LineSpec):
+                return op if isinstance(op, (Jump, IfFalse, CompareIfFalse, Return, Go)) else None
+        return None
+
+
+class ControlFlowGraph:
+    # Blocks start at labels and end after branches; calls and state
+    # transitions are edges too, so that reachability covers callables
+    # and states.
+    def __init__(self, ops):
+        self.blocks = []
+        labels = {}
+
+        block = None
+        code = False
+        for op in ops:
+            if block is None or (isinstance(op, Label) and code):
+                block = BasicBlock(len(self.blocks))
+                self.blocks.append(block)
+                code = False
+            block.ops.append(op)
+            if isinstance(op, Label):
+                labels[op] = block
+            elif not isinstance(op, LineSpec):
+                code = True
+                if isinstance(op, (Jump, IfFalse, CompareIfFalse, Return, Go)):
+                    block = None
+
+        for index, block in enumerate(self.blocks):
+            next_ = self.blocks[index + 1] if index + 1 < len(self.blocks) else None
+            for op in block.ops:
+                if isinstance(op, (FunctionCall, MethodCall)):
+                    block.successors.append(labels[op.label])
+            last = block.terminator()
+            if isinstance(last, (Jump, IfFalse, CompareIfFalse, Go)):
+                block.successors.append(labels[last.label])
+            if not isinstance(last, (Jump, Return, Go)) and next_ is not None:
+                block.successors.append(next_)
+
+    def reachable(self):
+        if not self.blocks:
+            return set()
+        seen = set([self.blocks[0]])
+        pending = [self.blocks[0]]
+        while pending:
+            for block in pending.pop().successors:
+                if block not in seen:
+                    seen.add(block)
+                    pending.append(block)
+        return seen
+
+    def ops(self):
+        return [op for block in self.blocks for op in block.ops]
+
+    def dump(self, stream):
+        for block in self.blocks:
+            stream.write('%s -> %s\n' % (block, ', '.join([str(succ) for succ in block.successors]) or '(exit)'))
+            for op in block.ops:
+                stream.write('%s\n' % op)
+
+
+class Facts:
+    # Values known to be held by variables, within a basic block
+    def __init__(self):
+        self._values = {} # operand key => value
+        self._users = {} # root key => (operand, operand keys)
+
+    def get(self, operand):
+        return self._values.get(operandKey(operand), None)
+
+    def set(self, dst, value):
+        key = operandKey(dst)
+        self._values[key] = value
+        for operand in (dst, value):
+            if not isinstance(operand, Const):
+                _, keys = self._users.setdefault(rootKey(operand), (operand, set()))
+                keys.add(key)
+
+    def forget(self, operand):
+        _, keys = self._users.pop(rootKey(operand), (None, ()))
+        for key in keys:
+            self._values.pop(key, None)
+
+    def forgetIf(self, predicate):
+        for operand, _ in list(self._users.values()):
+            if predicate(operand):
+                self.forget(operand)
+
+
+class DataflowOptimizer:
+    RULES = ('propagate', 'fold', 'deadstores', 'unreachable')
+
+    def __init__(self, rules=None):
+        self._rules = self.RULES if rules is None else tuple(rules)
+        for rule in self._rules:
+            if rule not in self.RULES:
+                raise ValueError('Unknown dataflow rule "%s"' % rule)
+        self._stats = collections.OrderedDict([(rule, 0) for rule in self.RULES])
+
+    def stats(self):
+        # rule => number of operands or ops changed
+        return collections.OrderedDict(self._stats)
+
+    def report(self):
+        lines = ['%-12s %8s' % ('rule', 'applied')]
+        for rule, count in self._stats.items():
+            lines.append('%-12s %8d' % (rule, count))
+        return '\n'.join(lines)
+
+    def optimize(self, ops):
+        # Each pass is linear in the number of ops; a pass may expose more
+        # opportunities to the next (folded branches, dead temporaries)
+        ops = list(ops)
+        constants = {} # TempVar key => Const; temporaries are only assigned once
+        while True:
+            graph = ControlFlowGraph(ops)
+            changed = False
+            for block in graph.blocks:
+                changed = self._propagate(block, constants) or changed
+            changed = self._deadstores(graph) or changed
+            graph = ControlFlowGraph(graph.ops())
+            changed = self._unreachable(graph) or changed
+            ops = graph.ops()
+            if not changed:
+                return ops
+
+    # Constant and copy propagation, constant folding
+
+    def _substitute(self, op, name, facts, constants):
+        operand = getattr(op, name)
+        value = constants.get(operandKey(operand), None) if isinstance(operand, TempVar) else None
+        if value is None:
+            value = facts.get(operand)
+        if value is None or value.type() is not operand.type():
+            return False
+        setattr(op, name, value)
+        self._stats['propagate'] += 1
+        return True
+
+    @staticmethod
+    def _factValue(dst, src):
+        # What dst can be replaced with after being assigned src
+        if isinstance(dst, (BuiltinVariable, Retval)) or isinstance(src, Retval) or dst.type() not in (INT, FLOAT):
+            # Registers clamp their value
+            return None
+        if operandKey(dst) == operandKey(src):
+            return None
+        if isinstance(src, Const) and dst.type() is FLOAT and isinstance(src.value, int):
+            value = foldConstant('castf', src.value)
+            return None if value is None else Const(value)
+        return src if src.type() is dst.type() else None
+
+    def _fold(self, op):
+        value = None
+        if isinstance(op, BinaryOp) and isinstance(op.op1, Const) and isinstance(op.op2, Const):
+            value = foldConstant(op.op, op.op1.value, op.op2.value)
+        elif isinstance(op, UnaryOp) and isinstance(op.op1, Const):
+            value = foldConstant(op.op, op.op1.value)
+        if value is None or Const(value).type() is not op.dst.type():
+            return op
+        self._stats['fold'] += 1
+        return Assignment(op.symbols, op.dst, Const(value))
+
+    def _propagate(self, block, constants):
+        if 'propagate' not in self._rules and 'fold' not in self._rules:
+            return False
+
+        facts = Facts()
+        changed = False
+        ops = []
+        for op in block.ops:
+            if 'propagate' in self._rules:
+                for name in operandNames(op):
+                    changed = self._substitute(op, name, facts, constants) or changed
+
+            if 'fold' in self._rules:
+                if isinstance(op, IfFalse) and isinstance(op.cond, Const):
+                    self._stats['fold'] += 1
+                    changed = True
+                    if op.cond.value:
+                        continue
+                    op = Jump(op.label)
+                folded = self._fold(op)
+                changed = changed or folded is not op
+                op = folded
+
+            if isinstance(op, (Assignment, UnaryOp, BinaryOp)):
+                facts.forget(op.dst)
+                if isinstance(op, Assignment):
+                    value = self._factValue(op.dst, op.src)
+                    if value is not None:
+                        facts.set(op.dst, value)
+                        if isinstance(op.dst, TempVar) and isinstance(value, Const):
+                            constants[operandKey(op.dst)] = value
+            elif isinstance(op, (FunctionCall, MethodCall)):
+                # The callee may change globals, state or struct members
+                facts.forgetIf(lambda operand: not isinstance(operand, TempVar))
+            elif isinstance(op, Yield):
+                # New report on resume
+                facts.forgetIf(lambda operand: isinstance(operand, BuiltinVariable))
+            ops.append(op)
+        block.ops = ops
+        return changed
+
+    # Dead stores
+
+    def _deadstores(self, graph):
+        if 'deadstores' not in self._rules:
+            return False
+
+        # Temporaries that are never read, transitively
+        uses = collections.Counter()
+        defs = {}
+        for block in graph.blocks:
+            for op in block.ops:
+                for operand in readOperands(op):
+                    if isinstance(operand, TempVar):
+                        uses[operandKey(operand)] += 1
+                if isinstance(op, (Assignment, UnaryOp, BinaryOp)) and isinstance(op.dst, TempVar):
+                    defs[operandKey(op.dst)] = op
+
+        dead = set()
+        pending = [key for key in defs if uses[key] == 0]
+        while pending:
+            op = defs[pending.pop()]
+            dead.add(op)
+            for operand in readOperands(op):
+                if isinstance(operand, TempVar):
+                    key = operandKey(operand)
+                    uses[key] -= 1
+                    if uses[key] == 0 and key in defs:
+                        pending.append(key)
+
+        # Variables written again later in the same block without being read
+        changed = False
+        for block in graph.blocks:
+            overwritten = set()
+            ops = []
+            for op in reversed(block.ops):
+                if op in dead:
+                    self._stats['deadstores'] += 1
+                    changed = True
+                    continue
+                if isinstance(op, (FunctionCall, MethodCall, Yield, Return, Go)):
+                    overwritten = set()
+                elif isinstance(op, (Assignment, UnaryOp, BinaryOp)) and not isinstance(op.dst, TempVar):
+                    key = operandKey(op.dst)
+                    if key in overwritten:
+                        self._stats['deadstores'] += 1
+                        changed = True
+                        continue
+                    overwritten.add(key)
+                for operand in readOperands(op):
+                    overwritten.discard(operandKey(operand))
+                ops.append(op)
+            block.ops = list(reversed(ops))
+        return changed
+
+    # Unreachable blocks
+
+    def _unreachable(self, graph):
+        if 'unreachable' not in self._rules:
+            return False
+
+        reachable = graph.reachable()
+        removed = [block for block in graph.blocks if block not in reachable]
+        for block in removed:
+            self._stats['unreachable'] += len([op for op in block.ops if not isinstance(op, (Label, LineSpec))])
+        graph.blocks = [block for block in graph.blocks if block in reachable]
+        return bool(removed)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import bisect
+import struct
+
+
+# Debug information for one action, kept apart from the bytecode that is
+# uploaded. Little endian:
+#
+# 4 bytes: magic "DSRD"
+# uint16_t: version
+# uint16_t: number of records
+# uint16_t: number of symbols
+# records, sorted by offset:
+#   uint16_t: bytecode offset, from the first instruction
+#   uint16_t: source line
+#   uint16_t: source column
+#   uint16_t: symbol index, 0xFFFF for none
+# symbols:
+#   uint8_t: length
+#   UTF-8 name
+#
+# A record applies to all the instructions from its offset up to the next
+# record, so lookups are a binary search on the fixed-size records and
+# the file can be used as is from a mmap.
+
+MAGIC = b'DSRD'
+VERSION = 1
+NO_SYMBOL = 0xFFFF
+
+HEADER = struct.Struct('<4sHHH')
+RECORD = struct.Struct('<HHHH')
+
+
+class DebugInfoError(Exception):
+    pass
+
+
+class DebugInfoBuilder:
+    def __init__(self):
+        self._records = []
+        self._symbols = []
+        self._index = {}
+
+    def add(self, offset, line, column, symbol):
+        # Calls must be in increasing offset order; records that do not
+        # change anything are dropped.
+        index = NO_SYMBOL if symbol is None else self._index.setdefault(symbol, len(self._index))
+        if index == len(self._symbols):
+            self._symbols.append(symbol)
+        record = (offset, line, column or 0, index)
+        if self._records and self._records[-1][1:] == record[1:]:
+            return
+        if self._records and self._records[-1][0] == offset:
+            self._records.pop()
+        self._records.append(record)
+
+    def attribute(self, names):
+        # Attribution function for bcgen.writeProgram; names maps scopes to
+        # symbol names
+        offsets = [0]
+        def attribute(op, size):
+            span = op.span
+            if span is not None and span.line is not None:
+                self.add(offsets[0], span.line, span.column, None if span.scope is None else names[span.scope])
+            offsets[0] += size
+        return attribute
+
+    def toBytes(self):
+        data = [HEADER.pack(MAGIC, VERSION, len(self._records), len(self._symbols))]
+        data.extend([RECORD.pack(*record) for record in self._records])
+        for symbol in self._symbols:
+            name = symbol.encode('utf-8')[:255]
+            data.append(struct.pack('<B', len(name)) + name)
+        return b''.join(data)
+
+
+class DebugInfo:
+    # Reads from any buffer (bytes, mmap...) without copying the records
+    def __init__(self, data):
+        if len(data) < HEADER.size:
+            raise DebugInfoError('Truncated debug info')
+        magic, version, self._count, symbols = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise DebugInfoError('Invalid magic %r' % magic)
+        if version != VERSION:
+            raise DebugInfoError('Unsupported debug info version %d' % version)
+        self._data = data
+
+        self._symbols = []
+        offset = HEADER.size + self._count * RECORD.size
+        for _ in range(symbols):
+            length, = struct.unpack_from('<B', data, offset)
+            self._symbols.append(bytes(data[offset + 1:offset + 1 + length]).decode('utf-8'))
+            offset += 1 + length
+
+    def __len__(self):
+        return self._count
+
+    def _record(self, index):
+        offset, line, column, symbol = RECORD.unpack_from(self._data, HEADER.size + index * RECORD.size)
+        return offset, line, column, None if symbol == NO_SYMBOL else self._symbols[symbol]
+
+    def records(self):
+        # (offset, line, column, symbol), by increasing offset
+        return [self._record(index) for index in range(self._count)]
+
+    def lookup(self, offset):
+        # (line, column, symbol) of the instruction at offset, or None
+        index = bisect.bisect_right(_Offsets(self), offset) - 1
+        if index < 0:
+            return None
+        return self._record(index)[1:]
+
+
+class _Offsets:
+    # Sequence of the record offsets, for bisect
+    def __init__(self, info):
+        self._info = info
+
+    def __len__(self):
+        return len(self._info)
+
+    def __getitem__(self, index):
+        return RECORD.unpack_from(self._info._data, HEADER.size + index * RECORD.size)[0] # pylint: disable=W0212
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import collections
+
+from .interm import LineSpec, BinaryOp, IfFalse, CompareIfFalse, TempVar, Const
+from .dataflow import ControlFlowGraph, readOperands
+from .slots import Liveness
+
+
+# a op b == b MIRRORED[op] a
+MIRRORED = {'<': '>', '>': '<', '<=': '>=', '>=': '<=', '==': '==', '!=': '!='}
+
+
+class BranchFusion:
+    # Replaces a comparison into a temporary that is only read by the
+    # IfFalse that follows with a CompareIfFalse, which the code generator
+    # turns into a single compare-and-branch instruction.
+    def __init__(self, enabled=True):
+        self._enabled = enabled
+        self._stats = collections.OrderedDict([(op, 0) for op in MIRRORED])
+
+    def stats(self):
+        # comparison => number of branches fused
+        return collections.OrderedDict(self._stats)
+
+    def report(self):
+        lines = ['%-12s %8s' % ('comparison', 'fused')]
+        for op, count in self._stats.items():
+            lines.append('%-12s %8d' % (op, count))
+        return '\n'.join(lines)
+
+    def fuse(self, ops):
+        if not self._enabled:
+            return ops
+        graph = ControlFlowGraph(ops)
+        liveness = Liveness(graph)
+        for block in graph.blocks:
+            self._fuseBlock(block, liveness)
+        return graph.ops()
+
+    def _fuseBlock(self, block, liveness):
+        branch = block.terminator()
+        if not isinstance(branch, IfFalse) or not isinstance(branch.cond, TempVar):
+            return
+        index = block.ops.index(branch) - 1
+        while index >= 0 and isinstance(block.ops[index], LineSpec):
+            index -= 1
+        if index < 0:
+            return
+        compare = block.ops[index]
+        if not isinstance(compare, BinaryOp) or compare.op not in MIRRORED or compare.dst is not branch.cond:
+            return
+
+        # Temporaries are only assigned once, so this is the only definition
+        temp = compare.dst
+        if liveness.liveOut[block] & liveness.bit(temp):
+            return
+        for op in block.ops[index + 1:]:
+            if op is not branch and temp in readOperands(op):
+                return
+
+        op, op1, op2 = compare.op, compare.op1, compare.op2
+        if isinstance(op1, Const):
+            if isinstance(op2, Const):
+                return
+            op, op1, op2 = MIRRORED[op], op2, op1
+
+        block.ops[block.ops.index(branch)] = CompareIfFalse(compare.symbols, op, op1, op2, branch.label)
+        del block.ops[index]
+        self._stats[compare.op] += 1
@@ -6,7 +6,7 @@ import collections
 from .mtypes import MethodType, VOID, FLOAT, INT
 from .ast.nodes import Variable, EmptyNode, StateNode, VariableNode, IdentifierNode, Callable, \
      ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMixin, ASTCallableVisitorMixin, ASTVisitor, \
-     ArgumentNode
+     ArgumentNode, BuiltinVariable
 
 
 class Address:
@@ -30,6 +30,7 @@ class TempVar(Address):
         self._id = counter.next()
         self._type = type_
         self.name = self
+        self.symbols = symbols
         symbols.add(self, self)
 
     def __str__(self):
@@ -103,6 +104,13 @@ class StateEnterLabel(Label):
         self.state = state
 
 
+class LoopLabel(Label):
+    # Head of a while loop
+    def __init__(self, node, counter):
+        super().__init__(counter)
+        self.node = node
+
+
 class CompoundStartLabel(Label):
     def __init__(self, symbols, counter):
         super().__init__(counter)
@@ -116,8 +124,9 @@ class CompoundEndLabel(Label):
 
 
 class LineSpec:
-    def __init__(self, line):
+    def __init__(self, line, column=None):
         self.line = line
+        self.column = column
 
     def __str__(self):
         return '# %d' % self.line
@@ -136,6 +145,9 @@ class UnaryOp:
     def __str__(self):
         return '\t%s <- %s %s' % (self.dst, self.op, self.op1)
 
+    def key(self):
+        return expressionKey(self.op, self.op1)
+
 
 class BinaryOp:
     def __init__(self, symbols, dst, op, op1, op2):
@@ -152,6 +164,9 @@ class BinaryOp:
     def __str__(self):
         return '\t%s <- %s %s %s' % (self.dst, self.op1, self.op, self.op2)
 
+    def key(self):
+        return expressionKey(self.op, self.op1, self.op2)
+
 
 class Assignment:
     def __init__(self, symbols, dst, src):
@@ -190,6 +205,22 @@ class IfFalse:
         return '\tifz %s %s' % (self.cond, self.label)
 
 
+class CompareIfFalse:
+    # A comparison followed by an IfFalse on its result; see fusion.py
+    def __init__(self, symbols, op, op1, op2, label):
+        self.symbols = symbols
+        self.op = op
+        self.op1 = op1
+        self.op2 = op2
+        self.label = label
+
+        assert isinstance(op1, (Address, Variable))
+        assert isinstance(op2, (Address, Variable))
+
+    def __str__(self):
+        return '\tifz %s %s %s %s' % (self.op1, self.op, self.op2, self.label)
+
+
 class Jump:
     def __init__(self, label):
         self.label = label
@@ -246,38 +277,84 @@ class Go:
         return '\tgo\t%s' % self.state.name
 
 
-class ExpressionCache:
-    def __init__(self, symbols):
-        self._values = []
-        self._symbols = symbols
+COMMUTATIVE_OPS = frozenset(['+', '*', '==', '!=', '&&', '||'])
+
+
+def operandKey(operand):
+    # Structural identity of an operand: variables by declaration, members
+    # by root and path, constants by type and value (floats through hex() so
+    # that 0.0 and -0.0 differ)
+    if isinstance(operand, Const):
+        value = operand.value
+        return ('const', type(value).__name__, value.hex() if isinstance(value, float) else value)
+    if isinstance(operand, Member):
+        return ('member', operandKey(operand.root)) + tuple(operand.fields)
+    return ('var', id(operand))
+
+
+def expressionKey(op, *operands):
+    keys = [operandKey(operand) for operand in operands]
+    if op in COMMUTATIVE_OPS:
+        keys.sort()
+    return (op,) + tuple(keys)
 
-    def var(self, op):
-        for var, _op in self._values:
-            if _op == op:
-                return var
-        return None
 
-    def add(self, var, op):
-        self._values.append((var, op))
+class ExpressionCache:
+    def __init__(self, symbols, barrier=False):
+        self.symbols = symbols
+        self.barrier = barrier
+        self._values = {} # expression key => TempVar
+        self._users = {} # operand key => (operand, expression keys)
+
+    def var(self, key):
+        return self._values.get(key, None)
+
+    def add(self, var, key, operands):
+        self._values[key] = var
+        for operand in operands:
+            _, keys = self._users.setdefault(operandKey(operand), (operand, set()))
+            keys.add(key)
         return var
 
+    def forget(self, opkey):
+        _, keys = self._users.pop(opkey, (None, ()))
+        for key in keys:
+            self._values.pop(key, None)
+
+    def forgetIf(self, predicate):
+        for opkey in [opkey for opkey, (operand, _) in self._users.items() if predicate(operand)]:
+            self.forget(opkey)
+
 
 class ExpressionCacheStack:
+    # Expressions computed in enclosing scopes are available, up to the
+    # nearest barrier (loop head, callable or state entry) since the code
+    # there may be reached from elsewhere.
     def __init__(self):
         self._values = []
 
-    def var(self, op):
+    def var(self, key):
         for cache in reversed(self._values):
-            var = cache.var(op)
+            var = cache.var(key)
             if var is not None:
                 return var
+            if cache.barrier:
+                break
         return None
 
-    def add(self, var, op):
-        self._values[-1].add(var, op)
+    def add(self, var, key, operands):
+        self._values[-1].add(var, key, operands)
+
+    def forget(self, opkey):
+        for cache in self._values:
+            cache.forget(opkey)
 
-    def push(self, symbols):
-        self._values.append(ExpressionCache(symbols))
+    def forgetIf(self, predicate):
+        for cache in self._values:
+            cache.forgetIf(predicate)
+
+    def push(self, symbols, barrier=False):
+        self._values.append(ExpressionCache(symbols, barrier=barrier))
 
     def pop(self):
         self._values.pop()
@@ -301,8 +378,18 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
     def addOp(self, op):
         self._blocks[-1].append(op)
 
+        if isinstance(op, (Assignment, UnaryOp, BinaryOp)):
+            if not isinstance(op.dst, TempVar):
+                self._expressions.forget(operandKey(op.dst))
+        elif isinstance(op, (FunctionCall, MethodCall)):
+            # The callee may change globals, state or struct members
+            self._expressions.forgetIf(lambda operand: not isinstance(operand, (TempVar, Const)))
+        elif isinstance(op, Yield):
+            # New report on resume
+            self._expressions.forgetIf(lambda operand: isinstance(operand, BuiltinVariable))
+
     def createLoop(self, node):
-        return LoopLabels(Label(self._labelcounter), Label(self._labelcounter))
+        return LoopLabels(LoopLabel(node, self._labelcounter), Label(self._labelcounter))
 
     def createState(self, node):
         return StateLabels(StateEnterLabel(node, self._labelcounter), Label(self._labelcounter))
@@ -322,11 +409,19 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
             ops = self._blocks.pop()
             self._blocks[-1].extend(ops)
 
-    def var(self, op):
-        return self._expressions.var(op)
+    @contextlib.contextmanager
+    def expressions(self, barrier=False):
+        self._expressions.push(self.currentTable(), barrier=barrier)
+        try:
+            yield
+        finally:
+            self._expressions.pop()
+
+    def var(self, key):
+        return self._expressions.var(key)
 
-    def add(self, var, op):
-        self._expressions.add(var, op)
+    def add(self, var, key, operands):
+        self._expressions.add(var, key, operands)
 
     def generate(self, node):
         # Assuming the node is the top-level compound statement. Reorder everything to pu
@@ -356,7 +451,7 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
     def encode(self, node):
         if node.position is not None and node.position.line != self._line:
             self._line = node.position.line
-            self.addOp(LineSpec(self._line))
+            self.addOp(LineSpec(self._line, node.position.column))
         return self.visit(node)
 
     def visitCompoundStatementNode(self, node):
@@ -388,23 +483,25 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
 
     def visitUnaryNode(self, node):
         op1 = self.encode(node.expr)
-        var = self.var((node.op, op1, None))
+        key = expressionKey(node.op, op1)
+        var = self.var(key)
         if var is None:
             var = TempVar(node.type(), self.currentTable(), self._varcounter)
             op = UnaryOp(self.currentTable(), var, node.op, op1)
             self.addOp(op)
-            self.add(var, (node.op, op1, None))
+            self.add(var, key, (op1,))
         return var
 
     def visitBinaryNode(self, node):
         op1 = self.encode(node.op1)
         op2 = self.encode(node.op2)
-        var = self.var((node.op, op1, op2))
+        key = expressionKey(node.op, op1, op2)
+        var = self.var(key)
         if var is None:
             var = TempVar(node.type(), self.currentTable(), self._varcounter)
             op = BinaryOp(self.currentTable(), var, node.op, op1, op2)
             self.addOp(op)
-            self.add(var, (node.op, op1, op2))
+            self.add(var, key, (op1, op2))
         return var
 
     def visitStructNode(self, node):
@@ -414,14 +511,17 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
     def visitStateNode(self, node):
         init, main = self.currentState()
         self.addOp(init)
-        self.encode(node.init)
+        with self.expressions(barrier=True):
+            self.encode(node.init)
         self.addOp(main)
-        self.encode(node.main)
+        with self.expressions(barrier=True):
+            self.encode(node.main)
 
     def encodeCallableNode(self, node):
         label = self.getCallable(node)
         self.addOp(label)
-        self.encode(node.body)
+        with self.expressions(barrier=True):
+            self.encode(node.body)
 
     def visitFunctionNode(self, node):
         self.encodeCallableNode(node)
@@ -454,17 +554,21 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
     def visitIfNode(self, node):
         cond = self.encode(node.expr)
         l1 = Label(self._labelcounter) # true
+        # Expressions computed in a branch are not available after it
         if isinstance(node.no, EmptyNode):
             self.addOp(IfFalse(self.currentTable(), cond, l1))
-            self.encode(node.yes)
+            with self.expressions():
+                self.encode(node.yes)
             self.addOp(l1)
         else:
             l2 = Label(self._labelcounter) # next
             self.addOp(IfFalse(self.currentTable(), cond, l1))
-            self.encode(node.yes)
+            with self.expressions():
+                self.encode(node.yes)
             self.addOp(Jump(l2))
             self.addOp(l1)
-            self.encode(node.no)
+            with self.expressions():
+                self.encode(node.no)
             self.addOp(l2)
 
     def visitCallNode(self, node):
@@ -502,10 +606,11 @@ class ICGenerator(ASTScopedVisitorMixin, ASTLoopVisitorMixin, ASTStateVisitorMix
     def visitWhileNode(self, node):
         l1, l2 = self.currentLoop()
         self.addOp(l1)
-        var = self.encode(node.expr)
-        self.addOp(IfFalse(self.currentTable(), var, l2))
-        self.encode(node.body)
-        self.addOp(Jump(l1))
+        with self.expressions(barrier=True):
+            var = self.encode(node.expr)
+            self.addOp(IfFalse(self.currentTable(), var, l2))
+            self.encode(node.body)
+            self.addOp(Jump(l1))
         self.addOp(l2)
 
     def visitBreakNode(self, node):
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+
+from .interm import Counter, Label, CallableLabel, StateEnterLabel
+from .asm import BranchInstruction
+from .bcgen import compileProgram, writeProgram, attributeSizes
+from .wcet import WorstCaseAnalyzer
+
+
+# Stands for the action length in a configuration, followed by the
+# linked program:
+#
+# uint8_t number of actions
+#   uint16_t little endian: entry point of the action in the code
+#   uint16_t little endian: stack size of the action
+#   next action...
+# code
+LINKED_MARKER = 0xFFFF
+
+
+class LinkedProgram:
+    # entries are (entry point, stack size), warnings the compiler warnings
+    # and worstcases the WorstCase, for each action
+    def __init__(self, warnings, entries, code, worstcases=None):
+        self.warnings = warnings
+        self.entries = entries
+        self.code = code
+        self.worstcases = worstcases or []
+
+    def headerSize(self):
+        return 3 + 4 * len(self.entries)
+
+    def bytecode(self):
+        header = struct.pack('<HB', LINKED_MARKER, len(self.entries))
+        for entry, stacksize in self.entries:
+            header += struct.pack('<HH', entry, stacksize)
+        return header + self.code
+
+
+class Segment:
+    # Instructions from a callable label to the next callable or state
+    def __init__(self, ops):
+        self.ops = ops
+        self.label = ops[0]
+        self.local = set([op for op in ops if isinstance(op, Label)])
+        self.callees = [op.label for op in ops if isinstance(op, BranchInstruction) and isinstance(op.label, CallableLabel) and op.label not in self.local]
+
+    def key(self):
+        # Contents, with local labels numbered by first appearance and
+        # calls abstracted; see Linker._partition
+        numbers = {}
+        def target(label):
+            if label in self.local:
+                return numbers.setdefault(label, len(numbers))
+            return None
+        key = []
+        for op in self.ops:
+            if isinstance(op, Label):
+                key.append(('label', target(op)))
+            else:
+                stream = io.BytesIO()
+                op.write({}, stream)
+                key.append((stream.getvalue(), target(op.label) if isinstance(op, BranchInstruction) else None))
+        return tuple(key)
+
+
+class Linker:
+    # Links several actions into a single program. Callables that compile
+    # to the same code are only kept once; the entries still get their own
+    # VM context (program counter and stack) since each action keeps its
+    # state between reports.
+    def __init__(self):
+        self._shared = 0
+
+    def stats(self):
+        # Number of callables removed by the last link
+        return {'shared': self._shared}
+
+    def link(self, sources, sizes=None):
+        # sizes is a list of SizeReport, one per source, or None. Compile
+        # errors are raised as with compileBytecode.
+        analyzers = [WorstCaseAnalyzer() for _ in sources]
+        programs = [compileProgram(source, worstcase=analyzer) for source, analyzer in zip(sources, analyzers)]
+
+        segments = []
+        for program in programs:
+            segments.extend(self._segments(program.ops))
+        aliases = self._partition(segments)
+        self._shared = len(aliases)
+
+        ops = []
+        owners = {}
+        starts = []
+        counter = Counter()
+        for index, program in enumerate(programs):
+            start = Label(counter)
+            starts.append(start)
+            ops.append(start)
+            keep = True
+            for op in program.ops:
+                if isinstance(op, (CallableLabel, StateEnterLabel)):
+                    keep = op not in aliases
+                if not keep:
+                    continue
+                if isinstance(op, BranchInstruction):
+                    op.label = aliases.get(op.label, op.label)
+                ops.append(op)
+                owners[op] = index
+
+        attributes = None
+        if sizes is not None:
+            attributes = [attributeSizes(report, program.ast) for report, program in zip(sizes, programs)]
+        def attribute(op, size):
+            attributes[owners[op]](op, size)
+
+        code = io.BytesIO()
+        labels = writeProgram(ops, code, attribute=None if attributes is None else attribute)
+        entries = [(labels[start], program.stacksize) for start, program in zip(starts, programs)]
+        return LinkedProgram([program.warnings for program in programs], entries, code.getvalue(), worstcases=[analyzer.result() for analyzer in analyzers])
+
+    def _segments(self, ops):
+        segments = []
+        current = None
+        for op in ops:
+            if isinstance(op, (CallableLabel, StateEnterLabel)):
+                current = [] if isinstance(op, CallableLabel) else None
+                if current is not None:
+                    segments.append(current)
+            if current is not None:
+                current.append(op)
+        return [Segment(segment) for segment in segments]
+
+    def _partition(self, segments):
+        # Partition refinement: segments start grouped by contents, then
+        # groups are split until all the members of a group call the same
+        # groups, which handles recursion. Returns the label of each
+        # redundant callable => label of the one that is kept.
+        byLabel = dict([(segment.label, segment) for segment in segments])
+        keys = dict([(segment, segment.key()) for segment in segments])
+        classes = self._number(segments, keys)
+        while True:
+            keys = dict([(segment, (classes[segment], tuple([classes[byLabel[label]] for label in segment.callees]))) for segment in segments])
+            refined = self._number(segments, keys)
+            if len(set(refined.values())) == len(set(classes.values())):
+                break
+            classes = refined
+
+        aliases = {}
+        kept = {}
+        for segment in segments:
+            first = kept.setdefault(classes[segment], segment)
+            if first is not segment:
+                aliases[segment.label] = first.label
+        return aliases
+
+    @staticmethod
+    def _number(segments, keys):
+        numbers = {}
+        return dict([(segment, numbers.setdefault(keys[segment], len(numbers))) for segment in segments])
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+
+# pylint: disable=protected-access
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+from ptk.parser import LRParser, _StartState, _Accept, _Item, _Shift
+from ptk.grammar import Production
+from ptk.lexer import EOF
+from ptk.meta import version as ptkVersion
+
+
+# Bump this when the file layout changes
+FORMAT_VERSION = 1
+
+SHIFT = 0
+REDUCE = 1
+
+
+class _TableState:
+    # Stands for an LR state loaded from file; the item sets are not
+    # stored, only the index. Iterable so that ParseError can format it.
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __iter__(self):
+        return iter(['state %d' % self.index])
+
+    def __repr__(self):
+        return 'state %d' % self.index
+
+
+def _addStartProduction(cls):
+    # Same as LRParser.prepare; the start production must exist before the
+    # fingerprint is computed.
+    for prod in cls.productions():
+        if prod.name is _StartState:
+            return
+    def acceptor(_, result):
+        raise _Accept(result)
+    prod = Production(_StartState, acceptor)
+    prod.add_symbol(cls._default_start_symbol() if cls.startSymbol is None else cls.startSymbol, name='result')
+    cls.__productions__.insert(0, prod)
+    cls.startSymbol = _StartState
+
+
+def _symbols(productions):
+    # Anonymous symbols (lists, start state) are new objects each time the
+    # class is defined; they are identified by their position in this list.
+    symbols = []
+    indexes = {}
+    for prod in productions:
+        for symbol in [prod.name] + prod.right:
+            if symbol not in indexes:
+                indexes[symbol] = len(symbols)
+                symbols.append(symbol)
+    return symbols, indexes
+
+
+def grammarFingerprint(cls):
+    productions = cls.productions()
+    symbols, indexes = _symbols(productions)
+    data = {
+        'format': FORMAT_VERSION,
+        'ptk': ptkVersion,
+        'symbols': [symbol if isinstance(symbol, str) else None for symbol in symbols],
+        'tokens': sorted(cls.token_types()),
+        'precedences': [(assoc, sorted(terminals)) for assoc, terminals in cls.precedences()],
+        'productions': [(indexes[prod.name], [indexes[symbol] for symbol in prod.right], prod.precedence(cls)) for prod in productions],
+        }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def saveTables(cls, filename):
+    productions = cls.productions()
+    _, indexes = _symbols(productions)
+    prodIndexes = {id(prod): index for index, prod in enumerate(productions)}
+    states = {frozenset(items): index for index, items in enumerate(cls.__lrstates__)}
+
+    def symbolIndex(symbol):
+        return -1 if symbol is EOF else indexes[symbol]
+
+    actions = []
+    for (state, symbol), action in cls.__actions__.items():
+        if isinstance(action, _Shift):
+            actions.append((states[state], symbolIndex(symbol), SHIFT, states[action.new_state]))
+        else:
+            actions.append((states[state], symbolIndex(symbol), REDUCE, prodIndexes[id(action.item.production)]))
+
+    goto = [(states[state], symbolIndex(symbol), states[target]) for (state, symbol), target in cls._goto.items()]
+
+    data = {
+        'fingerprint': grammarFingerprint(cls),
+        'states': len(states),
+        'nSR': cls.nSR,
+        'nRR': cls.nRR,
+        'actions': sorted(actions),
+        'goto': sorted(goto),
+        }
+
+    path = os.path.dirname(filename) or '.'
+    try:
+        handle, tmpname = tempfile.mkstemp(dir=path)
+    except OSError: # Read-only install
+        return False
+    try:
+        with os.fdopen(handle, 'w', encoding='utf-8') as fileobj:
+            json.dump(data, fileobj, separators=(',', ':'))
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, filename)
+    except OSError:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        return False
+    return True
+
+
+def loadTables(cls, filename):
+    _addStartProduction(cls)
+
+    try:
+        with open(filename, 'r', encoding='utf-8') as fileobj:
+            data = json.load(fileobj)
+    except (OSError, ValueError):
+        return False
+    if data.get('fingerprint') != grammarFingerprint(cls):
+        return False
+
+    productions = cls.productions()
+    symbols, _ = _symbols(productions)
+    states = [_TableState(index) for index in range(data['states'])]
+
+    def symbolValue(index):
+        return EOF if index == -1 else symbols[index]
+
+    actions = {}
+    for state, symbol, kind, value in data['actions']:
+        symbol = symbolValue(symbol)
+        if kind == SHIFT:
+            actions[(states[state], symbol)] = cls._create_shift_action(states[value])
+        else:
+            prod = productions[value]
+            actions[(states[state], symbol)] = cls._create_reduce_action(_Item(prod, len(prod.right), symbol))
+
+    cls.__actions__ = actions
+    cls._goto = {(states[state], symbolValue(symbol)): states[target] for state, symbol, target in data['goto']}
+    cls._startState = states[0]
+    cls.nSR = data['nSR']
+    cls.nRR = data['nRR']
+    cls.__prepared__ = True
+    return True
+
+
+class CachedLRParser(LRParser):
+    # Building the LR(1) automaton takes seconds; the tables are persisted to
+    # this file and reloaded as long as the grammar fingerprint matches.
+    # None disables persistence.
+    tablesFilename = None
+
+    # Compilation may happen in a worker thread
+    _prepareLock = threading.Lock()
+
+    @classmethod
+    def prepare(cls):
+        with cls._prepareLock:
+            if cls.__prepared__:
+                return
+            if cls.tablesFilename is not None and loadTables(cls, cls.tablesFilename):
+                return
+            super().prepare()
+            if cls.tablesFilename is not None:
+                saveTables(cls, cls.tablesFilename)
@@ -43,6 +43,18 @@ class Opcodes:
     OPCODE_SUBTYPE_FLOW_YIELD = 0x02
     OPCODE_SUBTYPE_FLOW_JUMP = 0x03
     OPCODE_SUBTYPE_FLOW_JZ = 0x04
+    OPCODE_SUBTYPE_FLOW_JZR8 = 0x05
+    OPCODE_SUBTYPE_FLOW_JZR16 = 0x06
+
+    # Compare and branch: jump (8 bits displacement) unless the comparison
+    # holds. Same operands as a binary instruction, the first one is only
+    # read. In the same order as the binary comparisons.
+    OPCODE_SUBTYPE_FLOW_JZCLT = 0x07
+    OPCODE_SUBTYPE_FLOW_JZCGT = 0x08
+    OPCODE_SUBTYPE_FLOW_JZCLTE = 0x09
+    OPCODE_SUBTYPE_FLOW_JZCGTE = 0x0A
+    OPCODE_SUBTYPE_FLOW_JZCE = 0x0B
+    OPCODE_SUBTYPE_FLOW_JZCN = 0x0C
 
     OPCODE_SUBTYPE_STACK_PUSHI = 0x00
     OPCODE_SUBTYPE_STACK_PUSHF = 0x01
@@ -57,6 +69,19 @@ class Opcodes:
     OPCODE_VARIANT_A = 0x00
     OPCODE_VARIANT_C = 0x01
 
+    # Small integral constants: signed 8 or 16 bits immediate, converted
+    # to float when the other operand is a float. Also used by PUSHI and
+    # PUSHF, for which variant 0 is the 32 bits immediate.
+    OPCODE_VARIANT_C8 = 0x02
+    OPCODE_VARIANT_C16 = 0x03
+
+    # Branch target for JUMP and CALL: 16 bits absolute, or signed
+    # displacement from the end of the instruction. JZ uses the JZR8 and
+    # JZR16 subtypes instead, since its variant is the condition type.
+    OPCODE_VARIANT_ABS16 = 0x00
+    OPCODE_VARIANT_REL8 = 0x01
+    OPCODE_VARIANT_REL16 = 0x02
+
     # JZ may have an A variant, or 2 different C variants
     OPCODE_VARIANT_CI = 0x01
     OPCODE_VARIANT_CF = 0x02
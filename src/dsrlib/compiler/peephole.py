@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+import collections
+
+from .interm import Label
+from .codegen import RegAddr, ConstAddr
+from .opcodes import Opcodes
+from . import asm
+
+
+def instructionSize(instr):
+    return 0 if isinstance(instr, Label) else instr.size()
+
+
+def addrKey(addr):
+    # ConstAddr has no structural equality, and namedtuples of different
+    # classes compare equal if their fields do
+    if isinstance(addr, ConstAddr):
+        value = addr.value()
+        return ('const', addr.type(), value.hex() if isinstance(value, float) else value)
+    if isinstance(addr, RegAddr):
+        return ('reg', addr.reg)
+    return ('regoff', addr.reg, addr.offset, addr.type)
+
+
+def isSPAdjust(instr):
+    return isinstance(instr, (asm.Add, asm.Sub)) and addrKey(instr.dst) == ('reg', Opcodes.REGINDEX_SP) \
+      and isinstance(instr.src, ConstAddr) and instr.src.type() == 'int'
+
+
+class KnownValues:
+    # Locations known to hold the same value as another address, within a
+    # basic block. Stack slots based on different registers may alias.
+    def __init__(self):
+        self._values = {} # dst key => src key
+
+    def clear(self):
+        self._values = {}
+
+    def get(self, addr):
+        return self._values.get(addrKey(addr), None)
+
+    def set(self, dst, src):
+        self._values[addrKey(dst)] = addrKey(src)
+
+    @staticmethod
+    def _clobbers(written, key):
+        if key[0] == 'const':
+            return False
+        if written[0] == 'reg':
+            # Changing %SP or %TH moves every slot based on it
+            return key == written or (key[0] == 'regoff' and key[1] == written[1])
+        if key[0] == 'reg':
+            return False
+        return key[1] != written[1] or abs(key[2] - written[2]) < 4
+
+    def write(self, addr):
+        written = addrKey(addr)
+        self._values = {dst: src for dst, src in self._values.items() if not (self._clobbers(written, dst) or self._clobbers(written, src))}
+
+
+class PeepholeOptimizer:
+    RULES = ('deadcode', 'jumps', 'sp', 'loads')
+
+    def __init__(self, rules=None):
+        self._rules = self.RULES if rules is None else tuple(rules)
+        for rule in self._rules:
+            if rule not in self.RULES:
+                raise ValueError('Unknown peephole rule "%s"' % rule)
+        self._stats = collections.OrderedDict([(rule, [0, 0]) for rule in self.RULES])
+
+    def stats(self):
+        # rule => (applied, bytes saved)
+        return collections.OrderedDict([(rule, tuple(values)) for rule, values in self._stats.items()])
+
+    def report(self):
+        lines = ['%-10s %8s %8s' % ('rule', 'applied', 'bytes')]
+        for rule, (count, saved) in self._stats.items():
+            lines.append('%-10s %8d %8d' % (rule, count, saved))
+        return '\n'.join(lines)
+
+    def _count(self, rule, removed=()):
+        self._stats[rule][0] += 1
+        self._stats[rule][1] += sum([instructionSize(instr) for instr in removed])
+
+    def optimize(self, instructions):
+        instructions = list(instructions)
+        while True:
+            changed = False
+            for rule in self._rules:
+                instructions, applied = getattr(self, '_%s' % rule)(instructions)
+                changed = changed or applied
+            if not changed:
+                return instructions
+
+    @staticmethod
+    def _targets(instructions):
+        return set([instr.label for instr in instructions if isinstance(instr, asm.BranchInstruction)])
+
+    def _deadcode(self, instructions):
+        # Nothing after an unconditional jump or return is reachable until
+        # the next label that is the target of something
+        targets = self._targets(instructions)
+        result = []
+        dead = False
+        changed = False
+        for instr in instructions:
+            if isinstance(instr, Label):
+                dead = dead and instr not in targets
+                result.append(instr)
+            elif dead:
+                self._count('deadcode', [instr])
+                changed = True
+            else:
+                result.append(instr)
+                dead = isinstance(instr, (asm.Jump, asm.Ret))
+        return result, changed
+
+    def _jumps(self, instructions):
+        changed = False
+
+        def follow(index):
+            # First instruction at or after index, skipping labels
+            while index < len(instructions) and isinstance(instructions[index], Label):
+                index += 1
+            return instructions[index] if index < len(instructions) else None
+
+        positions = {instr: index for index, instr in enumerate(instructions) if isinstance(instr, Label)}
+
+        # Threading
+        for instr in instructions:
+            if not isinstance(instr, (asm.Jump, asm.JZ, asm.CompareBranch)):
+                continue
+            seen = set([instr.label])
+            target = follow(positions[instr.label])
+            while isinstance(target, asm.Jump) and target.label not in seen:
+                seen.add(target.label)
+                instr.label = target.label
+                self._count('jumps')
+                changed = True
+                target = follow(positions[instr.label])
+
+        # Jumps to the next instruction
+        result = []
+        for index, instr in enumerate(instructions):
+            if isinstance(instr, (asm.Jump, asm.JZ, asm.CompareBranch)):
+                next_ = index + 1
+                while next_ < len(instructions) and isinstance(instructions[next_], Label) and instructions[next_] is not instr.label:
+                    next_ += 1
+                if next_ < len(instructions) and instructions[next_] is instr.label:
+                    self._count('jumps', [instr])
+                    changed = True
+                    continue
+            result.append(instr)
+        return result, changed
+
+    def _sp(self, instructions):
+        # Fold consecutive constant adjustments of %SP, across labels that
+        # nothing jumps to
+        targets = self._targets(instructions)
+        result = []
+        changed = False
+        for instr in instructions:
+            if isSPAdjust(instr):
+                index = len(result) - 1
+                while index >= 0 and isinstance(result[index], Label) and result[index] not in targets:
+                    index -= 1
+                if index >= 0 and isSPAdjust(result[index]):
+                    previous = result[index]
+                    delta = sum([(1 if isinstance(adj, asm.Add) else -1) * adj.src.value() for adj in (previous, instr)])
+                    if delta == 0:
+                        del result[index]
+                        self._count('sp', [previous, instr])
+                    else:
+                        result[index] = (asm.Add if delta > 0 else asm.Sub)(RegAddr(Opcodes.REGINDEX_SP), ConstAddr(abs(delta)))
+                        result[index].span = previous.span
+                        self._count('sp', [instr])
+                    changed = True
+                    continue
+            result.append(instr)
+        return result, changed
+
+    def _loads(self, instructions):
+        targets = self._targets(instructions)
+        known = KnownValues()
+        result = []
+        changed = False
+        for instr in instructions:
+            if isinstance(instr, Label):
+                if instr in targets:
+                    known.clear()
+            elif isinstance(instr, asm.Load):
+                dst, src = addrKey(instr.dst), addrKey(instr.src)
+                if dst == src or known.get(instr.dst) == src or \
+                  (dst[0] == src[0] == 'regoff' and dst[3] == src[3] and known.get(instr.src) == dst):
+                    self._count('loads', [instr])
+                    changed = True
+                    continue
+                known.write(instr.dst)
+                # Registers clamp the value when written
+                if dst[0] == 'regoff':
+                    known.set(instr.dst, instr.src)
+            elif isinstance(instr, (asm.BinaryInstruction, asm.UnaryInstruction)):
+                known.write(instr.dst)
+            elif isinstance(instr, (asm.Jump, asm.JZ, asm.CompareBranch)):
+                pass
+            else:
+                # Calls, returns, yields, push and pop
+                known.clear()
+            result.append(instr)
+        return result, changed
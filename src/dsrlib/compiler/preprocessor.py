@@ -6,6 +6,9 @@ import re
 from ptk.lexer import LexerPosition
 
 
+IDENTIFIER = re.compile(r'\w+')
+
+
 class PreprocessorWarning(Exception):
     pass
 
@@ -14,15 +17,21 @@ class Preprocessor:
     def __init__(self, *args, comment=';', directive='#', **kwargs):
         super().__init__(*args, **kwargs)
         self._macros = {}
+        self._pragmas = []
         self._comment = comment
         self._directive = directive
 
     def preprocessed(self, line):
         raise NotImplementedError
 
+    def pragmas(self):
+        # (text, position) for each pragma directive, the directive name excluded
+        return list(self._pragmas)
+
     def addMacro(self, name, value=None):
+        # Values are expanded when used, not when defined
         exists = name in self._macros
-        self._macros[name] = (self.expandMacros(value), re.compile(r'(?:\W|\A)(%s)(?:\W|$)' % name))
+        self._macros[name] = '' if value is None else value
         if exists:
             raise PreprocessorWarning('macro "%s" redefined' % name)
 
@@ -32,22 +41,30 @@ class Preprocessor:
             return
         raise PreprocessorWarning('macro "%s" is not defined' % name)
 
-    def expandMacros(self, value):
-        changed = True
-        while changed:
-            changed = False
-            for val, regex in self._macros.values():
-                match = regex.search(value)
-                if match is not None:
-                    changed = True
-                    value = '%s%s%s' % (value[:match.start(1)], val, value[match.end(1):])
-                    break
-        return value
-
-    def preprocess(self, src): # pylint: disable=R0912,R0915
+    def expandMacros(self, value, expanding=frozenset()):
+        # A macro is not expanded again in its own expansion, which stops
+        # recursive definitions
+        def replace(match):
+            name = match.group(0)
+            if name in expanding or name not in self._macros:
+                return name
+            return self.expandMacros(self._macros[name], expanding | {name})
+        if not self._macros:
+            return value
+        return IDENTIFIER.sub(replace, value)
+
+    def preprocess(self, src):
+        warnings = []
+        for line in self.preprocessLines(src, warnings):
+            self.preprocessed(line)
+        return warnings
+
+    def preprocessLines(self, src, warnings): # pylint: disable=R0912,R0915
+        # Generates exactly one line for each source line, so positions in
+        # the output are the same as in the source. Warnings are appended
+        # as they are found.
         lineno = 0
         stack = [True]
-        warnings = []
 
         for line in src:
             lineno += 1
@@ -60,28 +77,28 @@ class Preprocessor:
 
             if sline.startswith('%selse' % self._directive):
                 stack[-1] = not stack[-1]
-                self.preprocessed('')
+                yield ''
                 continue
 
             if sline.startswith('%sendif' % self._directive):
                 stack.pop()
-                self.preprocessed('')
+                yield ''
                 continue
 
             if sline.startswith('%sifdef' % self._directive):
                 name = sline[6:].strip()
                 stack.append(name in self._macros)
-                self.preprocessed('')
+                yield ''
                 continue
 
             if sline.startswith('%sifndef' % self._directive):
                 name = sline[7:].strip()
                 stack.append(not name in self._macros)
-                self.preprocessed('')
+                yield ''
                 continue
 
             if not all(stack):
-                self.preprocessed('')
+                yield ''
                 continue
 
             if sline.startswith('%sdefine' % self._directive):
@@ -99,7 +116,12 @@ class Preprocessor:
                 except PreprocessorWarning as exc:
                     warnings.append((str(exc), LexerPosition(line=lineno, column=1)))
 
-                self.preprocessed('')
+                yield ''
+                continue
+
+            if sline.startswith('%spragma' % self._directive):
+                self._pragmas.append((sline[7:].strip(), LexerPosition(line=lineno, column=1)))
+                yield ''
                 continue
 
             if sline.startswith('%sundef' % self._directive):
@@ -109,12 +131,10 @@ class Preprocessor:
                 except PreprocessorWarning as exc:
                     warnings.append((str(exc), LexerPosition(line=lineno, column=1)))
 
-                self.preprocessed('')
+                yield ''
                 continue
 
-            self.preprocessed(self.expandMacros(line))
-
-        return warnings
+            yield self.expandMacros(line)
 
 
 class FilePreprocessor(Preprocessor):
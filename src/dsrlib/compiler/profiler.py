@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import inspect
+import collections
+
+from .opcodes import Opcodes
+
+
+FrameStats = collections.namedtuple('FrameStats', ['count', 'total', 'mean', 'worst', 'worstIndex'])
+
+
+def opcodeName(opcode):
+    # Type and subtype, e.g. BINARY_ADD or FLOW_JZR8; variants are merged
+    maintype = Opcodes.opcode_type(opcode)
+    subtype = Opcodes.opcode_subtype(opcode)
+    members = inspect.getmembers(Opcodes, lambda x: isinstance(x, int))
+    for typename, value in members:
+        if typename.startswith('OPCODE_TYPE_') and value == maintype:
+            prefix = 'OPCODE_SUBTYPE_%s_' % typename[len('OPCODE_TYPE_'):]
+            for name, value in members:
+                if name.startswith(prefix) and value == subtype:
+                    return name[len('OPCODE_SUBTYPE_'):]
+    return '0x%02x' % opcode
+
+
+class Profile:
+    # Counters of a VM created with profile=True (see vmwrapper.VM), joined
+    # with the source positions of a DebugInfo if there is one
+    def __init__(self, opcodeCounts, offsetCounts, frameCounts, debug=None):
+        self._opcodes = list(opcodeCounts)
+        self._offsets = list(offsetCounts)
+        self._frames = list(frameCounts)
+        self._debug = debug
+
+    @classmethod
+    def fromVM(cls, vm, debug=None):
+        if vm.opcode_counts is None:
+            raise ValueError('VM is not profiling')
+        return cls(vm.opcode_counts, vm.offset_counts, vm.frame_counts, debug=debug)
+
+    def instructions(self):
+        return sum(self._opcodes)
+
+    def byOpcode(self):
+        # (name, count), most executed first
+        counts = collections.OrderedDict()
+        for opcode, count in enumerate(self._opcodes):
+            if count:
+                name = opcodeName(opcode)
+                counts[name] = counts.get(name, 0) + count
+        return sorted(counts.items(), key=lambda item: -item[1])
+
+    def byOffset(self):
+        # (offset, count) of the executed instructions, in offset order
+        return [(offset, count) for offset, count in enumerate(self._offsets) if count]
+
+    def byLine(self):
+        # ((symbol, line), count), most executed first. Instructions without
+        # debug info are counted as (None, None).
+        counts = collections.OrderedDict()
+        for offset, count in self.byOffset():
+            position = None if self._debug is None else self._debug.lookup(offset)
+            key = (None, None) if position is None else (position[2], position[0])
+            counts[key] = counts.get(key, 0) + count
+        return sorted(counts.items(), key=lambda item: -item[1])
+
+    def frames(self):
+        if not self._frames:
+            return FrameStats(0, 0, 0.0, 0, None)
+        worst = max(self._frames)
+        total = sum(self._frames)
+        return FrameStats(len(self._frames), total, 1.0 * total / len(self._frames), worst, self._frames.index(worst))
+
+    def overBudget(self, budget):
+        # Indexes of the frames that executed more than budget instructions
+        return [index for index, count in enumerate(self._frames) if count > budget]
+
+    def text(self, budget=None, limit=10):
+        total = self.instructions()
+        def percent(count):
+            return 100.0 * count / total if total else 0.0
+
+        lines = ['%-50s %10s %6s' % ('opcode', 'count', '')]
+        for name, count in self.byOpcode()[:limit]:
+            lines.append('%-50s %10d %5.1f%%' % (name, count, percent(count)))
+
+        lines.append('')
+        lines.append('%-50s %10s %6s' % ('line', 'count', ''))
+        for (symbol, line), count in self.byLine()[:limit]:
+            name = 'unknown' if line is None else '%s, line %d' % (symbol or 'globals', line)
+            lines.append('%-50s %10d %5.1f%%' % (name, count, percent(count)))
+
+        stats = self.frames()
+        lines.append('')
+        lines.append('%-50s %10d' % ('frames', stats.count))
+        lines.append('%-50s %10.1f' % ('mean instructions per frame', stats.mean))
+        if stats.worstIndex is not None:
+            lines.append('%-50s %10d' % ('worst frame (#%d)' % stats.worstIndex, stats.worst))
+        if budget is not None:
+            lines.append('%-50s %10d' % ('frames over budget (%d)' % budget, len(self.overBudget(budget))))
+        return '\n'.join(lines)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+from .bcgen import compileBytecode
+
+
+class SizeReport:
+    # Bytecode size, as a tree: configurations, actions, states and
+    # callables, source lines
+    def __init__(self, name, size=0):
+        self.name = name
+        self.children = []
+        self._size = size
+        self._index = {} # name => first child with that name
+
+    def child(self, name):
+        child = self._index.get(name, None)
+        if child is None:
+            child = self.append(SizeReport(name))
+        return child
+
+    def append(self, child):
+        self.children.append(child)
+        self._index.setdefault(child.name, child)
+        return child
+
+    def add(self, size):
+        self._size += size
+
+    def size(self):
+        return self._size + sum([child.size() for child in self.children])
+
+    def toJSON(self):
+        return {'name': self.name, 'size': self.size(), 'children': [child.toJSON() for child in self.children]}
+
+    @classmethod
+    def fromJSON(cls, data):
+        report = cls(data['name'], data['size'] - sum([child['size'] for child in data['children']]))
+        for child in data['children']:
+            report.append(cls.fromJSON(child))
+        return report
+
+    def text(self, budget=None):
+        # One line per node; the percentage is relative to the budget if
+        # there is one, to the total size otherwise
+        total = self.size() if budget is None else budget
+        lines = []
+        def walk(node, depth):
+            name = '%s%s' % ('  ' * depth, node.name)
+            percent = 100.0 * node.size() / total if total else 0.0
+            lines.append('%-50s %6d %6.1f%%' % (name, node.size(), percent))
+            for child in node.children:
+                walk(child, depth + 1)
+        walk(self, 0)
+        if budget is not None:
+            lines.append('%-50s %6d' % ('budget', budget))
+        return '\n'.join(lines)
+
+
+def sourceSizes(source, name):
+    # Compile errors are raised as with compileBytecode
+    report = SizeReport(name)
+    compileBytecode(source, sizes=report)
+    return report
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import collections
+
+from .ast.nodes import StateNode
+from .interm import UnaryOp, BinaryOp, Assignment, TempVar
+from .dataflow import ControlFlowGraph, readOperands
+from .codegen import StackSize, scopeNames
+
+
+def bits(value):
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+def stackSizes(ast):
+    # Stack needed by each state and callable, by name
+    depths = {}
+    sizes = collections.OrderedDict()
+    for node, name in scopeNames(ast).items():
+        if isinstance(node, StateNode):
+            sizes[name] = StackSize(depths).visit(node)
+        else:
+            sizes[name] = StackSize(depths).calleeSize(node)
+    return sizes
+
+
+class Liveness:
+    # Live temporaries at the end of each basic block, as bit sets
+    def __init__(self, graph):
+        self.graph = graph
+        self.temps = []
+        self.indexes = {} # TempVar => bit index
+
+        uses = {}
+        defs = {}
+        for block in graph.blocks:
+            use = kill = 0
+            for op in block.ops:
+                for operand in readOperands(op):
+                    if isinstance(operand, TempVar):
+                        use |= self.bit(operand) & ~kill
+                dst = self.defined(op)
+                if dst is not None:
+                    kill |= self.bit(dst)
+            uses[block] = use
+            defs[block] = kill
+
+        predecessors = collections.defaultdict(list)
+        for block in graph.blocks:
+            for succ in block.successors:
+                predecessors[succ].append(block)
+
+        self.liveIn = dict([(block, 0) for block in graph.blocks])
+        self.liveOut = dict([(block, 0) for block in graph.blocks])
+        pending = list(graph.blocks)
+        queued = set(pending)
+        while pending:
+            block = pending.pop()
+            queued.discard(block)
+            out = 0
+            for succ in block.successors:
+                out |= self.liveIn[succ]
+            self.liveOut[block] = out
+            live = uses[block] | (out & ~defs[block])
+            if live != self.liveIn[block]:
+                self.liveIn[block] = live
+                for pred in predecessors[block]:
+                    if pred not in queued:
+                        queued.add(pred)
+                        pending.append(pred)
+
+    @staticmethod
+    def defined(op):
+        if isinstance(op, (Assignment, UnaryOp, BinaryOp)) and isinstance(op.dst, TempVar):
+            return op.dst
+        return None
+
+    def bit(self, temp):
+        index = self.indexes.get(temp, None)
+        if index is None:
+            index = self.indexes[temp] = len(self.temps)
+            self.temps.append(temp)
+        return 1 << index
+
+    def interferences(self):
+        # temp index => bit set of the temps that may not share its slot
+        result = collections.defaultdict(int)
+        for block in self.graph.blocks:
+            live = self.liveOut[block]
+            for op in reversed(block.ops):
+                dst = self.defined(op)
+                if dst is not None:
+                    mask = self.bit(dst)
+                    # The first operand is loaded in the destination before
+                    # the second one is read
+                    if isinstance(op, BinaryOp) and isinstance(op.op2, TempVar):
+                        live |= self.bit(op.op2)
+                    result[self.indexes[dst]] |= live & ~mask
+                    live &= ~mask
+                for operand in readOperands(op):
+                    if isinstance(operand, TempVar):
+                        live |= self.bit(operand)
+
+        for index, others in list(result.items()):
+            for other in bits(others):
+                result[other] |= 1 << index
+        return result
+
+
+class SlotAllocator:
+    # Temporaries whose live ranges do not overlap share stack slots
+    def __init__(self, enabled=True):
+        self._enabled = enabled
+        self._sizes = collections.OrderedDict()
+
+    def stats(self):
+        # state or callable => (stack size before, stack size after)
+        return collections.OrderedDict(self._sizes)
+
+    def report(self):
+        lines = ['%-30s %8s %8s' % ('scope', 'before', 'after')]
+        for name, (before, after) in self._sizes.items():
+            lines.append('%-30s %8d %8d' % (name, before, after))
+        return '\n'.join(lines)
+
+    def allocate(self, ast, ops):
+        before = stackSizes(ast)
+        if self._enabled:
+            self._allocate(ops)
+        for name, size in stackSizes(ast).items():
+            self._sizes[name] = (before[name], size)
+        return ops
+
+    def _allocate(self, ops):
+        liveness = Liveness(ControlFlowGraph(ops))
+        interferences = liveness.interferences()
+
+        # Tables where every temporary was optimized away only show up in
+        # the ops' scopes
+        tables = collections.OrderedDict()
+        for op in ops:
+            symbols = getattr(op, 'symbols', None)
+            if symbols is not None:
+                tables.setdefault(symbols, [])
+        for temp in liveness.temps:
+            tables.setdefault(temp.symbols, []).append(temp)
+
+        for symbols, temps in tables.items():
+            slots = {}
+            colors = {} # temp index => slot
+            for symbol in symbols:
+                if isinstance(symbol.value, TempVar):
+                    # Never referenced, e.g. removed by dataflow optimizations
+                    slots[symbol.name] = None
+            for temp in temps:
+                index = liveness.indexes[temp]
+                taken = set([colors[other] for other in bits(interferences[index]) if other in colors])
+                size = temp.type().size
+                count = 0
+                while (size, count) in taken:
+                    count += 1
+                colors[index] = slots[temp] = (size, count)
+            symbols.shareSlots(slots)
@@ -21,6 +21,8 @@ class SymbolScope(enum.Enum):
 class SymbolTable:
     def __init__(self, *, parent=None):
         self._symbols = []
+        self._index = {} # name => (symbol, offset)
+        self._end = 0 # Offset of the next symbol; addSize() does not change it
         self._size = 0
         self._parent = parent
         self._children = []
@@ -37,12 +39,10 @@ class SymbolTable:
         return self._parent
 
     def offset(self, name):
-        offset = 0
-        for symbol in self._symbols:
-            if symbol.name == name:
-                return offset
-            offset += symbol.size
-        return 0 # for pylint
+        try:
+            return self._index[name][1]
+        except KeyError:
+            return 0
 
     def addChild(self, child):
         self._children.append(child)
@@ -67,24 +67,51 @@ class SymbolTable:
         return self._size
 
     def has(self, name, recurse=True):
-        for symbol in self._symbols:
-            if symbol.name == name:
+        table = self
+        while table is not None:
+            if name in table._index: # pylint: disable=W0212
                 return True
-
-        if recurse and self._parent is not None:
-            return self._parent.has(name)
-
+            if not recurse:
+                break
+            table = table._parent # pylint: disable=W0212
         return False
 
     def add(self, name, value, size=None):
         size = value.type().size if size is None else size
+        symbol = Symbol(name, value, size)
+        self._symbols.append(symbol)
+        self._index.setdefault(name, (symbol, self._end)) # First one wins, as with a linear lookup
+        self._end += size
         self._size += size
-        self._symbols.append(Symbol(name, value, size))
 
-    def get(self, name):
+    def shareSlots(self, slots):
+        # slots: name => slot number. Symbols with the same slot number share
+        # the same storage; None means the symbol is never accessed.
+        extra = self._size - self._end
+        offsets = {}
+        self._end = 0
         for symbol in self._symbols:
-            if symbol.name == name:
-                return symbol
-        if self._parent is not None:
-            return self._parent.get(name)
+            if symbol.name not in slots:
+                offset = self._end
+                self._end += symbol.size
+            else:
+                slot = slots[symbol.name]
+                if slot is None:
+                    offset = self._end
+                elif slot in offsets:
+                    offset = offsets[slot]
+                else:
+                    offset = offsets[slot] = self._end
+                    self._end += symbol.size
+            if self._index[symbol.name][0] is symbol:
+                self._index[symbol.name] = (symbol, offset)
+        self._size = self._end + extra
+
+    def get(self, name):
+        table = self
+        while table is not None:
+            entry = table._index.get(name, None) # pylint: disable=W0212
+            if entry is not None:
+                return entry[0]
+            table = table._parent # pylint: disable=W0212
         raise KeyError(name)
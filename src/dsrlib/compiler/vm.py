@@ -0,0 +1,894 @@
+#!/usr/bin/env python3
+
+import math
+import array
+import struct
+import operator
+import functools
+
+from .opcodes import Opcodes
+
+
+# Same interface and semantics as the vmwrapper extension (VM.cpp), for
+# when it is not built. Each instruction is decoded once into a closure
+# that takes the controller state (9 bytes, see controller_state_t) and
+# returns the offset of the next instruction, or'ed with YIELDED when the
+# VM yields. int values wrap around on 32 bits, float values are rounded
+# to 32 bits after each operation, and float to int conversions behave as
+# on x86 (NaN and out of range values give INT32_MIN).
+
+FRAME_FORMAT = '<9siffffff'
+FRAME_SIZE = struct.calcsize(FRAME_FORMAT)
+
+YIELDED = 0x10000
+
+STATE_SIZE = 9
+
+_S32 = struct.Struct('<i')
+_U16 = struct.Struct('<H')
+_F32 = struct.Struct('<f')
+_INPUTS = struct.Struct('<iffffff')
+
+# Register index => (byte, shift, mask) in the controller state
+_FIELDS = {
+    Opcodes.REGINDEX_LPADX: (0, 0, 0xFF),
+    Opcodes.REGINDEX_LPADY: (1, 0, 0xFF),
+    Opcodes.REGINDEX_RPADX: (2, 0, 0xFF),
+    Opcodes.REGINDEX_RPADY: (3, 0, 0xFF),
+    Opcodes.REGINDEX_HAT: (4, 0, 0x0F),
+    Opcodes.REGINDEX_SQUARE: (4, 4, 1),
+    Opcodes.REGINDEX_CROSS: (4, 5, 1),
+    Opcodes.REGINDEX_CIRCLE: (4, 6, 1),
+    Opcodes.REGINDEX_TRIANGLE: (4, 7, 1),
+    Opcodes.REGINDEX_L1: (5, 0, 1),
+    Opcodes.REGINDEX_R1: (5, 1, 1),
+    Opcodes.REGINDEX_L2: (5, 2, 1),
+    Opcodes.REGINDEX_R2: (5, 3, 1),
+    Opcodes.REGINDEX_SHARE: (5, 4, 1),
+    Opcodes.REGINDEX_OPTIONS: (5, 5, 1),
+    Opcodes.REGINDEX_L3: (5, 6, 1),
+    Opcodes.REGINDEX_R3: (5, 7, 1),
+    Opcodes.REGINDEX_PS: (6, 0, 1),
+    Opcodes.REGINDEX_TPAD: (6, 1, 1),
+    Opcodes.REGINDEX_L2VALUE: (7, 0, 0xFF),
+    Opcodes.REGINDEX_R2VALUE: (8, 0, 0xFF),
+    }
+
+# Float registers, in the order of VM._floats
+_FLOAT_REGISTERS = (Opcodes.REGINDEX_IMUX, Opcodes.REGINDEX_IMUY, Opcodes.REGINDEX_IMUZ,
+                    Opcodes.REGINDEX_ACCELX, Opcodes.REGINDEX_ACCELY, Opcodes.REGINDEX_ACCELZ)
+
+_INF = float('inf')
+# What the FPU returns for 0 / 0; its sign depends on the platform
+_NAN = _INF - _INF
+
+
+def s32(value):
+    return ((value + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+def f32(value):
+    try:
+        return _F32.unpack(_F32.pack(value))[0]
+    except OverflowError:
+        return math.copysign(_INF, value)
+
+
+def ftoi(value):
+    if value != value or value >= 2147483648.0 or value <= -2147483649.0: # pylint: disable=comparison-with-itself
+        return -0x80000000
+    return int(value)
+
+
+def _clampS16(value):
+    return -32768 if value < -32768 else 32767 if value > 32767 else value
+
+
+def _idiv(op1, op2):
+    quotient = abs(op1) // abs(op2)
+    return s32(quotient if (op1 < 0) == (op2 < 0) else -quotient)
+
+
+def _fdiv(op1, op2):
+    if op2 == 0.0:
+        if op1 != op1 or op1 == 0.0: # pylint: disable=comparison-with-itself
+            return op1 if op1 != op1 else _NAN # pylint: disable=comparison-with-itself
+        return math.copysign(_INF, op1) * math.copysign(1.0, op2)
+    return f32(op1 / op2)
+
+
+_INT_OPS = {
+    Opcodes.OPCODE_SUBTYPE_BINARY_ADD: lambda op1, op2: s32(op1 + op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_SUB: lambda op1, op2: s32(op1 - op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_MUL: lambda op1, op2: s32(op1 * op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_DIV: _idiv,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CLT: lambda op1, op2: int(op1 < op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_CGT: lambda op1, op2: int(op1 > op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_CLTE: lambda op1, op2: int(op1 <= op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_CGTE: lambda op1, op2: int(op1 >= op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_CE: lambda op1, op2: int(op1 == op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_CN: lambda op1, op2: int(op1 != op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_AND: lambda op1, op2: int(op1 != 0 and op2 != 0),
+    Opcodes.OPCODE_SUBTYPE_BINARY_OR: lambda op1, op2: int(op1 != 0 or op2 != 0),
+    Opcodes.OPCODE_SUBTYPE_BINARY_LOAD: lambda op1, op2: op2,
+    }
+
+_FLOAT_OPS = {
+    Opcodes.OPCODE_SUBTYPE_BINARY_ADD: lambda op1, op2: f32(op1 + op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_SUB: lambda op1, op2: f32(op1 - op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_MUL: lambda op1, op2: f32(op1 * op2),
+    Opcodes.OPCODE_SUBTYPE_BINARY_DIV: _fdiv,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CLT: lambda op1, op2: 1.0 if op1 < op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CGT: lambda op1, op2: 1.0 if op1 > op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CLTE: lambda op1, op2: 1.0 if op1 <= op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CGTE: lambda op1, op2: 1.0 if op1 >= op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CE: lambda op1, op2: 1.0 if op1 == op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_CN: lambda op1, op2: 1.0 if op1 != op2 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_AND: lambda op1, op2: 1.0 if op1 != 0.0 and op2 != 0.0 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_OR: lambda op1, op2: 1.0 if op1 != 0.0 or op2 != 0.0 else 0.0,
+    Opcodes.OPCODE_SUBTYPE_BINARY_LOAD: lambda op1, op2: op2,
+    }
+
+# Compare and branch subtypes; the branch is taken unless the comparison holds
+_COMPARISONS = {
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT: operator.lt,
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCGT: operator.gt,
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCLTE: operator.le,
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCGTE: operator.ge,
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCE: operator.eq,
+    Opcodes.OPCODE_SUBTYPE_FLOW_JZCN: operator.ne,
+    }
+
+
+def _identity(op1, op2): # pylint: disable=unused-argument
+    return op1
+
+
+def _fail(message):
+    # Where VM.cpp asserts; stands for a register reader or writer, an
+    # operand or an instruction
+    def run(*args): # pylint: disable=unused-argument
+        raise RuntimeError(message)
+    return run
+
+
+class _Reader:
+    # Bytecode loads, as VM::LoadU8 and friends. Reading past the end gives
+    # zeroes.
+    def __init__(self, bytecode, offset):
+        self.bytecode = bytecode
+        self.offset = offset
+        self.targets = []
+        self.falls = True
+
+    def u8(self):
+        self.offset += 1
+        return self.bytecode[self.offset - 1]
+
+    def s8(self):
+        value = self.u8()
+        return value - 0x100 if value & 0x80 else value
+
+    def s16(self):
+        value = self.u8() | (self.u8() << 8)
+        return value - 0x10000 if value & 0x8000 else value
+
+    def s32(self):
+        value, = _S32.unpack_from(self.bytecode, self.offset)
+        self.offset += 4
+        return value
+
+    def f32(self):
+        value, = _F32.unpack_from(self.bytecode, self.offset)
+        self.offset += 4
+        return value
+
+    def immediate(self, opcode):
+        variant = Opcodes.opcode_variant(opcode)
+        if variant == Opcodes.OPCODE_VARIANT_C8:
+            return self.s8()
+        if variant == Opcodes.OPCODE_VARIANT_C16:
+            return self.s16()
+        return self.s32()
+
+    def target(self, variant):
+        # Relative displacements start from the end of the instruction
+        if variant == Opcodes.OPCODE_VARIANT_REL8:
+            delta = self.s8()
+            target = (self.offset + delta) & 0xFFFF
+        elif variant == Opcodes.OPCODE_VARIANT_REL16:
+            delta = self.s16()
+            target = (self.offset + delta) & 0xFFFF
+        else:
+            target = self.u8() | (self.u8() << 8)
+        self.targets.append(target)
+        return target
+
+
+class Report:
+    # Same as vmwrapper.Report: the controller state and what the IMU
+    # integrator provides
+    DEFAULTS = (('LPadX', 127), ('LPadY', 127), ('RPadX', 127), ('RPadY', 127), ('Hat', 8),
+                ('Square', False), ('Cross', False), ('Circle', False), ('Triangle', False),
+                ('L1', False), ('R1', False), ('L2', False), ('R2', False), ('Share', False), ('Options', False),
+                ('L3', False), ('R3', False), ('PS', False), ('TPad', False),
+                ('L2Value', 0), ('R2Value', 0), ('DELTA', 5000), ('IMUX', 0.0), ('IMUY', 0.0), ('IMUZ', 0.0))
+
+    def __init__(self, *args, **kwargs):
+        self._state = bytearray(STATE_SIZE)
+        self._delta = 5000
+        self._imu = [0.0, 0.0, 0.0]
+
+        names = [name for name, _ in self.DEFAULTS]
+        if len(args) > len(names):
+            raise TypeError('Report takes at most %d arguments (%d given)' % (len(names), len(args)))
+        values = dict(self.DEFAULTS)
+        values.update(zip(names, args))
+        for name, value in kwargs.items():
+            if name not in values:
+                raise TypeError("'%s' is an invalid keyword argument for Report" % name)
+            values[name] = value
+        for name in names:
+            setattr(self, name, values[name])
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0): # pylint: disable=invalid-name
+        # The controller state is the 9 bytes at offset in a writable
+        # buffer, without copying
+        view = memoryview(buffer)
+        if view.readonly:
+            raise TypeError('buffer must be writable')
+        if not view.c_contiguous:
+            raise ValueError('buffer must be contiguous')
+        view = view.cast('B')
+        if offset < 0 or offset + STATE_SIZE > len(view):
+            raise ValueError('offset must be in the 0..%d range' % (len(view) - STATE_SIZE))
+        report = cls()
+        report._state = view[offset:offset + STATE_SIZE] # pylint: disable=protected-access
+        return report
+
+    def __buffer__(self, flags): # pylint: disable=unused-argument
+        # memoryview(report) from Python 3.12 on
+        return memoryview(self._state)
+
+    def _field(index, maxval=None): # pylint: disable=no-self-argument
+        name = Opcodes.register_name(index)
+        byte, shift, mask = _FIELDS[index]
+        if mask == 1:
+            def getter(self):
+                return bool((self._state[byte] >> shift) & 1) # pylint: disable=protected-access
+            def setter(self, value):
+                if not isinstance(value, bool):
+                    raise TypeError('%s must be a bool' % name)
+                state = self._state # pylint: disable=protected-access
+                state[byte] = (state[byte] & ~(1 << shift) & 0xFF) | (int(value) << shift)
+        else:
+            maxval = mask if maxval is None else maxval
+            def getter(self):
+                return (self._state[byte] >> shift) & mask # pylint: disable=protected-access
+            def setter(self, value):
+                if not isinstance(value, int):
+                    raise TypeError('%s value must be an int' % name)
+                if value < 0 or value > maxval:
+                    raise ValueError('%s must be in the 0..%d range' % (name, maxval))
+                state = self._state # pylint: disable=protected-access
+                state[byte] = (state[byte] & ~(mask << shift) & 0xFF) | (value << shift)
+        return property(getter, setter)
+
+    def _imuField(name, index): # pylint: disable=no-self-argument
+        def getter(self):
+            return self._imu[index] # pylint: disable=protected-access
+        def setter(self, value):
+            if not isinstance(value, float):
+                raise TypeError('%s must be a float' % name)
+            self._imu[index] = f32(value) # pylint: disable=protected-access
+        return property(getter, setter)
+
+    LPadX = _field(Opcodes.REGINDEX_LPADX)
+    LPadY = _field(Opcodes.REGINDEX_LPADY)
+    RPadX = _field(Opcodes.REGINDEX_RPADX)
+    RPadY = _field(Opcodes.REGINDEX_RPADY)
+    Hat = _field(Opcodes.REGINDEX_HAT, 8)
+    L2Value = _field(Opcodes.REGINDEX_L2VALUE)
+    R2Value = _field(Opcodes.REGINDEX_R2VALUE)
+
+    Square = _field(Opcodes.REGINDEX_SQUARE)
+    Cross = _field(Opcodes.REGINDEX_CROSS)
+    Circle = _field(Opcodes.REGINDEX_CIRCLE)
+    Triangle = _field(Opcodes.REGINDEX_TRIANGLE)
+    L1 = _field(Opcodes.REGINDEX_L1)
+    R1 = _field(Opcodes.REGINDEX_R1)
+    L2 = _field(Opcodes.REGINDEX_L2)
+    R2 = _field(Opcodes.REGINDEX_R2)
+    Share = _field(Opcodes.REGINDEX_SHARE)
+    Options = _field(Opcodes.REGINDEX_OPTIONS)
+    L3 = _field(Opcodes.REGINDEX_L3)
+    R3 = _field(Opcodes.REGINDEX_R3)
+    PS = _field(Opcodes.REGINDEX_PS)
+    TPad = _field(Opcodes.REGINDEX_TPAD)
+
+    IMUX = _imuField('IMUX', 0)
+    IMUY = _imuField('IMUY', 1)
+    IMUZ = _imuField('IMUZ', 2)
+
+    del _field, _imuField
+
+    @property
+    def DELTA(self): # pylint: disable=invalid-name
+        return self._delta
+
+    @DELTA.setter
+    def DELTA(self, value): # pylint: disable=invalid-name
+        if not isinstance(value, int):
+            raise TypeError('DELTA must be an integer')
+        if value <= 0 or value > 32767:
+            raise ValueError('DELTA must be in the 1..32767 range')
+        self._delta = value
+
+
+class VM: # pylint: disable=too-many-public-methods
+    def __init__(self, bytecode, stacksize, entry=0, profile=False):
+        if not isinstance(bytecode, bytes):
+            raise TypeError('bytecode must be a bytes object')
+
+        self._bytecode = bytecode
+        self._stacksize = stacksize
+        self._stack = bytearray(stacksize)
+        self._offset = entry
+        self._sp = 0
+        self._th = 0
+        self._delta = 0
+        self._floats = [0.0] * len(_FLOAT_REGISTERS)
+
+        self._profiling = profile
+        self._opcodeCounts = [0] * 256
+        self._offsetCounts = [0] * len(bytecode)
+        self._frameCounts = []
+        self._frameSteps = 0
+
+        # Operands may be read past the last instruction
+        self._padded = bytecode + bytes(8)
+        self._code = [functools.partial(self._decodeAt, offset) for offset in range(len(bytecode))]
+        self._predecode(entry)
+
+    # vmwrapper.VM interface
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def SP(self): # pylint: disable=invalid-name
+        return self._sp
+
+    @SP.setter
+    def SP(self, value): # pylint: disable=invalid-name
+        self._sp = self._checkRegister('SP', value)
+
+    @property
+    def TH(self): # pylint: disable=invalid-name
+        return self._th
+
+    @TH.setter
+    def TH(self, value): # pylint: disable=invalid-name
+        self._th = self._checkRegister('TH', value)
+
+    @property
+    def opcode_counts(self): # pylint: disable=invalid-name
+        return array.array('I', self._opcodeCounts) if self._profiling else None
+
+    @property
+    def offset_counts(self): # pylint: disable=invalid-name
+        return array.array('I', self._offsetCounts) if self._profiling else None
+
+    @property
+    def frame_counts(self): # pylint: disable=invalid-name
+        return array.array('I', self._frameCounts) if self._profiling else None
+
+    def get_stack(self): # pylint: disable=invalid-name
+        return bytes(self._stack[:self._sp])
+
+    def push(self, values):
+        if not isinstance(values, bytes):
+            raise TypeError('stack must be a bytes object')
+        if self._sp + len(values) > self._stacksize:
+            raise RuntimeError('Stack overflow')
+        self._stack[self._sp:self._sp + len(values)] = values
+        self._sp += len(values)
+
+    def step(self, report):
+        if not isinstance(report, Report):
+            raise TypeError('report must be a Report')
+        self._delta = report._delta # pylint: disable=protected-access
+        self._floats[:3] = report._imu # pylint: disable=protected-access
+        return self._run(report._state, 1) == 1 # pylint: disable=protected-access
+
+    def run_frames(self, frames, max_steps=100000): # pylint: disable=invalid-name
+        # See vmwrapper.VM.run_frames; max_steps 0 means no limit
+        view = memoryview(frames)
+        if view.readonly:
+            raise TypeError('frames must be writable')
+        if not view.c_contiguous or view.nbytes % FRAME_SIZE:
+            raise ValueError('frames must be a contiguous buffer of %d bytes frames' % FRAME_SIZE)
+        view = view.cast('B')
+
+        total = 0
+        for index in range(len(view) // FRAME_SIZE):
+            start = index * FRAME_SIZE
+            inputs = _INPUTS.unpack_from(view, start + STATE_SIZE)
+            if not inputs[0]:
+                continue
+            self._delta = inputs[0]
+            self._floats[:] = inputs[1:]
+
+            steps = self._run(view[start:start + STATE_SIZE], max_steps if max_steps else -1)
+            if steps < 0:
+                raise RuntimeError('frame %d did not yield after %d instructions' % (index, max_steps))
+            total += steps
+        return total
+
+    def reset_profile(self): # pylint: disable=invalid-name
+        self._opcodeCounts = [0] * 256
+        self._offsetCounts = [0] * len(self._bytecode)
+        self._frameCounts = []
+        self._frameSteps = 0
+
+    @staticmethod
+    def _checkRegister(name, value):
+        if not isinstance(value, int):
+            raise TypeError('%s must be an int' % name)
+        if value < -32768 or value > 32767:
+            raise RuntimeError('%s must be in the -32768..32767 range' % name)
+        return value
+
+    # Execution
+
+    def _run(self, state, limit):
+        # Runs until a yield; returns the number of instructions executed,
+        # or -1 after limit instructions without a yield
+        if self._profiling:
+            return self._runProfiled(state, limit)
+
+        code = self._code
+        offset = self._offset
+        steps = 0
+        try:
+            while True:
+                if steps == limit:
+                    return -1
+                steps += 1
+                offset = code[offset](state)
+                if offset & YIELDED:
+                    offset &= 0xFFFF
+                    return steps
+        finally:
+            self._offset = offset
+
+    def _runProfiled(self, state, limit):
+        code = self._code
+        bytecode = self._bytecode
+        opcodes = self._opcodeCounts
+        offsets = self._offsetCounts
+        offset = self._offset
+        steps = 0
+        try:
+            while True:
+                if steps == limit:
+                    return -1
+                steps += 1
+                current = offset
+                offset = code[offset](state)
+                opcodes[bytecode[current]] += 1
+                offsets[current] += 1
+                self._frameSteps += 1
+                if offset & YIELDED:
+                    offset &= 0xFFFF
+                    self._frameCounts.append(self._frameSteps)
+                    self._frameSteps = 0
+                    return steps
+        finally:
+            self._offset = offset
+
+    # Decoding
+
+    def _predecode(self, entry):
+        # Everything reachable from the entry point. Other offsets (return
+        # addresses changed by the program) are decoded when first run.
+        pending = [entry]
+        decoded = set()
+        while pending:
+            offset = pending.pop()
+            if offset in decoded or offset >= len(self._bytecode):
+                continue
+            decoded.add(offset)
+            run, reader = self._decode(offset)
+            self._code[offset] = run
+            pending.extend(reader.targets)
+            if reader.falls:
+                pending.append(reader.offset)
+
+    def _decodeAt(self, offset, state):
+        run, _ = self._decode(offset)
+        self._code[offset] = run
+        return run(state)
+
+    def _decode(self, offset):
+        reader = _Reader(self._padded, offset)
+        opcode = reader.u8()
+        maintype = Opcodes.opcode_type(opcode)
+        if maintype == Opcodes.OPCODE_TYPE_BINARY:
+            run = self._decodeBinary(reader, opcode)
+        elif maintype == Opcodes.OPCODE_TYPE_UNARY:
+            run = self._decodeUnary(reader, opcode)
+        elif maintype == Opcodes.OPCODE_TYPE_STACK:
+            run = self._decodeStack(reader, opcode)
+        else:
+            run = self._decodeFlow(reader, opcode)
+        return run, reader
+
+    def _next(self, reader):
+        nxt = reader.offset & 0xFFFF
+        def run(state): # pylint: disable=unused-argument
+            return nxt
+        return run
+
+    def _decodeBinary(self, reader, opcode): # pylint: disable=too-many-locals,too-many-return-statements
+        subtype = Opcodes.opcode_subtype(opcode)
+        stack = self._stack
+        dst = reader.u8() << 8
+
+        if dst >> 14 == Opcodes.ADDR_TYPE_REG:
+            index = (dst >> 8) & 0b111111
+            write = self._intWriter(index)
+            if subtype == Opcodes.OPCODE_SUBTYPE_BINARY_CAST:
+                load = self._floatOperand(reader, opcode)
+                nxt = reader.offset
+                def castRegister(state):
+                    write(state, ftoi(load(state)))
+                    return nxt
+                return castRegister
+            load = self._intOperand(reader, opcode)
+            read = self._intReader(index)
+            binop = _INT_OPS.get(subtype, _identity)
+            nxt = reader.offset
+            def binaryRegister(state):
+                write(state, binop(read(state), load(state)))
+                return nxt
+            return binaryRegister
+
+        if dst >> 14 != Opcodes.ADDR_TYPE_REGOFF:
+            return self._next(reader)
+
+        dst |= reader.u8()
+        address = self._address(dst)
+        if (dst >> 11) & 1 == Opcodes.ADDR_VALTYPE_INT:
+            if subtype == Opcodes.OPCODE_SUBTYPE_BINARY_CAST:
+                load = self._floatOperand(reader, opcode)
+                nxt = reader.offset
+                def castInt(state):
+                    _S32.pack_into(stack, address(state), ftoi(load(state)))
+                    return nxt
+                return castInt
+            load = self._intOperand(reader, opcode)
+            binop = _INT_OPS.get(subtype, _identity)
+            nxt = reader.offset
+            def binaryInt(state):
+                addr = address(state)
+                _S32.pack_into(stack, addr, binop(_S32.unpack_from(stack, addr)[0], load(state)))
+                return nxt
+            return binaryInt
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_BINARY_CAST:
+            load = self._intOperand(reader, opcode)
+            nxt = reader.offset
+            def castFloat(state):
+                _F32.pack_into(stack, address(state), f32(load(state)))
+                return nxt
+            return castFloat
+        load = self._floatOperand(reader, opcode)
+        binop = _FLOAT_OPS.get(subtype, _identity)
+        nxt = reader.offset
+        def binaryFloat(state):
+            addr = address(state)
+            _F32.pack_into(stack, addr, binop(_F32.unpack_from(stack, addr)[0], load(state)))
+            return nxt
+        return binaryFloat
+
+    def _decodeUnary(self, reader, opcode): # pylint: disable=too-many-locals
+        subtype = Opcodes.opcode_subtype(opcode)
+        stack = self._stack
+        addr = reader.u8() << 8
+        addrtype = addr >> 14
+        if addrtype != Opcodes.ADDR_TYPE_REG:
+            addr |= reader.u8()
+        nxt = reader.offset
+
+        if addrtype == Opcodes.ADDR_TYPE_REGOFF and (addr >> 11) & 1 == Opcodes.ADDR_VALTYPE_FLOAT:
+            unop = {Opcodes.OPCODE_SUBTYPE_UNARY_NEG: operator.neg,
+                    Opcodes.OPCODE_SUBTYPE_UNARY_NOT: lambda value: 1.0 if value == 0.0 else 0.0}.get(subtype, lambda value: value)
+            address = self._address(addr)
+            def unaryFloat(state):
+                offset = address(state)
+                _F32.pack_into(stack, offset, unop(_F32.unpack_from(stack, offset)[0]))
+                return nxt
+            return unaryFloat
+
+        unop = {Opcodes.OPCODE_SUBTYPE_UNARY_NEG: lambda value: s32(-value),
+                Opcodes.OPCODE_SUBTYPE_UNARY_NOT: lambda value: int(value == 0)}.get(subtype, lambda value: value)
+        if addrtype == Opcodes.ADDR_TYPE_REG:
+            index = (addr >> 8) & 0b111111
+            read = self._intReader(index)
+            write = self._intWriter(index)
+            def unaryRegister(state):
+                write(state, unop(read(state)))
+                return nxt
+            return unaryRegister
+        if addrtype != Opcodes.ADDR_TYPE_REGOFF:
+            return self._next(reader)
+
+        address = self._address(addr)
+        def unaryInt(state):
+            offset = address(state)
+            _S32.pack_into(stack, offset, unop(_S32.unpack_from(stack, offset)[0]))
+            return nxt
+        return unaryInt
+
+    def _decodeStack(self, reader, opcode): # pylint: disable=too-many-return-statements
+        subtype = Opcodes.opcode_subtype(opcode)
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_STACK_POP:
+            index = reader.u8() & 0b111111
+            nxt = reader.offset
+            if index not in (Opcodes.REGINDEX_SP, Opcodes.REGINDEX_TH):
+                return _fail('Cannot pop to register %d' % index)
+            name = '_sp' if index == Opcodes.REGINDEX_SP else '_th'
+            def pop(state): # pylint: disable=unused-argument
+                self._sp -= 4
+                setattr(self, name, _clampS16(_S32.unpack_from(self._stack, self._sp)[0]))
+                return nxt
+            return pop
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSHI:
+            ivalue = reader.immediate(opcode)
+            return self._pushValue(reader, _S32, lambda state: ivalue)
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSHF:
+            fvalue = reader.f32() if Opcodes.opcode_variant(opcode) == 0 else f32(reader.immediate(opcode))
+            return self._pushValue(reader, _F32, lambda state: fvalue)
+
+        if subtype != Opcodes.OPCODE_SUBTYPE_STACK_PUSH:
+            return self._next(reader)
+
+        addr = reader.u8() << 8
+        if addr >> 14 == Opcodes.ADDR_TYPE_REG:
+            index = (addr >> 8) & 0b111111
+            if index in _FLOAT_REGISTERS:
+                return self._pushValue(reader, _F32, self._floatReader(index))
+            return self._pushValue(reader, _S32, self._intReader(index))
+        if addr >> 14 != Opcodes.ADDR_TYPE_REGOFF:
+            return self._next(reader)
+
+        # Copies the 4 bytes, whatever the type
+        addr |= reader.u8()
+        address = self._address(addr)
+        nxt = reader.offset
+        stack = self._stack
+        def push(state):
+            offset = address(state)
+            sp = self._sp
+            stack[sp:sp + 4] = stack[offset:offset + 4]
+            self._sp = sp + 4
+            return nxt
+        return push
+
+    def _pushValue(self, reader, fmt, load):
+        stack = self._stack
+        nxt = reader.offset
+        def run(state):
+            fmt.pack_into(stack, self._sp, load(state))
+            self._sp += 4
+            return nxt
+        return run
+
+    def _decodeFlow(self, reader, opcode): # pylint: disable=too-many-return-statements
+        subtype = Opcodes.opcode_subtype(opcode)
+        variant = Opcodes.opcode_variant(opcode)
+        stack = self._stack
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_FLOW_JUMP:
+            target = reader.target(variant)
+            reader.falls = False
+            return lambda state: target
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_FLOW_YIELD:
+            nxt = reader.offset | YIELDED
+            return lambda state: nxt
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_FLOW_CALL:
+            target = reader.target(variant)
+            nxt = reader.offset & 0xFFFF
+            def call(state): # pylint: disable=unused-argument
+                _U16.pack_into(stack, self._sp, nxt)
+                self._sp += 2
+                return target
+            return call
+
+        if subtype == Opcodes.OPCODE_SUBTYPE_FLOW_RET:
+            reader.falls = False
+            def ret(state): # pylint: disable=unused-argument
+                self._sp -= 2
+                return _U16.unpack_from(stack, self._sp)[0]
+            return ret
+
+        if subtype in (Opcodes.OPCODE_SUBTYPE_FLOW_JZ, Opcodes.OPCODE_SUBTYPE_FLOW_JZR8, Opcodes.OPCODE_SUBTYPE_FLOW_JZR16):
+            test = self._zeroTest(reader, variant)
+            target = reader.target({Opcodes.OPCODE_SUBTYPE_FLOW_JZR8: Opcodes.OPCODE_VARIANT_REL8,
+                                    Opcodes.OPCODE_SUBTYPE_FLOW_JZR16: Opcodes.OPCODE_VARIANT_REL16}.get(subtype, Opcodes.OPCODE_VARIANT_ABS16))
+        elif subtype in _COMPARISONS:
+            test = self._compareTest(reader, opcode)
+            target = reader.target(Opcodes.OPCODE_VARIANT_REL8)
+        else:
+            return self._next(reader)
+
+        nxt = reader.offset & 0xFFFF
+        def branch(state):
+            return target if test(state) else nxt
+        return branch
+
+    def _zeroTest(self, reader, variant):
+        # Whether JZ jumps
+        if variant == Opcodes.OPCODE_VARIANT_CI:
+            value = reader.s32() == 0
+            return lambda state: value
+        if variant == Opcodes.OPCODE_VARIANT_CF:
+            value = reader.f32() == 0.0
+            return lambda state: value
+        if variant != Opcodes.OPCODE_VARIANT_A:
+            return lambda state: False
+
+        addr = reader.u8() << 8
+        if addr >> 14 == Opcodes.ADDR_TYPE_REG:
+            index = (addr >> 8) & 0b111111
+            read = self._floatReader(index) if index in _FLOAT_REGISTERS else self._intReader(index)
+            return lambda state: read(state) == 0
+        if addr >> 14 != Opcodes.ADDR_TYPE_REGOFF:
+            return lambda state: False
+
+        addr |= reader.u8()
+        read = self._stackReader(addr)
+        return lambda state: read(state) == 0
+
+    def _compareTest(self, reader, opcode):
+        # Whether a compare and branch jumps, i.e. the comparison does not
+        # hold. The operands are those of the binary comparison.
+        compare = _COMPARISONS[Opcodes.opcode_subtype(opcode)]
+        binop = Opcodes.make_opcode(Opcodes.OPCODE_TYPE_BINARY,
+                                    Opcodes.opcode_subtype(opcode) - Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT + Opcodes.OPCODE_SUBTYPE_BINARY_CLT,
+                                    Opcodes.opcode_variant(opcode))[0]
+
+        addr = reader.u8() << 8
+        if addr >> 14 == Opcodes.ADDR_TYPE_REG:
+            index = (addr >> 8) & 0b111111
+            if index in _FLOAT_REGISTERS:
+                read = self._floatReader(index)
+                load = self._floatOperand(reader, binop)
+            else:
+                read = self._intReader(index)
+                load = self._intOperand(reader, binop)
+        elif addr >> 14 == Opcodes.ADDR_TYPE_REGOFF:
+            addr |= reader.u8()
+            read = self._stackReader(addr)
+            if (addr >> 11) & 1 == Opcodes.ADDR_VALTYPE_FLOAT:
+                load = self._floatOperand(reader, binop)
+            else:
+                load = self._intOperand(reader, binop)
+        else:
+            return lambda state: True
+        return lambda state: not compare(read(state), load(state))
+
+    # Operands
+
+    def _intOperand(self, reader, opcode):
+        # VM::LoadIntAddr
+        if Opcodes.opcode_variant(opcode) != Opcodes.OPCODE_VARIANT_A:
+            value = reader.immediate(opcode)
+            return lambda state: value
+
+        addr = reader.u8() << 8
+        if addr >> 14 == Opcodes.ADDR_TYPE_REG:
+            return self._intReader((addr >> 8) & 0b111111)
+        if addr >> 14 != Opcodes.ADDR_TYPE_REGOFF:
+            return lambda state: 0
+        addr |= reader.u8()
+        if (addr >> 11) & 1 != Opcodes.ADDR_VALTYPE_INT:
+            return _fail('Float operand for an int operation')
+        return self._stackReader(addr)
+
+    def _floatOperand(self, reader, opcode):
+        # VM::LoadFloatAddr
+        variant = Opcodes.opcode_variant(opcode)
+        if variant == Opcodes.OPCODE_VARIANT_C:
+            value = reader.f32()
+            return lambda state: value
+        if variant != Opcodes.OPCODE_VARIANT_A:
+            value = float(reader.immediate(opcode))
+            return lambda state: value
+
+        addr = reader.u8() << 8
+        if addr >> 14 == Opcodes.ADDR_TYPE_REG:
+            return self._floatReader((addr >> 8) & 0b111111)
+        if addr >> 14 != Opcodes.ADDR_TYPE_REGOFF:
+            return lambda state: 0.0
+        addr |= reader.u8()
+        if (addr >> 11) & 1 != Opcodes.ADDR_VALTYPE_FLOAT:
+            return _fail('Int operand for a float operation')
+        return self._stackReader(addr)
+
+    def _address(self, addr):
+        # Stack offset of a register+offset address
+        index = (addr >> 12) & 0b11
+        delta = addr & 0b1111111111
+        if (addr >> 10) & 1:
+            delta = -delta
+        if index == Opcodes.REGINDEX_ZR:
+            return lambda state: delta
+        if index == Opcodes.REGINDEX_SP:
+            return lambda state: self._sp + delta
+        read = self._intReader(index)
+        return lambda state: read(state) + delta
+
+    def _stackReader(self, addr):
+        fmt = _F32 if (addr >> 11) & 1 == Opcodes.ADDR_VALTYPE_FLOAT else _S32
+        address = self._address(addr)
+        stack = self._stack
+        return lambda state: fmt.unpack_from(stack, address(state))[0]
+
+    # Registers
+
+    def _intReader(self, index):
+        # VM::GetIntRegister
+        if index == Opcodes.REGINDEX_ZR:
+            return lambda state: 0
+        if index == Opcodes.REGINDEX_SP:
+            return lambda state: self._sp
+        if index == Opcodes.REGINDEX_TH:
+            return lambda state: self._th
+        if index == Opcodes.REGINDEX_DELTA:
+            return lambda state: self._delta
+        if index not in _FIELDS:
+            return _fail('Register %d is not an int register' % index)
+        byte, shift, mask = _FIELDS[index]
+        if mask == 0xFF:
+            return lambda state: state[byte]
+        return lambda state: (state[byte] >> shift) & mask
+
+    def _intWriter(self, index):
+        # VM::SetIntRegister
+        if index in (Opcodes.REGINDEX_SP, Opcodes.REGINDEX_TH):
+            name = '_sp' if index == Opcodes.REGINDEX_SP else '_th'
+            def writeStackRegister(state, value): # pylint: disable=unused-argument
+                setattr(self, name, _clampS16(value))
+            return writeStackRegister
+        if index not in _FIELDS:
+            return _fail('Register %d is read only' % index)
+
+        byte, shift, mask = _FIELDS[index]
+        if mask == 0xFF:
+            def writeByte(state, value):
+                state[byte] = 0 if value < 0 else 255 if value > 255 else value
+            return writeByte
+        if mask == 1:
+            def writeButton(state, value):
+                state[byte] = (state[byte] & ~(1 << shift) & 0xFF) | ((1 if value > 0 else 0) << shift)
+            return writeButton
+        def writeHat(state, value):
+            state[byte] = (state[byte] & 0xF0) | (0 if value < 0 else 8 if value > 8 else value)
+        return writeHat
+
+    def _floatReader(self, index):
+        # VM::GetFloatRegister; other registers read as 0
+        if index not in _FLOAT_REGISTERS:
+            return lambda state: 0.0
+        floats = self._floats
+        position = _FLOAT_REGISTERS.index(index)
+        return lambda state: floats[position]
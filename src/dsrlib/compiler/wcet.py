@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+
+import math
+import collections
+
+from .interm import Label, LoopLabel, CallableLabel, StateEnterLabel
+from .asm import BinaryInstruction, UnaryInstruction, BranchInstruction, Call, Ret, Yield, Jump, JZ, CompareBranch, Push, Pop, \
+     Mul, Div, Cast, relaxBranches, immediateSize
+from .codegen import RegoffAddr, ConstAddr, scopeNames
+from .opcodes import Opcodes
+from .ast import LoopBoundAnalyzer
+
+
+# Rough ATmega32U4 cycle counts, for the estimate: fetch and dispatch,
+# then each operand, then the operation on ints or floats. Floats,
+# multiplications and divisions are done in software.
+DISPATCH_CYCLES = 40
+ADDRESS_CYCLES = 30
+IMMEDIATE_CYCLES = {1: 10, 2: 15, 4: 25}
+OPERATION_CYCLES = {
+    Mul: (60, 170),
+    Div: (650, 490),
+    Cast: (120, 120),
+    }
+ARITHMETIC_CYCLES = (15, 120)
+BRANCH_CYCLES = 20
+CALL_CYCLES = 40
+
+
+def isFloat(addr):
+    if isinstance(addr, RegoffAddr):
+        return addr.type == Opcodes.ADDR_VALTYPE_FLOAT
+    if isinstance(addr, ConstAddr):
+        return addr.type() == 'float'
+    return False
+
+
+def addressCycles(addr):
+    if isinstance(addr, ConstAddr):
+        return IMMEDIATE_CYCLES[immediateSize(addr)]
+    return ADDRESS_CYCLES
+
+
+def instructionCycles(op):
+    if isinstance(op, BinaryInstruction):
+        ints, floats = OPERATION_CYCLES.get(type(op), ARITHMETIC_CYCLES)
+        cost = floats if isFloat(op.dst) or isFloat(op.src) else ints
+        return DISPATCH_CYCLES + addressCycles(op.dst) + addressCycles(op.src) + cost
+    if isinstance(op, UnaryInstruction):
+        return DISPATCH_CYCLES + addressCycles(op.dst) + ARITHMETIC_CYCLES[1 if isFloat(op.dst) else 0]
+    if isinstance(op, CompareBranch):
+        cost = DISPATCH_CYCLES + addressCycles(op.op1) + addressCycles(op.op2) + ARITHMETIC_CYCLES[1 if isFloat(op.op1) else 0] + BRANCH_CYCLES
+        # The long form is followed by 2 jumps, one of which runs
+        return cost if op.short else cost + DISPATCH_CYCLES + BRANCH_CYCLES
+    if isinstance(op, JZ):
+        return DISPATCH_CYCLES + addressCycles(op.cond) + BRANCH_CYCLES
+    if isinstance(op, (Call, Ret)):
+        return DISPATCH_CYCLES + CALL_CYCLES
+    if isinstance(op, Jump):
+        return DISPATCH_CYCLES + BRANCH_CYCLES
+    if isinstance(op, Push):
+        return DISPATCH_CYCLES + addressCycles(op.value)
+    if isinstance(op, Pop):
+        return DISPATCH_CYCLES + addressCycles(op.addr)
+    return DISPATCH_CYCLES
+
+
+def instructionCount(op):
+    return 2 if isinstance(op, CompareBranch) and not op.short else 1
+
+
+# Worst case of a frame, from a yield (or a state entry) to the next one.
+# Both are None when a loop has no known bound.
+FrameCost = collections.namedtuple('FrameCost', ['instructions', 'cycles'])
+
+
+def totalCost(costs):
+    # Programs run one after the other on each report, e.g. the actions of
+    # a configuration
+    instructions = cycles = 0
+    for cost in costs:
+        instructions = None if instructions is None or cost.instructions is None else instructions + cost.instructions
+        cycles = None if cycles is None or cost.cycles is None else cycles + cost.cycles
+    return FrameCost(instructions, cycles)
+
+
+class WorstCase:
+    def __init__(self, frame, states, unbounded):
+        self.frame = frame
+        self.states = states # Scope name => FrameCost
+        self.unbounded = unbounded # Positions of the code that may not yield
+
+    def toJSON(self):
+        return {'instructions': self.frame.instructions, 'cycles': self.frame.cycles,
+                'states': dict([(name, {'instructions': cost.instructions, 'cycles': cost.cycles}) for name, cost in self.states.items()])}
+
+
+class WorstCaseAnalyzer:
+    # Upper bound of the instructions executed in one frame, i.e. between
+    # two yields, since VM::Run steps until one. Loops that do not yield
+    # on every iteration need a bound from LoopBoundAnalyzer; the other
+    # ones are reported as warnings. With a budget (in estimated cycles),
+    # a worst case over it is an error.
+    def __init__(self, budget=None):
+        self._budget = budget
+        self._result = None
+
+    def result(self):
+        return self._result
+
+    def analyze(self, ast, ops, warnings, errors):
+        bounds = LoopBoundAnalyzer().analyze(ast)
+        # Long branches cost more; the layout is done again when writing
+        shorts = [(op, op.short) for op in ops if isinstance(op, BranchInstruction)]
+        relaxBranches(ops)
+        graph = _Graph(ops, bounds)
+        costs = [_Solver(graph, instructionCount).frames(), _Solver(graph, instructionCycles).frames()]
+        for op, short in shorts:
+            op.short = short
+
+        names = scopeNames(ast)
+        states = collections.OrderedDict()
+        for start, instructions in costs[0].items():
+            name = names.get(graph.scope(start), 'globals')
+            current = states.get(name, FrameCost(0, 0))
+            states[name] = FrameCost(self._max(current.instructions, instructions), self._max(current.cycles, costs[1][start]))
+        frame = FrameCost(0, 0)
+        for cost in states.values():
+            frame = FrameCost(self._max(frame.instructions, cost.instructions), self._max(frame.cycles, cost.cycles))
+
+        unbounded = sorted(graph.unbounded, key=lambda item: (0, 0) if item[1] is None else (item[1].line, item[1].column))
+        warnings.extend(unbounded)
+        self._result = WorstCase(frame, states, [position for _, position in unbounded])
+
+        if self._budget is not None:
+            if frame.cycles is None:
+                errors.append(('worst case per frame is unbounded, budget is %d cycles' % self._budget, unbounded[0][1] if unbounded else None))
+            elif frame.cycles > self._budget:
+                errors.append(('worst case per frame is %d cycles (%d instructions), budget is %d' % (frame.cycles, frame.instructions, self._budget), None))
+        return self._result
+
+    @staticmethod
+    def _max(current, value):
+        if current is None or value is None:
+            return None
+        return max(current, value)
+
+
+class _Graph:
+    # Instructions and control flow. Calls are not edges; see _Solver.
+    def __init__(self, ops, bounds):
+        self.instructions = []
+        self.labels = {}
+        self.loops = {} # Index => loop bound, or None
+        self.positions = {} # Index => loop position
+        self.states = {} # Index => state position
+        self.owners = [] # Index => CallableLabel, None for states and globals
+        self.stateOf = [] # Index => index of the enclosing state entry, or None
+        self.unbounded = set() # (message, position)
+
+        owner = None
+        state = None
+        for op in ops:
+            if isinstance(op, Label):
+                index = len(self.instructions)
+                self.labels[op] = index
+                if isinstance(op, CallableLabel):
+                    owner = op
+                    state = None
+                elif isinstance(op, StateEnterLabel):
+                    owner = None
+                    state = index
+                    self.states[index] = op.state.position
+                elif isinstance(op, LoopLabel):
+                    self.loops[index] = bounds.get(op.node, None)
+                    self.positions[index] = op.node.position
+            else:
+                self.instructions.append(op)
+                self.owners.append(owner)
+                self.stateOf.append(state)
+
+        self.successors = [self._successors(index) for index in range(len(self.instructions))]
+        self.predecessors = [[] for _ in self.instructions]
+        for index, successors in enumerate(self.successors):
+            for successor in successors:
+                if successor < len(self.instructions):
+                    self.predecessors[successor].append(index)
+
+    def _successors(self, index):
+        op = self.instructions[index]
+        if isinstance(op, (Yield, Ret)):
+            return []
+        if isinstance(op, Jump):
+            return [self.labels[op.label]]
+        if isinstance(op, (JZ, CompareBranch)):
+            return [index + 1, self.labels[op.label]]
+        return [index + 1]
+
+    def isGo(self, index):
+        op = self.instructions[index]
+        return isinstance(op, Jump) and isinstance(op.label, StateEnterLabel)
+
+    def scope(self, index):
+        span = self.instructions[index].span if index < len(self.instructions) else None
+        return None if span is None else span.scope
+
+    def region(self, owner):
+        return set([index for index in range(len(self.instructions)) if self.owners[index] is owner])
+
+    def starts(self):
+        # Where frames start: the first instruction, state entries, and after yields
+        starts = [0] if self.instructions else []
+        starts.extend([index for label, index in self.labels.items() if isinstance(label, StateEnterLabel) and index < len(self.instructions)])
+        starts.extend([index + 1 for index, op in enumerate(self.instructions) if isinstance(op, Yield) and index + 1 < len(self.instructions)])
+        return sorted(set(starts))
+
+
+class _Solver:
+    # Longest paths for one cost function. Values are {outcome: cost}, the
+    # outcome being 'Y' for a yield, 'R' for a return and a loop header for
+    # the back edges of the loop being solved.
+    def __init__(self, graph, cost):
+        self._graph = graph
+        self._cost = cost
+        self._regions = {}
+        self._pending = set()
+        self._continuations = {}
+        self._returning = set()
+
+    def frames(self):
+        # Start index => worst cost, None if unbounded
+        result = {}
+        for start in self._graph.starts():
+            owner = self._graph.owners[start]
+            values = self._region(owner)[start]
+            cost = values.get('Y', -math.inf)
+            if owner is not None and 'R' in values:
+                cost = max(cost, values['R'] + self._continuation(owner))
+            if cost != -math.inf:
+                result[start] = None if math.isinf(cost) else cost
+        return result
+
+    def _region(self, owner):
+        if owner not in self._regions:
+            self._pending.add(owner)
+            self._regions[owner] = self._solve(self._graph.region(owner), frozenset(), {})
+            self._pending.discard(owner)
+        return self._regions[owner]
+
+    def _summary(self, label):
+        if label in self._pending:
+            return {'Y': math.inf}
+        return self._region(label)[self._graph.labels[label]]
+
+    def _continuation(self, owner):
+        # Worst cost after a return from owner, over all its callers
+        if owner in self._returning:
+            return math.inf
+        if owner not in self._continuations:
+            self._returning.add(owner)
+            worst = -math.inf
+            for index, op in enumerate(self._graph.instructions):
+                if isinstance(op, Call) and op.label is owner:
+                    caller = self._graph.owners[index]
+                    after = self._region(caller)[index + 1]
+                    worst = max(worst, after.get('Y', -math.inf))
+                    if caller is not None and 'R' in after:
+                        worst = max(worst, after['R'] + self._continuation(caller))
+            self._returning.discard(owner)
+            self._continuations[owner] = worst
+        return self._continuations[owner]
+
+    def _solve(self, nodes, headers, outside):
+        values = {}
+        def lookup(index):
+            if index in headers:
+                return {index: 0}
+            if index in values:
+                return values[index]
+            if index in outside:
+                return outside[index]
+            return {'Y': 0} # End of the bytecode
+
+        for component in self._components(nodes, headers):
+            index = component[0]
+            if len(component) == 1 and index not in self._graph.successors[index]:
+                values[index] = self._value(index, lookup)
+            else:
+                scope = dict(outside)
+                scope.update(values)
+                values.update(self._loop(component, scope))
+        return values
+
+    def _value(self, index, lookup):
+        op = self._graph.instructions[index]
+        cost = self._cost(op)
+        if isinstance(op, Yield):
+            return {'Y': cost}
+        if isinstance(op, Ret):
+            return {'R': cost}
+        if isinstance(op, Call):
+            callee = self._summary(op.label)
+            result = {}
+            if 'Y' in callee:
+                result['Y'] = cost + callee['Y']
+            if 'R' in callee:
+                for outcome, value in lookup(index + 1).items():
+                    result[outcome] = max(result.get(outcome, -math.inf), cost + callee['R'] + value)
+            return result
+        result = {}
+        for successor in self._graph.successors[index]:
+            for outcome, value in lookup(successor).items():
+                result[outcome] = max(result.get(outcome, -math.inf), cost + value)
+        return result
+
+    def _loop(self, component, outside):
+        members = set(component)
+        states = [index for index in component if index in self._graph.states]
+        # Loops in a go cycle, even yielding ones, belong to its component;
+        # once the cycle is cut at the entries of the states gone to, they
+        # are solved on their own.
+        targets = sorted(set([self._graph.labels[self._graph.instructions[index].label] for index in component if self._graph.isGo(index)]) & members)
+        if targets and all([self._mayLeave(members, state) for state in targets]):
+            return self._stateCycle(members, targets, outside)
+
+        heads = [index for index in component if index in self._graph.loops and any([pred not in members for pred in self._graph.predecessors[index]])]
+        if len(heads) != 1 or self._graph.loops[heads[0]] is None:
+            loops = heads or [index for index in component if index in self._graph.loops]
+            if loops:
+                self._graph.unbounded.add(('loop without a provable bound may not yield', self._graph.positions[loops[0]]))
+            elif states:
+                self._graph.unbounded.add(('states may go to each other without yielding', self._graph.states[states[0]]))
+            else:
+                self._graph.unbounded.add(('code may loop without yielding', None))
+            return dict([(index, {'Y': math.inf}) for index in component])
+
+        head, = heads
+        bound = self._graph.loops[head]
+        inner = self._solve(members, frozenset([head]), outside)
+        iteration = inner[head].get(head, 0)
+        total = dict([(outcome, bound * iteration + value) for outcome, value in inner[head].items() if outcome != head])
+
+        values = {head: total}
+        for index in component:
+            if index != head:
+                value = dict([(outcome, cost) for outcome, cost in inner[index].items() if outcome != head])
+                if head in inner[index]:
+                    for outcome, cost in total.items():
+                        value[outcome] = max(value.get(outcome, -math.inf), inner[index][head] + cost)
+                values[index] = value
+        return values
+
+    def _mayLeave(self, members, state):
+        # Whether the code of a state in a go cycle has a path out of the
+        # cycle, i.e. its go is conditional
+        for index in members:
+            if self._graph.stateOf[index] != state:
+                continue
+            op = self._graph.instructions[index]
+            if isinstance(op, Call) and 'Y' in self._summary(op.label):
+                return True
+            if any([successor not in members for successor in self._graph.successors[index]]):
+                return True
+        return False
+
+    def _stateCycle(self, members, states, outside):
+        # States that go to each other on conditions, like "if (x < 10) go
+        # a;" and "if (x >= 10) go b;". Whether the conditions may all hold
+        # in the same frame cannot be proven, so this is not reported; the
+        # cost assumes each state is entered at most once per frame.
+        inner = self._solve(members, frozenset(states), outside)
+        paths = {}
+
+        def through(state, visited):
+            key = (state, visited)
+            if key not in paths:
+                result = {}
+                for outcome, cost in inner[state].items():
+                    if outcome not in states:
+                        result[outcome] = max(result.get(outcome, -math.inf), cost)
+                    elif outcome not in visited:
+                        for final, rest in through(outcome, visited | frozenset([outcome])).items():
+                            result[final] = max(result.get(final, -math.inf), cost + rest)
+                paths[key] = result
+            return paths[key]
+
+        values = {}
+        for index in members:
+            if index in states:
+                values[index] = through(index, frozenset([index]))
+                continue
+            value = {}
+            for outcome, cost in inner[index].items():
+                if outcome not in states:
+                    value[outcome] = max(value.get(outcome, -math.inf), cost)
+                    continue
+                visited = frozenset([outcome, self._graph.stateOf[index]])
+                for final, rest in through(outcome, visited).items():
+                    value[final] = max(value.get(final, -math.inf), cost + rest)
+            values[index] = value
+        return values
+
+    def _components(self, nodes, headers):
+        # Strongly connected components of nodes, without the edges to
+        # headers, successors first (Tarjan)
+        index = {}
+        lowlink = {}
+        stack = []
+        onstack = set()
+        components = []
+
+        def successors(node):
+            op = self._graph.instructions[node]
+            if isinstance(op, Call) and 'R' not in self._summary(op.label):
+                return [] # Always yields
+            return [succ for succ in self._graph.successors[node] if succ in nodes and succ not in headers]
+
+        for root in sorted(nodes):
+            if root in index:
+                continue
+            # Iterative, since loops may be long
+            work = [(root, iter(successors(root)))]
+            index[root] = lowlink[root] = len(index)
+            stack.append(root)
+            onstack.add(root)
+            while work:
+                node, children = work[-1]
+                child = next(children, None)
+                if child is not None:
+                    if child not in index:
+                        index[child] = lowlink[child] = len(index)
+                        stack.append(child)
+                        onstack.add(child)
+                        work.append((child, iter(successors(child))))
+                    elif child in onstack:
+                        lowlink[node] = min(lowlink[node], index[child])
+                    continue
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onstack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(sorted(component))
+        return components
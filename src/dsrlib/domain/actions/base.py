@@ -4,7 +4,8 @@ import struct
 
 from PyQt5 import QtCore
 
-from dsrlib.compiler.bcgen import generateBytecode
+from dsrlib.compiler.bcgen import generateBytecode, compileBytecode
+from dsrlib.compiler.sizes import SizeReport
 
 
 class Action(QtCore.QObject):
@@ -21,12 +22,22 @@ class Action(QtCore.QObject):
         self._bytecode = struct.pack('<H', bytecode.tell()) + bytecode.getvalue()
         self.changed.emit()
 
+    def pending(self):
+        # Whether the bytecode is not up to date with the source yet
+        return False
+
     def bytecode(self):
         return self._bytecode
 
     def size(self):
         return len(self._bytecode)
 
+    def sizeReport(self):
+        report = SizeReport(self.label())
+        report.child('header').add(2) # Action size
+        compileBytecode(self.source(), sizes=report)
+        return report
+
     def label(self):
         return self.labelFormat().format(**self.labelValues())
 
@@ -1,5 +1,10 @@
 #!/usr/bin/env python3
 
+import struct
+
+from dsrlib.compiler.sizes import SizeReport
+from dsrlib.domain.compileservice import createCompile, startCompile
+
 from .base import Action
 
 
@@ -7,6 +12,7 @@ class CustomAction(Action):
     def __init__(self):
         self._code = ''
         self._error = None
+        self._job = None
         super().__init__()
 
     def labelFormat(self):
@@ -33,11 +39,46 @@ class CustomAction(Action):
     def error(self):
         return self._error
 
+    def pending(self):
+        return self._job is not None
+
+    def bytecode(self):
+        # Result of the last completed compilation; empty until the first
+        # one completes.
+        return self._bytecode or b''
+
+    def size(self):
+        return len(self.bytecode())
+
+    def sizeReport(self):
+        if self.pending():
+            return SizeReport(_('{label} (compiling)').format(label=self.label()))
+        if self._error is not None or not self._bytecode:
+            return SizeReport(self.label())
+        return super().sizeReport()
+
     def notifyChanged(self):
-        self._error = None
-        try:
-            super().notifyChanged()
-        except Exception as exc: # pylint: disable=W0703
-            self._error = str(exc)
-            self._bytecode = b''
+        # Compiled in the background; changed is emitted when the job
+        # starts, so that views show it as pending, and when the result is
+        # available.
+        if self._job is not None:
+            self._job.cancel()
+        self._job = createCompile(self.source(), self._compiled)
+        startCompile(self._job)
+        if self._job is not None:
             self.changed.emit()
+
+    def _compiled(self, job):
+        if job is not self._job:
+            return # Stale
+        self._job = None
+
+        if job.exception() is None:
+            self._error = None
+            bytecode = job.bytecode()
+            # Header: action size
+            self._bytecode = struct.pack('<H', bytecode.tell()) + bytecode.getvalue()
+        else:
+            self._error = str(job.exception())
+            self._bytecode = b''
+        self.changed.emit()
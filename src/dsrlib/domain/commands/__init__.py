@@ -2,5 +2,5 @@
 
 from .actions import SetActionAttributesCommand, SetGyroButtonsCommand
 from .configuration import ChangeConfigurationNameCommand, ChangeConfigurationThumbnailCommand, \
-     AddActionCommand, DeleteActionsCommand, ChangeConfigurationDescriptionCommand
+     AddActionCommand, DeleteActionsCommand, ChangeConfigurationDescriptionCommand, ChangeConfigurationLinkedCommand
 from .workspace import AddConfigurationCommand, DeleteConfigurationsCommand
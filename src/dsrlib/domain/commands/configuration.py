@@ -31,6 +31,19 @@ class ChangeConfigurationDescriptionCommand(ConfigurationMixin, Command):
         self.configuration().setDescription(self._oldDescription)
 
 
+class ChangeConfigurationLinkedCommand(ConfigurationMixin, Command):
+    def __init__(self, *, configuration, linked):
+        super().__init__(configuration=configuration)
+        self._oldLinked = configuration.linked()
+        self._newLinked = linked
+
+    def do(self):
+        self.configuration().setLinked(self._newLinked)
+
+    def undo(self):
+        self.configuration().setLinked(self._oldLinked)
+
+
 class ChangeConfigurationThumbnailCommand(ConfigurationMixin, Command):
     def __init__(self, *, configuration, filename):
         super().__init__(configuration=configuration)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import queue
+import threading
+
+from PyQt5 import QtCore
+
+from dsrlib.compiler.bcgen import generateBytecode
+
+
+class CompileJob(QtCore.QObject):
+    # Emitted with the job as argument, from the worker thread; receivers
+    # living in the main thread get it queued. Not emitted once cancelled.
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, source):
+        super().__init__()
+        self._source = source
+        self._event = threading.Event()
+        self._cancelled = False
+        self._warnings = []
+        self._bytecode = None
+        self._exception = None
+
+    def source(self):
+        return self._source
+
+    def cancel(self):
+        # A compilation in progress cannot be interrupted; its result is
+        # simply dropped.
+        self._cancelled = True
+
+    def cancelled(self):
+        return self._cancelled
+
+    def done(self):
+        return self._event.is_set()
+
+    def wait(self, timeout=None):
+        return self._event.wait(timeout)
+
+    def warnings(self):
+        return self._warnings
+
+    def bytecode(self):
+        return self._bytecode
+
+    def exception(self):
+        return self._exception
+
+    def result(self):
+        self.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._warnings, self._bytecode
+
+    def run(self):
+        if not self._cancelled:
+            try:
+                self._warnings, self._bytecode = generateBytecode(self._source)
+            except Exception as exc: # pylint: disable=W0703
+                self._exception = exc
+        self._event.set()
+        if not self._cancelled:
+            self.finished.emit(self)
+
+
+class CompileService(QtCore.QThread):
+    def __init__(self):
+        super().__init__()
+        self._queue = queue.Queue()
+
+    def stop(self):
+        self._queue.put(None)
+        self.wait()
+
+    def submit(self, source, callback=None):
+        return self.post(createCompile(source, callback=callback))
+
+    def post(self, job):
+        self._queue.put(job)
+        return job
+
+    def run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.run()
+
+
+_service = None
+
+
+def setCompileService(service):
+    global _service # pylint: disable=W0603
+    _service = service
+
+
+def compileService():
+    return _service
+
+
+def createCompile(source, callback=None):
+    # Not started; lets the caller keep a reference to the job before the
+    # callback may run.
+    job = CompileJob(source)
+    if callback is not None:
+        job.finished.connect(callback)
+    return job
+
+
+def startCompile(job):
+    # Without a running service (tests, command line tools) the job is
+    # run synchronously, and its callback invoked before returning.
+    if _service is not None:
+        return _service.post(job)
+    job.run()
+    return job
+
+
+def submitCompile(source, callback=None):
+    return startCompile(createCompile(source, callback=callback))
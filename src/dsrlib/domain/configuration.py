@@ -6,6 +6,12 @@ import uuid
 
 from PyQt5 import QtCore
 
+from dsrlib.meta import Meta
+from dsrlib.compiler.sizes import SizeReport
+from dsrlib.compiler.linker import Linker
+from dsrlib.compiler.bcgen import compileProgram
+from dsrlib.compiler.wcet import WorstCaseAnalyzer, totalCost
+
 from .listmodel import ListModel
 
 
@@ -19,6 +25,9 @@ class Configuration(QtCore.QObject):
         self._description = ''
         self._actions = ListModel()
         self._uuid = uid or uuid.uuid1().hex
+        self._linked = False
+        self._program = None # (sources, linked program)
+        self._worstcases = None # (sources, WorstCase of each action)
 
     def uuid(self):
         return self._uuid
@@ -46,6 +55,14 @@ class Configuration(QtCore.QObject):
         self._thumbnail = filename
         self.changed.emit()
 
+    def linked(self):
+        return self._linked
+
+    def setLinked(self, linked):
+        if linked != self._linked:
+            self._linked = linked
+            self.changed.emit()
+
     def actions(self):
         return self._actions
 
@@ -59,14 +76,74 @@ class Configuration(QtCore.QObject):
         self._actions.removeItem(action)
         self.changed.emit()
 
+    def pending(self):
+        # Actions still compiling are left out of the bytecode, sizes and
+        # worst case until they are done
+        return any([action.pending() for action in self._actions])
+
     def bytecodeSize(self):
         total = 2 # first 2 bytes: total size of configuration
+        if self._isLinked():
+            return total + len(self._linkedProgram().bytecode())
         for action in self.actions():
             total += action.size()
         return total
 
+    def sizeReport(self):
+        report = SizeReport(self.name())
+        report.child('header').add(2) # Configuration size
+        if self._isLinked():
+            actions = self._linkedActions()
+            reports = [SizeReport(action.label()) for action in actions]
+            program = Linker().link([action.source() for action in actions], sizes=reports)
+            report.child('header').add(program.headerSize())
+            for child in reports:
+                report.append(child)
+            return report
+        for action in self.actions():
+            report.append(action.sizeReport())
+        return report
+
+    def worstCase(self):
+        # FrameCost of a report, in which every action runs until it
+        # yields; None members when one of them is unbounded
+        if self._isLinked():
+            return totalCost([result.frame for result in self._linkedProgram().worstcases])
+        sources = [action.source() for action in self._linkedActions()]
+        if self._worstcases is None or self._worstcases[0] != sources:
+            results = []
+            for source in sources:
+                analyzer = WorstCaseAnalyzer()
+                compileProgram(source, worstcase=analyzer)
+                results.append(analyzer.result())
+            self._worstcases = (sources, results)
+        return totalCost([result.frame for result in self._worstcases[1]])
+
+    def overFrameBudget(self, budget=None):
+        budget = Meta.frameBudget() if budget is None else budget
+        cost = self.worstCase()
+        return cost.cycles is None or cost.cycles > budget
+
     def bytecode(self):
+        if self._isLinked():
+            bytecode = self._linkedProgram().bytecode()
+            return struct.pack('<H', len(bytecode)) + bytecode
         bytecode = io.BytesIO()
         for action in self._actions:
             bytecode.write(action.bytecode())
         return struct.pack('<H', bytecode.tell()) + bytecode.getvalue()
+
+    def _linkedActions(self):
+        # Actions that do not compile are left out, as when not linked
+        return [action for action in self._actions if action.bytecode()]
+
+    def _isLinked(self):
+        return self._linked and bool(self._linkedActions())
+
+    def _linkedProgram(self):
+        # All actions are compiled together, so the result is kept until
+        # one of them changes
+        sources = [action.source() for action in self._linkedActions()]
+        if self._program is None or self._program[0] != sources:
+            self._program = (sources, Linker().link(sources))
+        return self._program[1]
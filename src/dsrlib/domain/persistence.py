@@ -25,7 +25,7 @@ class BaseJSONWriter(ActionVisitor):
         actions = []
         for action in configuration.actions():
             actions.append(self.encodeAction(action))
-        return {'name': configuration.name(), 'uuid': configuration.uuid(), 'thumbnail': self.pathFor(configuration.thumbnail()), 'actions': actions, 'description': configuration.description()}
+        return {'name': configuration.name(), 'uuid': configuration.uuid(), 'thumbnail': self.pathFor(configuration.thumbnail()), 'actions': actions, 'description': configuration.description(), 'linked': configuration.linked()}
 
     def encodeAction(self, action):
         return self.visit(action)
@@ -89,6 +89,7 @@ class BaseJSONReader:
         configuration = Configuration(uid=data['uuid'])
         configuration.setName(data['name'])
         configuration.setDescription(data.get('description', ''))
+        configuration.setLinked(data.get('linked', False))
         configuration.setThumbnail(self.pathFor(data['thumbnail']))
 
         for adata in data['actions']:
@@ -8,6 +8,7 @@ import struct
 from pyqtcmd import History
 
 from dsrlib.meta import Meta
+from dsrlib.compiler.sizes import SizeReport
 
 from .listmodel import ListModel
 from .persistence import JSONReader, JSONWriter
@@ -31,6 +32,13 @@ class Workspace:
             total += configuration.bytecodeSize()
         return total
 
+    def sizeReport(self, configurations):
+        report = SizeReport(_('Workspace'))
+        report.child('header').add(4) # Magic word and sentinel
+        for configuration in configurations:
+            report.append(configuration.sizeReport())
+        return report
+
     def bytecode(self, configurations):
         # The format of the data stored in the EEPROM is the following:
         #
@@ -24,7 +24,7 @@ class Meta:
 
     @staticmethod
     def firmwareVersion():
-        return Version(1, 1, 0)
+        return Version(1, 2, 0)
 
     @staticmethod
     def appName():
@@ -99,6 +99,12 @@ class Meta:
     def maxBytecodeSize():
         return 1024 # Leonardo EEPROM size
 
+    @staticmethod
+    def frameBudget():
+        # Estimated cycles for all actions on one report: half of the 4ms
+        # between two reports at 16MHz
+        return 32000
+
     @staticmethod
     def standardColors():
         return (QtGui.QColor(0xDC, 0xED, 0xC1), QtGui.QColor(0xFF, 0xFF, 0xFF))
@@ -148,6 +154,17 @@ class Meta:
             raise RuntimeError('Unsupported platform')
         return os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'res', 'configurations'))
 
+    @staticmethod
+    def parseTables():
+        # The compiler package is in a zip archive in py2app and cx_Freeze
+        # bundles; the AppImage keeps it as is.
+        if Meta.isFrozen():
+            if platform.system() == 'Darwin':
+                return os.path.normpath(os.path.join(os.path.dirname(sys.executable), '..', 'Resources', 'parsetab.json'))
+            if platform.system() == 'Windows':
+                return os.path.normpath(os.path.join(os.path.dirname(sys.executable), 'resources', 'parsetab.json'))
+        return os.path.normpath(os.path.join(os.path.dirname(__file__), 'compiler', 'parsetab.json'))
+
     @staticmethod
     def messages():
         if Meta.isFrozen():
@@ -10,13 +10,15 @@ from dsrlib.ui.ide import Editor
 from .base import ActionWidgetMixin
 
 
-class ErrorMessage(QtWidgets.QWidget):
+class StatusMessage(QtWidgets.QWidget):
     def __init__(self, parent):
         super().__init__(parent)
         self._text = ''
+        self._color = QtCore.Qt.red
 
-    def setText(self, text):
+    def setText(self, text, color=QtCore.Qt.red):
         self._text = text
+        self._color = color
         if text:
             self.show()
         else:
@@ -29,7 +31,7 @@ class ErrorMessage(QtWidgets.QWidget):
 
     def paintEvent(self, event): # pylint: disable=W0613
         painter = QtGui.QPainter(self)
-        painter.setPen(QtCore.Qt.red)
+        painter.setPen(self._color)
         mt = painter.fontMetrics()
         text = mt.elidedText(self._text or '', QtCore.Qt.ElideRight, self.width())
         painter.drawText(self.rect(), QtCore.Qt.AlignLeft, text)
@@ -40,7 +42,7 @@ class CustomActionWidget(MainWindowMixin, ActionWidgetMixin, QtWidgets.QWidget):
         super().__init__(*args, **kwargs)
 
         self._name = QtWidgets.QLabel(self)
-        self._error = ErrorMessage(self)
+        self._status = StatusMessage(self)
         self._btn = QtWidgets.QPushButton(_('Edit'), self)
 
         bld = LayoutBuilder(self)
@@ -48,14 +50,17 @@ class CustomActionWidget(MainWindowMixin, ActionWidgetMixin, QtWidgets.QWidget):
             with bld.hbox() as hbox:
                 hbox.addWidget(self._name, stretch=1)
                 hbox.addWidget(self._btn)
-            vbox.addWidget(self._error)
+            vbox.addWidget(self._status)
 
         self._btn.clicked.connect(self._editCode)
         self.reload()
 
     def reload(self):
         self._name.setText(self.action().label())
-        self._error.setText(self.action().error())
+        if self.action().pending():
+            self._status.setText(_('Compiling...'), color=QtCore.Qt.darkGray)
+        else:
+            self._status.setText(self.action().error())
 
         # The tree widget updates the cell size but not the widget...
         self.resize(self.width(), self.sizeHint().height())
@@ -129,6 +129,10 @@ class ConfigurationView(MainWindowMixin, ConfigurationMixin, QtWidgets.QWidget):
         self._description.setAcceptRichText(False)
         self._description.setPlainText(self.configuration().description())
         self._description.editingFinished.connect(self._changeDescription)
+        self._linked = QtWidgets.QCheckBox(_('Link actions'), self)
+        self._linked.setToolTip(_('Compile all actions as a single program, sharing identical functions'))
+        self._linked.setChecked(self.configuration().linked())
+        self._linked.clicked.connect(self._changeLinked)
 
         # We don't actually use a QTreeView because setItemWidget is
         # convenient. Not in the mood to write a custom delegate.
@@ -153,6 +157,7 @@ class ConfigurationView(MainWindowMixin, ConfigurationMixin, QtWidgets.QWidget):
                 with bld.vbox() as vbox:
                     vbox.addWidget(self._tree)
                     vbox.addWidget(self._description)
+                    vbox.addWidget(self._linked)
 
         self.configuration().changed.connect(self._updateValues)
 
@@ -190,7 +195,13 @@ class ConfigurationView(MainWindowMixin, ConfigurationMixin, QtWidgets.QWidget):
             cmd = commands.ChangeConfigurationDescriptionCommand(configuration=self.configuration(), description=text)
             self.history().run(cmd)
 
+    def _changeLinked(self, checked):
+        if checked != self.configuration().linked():
+            cmd = commands.ChangeConfigurationLinkedCommand(configuration=self.configuration(), linked=checked)
+            self.history().run(cmd)
+
     def _updateValues(self):
         self._name.setText(self.configuration().name())
         self._description.setPlainText(self.configuration().description())
+        self._linked.setChecked(self.configuration().linked())
         self._thumbnail.reload()
@@ -7,7 +7,8 @@ from ptk.lexer import LexerError
 
 from dsrlib.settings import Settings
 from dsrlib.ui.utils import LayoutBuilder
-from dsrlib.compiler.bcgen import generateBytecode, BytecodeGenError
+from dsrlib.compiler.bcgen import BytecodeGenError
+from dsrlib.domain.compileservice import createCompile, startCompile
 
 
 class Editor(QtWidgets.QDialog):
@@ -58,6 +59,7 @@ class Editor(QtWidgets.QDialog):
             else:
                 self.resize(1024, 768)
 
+        self._job = None
         self._timer = QtCore.QTimer(self)
         self._timer.timeout.connect(self._tryCompile)
         self._timer.setSingleShot(True)
@@ -65,17 +67,32 @@ class Editor(QtWidgets.QDialog):
         self._tryCompile()
 
     def _onTextChanged(self):
-        self._timer.start(3000)
+        self._timer.start(200)
 
     def _tryCompile(self):
+        self._cancelCompile()
+        self._job = createCompile(self.source(), self._compiled)
+        startCompile(self._job)
+
+    def _cancelCompile(self):
+        if self._job is not None:
+            self._job.cancel()
+            self._job = None
+
+    def _compiled(self, job):
+        if job is not self._job:
+            return
+        self._job = None
+
         self._sci.markerDeleteAll(self._errorMarker)
+        self._sci.markerDeleteAll(self._warningMarker)
         self._sci.clearAnnotations()
         self._report.hide()
         while self._report.topLevelItemCount():
             self._report.takeTopLevelItem(0)
 
         try:
-            warnings, _ = generateBytecode(self.source())
+            warnings, _ = job.result()
         except (LexerError, ParseError) as exc:
             self._addError(exc.position.line, str(exc))
             self._report.show()
@@ -109,11 +126,13 @@ class Editor(QtWidgets.QDialog):
         self._addReport(line, msg, self._warningMarker, 'warning')
 
     def accept(self):
+        self._cancelCompile()
         with Settings().grouped('IDE') as settings:
             settings.setValue('WindowGeometry', self.saveGeometry())
         return super().accept()
 
     def reject(self):
+        self._cancelCompile()
         with Settings().grouped('IDE') as settings:
             settings.setValue('WindowGeometry', self.saveGeometry())
         return super().reject()
@@ -17,6 +17,10 @@ from dsrlib import resources # pylint: disable=W0611
 from dsrlib.meta import Meta
 from dsrlib.settings import Settings
 from dsrlib.domain import Workspace, DeviceEnumerator, JSONImporter, Changelog
+from dsrlib.compiler.bcgen import setBytecodeCache
+from dsrlib.compiler.compiler import Parser
+from dsrlib.compiler.cache import BytecodeCache
+from dsrlib.domain.compileservice import CompileService, setCompileService
 from dsrlib.ui.wizard import FirstLaunchWizard
 from dsrlib.ui.changelog import ChangelogView
 from dsrlib.ui.utils import LayoutBuilder
@@ -75,6 +79,7 @@ class MainWindow(QtWidgets.QMainWindow):
         filemenu.addAction(uicommands.ExportConfigurationUICommand(self, mainWindow=self, container=self.centralWidget()))
         filemenu.addAction(uicommands.ImportConfigurationUICommand(self, mainWindow=self, workspace=self._workspace))
         filemenu.addAction(uicommands.ExportBytecodeUICommand(self, mainWindow=self, workspace=self._workspace, container=self.centralWidget()))
+        filemenu.addAction(uicommands.ShowSizeReportUICommand(self, mainWindow=self, workspace=self._workspace, container=self.centralWidget()))
         self.menuBar().addMenu(filemenu)
 
         editmenu = QtWidgets.QMenu(_('Edit'), self)
@@ -289,9 +294,23 @@ def uimain():
             settings.clear()
             sys.exit(0)
 
+    Parser.tablesFilename = Meta.parseTables()
+    cache = BytecodeCache(Meta.dataPath('bytecode'), salt=str(Meta.appVersion()))
+    setBytecodeCache(cache)
+
+    service = CompileService()
+    service.start()
+    setCompileService(service)
+
     win = MainWindow() # pylint: disable=W0612
     app.exec_()
 
+    setCompileService(None)
+    service.stop()
+
+    logger = logging.getLogger('dsremap')
+    logger.info('Bytecode cache: %d hits, %d misses', cache.hits, cache.misses)
+
 
 def askpass():
     app = Application(sys.argv) # pylint: disable=W0612
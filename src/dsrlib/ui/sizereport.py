@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import json
+import codecs
+
+from PyQt5 import QtWidgets
+
+from dsrlib.meta import Meta
+
+from .utils import LayoutBuilder, getSaveFilename
+
+
+class SizeReportDialog(QtWidgets.QDialog):
+    def __init__(self, parent, *, report):
+        super().__init__(parent)
+        self._report = report
+        self.setWindowTitle(_('Bytecode size report'))
+
+        budget = Meta.maxBytecodeSize()
+        self._tree = QtWidgets.QTreeWidget(self)
+        self._tree.setHeaderLabels([_('Item'), _('Bytes'), _('Budget')])
+        self._addItem(self._tree, report, budget)
+        self._tree.expandToDepth(1)
+        self._tree.resizeColumnToContents(0)
+
+        summary = QtWidgets.QLabel(_('{size} bytes used out of {budget}').format(size=report.size(), budget=budget), self)
+
+        copy = QtWidgets.QPushButton(_('Copy as text'), self)
+        export = QtWidgets.QPushButton(_('Export JSON'), self)
+        btn = QtWidgets.QPushButton(_('Done'), self)
+
+        bld = LayoutBuilder(self)
+        with bld.vbox() as vbox:
+            vbox.addWidget(summary)
+            vbox.addWidget(self._tree, stretch=1)
+            with bld.hbox() as buttons:
+                buttons.addWidget(copy)
+                buttons.addWidget(export)
+                buttons.addStretch(1)
+                buttons.addWidget(btn)
+
+        copy.clicked.connect(self._copy)
+        export.clicked.connect(self._export)
+        btn.clicked.connect(self.accept)
+
+        self.resize(800, 600)
+
+    def _addItem(self, parent, report, budget):
+        item = QtWidgets.QTreeWidgetItem(parent, [report.name, '%d' % report.size(), '%.1f%%' % (100.0 * report.size() / budget)])
+        for child in report.children:
+            self._addItem(item, child, budget)
+
+    def _copy(self):
+        QtWidgets.QApplication.clipboard().setText(self._report.text(budget=Meta.maxBytecodeSize()))
+
+    def _export(self):
+        filename = getSaveFilename(self, 'SizeReport', 'json')
+        if filename is None:
+            return
+
+        try:
+            with codecs.getwriter('utf-8')(open(filename, 'wb')) as fileobj:
+                json.dump(self._report.toJSON(), fileobj, indent=2)
+        except Exception as exc: # pylint: disable=W0703
+            QtWidgets.QMessageBox.critical(self, _('Export error'), _('Cannot export size report:\n{error}').format(error=str(exc)))
@@ -3,6 +3,7 @@
 from .base import UICommand, UndoUICommand, RedoUICommand
 from .configuration import AddActionButton, DeleteActionsButton, ConvertToCustomActionButton
 from .workspace import AddConfigurationButton, DeleteConfigurationsButton
-from .misc import UpdateHexUICommand, ShowAboutDialogUICommand, ShowSettingsDialogUICommand, OpenDocsUICommand
+from .misc import UpdateHexUICommand, ShowAboutDialogUICommand, ShowSettingsDialogUICommand, OpenDocsUICommand, \
+     ShowSizeReportUICommand
 from .io import ExportConfigurationUICommand, ImportConfigurationUICommand, ExportBytecodeUICommand
 from .device import DeviceMenu, UploadMenu
@@ -4,6 +4,7 @@ from pyqtcmd import NeedsSelectionUICommandMixin
 
 from dsrlib.domain.mixins import WorkspaceMixin
 from dsrlib.domain.device import NetworkDevice
+from dsrlib.ui.utils import checkBytecode
 from dsrlib.ui.configupload import ConfigurationHIDUploader, ConfigurationNetworkUploader
 
 from .base import UICommand
@@ -19,6 +20,9 @@ class UploadConfigurationsUICommand(WorkspaceMixin, NeedsSelectionUICommandMixin
         return super().should_be_enabled() and enabled
 
     def do(self):
+        if not checkBytecode(self.mainWindow(), self.selection()):
+            return
+
         if isinstance(self._device, NetworkDevice):
             configuration, = self.selection()
             uploader = ConfigurationNetworkUploader(self.mainWindow(), device=self._device, configuration=configuration, workspace=self.workspace(), mainWindow=self.mainWindow())
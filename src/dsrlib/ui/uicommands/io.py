@@ -8,7 +8,7 @@ from pyqtcmd import NeedsSelectionUICommandMixin
 
 from dsrlib.domain.mixins import WorkspaceMixin
 from dsrlib.domain.persistence import JSONExporter, JSONImporter
-from dsrlib.ui.utils import getSaveFilename, getOpenFilename
+from dsrlib.ui.utils import getSaveFilename, getOpenFilename, checkBytecode
 
 from .base import UICommand
 
@@ -55,6 +55,9 @@ class ExportBytecodeUICommand(WorkspaceMixin, NeedsSelectionUICommandMixin, UICo
         super().__init__(*args, text=_('Export bytecode'), tip=_('Export bytecode to file'), **kwargs)
 
     def do(self):
+        if not checkBytecode(self.mainWindow(), self.selection()):
+            return
+
         filename = getSaveFilename(self.mainWindow(), 'ExportBC', 'bin')
         if filename is None:
             return
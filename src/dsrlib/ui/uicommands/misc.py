@@ -2,10 +2,14 @@
 
 from PyQt5 import QtCore, QtGui
 
+from pyqtcmd import NeedsSelectionUICommandMixin
+
+from dsrlib.domain.mixins import WorkspaceMixin
 from dsrlib.ui.wizard import HexUploaderWizard, SetupSDWizard
 from dsrlib.ui.about import AboutDialog
 from dsrlib.ui.settings import SettingsDialog
 from dsrlib.ui.resdl import ResourceDownloader
+from dsrlib.ui.sizereport import SizeReportDialog
 from dsrlib.meta import Meta
 
 from .base import UICommand
@@ -60,3 +64,12 @@ class OpenDocsUICommand(UICommand):
 
     def do(self):
         QtGui.QDesktopServices.openUrl(QtCore.QUrl(Meta.documentationUrl()))
+
+
+class ShowSizeReportUICommand(WorkspaceMixin, NeedsSelectionUICommandMixin, UICommand):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, text=_('Bytecode size report...'), tip=_('Show the bytecode size of the selected configurations, by action, state, function and line'), **kwargs)
+
+    def do(self):
+        dlg = SizeReportDialog(self.mainWindow(), report=self.workspace().sizeReport(self.selection()))
+        dlg.exec_()
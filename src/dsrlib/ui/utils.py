@@ -117,6 +117,23 @@ def getSaveFilename(parent, domain, extension):
             return name
 
 
+def checkBytecode(parent, configurations):
+    # Before the bytecode of configurations is sent or saved; tells the
+    # user why it cannot be and returns False.
+    if any([configuration.pending() for configuration in configurations]):
+        QtWidgets.QMessageBox.warning(parent, _('Compiling'), _('Some actions are still being compiled. Please try again in a moment.'))
+        return False
+
+    slow = [configuration.name() for configuration in configurations if configuration.overFrameBudget()]
+    if slow:
+        QtWidgets.QMessageBox.critical(parent,
+                                       _('Slow configuration'),
+                                       _('The actions of {names} may not complete between two controller reports, which would make the controller lag. Please simplify them first.').format(names=', '.join(slow)))
+        return False
+
+    return True
+
+
 def getOpenFilename(parent, domain, extension):
     with Settings().grouped('Paths') as settings:
         path = QtCore.QStandardPaths.writableLocation(QtCore.QStandardPaths.DocumentsLocation)
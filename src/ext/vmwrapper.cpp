@@ -11,13 +11,41 @@ typedef struct {
   USBReport01_t report;
   int delta;
   float IMUX, IMUY, IMUZ;
+
+  // Either the state in report, or in the buffer of a from_buffer report
+  controller_state_t* pState;
+  Py_buffer view;
+  bool bView;
 } ReportObject;
 
+/*
+ * One frame for VM.run_frames, little endian and packed: the controller
+ * state the VM reads and writes, then what the IMU integrator provides.
+ * A frame with a 0 delta is left untouched, as in VM::Run.
+ */
+
+#ifdef WIN32
+#pragma pack(push, 1)
+#endif
+
+typedef struct PACKED {
+  controller_state_t state;
+  int32_t delta;
+  float IMUX, IMUY, IMUZ;
+  float AccelX, AccelY, AccelZ;
+} frame_t;
+
+#ifdef WIN32
+#pragma pack(pop)
+#endif
+
+#define FRAME_FORMAT "<9siffffff"
+
 class PyVM : public VM
 {
 public:
-  PyVM(uint8_t* bytecode, uint8_t stacksize)
-    : VM(bytecode, false, stacksize),
+  PyVM(uint8_t* bytecode, uint8_t stacksize, uint16_t entry)
+    : VM(bytecode, false, stacksize, entry),
       m_StackSize(stacksize)
   {
     memset(m_Stack, 0, stacksize);
@@ -29,7 +57,38 @@ public:
     m_IMUY = report->IMUY;
     m_IMUZ = report->IMUZ;
 
-    return VM::Step((controller_state_t*)((uint8_t*)&report->report + 1));
+    return VM::Step(report->pState);
+  }
+
+  // Returns the number of instructions executed, or -1 if a frame did not
+  // yield within maxSteps instructions; its index is then in *failed.
+  long RunFrames(frame_t* frames, Py_ssize_t count, long maxSteps, Py_ssize_t* failed) {
+    long total = 0;
+    for (Py_ssize_t i = 0; i < count; ++i) {
+      frame_t* frame = frames + i;
+      if (!frame->delta)
+        continue;
+
+      m_DELTA = frame->delta;
+      m_IMUX = frame->IMUX;
+      m_IMUY = frame->IMUY;
+      m_IMUZ = frame->IMUZ;
+      m_AccelX = frame->AccelX;
+      m_AccelY = frame->AccelY;
+      m_AccelZ = frame->AccelZ;
+
+      long steps = 0;
+      do {
+        if (maxSteps && (steps == maxSteps)) {
+          *failed = i;
+          return -1;
+        }
+        ++steps;
+      } while (!VM::Step(&frame->state));
+      total += steps;
+    }
+
+    return total;
   }
 
   PyObject* GetStack() {
@@ -61,6 +120,44 @@ public:
     m_TH = th;
   }
 
+  void EnableProfile(uint16_t size) {
+    VM::EnableProfile(size);
+  }
+
+  void ResetProfile() {
+    VM::ResetProfile();
+  }
+
+  bool IsProfiling() const {
+    return m_OffsetCounts != NULL;
+  }
+
+  PyObject* GetOpcodeCounts() {
+    return MakeCounts(m_OpcodeCounts, 256);
+  }
+
+  PyObject* GetOffsetCounts() {
+    return MakeCounts(m_OffsetCounts, m_ProfileSize);
+  }
+
+  PyObject* GetFrameCounts() {
+    return MakeCounts(m_FrameCounts, m_FrameCount);
+  }
+
+private:
+  static PyObject* MakeCounts(const uint32_t* counts, Py_ssize_t count) {
+    // array.array('I'), which is 32 bits on all supported platforms
+    PyObject* mdl = PyImport_ImportModule("array");
+    if (!mdl)
+      return NULL;
+
+    PyObject* ret = PyObject_CallMethod(mdl, "array", "sy#", "I", count ? (const char*)counts : "", count * (Py_ssize_t)sizeof(uint32_t));
+    Py_DECREF(mdl);
+    return ret;
+  }
+
+public:
+
   int m_StackSize;
 };
 
@@ -69,13 +166,27 @@ typedef struct {
 
   PyVM *pVM;
   PyObject* pBytecode; // Bytes object
+  bool bRunning; // In run_frames, without the GIL
 } VMObject;
 
+static bool VM_check_running(VMObject* self)
+{
+  if (self->bRunning) {
+    PyErr_SetString(PyExc_RuntimeError, "VM is running frames in another thread");
+    return false;
+  }
+
+  return true;
+}
+
 //==============================================================================
 // Report methods
 
 static void Report_dealloc(ReportObject* self)
 {
+  if (self->bView)
+    PyBuffer_Release(&self->view);
+
   Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
@@ -86,6 +197,8 @@ static PyObject* Report_new(PyTypeObject* type, PyObject* args, PyObject* kwargs
     memset(&self->report, 0, sizeof(self->report));
     self->delta = 5000;
     self->IMUX = self->IMUY = self->IMUZ = 0.0f;
+    self->pState = (controller_state_t*)((uint8_t*)&self->report + 1);
+    self->bView = false;
   }
 
   return (PyObject*)self;
@@ -109,40 +222,89 @@ static int Report_init(ReportObject* self, PyObject* args, PyObject* kwargs)
                                    &L2Value, &r2val, &self->delta, &self->IMUX, &self->IMUY, &self->IMUZ))
     return -1;
 
-  self->report.LPadX = lpadx;
-  self->report.LPadY = lpady;
-  self->report.RPadX = rpadx;
-  self->report.RPadY = rpady;
-  self->report.Hat = hat;
-  self->report.Square = Square;
-  self->report.Cross = cross;
-  self->report.Circle = circle;
-  self->report.Triangle = triangle;
-  self->report.L1 = l1;
-  self->report.R1 = r1;
-  self->report.L2 = l2;
-  self->report.R2 = r2;
-  self->report.Share = share;
-  self->report.Options = options;
-  self->report.L3 = l3;
-  self->report.R3 = r3;
-  self->report.PS = ps;
-  self->report.TPad = tpad;
-  self->report.L2Value = L2Value;
-  self->report.R2Value = r2val;
+  self->pState->LPadX = lpadx;
+  self->pState->LPadY = lpady;
+  self->pState->RPadX = rpadx;
+  self->pState->RPadY = rpady;
+  self->pState->Hat = hat;
+  self->pState->Square = Square;
+  self->pState->Cross = cross;
+  self->pState->Circle = circle;
+  self->pState->Triangle = triangle;
+  self->pState->L1 = l1;
+  self->pState->R1 = r1;
+  self->pState->L2 = l2;
+  self->pState->R2 = r2;
+  self->pState->Share = share;
+  self->pState->Options = options;
+  self->pState->L3 = l3;
+  self->pState->R3 = r3;
+  self->pState->PS = ps;
+  self->pState->TPad = tpad;
+  self->pState->L2Value = L2Value;
+  self->pState->R2Value = r2val;
 
   return 0;
 }
 
+static PyObject* Report_from_buffer(PyTypeObject* type, PyObject* args, PyObject* kwargs)
+{
+  static char* kwlist[] = { "buffer", "offset", NULL };
+  Py_buffer view;
+  Py_ssize_t offset = 0;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "w*|n:from_buffer", kwlist, &view, &offset))
+    return NULL;
+
+  if (!PyBuffer_IsContiguous(&view, 'C')) {
+    PyBuffer_Release(&view);
+    PyErr_SetString(PyExc_ValueError, "buffer must be contiguous");
+    return NULL;
+  }
+
+  if ((offset < 0) || (offset + (Py_ssize_t)sizeof(controller_state_t) > view.len)) {
+    PyBuffer_Release(&view);
+    PyErr_Format(PyExc_ValueError, "offset must be in the 0..%zd range", view.len - (Py_ssize_t)sizeof(controller_state_t));
+    return NULL;
+  }
+
+  ReportObject* self = (ReportObject*)type->tp_new(type, NULL, NULL);
+  if (!self) {
+    PyBuffer_Release(&view);
+    return NULL;
+  }
+
+  // The buffer stays locked (cannot be resized) while the report lives
+  self->view = view;
+  self->bView = true;
+  self->pState = (controller_state_t*)((uint8_t*)view.buf + offset);
+
+  return (PyObject*)self;
+}
+
 static PyMethodDef Report_methods[] = {
+  { "from_buffer", (PyCFunction)Report_from_buffer, METH_VARARGS|METH_KEYWORDS|METH_CLASS,
+    "Returns a report whose controller state is the 9 bytes at offset in a writable buffer, "
+    "without copying; changes made through either are seen by the other. For a DS4 USB input "
+    "report, the state starts at offset 1, after the report ID." },
+
   { NULL }
 };
 
+static int Report_getbuffer(ReportObject* self, Py_buffer* view, int flags)
+{
+  return PyBuffer_FillInfo(view, (PyObject*)self, self->pState, sizeof(controller_state_t), 0, flags);
+}
+
+static PyBufferProcs Report_as_buffer = {
+  (getbufferproc)Report_getbuffer,
+  NULL,
+};
+
 #define IDCAT(a, b) a##b
 
 #define INPUT8_GETSET(name, minval, maxval)                             \
   static PyObject* IDCAT(Report_get_, name)(ReportObject* self, void*) { \
-    return Py_BuildValue("i", (int)self->report . name);                 \
+    return Py_BuildValue("i", (int)self->pState-> name);                 \
   }                                                                      \
   static int IDCAT(Report_set_, name)(ReportObject* self, PyObject* value, void*) { \
     if (!PyLong_Check(value)) {                                          \
@@ -154,13 +316,13 @@ static PyMethodDef Report_methods[] = {
       PyErr_SetString(PyExc_ValueError, #name " must be in the " #minval ".." #maxval " range"); \
       return -1;                                                         \
     }                                                                    \
-    self->report . name = CLAMPU8(PyLong_AsLong(value));                  \
+    self->pState-> name = CLAMPU8(PyLong_AsLong(value));                  \
     return 0;                                                            \
   }
 
 #define BUTTON_GETSET(name) \
   static PyObject* IDCAT(Report_get_, name)(ReportObject* self, void*) { \
-    PyObject* ret = self->report . name ? Py_True : Py_False;            \
+    PyObject* ret = self->pState-> name ? Py_True : Py_False;            \
     Py_INCREF(ret);                                                      \
     return ret;                                                          \
   }                                                                      \
@@ -169,7 +331,7 @@ static PyMethodDef Report_methods[] = {
       PyErr_SetString(PyExc_TypeError, #name " must be a bool");        \
       return -1;                                                        \
     }                                                                   \
-    self->report . name = (value == Py_True);                           \
+    self->pState-> name = (value == Py_True);                           \
     return 0;                                                           \
   }
 
@@ -287,7 +449,7 @@ static PyTypeObject ReportType = {
   0,
   0,
   0,
-  0,
+  &Report_as_buffer,
   Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE,
   "VM wrapper report objects",
   0,
@@ -326,6 +488,7 @@ static PyObject* VM_new(PyTypeObject* type, PyObject* args, PyObject* kwargs)
   if (self) {
     self->pVM = NULL;
     self->pBytecode = NULL;
+    self->bRunning = false;
   }
 
   return (PyObject*)self;
@@ -333,10 +496,12 @@ static PyObject* VM_new(PyTypeObject* type, PyObject* args, PyObject* kwargs)
 
 static int VM_init(VMObject* self, PyObject* args, PyObject* kwargs)
 {
-  static char *kwlist[] = { "bytecode", "stacksize", NULL };
+  static char *kwlist[] = { "bytecode", "stacksize", "entry", "profile", NULL };
   int stacksize;
+  int entry = 0;
+  int profile = 0;
 
-  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Oi:__init__", kwlist, &self->pBytecode, &stacksize))
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "Oi|ip:__init__", kwlist, &self->pBytecode, &stacksize, &entry, &profile))
     return -1;
 
   if (!PyBytes_Check(self->pBytecode)) {
@@ -346,7 +511,9 @@ static int VM_init(VMObject* self, PyObject* args, PyObject* kwargs)
   }
 
   Py_INCREF(self->pBytecode);
-  self->pVM = new PyVM((uint8_t*)PyBytes_AsString(self->pBytecode), stacksize);
+  self->pVM = new PyVM((uint8_t*)PyBytes_AsString(self->pBytecode), stacksize, entry);
+  if (profile)
+    self->pVM->EnableProfile(PyBytes_Size(self->pBytecode));
 
   return 0;
 }
@@ -357,6 +524,9 @@ static PyObject* VM_get_stack(VMObject* self, PyObject* args, PyObject* kwargs)
   if (!PyArg_ParseTupleAndKeywords(args, kwargs, ":get_stack", kwlist))
     return NULL;
 
+  if (!VM_check_running(self))
+    return NULL;
+
   return self->pVM->GetStack();
 }
 
@@ -372,6 +542,9 @@ static PyObject* VM_push(VMObject* self, PyObject* args, PyObject* kwargs)
     return NULL;
   }
 
+  if (!VM_check_running(self))
+    return NULL;
+
   int size = PyBytes_Size(values);
   if (size + self->pVM->GetSP() > self->pVM->m_StackSize) {
     PyErr_SetString(PyExc_RuntimeError, "Stack overflow");
@@ -396,6 +569,9 @@ static PyObject* VM_step(VMObject* self, PyObject* args, PyObject* kwargs)
     return NULL;
   }
 
+  if (!VM_check_running(self))
+    return NULL;
+
   bool ret = self->pVM->Step((ReportObject*)pyreport);
 
   PyObject* r = (ret ? Py_True : Py_False);
@@ -403,16 +579,77 @@ static PyObject* VM_step(VMObject* self, PyObject* args, PyObject* kwargs)
   return r;
 }
 
+static PyObject* VM_run_frames(VMObject* self, PyObject* args, PyObject* kwargs)
+{
+  static char* kwlist[] = { "frames", "max_steps", NULL };
+  Py_buffer buffer;
+  long maxSteps = 100000;
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, "w*|l:run_frames", kwlist, &buffer, &maxSteps))
+    return NULL;
+
+  if (!PyBuffer_IsContiguous(&buffer, 'C') || (buffer.len % sizeof(frame_t))) {
+    PyBuffer_Release(&buffer);
+    PyErr_Format(PyExc_ValueError, "frames must be a contiguous buffer of %d bytes frames", (int)sizeof(frame_t));
+    return NULL;
+  }
+
+  if (!VM_check_running(self)) {
+    PyBuffer_Release(&buffer);
+    return NULL;
+  }
+
+  Py_ssize_t failed = 0;
+  long steps;
+
+  self->bRunning = true;
+  Py_BEGIN_ALLOW_THREADS
+  steps = self->pVM->RunFrames((frame_t*)buffer.buf, buffer.len / sizeof(frame_t), maxSteps, &failed);
+  Py_END_ALLOW_THREADS
+  self->bRunning = false;
+
+  PyBuffer_Release(&buffer);
+
+  if (steps < 0) {
+    PyErr_Format(PyExc_RuntimeError, "frame %zd did not yield after %ld instructions", failed, maxSteps);
+    return NULL;
+  }
+
+  return PyLong_FromLong(steps);
+}
+
+static PyObject* VM_reset_profile(VMObject* self, PyObject* args, PyObject* kwargs)
+{
+  static char* kwlist[] = { NULL };
+  if (!PyArg_ParseTupleAndKeywords(args, kwargs, ":reset_profile", kwlist))
+    return NULL;
+
+  if (!VM_check_running(self))
+    return NULL;
+
+  self->pVM->ResetProfile();
+
+  Py_INCREF(Py_None);
+  return Py_None;
+}
+
 static PyMethodDef VM_methods[] = {
   { "get_stack", (PyCFunction)VM_get_stack, METH_VARARGS|METH_KEYWORDS },
   { "push", (PyCFunction)VM_push, METH_VARARGS|METH_KEYWORDS },
   { "step", (PyCFunction)VM_step, METH_VARARGS|METH_KEYWORDS },
+  { "run_frames", (PyCFunction)VM_run_frames, METH_VARARGS|METH_KEYWORDS,
+    "Runs each frame of a writable buffer until the VM yields, without the GIL. "
+    "The controller states are updated in place. Returns the number of instructions executed." },
+  { "reset_profile", (PyCFunction)VM_reset_profile, METH_VARARGS|METH_KEYWORDS,
+    "Clears the profile counters" },
 
   { NULL }
 };
 
 static PyObject* VM_get_offset(VMObject* self, void*)
 {
+  if (!VM_check_running(self))
+    return NULL;
+
   return Py_BuildValue("i", (int)self->pVM->GetOffset());
 }
 
@@ -430,6 +667,8 @@ static PyObject* VM_get_offset(VMObject* self, void*)
       PyErr_SetString(PyExc_RuntimeError, #name " must be in the -32768..32767 range"); \
       return -1;                                                        \
     }                                                                   \
+    if (!VM_check_running(self))                                        \
+      return -1;                                                        \
     self->pVM-> IDCAT(Set, name)(v);                                    \
     return 0;                                                           \
   }
@@ -437,10 +676,28 @@ static PyObject* VM_get_offset(VMObject* self, void*)
 GETSET_IVAL(SP);
 GETSET_IVAL(TH);
 
+#define GET_COUNTS(name, method)                                 \
+  static PyObject* IDCAT(VM_get_, name)(VMObject* self, void*) { \
+    if (!VM_check_running(self))                                 \
+      return NULL;                                               \
+    if (!self->pVM->IsProfiling()) {                             \
+      Py_INCREF(Py_None);                                        \
+      return Py_None;                                            \
+    }                                                            \
+    return self->pVM-> method();                                 \
+  }
+
+GET_COUNTS(opcode_counts, GetOpcodeCounts);
+GET_COUNTS(offset_counts, GetOffsetCounts);
+GET_COUNTS(frame_counts, GetFrameCounts);
+
 static PyGetSetDef VM_getsetters[] = {
   { "offset", (getter)VM_get_offset, NULL, "Offset value", NULL },
   { "SP", (getter)VM_get_SP, (setter)VM_set_SP, "SP value", NULL },
   { "TH", (getter)VM_get_TH, (setter)VM_set_TH, "TH value", NULL },
+  { "opcode_counts", (getter)VM_get_opcode_counts, NULL, "Instructions executed by opcode byte, or None when not profiling", NULL },
+  { "offset_counts", (getter)VM_get_offset_counts, NULL, "Instructions executed by bytecode offset, or None when not profiling", NULL },
+  { "frame_counts", (getter)VM_get_frame_counts, NULL, "Instructions executed by each frame, up to its yield, or None when not profiling", NULL },
 
   { NULL }
 };
@@ -510,5 +767,8 @@ PyMODINIT_FUNC PyInit_vmwrapper(void)
   Py_INCREF(&ReportType);
   PyModule_AddObject(mdl, "Report", (PyObject*)&ReportType);
 
+  PyModule_AddIntConstant(mdl, "FRAME_SIZE", sizeof(frame_t));
+  PyModule_AddStringConstant(mdl, "FRAME_FORMAT", FRAME_FORMAT);
+
   return mdl;
 }
@@ -8,6 +8,30 @@ from test_vm_binary import *
 from test_vm_unary import *
 from test_vm_stack import *
 from test_vm_flow import *
+from test_vm_frames import *
+from test_vm_report import *
+from test_bccache import *
+from test_lrtables import *
+from test_compileservice import *
+from test_symbols import *
+from test_cse import *
+from test_peephole import *
+from test_dataflow import *
+from test_slots import *
+from test_callgraph import *
+from test_batch import *
+from test_sizes import *
+from test_streaming import *
+from test_inline import *
+from test_branches import *
+from test_fusion import *
+from test_linker import *
+from test_deadcode import *
+from test_debuginfo import *
+from test_profiler import *
+from test_loopbound import *
+from test_wcet import *
+from test_pyvm import *
 
 
 if __name__ == '__main__':
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+import unittest
+import contextlib
+
+import base
+
+from dsrlib.compiler.batch import Unit, BatchCompiler, collectUnits, compileUnit, main
+
+
+GOOD = 'state idle { idle() { LPadX = 1; } };'
+BAD = 'state idle { idle() { x = 1; } };'
+
+
+class TempDirMixin:
+    def setUp(self):
+        super().setUp()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        super().tearDown()
+
+    def write(self, name, content):
+        filename = os.path.join(self.path, name)
+        with open(filename, 'w', encoding='utf-8') as fileobj:
+            fileobj.write(content)
+        return filename
+
+    def configuration(self, uid, *sources):
+        actions = [{'type': 'invert_pad', 'pad': 0, 'axis': 0}]
+        actions.extend([{'type': 'custom', 'code': source} for source in sources])
+        return {'name': 'Config %s' % uid, 'uuid': uid, 'thumbnail': None, 'actions': actions, 'description': ''}
+
+
+class TestCollect(TempDirMixin, unittest.TestCase):
+    def test_source(self):
+        unit, = collectUnits(self.write('my action.gac', GOOD))
+        self.assertEqual((unit.key, unit.source), ('my_action', GOOD))
+
+    def test_workspace(self):
+        data = {'version': 0, 'workspace': {'configurations': [self.configuration('a', GOOD, BAD), self.configuration('b')]}}
+        units = collectUnits(self.write('workspace.json', json.dumps(data)))
+        self.assertEqual([unit.key for unit in units], ['a-1', 'a-2'])
+        self.assertEqual([unit.source for unit in units], [GOOD, BAD])
+
+    def test_zip(self):
+        filename = os.path.join(self.path, 'config.zip')
+        with zipfile.ZipFile(filename, mode='w') as zipobj:
+            zipobj.writestr('configuration.json', json.dumps(self.configuration('c', GOOD)))
+        unit, = collectUnits(filename)
+        self.assertEqual(unit.key, 'c-1')
+
+
+class TestCompileUnit(unittest.TestCase):
+    def diagnostics(self, source):
+        return [(diag['severity'], diag['line'], diag['column']) for diag in compileUnit(Unit('test', 'test', source))['diagnostics']]
+
+    def test_success(self):
+        result = compileUnit(Unit('test', 'test', GOOD))
+        self.assertEqual(result['diagnostics'], [])
+        self.assertEqual(result['size'], len(result['bytecode']) - 2)
+        self.assertEqual(result['stacksize'], 0)
+
+    def test_semantic_error(self):
+        self.assertEqual(self.diagnostics(BAD), [('error', 1, 23)])
+
+    def test_parse_error(self):
+        self.assertEqual(self.diagnostics('state idle { idle() { LPadX = 1 } };'), [('error', 1, 33)])
+
+    def test_lexer_error(self):
+        self.assertEqual(self.diagnostics('state idle { idle() { $ } };'), [('error', 1, 23)])
+
+    def test_warning(self):
+        self.assertEqual(self.diagnostics('#define X 1\n#define X 2\n' + GOOD), [('warning', 2, 1)])
+
+    def test_worst_case(self):
+        result = compileUnit(Unit('test', 'test', GOOD))
+        self.assertGreater(result['worstcase']['instructions'], 0)
+        self.assertEqual(result['worstcase']['states']['state idle']['cycles'], result['worstcase']['cycles'])
+
+    def test_frame_budget(self):
+        cycles = compileUnit(Unit('test', 'test', GOOD))['worstcase']['cycles']
+        self.assertEqual(compileUnit(Unit('test', 'test', GOOD), budget=cycles)['diagnostics'], [])
+        result = compileUnit(Unit('test', 'test', GOOD), budget=cycles - 1)
+        self.assertIsNone(result['bytecode'])
+        self.assertEqual([diag['severity'] for diag in result['diagnostics']], ['error'])
+
+
+class TestBatchCompiler(unittest.TestCase):
+    def test_order(self):
+        units = [Unit(str(index), str(index), GOOD if index % 3 else BAD) for index in range(12)]
+        results = BatchCompiler(jobs=2).compile(units)
+        self.assertEqual([result['name'] for result in results], [unit.name for unit in units])
+        self.assertEqual(results, BatchCompiler(jobs=1).compile(units))
+
+
+class TestMain(TempDirMixin, unittest.TestCase):
+    def run_main(self, *args):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(io.StringIO()):
+            code = main(list(args))
+        return code, stdout.getvalue()
+
+    def test_success(self):
+        output = os.path.join(self.path, 'out')
+        code, stdout = self.run_main('-j', '1', '-o', output, '-d', '-', self.write('good.gac', GOOD))
+        self.assertEqual(code, 0)
+        self.assertEqual(os.listdir(output), ['good.bin'])
+        report = json.loads(stdout)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(report['units'][0]['key'], 'good')
+
+    def test_debug(self):
+        output = os.path.join(self.path, 'out')
+        code, _ = self.run_main('-j', '1', '-o', output, '-g', self.write('good.gac', GOOD))
+        self.assertEqual(code, 0)
+        self.assertEqual(sorted(os.listdir(output)), ['good.bin', 'good.dbg'])
+
+    def test_failure(self):
+        report = os.path.join(self.path, 'report.json')
+        code, _ = self.run_main('-d', report, self.write('good.gac', GOOD), self.write('bad.gac', BAD))
+        self.assertEqual(code, 1)
+        with open(report, 'r', encoding='utf-8') as fileobj:
+            self.assertEqual(json.load(fileobj)['errors'], 1)
+
+    def test_frame_budget(self):
+        code, _ = self.run_main('-j', '1', '-f', '10', self.write('good.gac', GOOD))
+        self.assertEqual(code, 1)
+        self.assertEqual(self.run_main('-j', '1', '--frame-budget', '100000', self.write('good.gac', GOOD))[0], 0)
+
+    def test_usage(self):
+        self.assertEqual(self.run_main()[0], 2)
+        self.assertEqual(self.run_main('-j', 'spam', 'file.gac')[0], 2)
+        self.assertEqual(self.run_main(os.path.join(self.path, 'missing.gac'))[0], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+import base
+from dsrlib.compiler import bcgen
+from dsrlib.compiler.cache import BytecodeCache
+
+
+SOURCE = '''
+state idle {
+  idle() {
+    Square = Cross;
+  }
+};
+'''
+
+
+class TestBytecodeCache(unittest.TestCase):
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._path)
+
+    def test_miss(self):
+        cache = BytecodeCache(self._path)
+        self.assertEqual(cache.get(SOURCE), None)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_hit(self):
+        cache = BytecodeCache(self._path)
+        cache.put(SOURCE, [], b'\x01\x02\x03')
+        self.assertEqual(cache.get(SOURCE), ([], b'\x01\x02\x03'))
+        self.assertEqual((cache.hits, cache.misses), (1, 0))
+
+    def test_persistent(self):
+        BytecodeCache(self._path).put(SOURCE, [], b'spam')
+        self.assertEqual(BytecodeCache(self._path).get(SOURCE), ([], b'spam'))
+
+    def test_salt(self):
+        BytecodeCache(self._path, salt='1.0.0').put(SOURCE, [], b'spam')
+        self.assertEqual(BytecodeCache(self._path, salt='1.0.1').get(SOURCE), None)
+
+    def test_source_key(self):
+        cache = BytecodeCache(self._path)
+        cache.put(SOURCE, [], b'spam')
+        self.assertEqual(cache.get(SOURCE + ' '), None)
+
+    def test_eviction(self):
+        cache = BytecodeCache(self._path)
+        cache.put('1', [], b'spam')
+        size = cache.size()
+
+        cache = BytecodeCache(self._path, maxSize=2 * size)
+        cache.put('2', [], b'spam')
+        # Make sure "1" is the most recently used one
+        now = time.time()
+        os.utime(os.path.join(self._path, '%s.bc' % cache.key('2')), (now - 10, now - 10))
+        self.assertNotEqual(cache.get('1'), None)
+        cache.put('3', [], b'spam')
+
+        self.assertNotEqual(cache.get('1'), None)
+        self.assertEqual(cache.get('2'), None)
+        self.assertNotEqual(cache.get('3'), None)
+        self.assertLessEqual(cache.size(), 2 * size)
+
+    def test_counters_threads(self):
+        cache = BytecodeCache(self._path)
+        cache.put(SOURCE, [], b'spam')
+
+        def lookup():
+            for _ in range(200):
+                cache.get(SOURCE)
+                cache.get(SOURCE + ' ')
+        threads = [threading.Thread(target=lookup) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((cache.hits, cache.misses), (800, 800))
+
+
+class TestBytecodeGenCache(unittest.TestCase):
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+        self._cache = BytecodeCache(self._path)
+        bcgen.setBytecodeCache(self._cache)
+
+    def tearDown(self):
+        bcgen.setBytecodeCache(None)
+        shutil.rmtree(self._path)
+
+    def test_generate(self):
+        _, bytecode1 = bcgen.generateBytecode(SOURCE)
+        _, bytecode2 = bcgen.generateBytecode(SOURCE)
+        self.assertEqual((self._cache.hits, self._cache.misses), (1, 1))
+        self.assertEqual(bytecode1.getvalue(), bytecode2.getvalue())
+        self.assertEqual(bytecode1.tell(), bytecode2.tell())
+
+    def test_warnings(self):
+        source = '#define X 1\n#define X 2\n' + SOURCE
+        warnings1, _ = bcgen.generateBytecode(source)
+        warnings2, _ = bcgen.generateBytecode(source)
+        self.assertEqual(self._cache.hits, 1)
+        self.assertEqual(len(warnings1), 1)
+        self.assertEqual(warnings1, warnings2)
+
+    def test_errors_not_cached(self):
+        with self.assertRaises(bcgen.BytecodeGenError):
+            bcgen.generateBytecode('int x;')
+        with self.assertRaises(bcgen.BytecodeGenError):
+            bcgen.generateBytecode('int x;')
+        self.assertEqual(self._cache.hits, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.interm import Label, Counter
+from dsrlib.compiler.codegen import RegAddr
+from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler import asm
+
+
+class TestRelaxation(unittest.TestCase):
+    def setUp(self):
+        self.counter = Counter()
+
+    def label(self):
+        return Label(self.counter)
+
+    @staticmethod
+    def filler(size):
+        return [asm.Yield() for _ in range(size)]
+
+    def test_short(self):
+        label = self.label()
+        jump = asm.Jump(label)
+        addresses = asm.relaxBranches([jump] + self.filler(127) + [label])
+        self.assertTrue(jump.short)
+        self.assertEqual(addresses[label], 129)
+
+    def test_long(self):
+        label = self.label()
+        jump = asm.JZ(RegAddr(Opcodes.REGINDEX_TH), label)
+        asm.relaxBranches([jump] + self.filler(128) + [label])
+        self.assertFalse(jump.short)
+
+    def test_backward(self):
+        label = self.label()
+        near, far = asm.Jump(label), asm.Jump(label)
+        asm.relaxBranches([label] + self.filler(126) + [near] + self.filler(1) + [far])
+        self.assertTrue(near.short)
+        self.assertFalse(far.short)
+
+    def test_cascade(self):
+        # Widening the second branch moves the first one's target out of reach
+        first, second = self.label(), self.label()
+        jump1, jump2 = asm.Jump(first), asm.Jump(second)
+        asm.relaxBranches([jump1, jump2] + self.filler(125) + [first] + self.filler(10) + [second])
+        self.assertFalse(jump1.short)
+        self.assertFalse(jump2.short)
+
+    def test_no_cascade(self):
+        first, second = self.label(), self.label()
+        jump1, jump2 = asm.Jump(first), asm.Jump(second)
+        asm.relaxBranches([jump1, jump2] + self.filler(124) + [first] + self.filler(10) + [second])
+        self.assertTrue(jump1.short)
+        self.assertFalse(jump2.short)
+
+    def test_patch(self):
+        label = self.label()
+        jump = asm.Jump(label)
+        ops = [asm.Yield(), jump, asm.Yield(), label]
+        addresses = asm.relaxBranches(ops)
+        stream = io.BytesIO()
+        offsets = {}
+        for op in ops[:-1]:
+            op.write(offsets, stream)
+        asm.patchBranches(offsets, addresses, stream)
+        self.assertEqual(stream.getvalue()[1:3], Opcodes.make_opcode(Opcodes.OPCODE_TYPE_FLOW, Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, Opcodes.OPCODE_VARIANT_REL8) + struct.pack('<b', 1))
+
+
+class TestLongBranches(unittest.TestCase):
+    def test_loop(self):
+        # The loop body is too large for short branches
+        body = '\n'.join(['    n = n + %d;' % index for index in range(1, 40)])
+        source = '''state idle {
+  int i;
+  int n;
+  idle() {
+    i = 0;
+    n = 0;
+    while (i < 3) {
+%s
+      i = i + 1;
+    }
+    LPadX = n / 10;
+    RPadX = i;
+  }
+};''' % body
+        _, bytecode = compileBytecode(source)
+        bytecode = bytecode.getvalue()
+        self.assertGreater(len(bytecode), 200)
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        report = Report()
+        while not vm.step(report):
+            pass
+        self.assertEqual((report.LPadX, report.RPadX), (3 * sum(range(1, 40)) // 10, 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
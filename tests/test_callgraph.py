@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+import io
+import time
+import unittest
+import unittest.mock
+
+import base
+
+from dsrlib.compiler import Compiler
+from dsrlib.compiler.ast import CallGraph, CallGraphChecker
+from dsrlib.compiler.codegen import StackSize, CalleeStackSize, callableStackSizes
+
+
+CALLS = '''
+int a(int x) { return x + 1; }
+int b(int x) { return a(x) + a(x + 1); }
+int c(int x) { return b(x) * b(x + 2); }
+struct S {
+  int v;
+  int get() { return c(v) + 0; }
+};
+state idle { S s; idle() { LPadX = s.get(); } };
+'''
+
+
+class Function:
+    def __init__(self, name):
+        self.name = name
+
+
+class CompilerMixin:
+    def compile(self, source):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        return ast
+
+    def byName(self, funcs):
+        return dict([(func.name, value) for func, value in funcs.items()])
+
+
+class TestCallGraph(CompilerMixin, unittest.TestCase):
+    def test_callees(self):
+        graph = CallGraph().build(self.compile(CALLS))
+        funcs = dict([(func.name, func) for func in graph.callables()])
+        self.assertEqual(sorted(funcs.keys()), ['a', 'b', 'c', 'get'])
+        self.assertEqual([func.name for func in graph.callees(funcs['b'])], ['a', 'a'])
+        self.assertEqual([func.name for func in graph.callees(funcs['get'])], ['c'])
+        self.assertEqual(graph.callees(funcs['a']), [])
+        self.assertEqual(graph.cycles(), [])
+
+    def graph(self, *edges):
+        # The language cannot express recursion yet, so build the graph by hand
+        graph = CallGraph()
+        funcs = {}
+        for caller, callee in edges:
+            for name in (caller, callee):
+                funcs.setdefault(name, Function(name))
+                graph._calls.setdefault(funcs[name], []) # pylint: disable=W0212
+            graph._calls[funcs[caller]].append((funcs[callee], (caller, callee))) # pylint: disable=W0212
+        return graph
+
+    def test_self_cycle(self):
+        cycle, = self.graph(('f', 'f')).cycles()
+        self.assertEqual([func.name for func in cycle[0]], ['f', 'f'])
+        self.assertEqual(cycle[1], ('f', 'f'))
+
+    def test_cycle(self):
+        cycles = self.graph(('main', 'f'), ('f', 'g'), ('g', 'h'), ('h', 'f'), ('g', 'k')).cycles()
+        self.assertEqual([[func.name for func in cycle] for cycle, _ in cycles], [['f', 'g', 'h', 'f']])
+
+    def test_diamond(self):
+        self.assertEqual(self.graph(('f', 'g'), ('f', 'h'), ('g', 'k'), ('h', 'k')).cycles(), [])
+
+    def test_checker(self):
+        errors = []
+        graph = self.graph(('f', 'g'), ('g', 'f'), ('h', 'h'))
+        with unittest.mock.patch.object(CallGraph, 'build', return_value=graph):
+            CallGraphChecker(errors, []).check(None)
+        self.assertEqual([msg for msg, _ in errors], ['call cycle: f -> g -> f', 'recursive call to "h"'])
+
+
+class TestStackDepth(CompilerMixin, unittest.TestCase):
+    def test_sizes(self):
+        sizes = self.byName(callableStackSizes(self.compile(CALLS)))
+        self.assertEqual(sizes['a'], 0)
+        self.assertGreater(sizes['b'], 0)
+        self.assertGreater(sizes['c'], sizes['b'])
+        self.assertGreater(sizes['get'], sizes['c'])
+
+    def test_memoized(self):
+        ast = self.compile(CALLS)
+        with unittest.mock.patch.object(CalleeStackSize, 'visitFunctionNode', autospec=True, side_effect=CalleeStackSize.visitFunctionNode) as visit:
+            StackSize().visit(ast)
+        self.assertEqual(sorted([call[0][1].name for call in visit.call_args_list]), ['a', 'b', 'c'])
+
+    def test_recursion(self):
+        func = Function('f')
+        sizes = StackSize({func: None})
+        with self.assertRaises(RuntimeError):
+            sizes.calleeSize(func)
+
+    def test_chain(self):
+        # Each helper calls the previous one twice; walking every call site
+        # would be exponential in the depth of the chain
+        lines = ['int f0(int x) { return x + 1; }']
+        for index in range(1, 40):
+            lines.append('int f%d(int x) { return f%d(x) + f%d(x + 1); }' % (index, index - 1, index - 1))
+        lines.append('state idle { idle() { LPadX = f39(1); } };')
+        ast = self.compile('\n'.join(lines))
+        start = time.time()
+        sizes = self.byName(callableStackSizes(ast))
+        self.assertLess(time.time() - start, 5)
+        self.assertGreater(sizes['f39'], sizes['f38'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import time
+import struct
+import unittest
+import unittest.mock
+
+import base
+from PyQt5 import QtCore
+from dsrlib.compiler.bcgen import generateBytecode, BytecodeGenError
+from dsrlib.domain.compileservice import CompileService, setCompileService, submitCompile, createCompile, startCompile
+from dsrlib.domain.actions.custom import CustomAction
+from dsrlib.domain.configuration import Configuration
+
+
+SOURCE = '''
+state idle {
+  idle() {
+    Square = Cross;
+  }
+};
+'''
+
+
+class TestSynchronousCompile(unittest.TestCase):
+    def test_callback(self):
+        results = []
+        job = submitCompile(SOURCE, results.append)
+        self.assertTrue(job.done())
+        self.assertEqual(results, [job])
+        self.assertEqual(job.bytecode().getvalue(), generateBytecode(SOURCE)[1].getvalue())
+
+    def test_error(self):
+        job = submitCompile('int x;')
+        self.assertIsInstance(job.exception(), BytecodeGenError)
+        with self.assertRaises(BytecodeGenError):
+            job.result()
+
+    def test_created_not_started(self):
+        results = []
+        job = createCompile(SOURCE, results.append)
+        self.assertFalse(job.done())
+        self.assertEqual(results, [])
+        self.assertIs(startCompile(job), job)
+        self.assertEqual(results, [job])
+
+    def test_custom_action(self):
+        action = CustomAction()
+        changes = []
+        action.changed.connect(lambda: changes.append(action.bytecode()))
+        action.setSource(SOURCE)
+        self.assertFalse(action.pending())
+        self.assertEqual(action.error(), None)
+        _, bytecode = generateBytecode(SOURCE)
+        self.assertEqual(changes, [struct.pack('<H', bytecode.tell()) + bytecode.getvalue()])
+        action.bytecode()
+        action.size()
+        self.assertEqual(len(changes), 1)
+
+
+class TestCompileService(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Needed for the queued completion signals
+        cls._app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+    def setUp(self):
+        self._service = CompileService()
+
+    def tearDown(self):
+        setCompileService(None)
+        if self._service.isRunning():
+            self._service.stop()
+
+    def test_result(self):
+        self._service.start()
+        job = self._service.submit(SOURCE)
+        _, bytecode = job.result()
+        self.assertEqual(bytecode.getvalue(), generateBytecode(SOURCE)[1].getvalue())
+
+    def test_cancel(self):
+        job1 = self._service.submit(SOURCE)
+        job2 = self._service.submit(SOURCE + ' ')
+        job1.cancel()
+        self._service.start()
+        job2.wait()
+        self.assertTrue(job1.wait(5))
+        self.assertEqual(job1.bytecode(), None)
+        self.assertNotEqual(job2.bytecode(), None)
+
+    def _waitCompiled(self, action):
+        deadline = time.monotonic() + 10
+        while action.pending() and time.monotonic() < deadline:
+            QtCore.QCoreApplication.processEvents(QtCore.QEventLoop.AllEvents, 50)
+        self.assertFalse(action.pending())
+
+    def test_custom_action(self):
+        setCompileService(self._service)
+        self._service.start()
+        action = CustomAction()
+        changes = []
+        action.changed.connect(lambda: changes.append((action.pending(), action.bytecode())))
+        action.setSource(SOURCE)
+        self._waitCompiled(action)
+        _, bytecode = generateBytecode(SOURCE)
+        self.assertEqual(action.bytecode(), struct.pack('<H', bytecode.tell()) + bytecode.getvalue())
+        self.assertEqual(action.error(), None)
+        # Once when the job starts, once when it is done
+        self.assertEqual(changes, [(True, b''), (False, action.bytecode())])
+
+    def test_custom_action_not_blocking(self):
+        setCompileService(self._service)
+        action = CustomAction()
+        action.setSource(SOURCE)
+        # Service not started: the getters return the last result instead of waiting
+        self.assertTrue(action.pending())
+        self.assertEqual(action.bytecode(), b'')
+        self.assertEqual(action.size(), 0)
+        self._service.start()
+        self._waitCompiled(action)
+        self.assertNotEqual(action.size(), 0)
+
+    def test_configuration_pending(self):
+        setCompileService(self._service)
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            configuration = Configuration()
+            action = CustomAction()
+            action.setSource(SOURCE)
+            configuration.addAction(action)
+            self.assertTrue(configuration.pending())
+            self.assertTrue(action.sizeReport().name.endswith('(compiling)'))
+        self._service.start()
+        self._waitCompiled(action)
+        self.assertFalse(configuration.pending())
+        self.assertEqual(len(configuration.bytecode()), 2 + action.size())
+
+    def test_custom_action_error(self):
+        setCompileService(self._service)
+        self._service.start()
+        action = CustomAction()
+        action.setSource(SOURCE)
+        action.setSource('int x;')
+        self._waitCompiled(action)
+        self.assertEqual(action.size(), 0)
+        self.assertNotEqual(action.error(), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
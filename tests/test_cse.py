@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.interm import BinaryOp, UnaryOp, Const, expressionKey
+
+
+class CSEMixin:
+    def generate(self, source):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        return ICGenerator().generate(ast)
+
+    def count(self, source, op):
+        return len([instr for instr in self.generate(source) if isinstance(instr, (BinaryOp, UnaryOp)) and instr.op == op])
+
+    def run_frame(self, source, **fields):
+        _, bytecode = compileBytecode(source)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        report = Report()
+        for name, value in fields.items():
+            setattr(report, name, value)
+        while not vm.step(report):
+            pass
+        return report
+
+
+class TestExpressionKey(unittest.TestCase):
+    def test_commutative(self):
+        a, b = Const(1), Const(2)
+        self.assertEqual(expressionKey('+', a, b), expressionKey('+', b, a))
+        self.assertEqual(expressionKey('==', a, b), expressionKey('==', b, a))
+
+    def test_not_commutative(self):
+        a, b = Const(1), Const(2)
+        self.assertNotEqual(expressionKey('-', a, b), expressionKey('-', b, a))
+
+    def test_const_type(self):
+        self.assertNotEqual(expressionKey('+', Const(1), Const(1)), expressionKey('+', Const(1.0), Const(1)))
+        self.assertNotEqual(expressionKey('-', Const(0.0)), expressionKey('-', Const(-0.0)))
+
+    def test_hashable(self):
+        self.assertEqual({expressionKey('*', Const(3), Const(4)): 1}[expressionKey('*', Const(4), Const(3))], 1)
+
+
+class TestCSE(CSEMixin, unittest.TestCase):
+    def test_reuse(self):
+        self.assertEqual(self.count('int a = 1; int b = 2; state idle { idle() { LPadX = a + b; LPadY = a + b; } };', '+'), 1)
+
+    def test_commutative(self):
+        self.assertEqual(self.count('int a = 1; int b = 2; state idle { idle() { LPadX = a * b; LPadY = b * a; } };', '*'), 1)
+
+    def test_member(self):
+        source = 'struct ST { int x; }; state idle { ST st; idle() { LPadX = st.x + 1; LPadY = st.x + 1; } };'
+        self.assertEqual(self.count(source, '+'), 1)
+
+    def test_assignment(self):
+        source = 'int a = 1; int b = 2; state idle { idle() { LPadX = a + b; a = 10; LPadY = a + b; } };'
+        self.assertEqual(self.count(source, '+'), 2)
+        report = self.run_frame(source)
+        self.assertEqual((report.LPadX, report.LPadY), (3, 12))
+
+    def test_compound_assignment(self):
+        source = 'int a = 1; state idle { idle() { LPadX = a * 3; a += 1; LPadY = a * 3; } };'
+        report = self.run_frame(source)
+        self.assertEqual((report.LPadX, report.LPadY), (3, 6))
+
+    def test_loop(self):
+        source = 'int a = 1; state idle { idle() { LPadY = a + 1; while (a + 1 < 5) { a = a + 1; } LPadX = a; } };'
+        report = self.run_frame(source)
+        self.assertEqual((report.LPadX, report.LPadY), (4, 2))
+
+    def test_branch(self):
+        source = 'int a = 1; int b = 2; state idle { idle() { if (Square) LPadX = a + b; LPadY = a + b; } };'
+        report = self.run_frame(source, Square=False)
+        self.assertEqual(report.LPadY, 3)
+
+    def test_call(self):
+        source = 'int a = 1; void f() { a = 5; } state idle { idle() { LPadX = a + 1; f(); LPadY = a + 1; } };'
+        report = self.run_frame(source)
+        self.assertEqual((report.LPadX, report.LPadY), (2, 6))
+
+    def test_callable_barrier(self):
+        source = 'int a = 1; int g = a + 1; int f() { return a + 1; } state idle { idle() { a = 3; LPadX = f(); } };'
+        report = self.run_frame(source)
+        self.assertEqual(report.LPadX, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
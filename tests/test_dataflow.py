@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.dataflow import DataflowOptimizer, ControlFlowGraph, foldConstant
+from dsrlib.compiler.interm import BinaryOp, UnaryOp, Assignment, IfFalse, Return, Const
+
+
+class DataflowMixin:
+    def generate(self, source, *rules):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        self.optimizer = DataflowOptimizer(rules=rules or None)
+        return self.optimizer.optimize(ICGenerator().generate(ast))
+
+    def ops(self, source, cls, *rules):
+        return [op for op in self.generate(source, *rules) if isinstance(op, cls)]
+
+    def run_frames(self, source, count, dataflow):
+        _, bytecode = compileBytecode(source, dataflow=dataflow)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        results = []
+        for index in range(count):
+            report = Report()
+            report.Square = bool(index % 2)
+            report.LPadY = 100
+            while not vm.step(report):
+                pass
+            results.append((report.LPadX, report.LPadY, report.RPadX, report.RPadY))
+        return results
+
+    def check(self, source, count=6):
+        results = self.run_frames(source, count, DataflowOptimizer())
+        self.assertEqual(results, self.run_frames(source, count, DataflowOptimizer(rules=[])))
+        return results
+
+
+class TestFoldConstant(unittest.TestCase):
+    def test_arithmetic(self):
+        self.assertEqual(foldConstant('+', 2, 3), 5)
+        self.assertEqual(foldConstant('<', 2, 3), 1)
+        self.assertEqual(foldConstant('!', 0), 1)
+        self.assertEqual(foldConstant('castf', 3), 3.0)
+
+    def test_division(self):
+        self.assertEqual(foldConstant('/', 7, 2), 3)
+        # C truncates towards zero
+        self.assertEqual(foldConstant('/', -7, 2), None)
+        self.assertEqual(foldConstant('/', 7, 0), None)
+
+    def test_overflow(self):
+        self.assertEqual(foldConstant('*', 2**20, 2**20), None)
+
+    def test_float(self):
+        self.assertEqual(foldConstant('+', 1.0, 2.0), None)
+
+
+class TestControlFlowGraph(DataflowMixin, unittest.TestCase):
+    def test_blocks(self):
+        ops = self.generate('state idle { idle() { if (Square) { LPadX = 1; } } };')
+        graph = ControlFlowGraph(ops)
+        branch, = [block for block in graph.blocks if isinstance(block.terminator(), IfFalse)]
+        self.assertEqual(len(branch.successors), 2)
+        self.assertEqual(graph.ops(), ops)
+
+    def test_dump(self):
+        stream = io.StringIO()
+        compileBytecode('state idle { idle() { LPadX = 1; } };', dumpIR=stream)
+        self.assertIn('block_0 -> block_1', stream.getvalue())
+        self.assertIn('LPadX <- 1', stream.getvalue())
+
+
+class TestDataflow(DataflowMixin, unittest.TestCase):
+    def test_constant(self):
+        source = 'state idle { idle() { int a = 2; LPadX = a * 3; } };'
+        self.assertEqual(self.ops(source, BinaryOp), [])
+        self.assertEqual(self.optimizer.stats()['fold'], 1)
+        self.assertEqual(self.check(source)[0][0], 6)
+
+    def test_copy(self):
+        source = 'int g = 5; state idle { idle() { int a = g; LPadX = a + 1; } };'
+        op, = self.ops(source, BinaryOp)
+        self.assertEqual(op.op1.name, 'g')
+        self.assertEqual(self.check(source)[0][0], 6)
+
+    def test_float(self):
+        source = 'state idle { idle() { float f = 2; f = f * 1.5; LPadX = f; } };'
+        op, = self.ops(source, BinaryOp)
+        self.assertEqual(op.op1, Const(2.0))
+        self.assertEqual(self.check(source)[0][0], 3)
+
+    def test_register(self):
+        # Registers clamp the values they are assigned
+        source = 'state idle { idle() { LPadX = 300; LPadY = LPadX; } };'
+        self.assertEqual([op.src.name for op in self.ops(source, Assignment) if not isinstance(op.src, Const)], ['LPadX'])
+        self.assertEqual(self.check(source)[0][:2], (255, 255))
+
+    def test_call(self):
+        source = 'int g = 1; void f() { g = 2; } state idle { idle() { g = 1; f(); LPadX = g; } };'
+        self.assertEqual(self.check(source)[0][0], 2)
+
+    def test_method_call(self):
+        source = '''struct S { int v; void set() { v = 7; } };
+state idle { S s; idle() { s.v = 1; s.set(); LPadX = s.v; } };'''
+        self.assertEqual(self.check(source)[0][0], 7)
+
+    def test_yield(self):
+        source = 'state idle { idle() { int a = Square; yield; RPadX = a; RPadY = Square; } };'
+        self.check(source)
+
+    def test_branch(self):
+        source = 'state idle { idle() { if (1 > 2) { LPadX = 1; } else { LPadX = 2; } } };'
+        self.assertEqual(self.ops(source, IfFalse), [])
+        self.assertGreater(self.optimizer.stats()['unreachable'], 0)
+        self.assertEqual(self.check(source)[0][0], 2)
+
+    def test_dead_temp(self):
+        source = 'state idle { int n; idle() { n++; LPadX = n; } };'
+        self.assertEqual(len(self.ops(source, Assignment)), 1)
+        self.assertEqual([result[0] for result in self.check(source)], [1, 2, 3, 4, 5, 6])
+
+    def test_dead_store(self):
+        source = 'state idle { idle() { RPadX = 1; RPadX = 2; RPadY = RPadX; RPadX = 3; } };'
+        self.assertEqual([op.src for op in self.ops(source, Assignment, 'deadstores')][0], Const(2))
+        self.assertEqual(self.check(source)[0][2:], (3, 2))
+
+    def test_loop(self):
+        source = '''int n = 0;
+state idle {
+  idle() {
+    int i = 0;
+    int s = 0;
+    while (i < 4) { s = s + i; i++; }
+    LPadX = s + n;
+    n = n + 1;
+  }
+};'''
+        self.assertEqual([result[0] for result in self.check(source)], [6, 7, 8, 9, 10, 11])
+
+    def test_transition(self):
+        source = '''state other {
+  int k;
+  other() { k = k + 1; LPadX = k; if (k == 2) { go idle; } }
+};
+state idle {
+  int count;
+  idle() { count = count + 1; LPadX = count * 10; if (count == 3) { go other; } }
+};'''
+        self.check(source, 10)
+
+    def test_unused_function(self):
+        source = 'int f() { return 1; } state idle { idle() { LPadX = 2; } };'
+        self.assertEqual(self.ops(source, Return), [])
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            DataflowOptimizer(rules=['spam'])
+
+
+class TestUnary(DataflowMixin, unittest.TestCase):
+    def test_fold(self):
+        source = 'state idle { idle() { int a = 3; LPadX = -a + 10; } };'
+        self.assertEqual(self.ops(source, (UnaryOp, BinaryOp)), [])
+        self.assertEqual(self.check(source)[0][0], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
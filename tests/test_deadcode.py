@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from dsrlib.compiler import Compiler
+from dsrlib.compiler.ast import DeadCodeEliminator, Inliner
+from dsrlib.compiler.ast.nodes import StateNode, FunctionNode, StructNode
+from dsrlib.compiler.bcgen import compileBytecode
+
+
+SOURCE = '''int sq(int x) { return x * x; }
+int unused(int x) { return x + 1; }
+int helper(int x) { return unused(x) * 2; }
+struct S {
+  int v;
+  void set(int x) { v = sq(x); }
+  void reset() { v = helper(0); }
+};
+state idle {
+  S s;
+  idle() {
+    s.set(LPadX);
+    if (s.v > 1000) go other;
+  }
+};
+state other {
+  other() {
+    RPadX = 0;
+    go third;
+  }
+};
+state third {
+  third() {
+    go idle;
+  }
+};
+state orphan {
+  int a;
+  int b;
+  orphan() {
+    a = helper(LPadX);
+    b = a;
+    go idle;
+  }
+};
+#pragma noinline
+'''
+
+
+class TestDeadCode(unittest.TestCase):
+    def eliminate(self, source):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        self.warnings = []
+        self.eliminator = DeadCodeEliminator(self.warnings)
+        return self.eliminator.eliminate(ast)
+
+    @staticmethod
+    def names(ast):
+        names = []
+        for node in ast.statements:
+            if isinstance(node, (StateNode, FunctionNode)):
+                names.append(node.name)
+            elif isinstance(node, StructNode):
+                names.extend(['%s.%s' % (node.struct.name, method.name) for method in node.struct.methods])
+        return names
+
+    def test_removed(self):
+        ast = self.eliminate(SOURCE)
+        self.assertEqual(self.names(ast), ['sq', 'S.set', 'idle', 'other', 'third'])
+        self.assertEqual(self.eliminator.removed(), ['function unused', 'function helper', 'method S.reset', 'state orphan'])
+
+    def test_warning(self):
+        self.eliminate(SOURCE)
+        (msg, pos), = self.warnings
+        self.assertEqual(msg, 'unreachable code removed: function unused, function helper, method S.reset, state orphan')
+        self.assertEqual(pos.line, 2)
+
+    def test_nothing_removed(self):
+        ast = self.eliminate('int f(int x) { return x + 1; }\nstate idle { idle() { LPadX = f(LPadX); } };')
+        self.assertEqual(self.names(ast), ['f', 'idle'])
+        self.assertEqual(self.warnings, [])
+
+    def test_compile_warning(self):
+        warnings, _ = compileBytecode(SOURCE)
+        self.assertIn('unreachable code removed: function unused, function helper, method S.reset, state orphan', [msg for msg, _ in warnings])
+
+    def test_stack_size(self):
+        # The orphan state locals do not count anymore
+        def stacksize(source):
+            _, bytecode = compileBytecode(source)
+            return struct.unpack('<H', bytecode.getvalue()[:2])[0]
+        self.assertEqual(stacksize(SOURCE), stacksize(SOURCE[:SOURCE.index('state orphan')] + '#pragma noinline\n'))
+
+    def test_inlined(self):
+        # Callables inlined everywhere are removed without a warning
+        source = 'int sq(int x) { return x * x; }\nstate idle { idle() { LPadX = sq(LPadX); } };'
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, _ = comp.compile()
+        warnings = []
+        ast = DeadCodeEliminator(warnings).eliminate(ast)
+        ast = Inliner().inline(ast)
+        eliminator = DeadCodeEliminator()
+        ast = eliminator.eliminate(ast)
+        self.assertEqual(eliminator.removed(), ['function sq'])
+        self.assertEqual(self.names(ast), ['idle'])
+        self.assertEqual(warnings, [])
+        self.assertEqual(compileBytecode(source)[0], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
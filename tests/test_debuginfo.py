@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+import io
+import mmap
+import struct
+import tempfile
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.debuginfo import DebugInfoBuilder, DebugInfo, DebugInfoError
+
+
+SOURCE = '''int g = 3;
+int h(int a, int b) {
+  return a * b + a - b;
+}
+state idle {
+  int n;
+  idle() {
+    n = n + 1;
+      LPadX = h(n, g);
+  }
+};
+#pragma noinline
+'''
+
+
+class TestFormat(unittest.TestCase):
+    def test_empty(self):
+        info = DebugInfo(DebugInfoBuilder().toBytes())
+        self.assertEqual(len(info), 0)
+        self.assertEqual(info.lookup(0), None)
+
+    def test_lookup(self):
+        builder = DebugInfoBuilder()
+        builder.add(0, 1, 1, None)
+        builder.add(4, 2, 3, 'state idle')
+        builder.add(7, 2, 3, 'state idle') # Same position
+        builder.add(9, 5, 1, 'function f')
+        info = DebugInfo(builder.toBytes())
+        self.assertEqual(info.records(), [(0, 1, 1, None), (4, 2, 3, 'state idle'), (9, 5, 1, 'function f')])
+        self.assertEqual(info.lookup(3), (1, 1, None))
+        self.assertEqual(info.lookup(4), (2, 3, 'state idle'))
+        self.assertEqual(info.lookup(8), (2, 3, 'state idle'))
+        self.assertEqual(info.lookup(200), (5, 1, 'function f'))
+
+    def test_same_offset(self):
+        builder = DebugInfoBuilder()
+        builder.add(0, 1, 1, None)
+        builder.add(0, 2, 1, None)
+        self.assertEqual(DebugInfo(builder.toBytes()).records(), [(0, 2, 1, None)])
+
+    def test_invalid(self):
+        self.assertRaises(DebugInfoError, DebugInfo, b'DSR')
+        self.assertRaises(DebugInfoError, DebugInfo, b'SPAM\x01\x00\x00\x00\x00\x00')
+        self.assertRaises(DebugInfoError, DebugInfo, b'DSRD\x02\x00\x00\x00\x00\x00')
+
+    def test_mmap(self):
+        builder = DebugInfoBuilder()
+        builder.add(0, 1, 1, 'state idle')
+        builder.add(10, 3, 2, 'state idle')
+        with tempfile.TemporaryFile() as fileobj:
+            fileobj.write(builder.toBytes())
+            fileobj.flush()
+            with mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                info = DebugInfo(data)
+                self.assertEqual(info.lookup(12), (3, 2, 'state idle'))
+                del info
+
+
+class TestCompile(unittest.TestCase):
+    def compile(self):
+        builder = DebugInfoBuilder()
+        _, bytecode = compileBytecode(SOURCE, debug=builder)
+        return bytecode.getvalue(), DebugInfo(builder.toBytes())
+
+    def test_same_bytecode(self):
+        bytecode, _ = self.compile()
+        self.assertEqual(bytecode, compileBytecode(SOURCE)[1].getvalue())
+
+    def test_records(self):
+        bytecode, info = self.compile()
+        records = info.records()
+        self.assertEqual([offset for offset, _, _, _ in records], sorted(set([offset for offset, _, _, _ in records])))
+        self.assertTrue(all([0 <= offset < len(bytecode) - 2 for offset, _, _, _ in records]))
+        self.assertEqual(set([symbol for _, _, _, symbol in records]), set([None, 'state idle', 'function h']))
+        self.assertIn((9, 7, 'state idle'), [record[1:] for record in records])
+        self.assertIn((3, 3, 'function h'), [record[1:] for record in records])
+
+    def test_trace(self):
+        bytecode, info = self.compile()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        lines = set()
+        report = Report()
+        for _ in range(2):
+            while True:
+                position = info.lookup(vm.offset)
+                if position is not None:
+                    lines.add((position[2], position[0]))
+                if vm.step(report):
+                    break
+        self.assertIn(('function h', 3), lines)
+        self.assertIn(('state idle', 8), lines)
+        self.assertIn(('state idle', 9), lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.dataflow import DataflowOptimizer
+from dsrlib.compiler.fusion import BranchFusion
+from dsrlib.compiler.interm import BinaryOp, IfFalse, CompareIfFalse
+
+
+class TestSelection(unittest.TestCase):
+    def fuse(self, source):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        self.fusion = BranchFusion()
+        return self.fusion.fuse(DataflowOptimizer().optimize(ICGenerator().generate(ast)))
+
+    def ops(self, source, cls):
+        return [op for op in self.fuse(source) if isinstance(op, cls)]
+
+    def test_if(self):
+        branch, = self.ops('state idle { idle() { if (LPadX < 3) RPadX = 1; } };', CompareIfFalse)
+        self.assertEqual((str(branch.op1), branch.op, str(branch.op2)), ('LPadX', '<', '3'))
+        self.assertEqual(self.ops('state idle { idle() { if (LPadX < 3) RPadX = 1; } };', IfFalse), [])
+        self.assertEqual(self.fusion.stats()['<'], 1)
+
+    def test_while(self):
+        source = 'state idle { int n; idle() { n = 0; while (n != LPadX) { n = n + 1; } RPadX = n; } };'
+        branch, = self.ops(source, CompareIfFalse)
+        self.assertEqual(branch.op, '!=')
+
+    def test_mirrored(self):
+        branch, = self.ops('state idle { idle() { if (3 <= LPadX) RPadX = 1; } };', CompareIfFalse)
+        self.assertEqual((str(branch.op1), branch.op, str(branch.op2)), ('LPadX', '>=', '3'))
+
+    def test_reused(self):
+        # The comparison result is also read after the branch
+        source = 'state idle { idle() { if (LPadX < 3) RPadX = 1; RPadY = LPadX < 3; } };'
+        self.assertEqual(self.ops(source, CompareIfFalse), [])
+        self.assertEqual(len(self.ops(source, IfFalse)), 1)
+
+    def test_not_comparison(self):
+        self.assertEqual(self.ops('state idle { idle() { if (LPadX + 1) RPadX = 1; } };', CompareIfFalse), [])
+
+    def test_disabled(self):
+        ops = BranchFusion(enabled=False).fuse(self.fuse('state idle { idle() { if (LPadX < 3) RPadX = 1; } };'))
+        self.assertEqual(len([op for op in ops if isinstance(op, CompareIfFalse)]), 1)
+
+
+SOURCE = '''float f;
+int n;
+state idle {
+  idle() {
+    f = IMUX;
+    n = LPadX;
+    if (n < 100) LPadY = 1; else LPadY = 0;
+    if (n >= RPadX) RPadY = 1; else RPadY = 0;
+    if (f > 0.5) Square = 1;
+    if (f <= -0.5) Cross = 1;
+    if (200 == n) Circle = 1;
+    if (RPadY != 0) Triangle = 1;
+    while (n > 10) {
+      n = n / 2;
+    }
+    L2Value = n;
+  }
+};
+'''
+
+
+class TestSemantics(unittest.TestCase):
+    def run_frames(self, source, fusion):
+        _, bytecode = compileBytecode(source, fusion=fusion)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        results = []
+        for lpadx, rpadx, imux in [(0, 0, 0.0), (99, 100, 0.6), (100, 99, -0.5), (200, 255, -1.0), (255, 12, 0.5)]:
+            report = Report(LPadX=lpadx, RPadX=rpadx, IMUX=imux)
+            while not vm.step(report):
+                pass
+            results.append((report.LPadY, report.RPadY, report.Square, report.Cross, report.Circle, report.Triangle, report.L2Value))
+        return len(bytecode), results
+
+    def test_same_results(self):
+        size, results = self.run_frames(SOURCE, BranchFusion())
+        refsize, reference = self.run_frames(SOURCE, BranchFusion(enabled=False))
+        self.assertEqual(results, reference)
+        self.assertLess(size, refsize)
+
+    def test_long(self):
+        # Too far for the 8 bits displacement
+        body = '\n'.join(['      n = n + %d;' % index for index in range(1, 40)])
+        source = 'state idle { int n; idle() { n = 0; if (LPadX < 10) {\n%s\n    } L2Value = n / 10; } };' % body
+        for lpadx, expected in [(5, sum(range(1, 40)) // 10), (50, 0)]:
+            for fusion in (BranchFusion(), BranchFusion(enabled=False)):
+                _, bytecode = compileBytecode(source, fusion=fusion)
+                bytecode = bytecode.getvalue()
+                stacksize, = struct.unpack('<H', bytecode[:2])
+                vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+                report = Report(LPadX=lpadx)
+                while not vm.step(report):
+                    pass
+                self.assertEqual(report.L2Value, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
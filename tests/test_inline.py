@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.ast import Inliner
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.interm import FunctionCall, MethodCall
+
+
+SOURCE = '''int g = 3;
+int sq(int x) { return x * x; }
+int add(int a, int b) { return a + b; }
+int bump() { return g++; }
+int useg(int a) { return a + g; }
+void setg(int v) { g = v; }
+struct P {
+  int v;
+  int get() { return v + 1; }
+  void set(int x) { v = x * 2; }
+};
+state idle {
+  P p;
+  int n;
+  idle() {
+    n = n + 1;
+    p.set(3);
+    LPadX = sq(n) + add(n, 2) + p.get();
+    RPadX = sq(bump()) + add(n * 2, 1);
+    if (Square) setg(5);
+    RPadY = useg(n) + g;
+  }
+};
+'''
+
+
+class InlinerMixin:
+    def inline(self, source, inliner=None):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        self.inliner = Inliner() if inliner is None else inliner
+        return ICGenerator().generate(self.inliner.inline(ast, pragmas=comp.pragmas()))
+
+    def calls(self, source, inliner=None):
+        return sorted([op.function.name if isinstance(op, FunctionCall) else op.method.name
+                       for op in self.inline(source, inliner) if isinstance(op, (FunctionCall, MethodCall))])
+
+    def run_frames(self, source, inliner):
+        _, bytecode = compileBytecode(source, inliner=inliner)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        results = []
+        for index in range(6):
+            report = Report()
+            report.Square = bool(index % 2)
+            while not vm.step(report):
+                pass
+            results.append((report.LPadX, report.LPadY, report.RPadX, report.RPadY))
+        return len(bytecode), results
+
+
+class TestInliner(InlinerMixin, unittest.TestCase):
+    def test_inlined(self):
+        # sq(g++) would evaluate its argument twice
+        self.assertEqual(self.calls(SOURCE), ['sq'])
+        self.assertEqual(dict(self.inliner.stats()), {'sq': 1, 'add': 2, 'P.set': 1, 'P.get': 1, 'bump': 1, 'setg': 1, 'useg': 1})
+
+    def test_same_results(self):
+        size, results = self.run_frames(SOURCE, Inliner())
+        refsize, reference = self.run_frames(SOURCE, Inliner(enabled=False))
+        self.assertEqual(results, reference)
+        self.assertLess(size, refsize)
+
+    def test_shadowed(self):
+        source = 'int g = 1; int f() { return g + 1; } state idle { idle() { int g = 5; LPadX = f(); } };'
+        self.assertEqual(self.calls(source), ['f'])
+        self.assertEqual(self.run_frames(source, Inliner())[1][0][0], 2)
+
+    def test_side_effects(self):
+        # The argument would be read after the call to bump()
+        source = 'int g = 1; int bump() { g = g + 1; return g + 0; } int f(int a) { return bump() + a; } state idle { idle() { LPadX = f(g); } };'
+        self.assertEqual(self.calls(source), ['bump', 'f'])
+        self.assertEqual(self.run_frames(source, Inliner())[1][0][0], 3)
+
+    def test_argument_assigned(self):
+        source = 'void f(int a) { a = 2; } state idle { idle() { f(1); } };'
+        self.assertEqual(self.calls(source), ['f'])
+
+    def test_large(self):
+        source = '''int f(int a, int b) { return a * b + a * a - b * b + (a - b) * (a + b) + a / b; }
+state idle { idle() { LPadX = f(LPadY, 2); RPadX = f(RPadY, 3); } };'''
+        self.assertEqual(self.calls(source), ['f', 'f'])
+        self.assertEqual(self.calls(source, Inliner(maxCost=20, budget=1000)), [])
+
+    def test_budget(self):
+        source = '''int f(int a) { return a * a + a * 3 - a / 2 + 1; }
+state idle { idle() { LPadX = f(LPadY) + f(RPadY) + f(LPadX) + f(RPadX); } };'''
+        self.assertEqual(self.calls(source, Inliner(budget=0)), ['f', 'f', 'f', 'f'])
+        self.assertEqual(self.calls(source, Inliner(budget=1000)), [])
+        self.assertGreater(self.inliner.growth(), 0)
+
+    def test_single_call(self):
+        source = '''int f(int a) { return a * a + a * 3 - a / 2 + a * 7 - (a + 1) * (a - 1) + 1; }
+state idle { idle() { LPadX = f(LPadY); } };'''
+        self.assertEqual(self.calls(source, Inliner(budget=0)), [])
+        self.assertLess(self.inliner.growth(), 0)
+
+
+class TestPragma(InlinerMixin, unittest.TestCase):
+    def test_named(self):
+        self.assertEqual(self.calls('#pragma noinline sq P.get\n' + SOURCE), ['get', 'sq', 'sq'])
+
+    def test_all(self):
+        self.assertEqual(len(self.calls(SOURCE + '#pragma noinline\n')), 9)
+        self.assertEqual(self.inliner.stats(), {})
+
+    def test_skipped(self):
+        self.assertEqual(self.calls('#ifdef SPAM\n#pragma noinline\n#endif\n' + SOURCE), ['sq'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import struct
+import unittest
+import unittest.mock
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.linker import Linker, LINKED_MARKER
+from dsrlib.domain.configuration import Configuration
+from dsrlib.domain.actions import CustomAction
+
+
+ACTION1 = '''int scale(int v, int n) {
+  int r = 0;
+  while (n > 0) {
+    r = r + v;
+    n = n - 1;
+  }
+  return r + 0;
+}
+state idle {
+  idle() {
+    LPadX = scale(LPadX, 2);
+  }
+};
+#pragma noinline
+'''
+
+ACTION2 = '''int count;
+int scale(int v, int n) {
+  int r = 0;
+  while (n > 0) {
+    r = r + v;
+    n = n - 1;
+  }
+  return r + 0;
+}
+state idle {
+  idle() {
+    count = count + 1;
+    RPadY = scale(count, 3);
+  }
+};
+#pragma noinline
+'''
+
+
+def run(vm, report, frames=1):
+    for _ in range(frames):
+        while not vm.step(report):
+            pass
+
+
+class TestLinker(unittest.TestCase):
+    def test_shared(self):
+        linker = Linker()
+        program = linker.link([ACTION1, ACTION2])
+        self.assertEqual(linker.stats()['shared'], 1)
+        separate = sum([len(compileBytecode(source)[1].getvalue()) - 2 for source in (ACTION1, ACTION2)])
+        self.assertLess(len(program.code), separate)
+
+    def test_header(self):
+        program = Linker().link([ACTION1, ACTION2])
+        data = program.bytecode()
+        self.assertEqual(struct.unpack('<HB', data[:3]), (LINKED_MARKER, 2))
+        self.assertEqual(list(struct.iter_unpack('<HH', data[3:program.headerSize()])), program.entries)
+        self.assertEqual(data[program.headerSize():], program.code)
+        self.assertEqual(program.entries[0][0], 0)
+
+    def test_run(self):
+        program = Linker().link([ACTION1, ACTION2])
+        vms = [VM(bytecode=program.code, stacksize=stacksize, entry=entry) for entry, stacksize in program.entries]
+        for frame in range(1, 4):
+            report = Report(LPadX=10 * frame)
+            for vm in vms:
+                run(vm, report)
+            self.assertEqual(report.LPadX, 20 * frame)
+            self.assertEqual(report.RPadY, 3 * frame)
+
+    def test_different_globals(self):
+        # Same source, but g is not at the same address
+        source1 = 'int g;\nint f(int x) { return x + g; }\nstate idle { idle() { g = 1; LPadX = f(LPadX); } };\n#pragma noinline\n'
+        source2 = 'int h;\nint g;\nint f(int x) { return x + g; }\nstate idle { idle() { g = 2; h = 0; LPadY = f(LPadY); } };\n#pragma noinline\n'
+        linker = Linker()
+        program = linker.link([source1, source2])
+        self.assertEqual(linker.stats()['shared'], 0)
+
+        vms = [VM(bytecode=program.code, stacksize=stacksize, entry=entry) for entry, stacksize in program.entries]
+        report = Report(LPadX=10, LPadY=10)
+        for vm in vms:
+            run(vm, report)
+        self.assertEqual((report.LPadX, report.LPadY), (11, 12))
+
+    def test_different_callees(self):
+        # f compiles to the same code in both, but not g
+        template = 'int g(int x) { return x * %d; }\nint f(int x) { return g(x) + 1; }\nstate idle { idle() { LPadX = f(LPadX); } };\n#pragma noinline\n'
+        linker = Linker()
+        program = linker.link([template % 2, template % 3])
+        self.assertEqual(linker.stats()['shared'], 0)
+
+        for (entry, stacksize), expected in zip(program.entries, [21, 31]):
+            report = Report(LPadX=10)
+            run(VM(bytecode=program.code, stacksize=stacksize, entry=entry), report)
+            self.assertEqual(report.LPadX, expected)
+
+    def test_same_callees(self):
+        source = 'int g(int x) { return x * 2; }\nint f(int x) { return g(x) + 1; }\nstate idle { idle() { LPadX = f(LPadX); } };\n#pragma noinline\n'
+        linker = Linker()
+        program = linker.link([source, source])
+        self.assertEqual(linker.stats()['shared'], 2)
+
+        for entry, stacksize in program.entries:
+            report = Report(LPadX=10)
+            run(VM(bytecode=program.code, stacksize=stacksize, entry=entry), report)
+            self.assertEqual(report.LPadX, 21)
+
+
+class TestConfiguration(unittest.TestCase):
+    def setUp(self):
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            self.configuration = Configuration()
+            for source in (ACTION1, ACTION2, 'syntax error'):
+                action = CustomAction()
+                action.setSource(source)
+                self.configuration.addAction(action)
+
+    def test_unlinked(self):
+        data = self.configuration.bytecode()
+        self.assertNotEqual(struct.unpack('<H', data[2:4])[0], LINKED_MARKER)
+
+    def test_linked(self):
+        unlinked = self.configuration.bytecodeSize()
+        self.configuration.setLinked(True)
+        data = self.configuration.bytecode()
+        self.assertEqual(struct.unpack('<HHB', data[:5]), (len(data) - 2, LINKED_MARKER, 2))
+        self.assertEqual(len(data), self.configuration.bytecodeSize())
+        self.assertLess(len(data), unlinked)
+
+    def test_size_report(self):
+        self.configuration.setLinked(True)
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            report = self.configuration.sizeReport()
+        self.assertEqual(report.size(), self.configuration.bytecodeSize())
+        self.assertEqual(len(report.children), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
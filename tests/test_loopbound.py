@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+import base
+
+from dsrlib.compiler import Compiler
+from dsrlib.compiler.ast import LoopBoundAnalyzer
+
+
+class TestLoopBounds(unittest.TestCase):
+    def bounds(self, body, prefix=''):
+        source = '%sstate idle { idle() { %s } };' % (prefix, body)
+        ast, _, errors = Compiler().compileLines(io.StringIO(source))
+        self.assertEqual(errors, [])
+        bounds = LoopBoundAnalyzer().analyze(ast)
+        return sorted([(node.position.column, bound) for node, bound in bounds.items()])
+
+    def bound(self, body, prefix=''):
+        bounds = self.bounds(body, prefix=prefix)
+        self.assertLessEqual(len(bounds), 1)
+        return bounds[0][1] if bounds else None
+
+    def test_increment(self):
+        self.assertEqual(self.bound('int i = 0; while (i < 10) { LPadX = i; i = i + 1; }'), 10)
+
+    def test_inclusive(self):
+        self.assertEqual(self.bound('int i = 0; while (i <= 10) { i++; }'), 11)
+
+    def test_step(self):
+        self.assertEqual(self.bound('int i = 1; while (i < 10) { i += 3; }'), 3)
+
+    def test_decrement(self):
+        self.assertEqual(self.bound('int i = 10; while (i > 0) { --i; }'), 10)
+        self.assertEqual(self.bound('int i = 10; while (i >= 0) { i -= 4; }'), 3)
+
+    def test_flipped(self):
+        self.assertEqual(self.bound('int i = 0; while (5 > i) { i++; }'), 5)
+
+    def test_not_equal(self):
+        self.assertEqual(self.bound('int i = 7; while (i != 2) { i--; }'), 5)
+        self.assertIsNone(self.bound('int i = 7; while (i != 2) { i++; }'))
+        self.assertIsNone(self.bound('int i = 0; while (i != 5) { i += 2; }'))
+
+    def test_empty(self):
+        self.assertEqual(self.bound('int i = 10; while (i < 5) { i++; }'), 0)
+
+    def test_assignment(self):
+        self.assertEqual(self.bound('int i; LPadX = 1; i = 2; RPadX = 3; while (i < 4) { i++; }'), 2)
+
+    def test_wrong_direction(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < 10) { i--; }'))
+
+    def test_no_start(self):
+        self.assertIsNone(self.bound('int i = LPadX; while (i < 10) { i++; }'))
+        self.assertIsNone(self.bound('int i = 0; i = i + LPadX; while (i < 10) { i++; }'))
+
+    def test_variable_limit(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < LPadX) { i++; }'))
+
+    def test_global(self):
+        self.assertIsNone(self.bound('i = 0; while (i < 10) { i++; }', prefix='int i;\n'))
+
+    def test_conditional_update(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < 10) { if (Square) i++; }'))
+
+    def test_two_updates(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < 10) { i++; i++; }'))
+
+    def test_other_write(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < 10) { i++; if (Square) i = 0; }'))
+
+    def test_continue(self):
+        self.assertIsNone(self.bound('int i = 0; while (i < 10) { if (Square) continue; i++; }'))
+
+    def test_break(self):
+        self.assertEqual(self.bound('int i = 0; while (i < 10) { if (Square) break; i++; }'), 10)
+
+    def test_nested(self):
+        bounds = self.bounds('int i = 0; while (i < 3) { int j = 0; while (j < 4) { j++; } i++; }')
+        self.assertEqual([bound for _, bound in bounds], [3, 4])
+
+    def test_function(self):
+        source = 'int f() { int k = 0; int s = 0; while (k < 8) { s += k; k++; } return s; }\nstate idle { idle() { LPadX = f(); } };'
+        ast, _, errors = Compiler().compileLines(io.StringIO(source))
+        self.assertEqual(errors, [])
+        self.assertEqual(list(LoopBoundAnalyzer().analyze(ast).values()), [8])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from ptk.parser import production, left_assoc, ParseError
+from ptk.lexer import token, ReLexer
+
+import base
+from dsrlib.compiler import Compiler
+from dsrlib.compiler.lrtables import CachedLRParser, grammarFingerprint
+
+
+def makeParser(filename, withMul=True):
+    # A new class each time, so that it gets prepared again
+    @left_assoc('+')
+    @left_assoc('*')
+    class Calc(CachedLRParser, ReLexer):
+        tablesFilename = filename
+
+        def ignore(self, char):
+            return char == ' '
+
+        @token(r'[0-9]+')
+        def number(self, tok):
+            tok.value = int(tok.value)
+
+        @production('sums -> expr+<values>')
+        def sums(self, values):
+            return sum(values)
+
+        @production('expr -> number<value>')
+        def litteral(self, value):
+            return value
+
+        @production('expr -> "(" expr<value> ")"')
+        def paren(self, value):
+            return value
+
+        @production('expr -> expr<left> "+" expr<right>')
+        def add(self, left, right):
+            return left + right
+
+        if withMul:
+            @production('expr -> expr<left> "*" expr<right>')
+            def mul(self, left, right):
+                return left * right
+
+        def newSentence(self, result):
+            self.result = result
+
+    return Calc
+
+
+class TestLRTables(unittest.TestCase):
+    def setUp(self):
+        self._path = tempfile.mkdtemp()
+        self._filename = os.path.join(self._path, 'parsetab.json')
+
+    def tearDown(self):
+        shutil.rmtree(self._path)
+
+    def _parse(self, cls, text):
+        parser = cls()
+        parser.parse(text)
+        return parser.result
+
+    def test_save(self):
+        cls = makeParser(self._filename)
+        self.assertEqual(self._parse(cls, '1 + 2 * 3 (4)'), 11)
+        with open(self._filename, 'r', encoding='utf-8') as fileobj:
+            self.assertEqual(json.load(fileobj)['fingerprint'], grammarFingerprint(cls))
+
+    def test_load(self):
+        built = makeParser(self._filename)
+        self.assertEqual(self._parse(built, '2 * (3 + 4)'), 14)
+        os.utime(self._filename, (0, 0))
+
+        loaded = makeParser(self._filename)
+        self.assertEqual(self._parse(loaded, '2 * (3 + 4)'), 14)
+        self.assertEqual(self._parse(loaded, '1 + 2 * 3 + 4 5'), 16)
+        self.assertEqual(os.stat(self._filename).st_mtime, 0) # Not rebuilt
+        self.assertEqual(len(loaded.__actions__), len(built.__actions__))
+        self.assertEqual((loaded.nSR, loaded.nRR), (built.nSR, built.nRR))
+
+    def test_stale(self):
+        makeParser(self._filename, withMul=False)()
+        cls = makeParser(self._filename)
+        self.assertEqual(self._parse(cls, '2 * 3'), 6)
+        with open(self._filename, 'r', encoding='utf-8') as fileobj:
+            self.assertEqual(json.load(fileobj)['fingerprint'], grammarFingerprint(cls))
+
+    def test_corrupt(self):
+        with open(self._filename, 'w', encoding='utf-8') as fileobj:
+            fileobj.write('{spam')
+        self.assertEqual(self._parse(makeParser(self._filename), '2 * 3'), 6)
+
+    def test_disabled(self):
+        self.assertEqual(self._parse(makeParser(None), '2 * 3'), 6)
+        self.assertEqual(os.listdir(self._path), [])
+
+    def test_parse_error(self):
+        makeParser(self._filename)()
+        parser = makeParser(self._filename)()
+        with self.assertRaises(ParseError) as cm:
+            parser.parse('2 * )')
+        self.assertEqual(cm.exception.expecting(), {'number', '('})
+
+    def test_compiler_tables_up_to_date(self):
+        Compiler()
+        with open(Compiler.tablesFilename, 'r', encoding='utf-8') as fileobj:
+            self.assertEqual(json.load(fileobj)['fingerprint'], grammarFingerprint(Compiler))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 
+import io
 import unittest
 import struct
 
 import base
 
 from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler.codegen import RegAddr, ConstAddr
+from dsrlib.compiler import asm
 
 
 class TestRegAddr(unittest.TestCase):
@@ -52,5 +55,44 @@ class TestRegAddrOffset(unittest.TestCase):
         self.assertEqual(Opcodes.make_addr_str(value).str, '[%TH-42]f')
 
 
+class TestImmediates(unittest.TestCase):
+    def encode(self, instr):
+        stream = io.BytesIO()
+        instr.write({}, stream)
+        return stream.getvalue()
+
+    def variant(self, value):
+        return Opcodes.opcode_variant(self.encode(asm.Add(RegAddr(Opcodes.REGINDEX_TH), ConstAddr(value)))[0])
+
+    def test_int8(self):
+        self.assertEqual(self.encode(asm.Add(RegAddr(Opcodes.REGINDEX_TH), ConstAddr(-128)))[2:], struct.pack('<b', -128))
+        self.assertEqual(self.variant(127), Opcodes.OPCODE_VARIANT_C8)
+
+    def test_int16(self):
+        self.assertEqual(self.encode(asm.Add(RegAddr(Opcodes.REGINDEX_TH), ConstAddr(128)))[2:], struct.pack('<h', 128))
+        self.assertEqual(self.variant(-32768), Opcodes.OPCODE_VARIANT_C16)
+
+    def test_int32(self):
+        self.assertEqual(self.encode(asm.Add(RegAddr(Opcodes.REGINDEX_TH), ConstAddr(32768)))[2:], struct.pack('<i', 32768))
+        self.assertEqual(self.variant(32768), Opcodes.OPCODE_VARIANT_C)
+
+    def test_float_integral(self):
+        self.assertEqual(self.variant(2.0), Opcodes.OPCODE_VARIANT_C8)
+        self.assertEqual(self.variant(-300.0), Opcodes.OPCODE_VARIANT_C16)
+
+    def test_float(self):
+        self.assertEqual(self.variant(2.5), Opcodes.OPCODE_VARIANT_C)
+        self.assertEqual(self.variant(-0.0), Opcodes.OPCODE_VARIANT_C)
+        self.assertEqual(self.variant(float('inf')), Opcodes.OPCODE_VARIANT_C)
+
+    def test_push(self):
+        self.assertEqual(self.encode(asm.Push(ConstAddr(3))), Opcodes.make_opcode(Opcodes.OPCODE_TYPE_STACK, Opcodes.OPCODE_SUBTYPE_STACK_PUSHI, Opcodes.OPCODE_VARIANT_C8) + b'\x03')
+        self.assertEqual(self.encode(asm.Push(ConstAddr(3.5))), Opcodes.make_opcode(Opcodes.OPCODE_TYPE_STACK, Opcodes.OPCODE_SUBTYPE_STACK_PUSHF) + struct.pack('<f', 3.5))
+
+    def test_jz(self):
+        # No compact encoding for JZ conditions
+        self.assertEqual(self.encode(asm.JZ(ConstAddr(1), 'label'))[1:5], struct.pack('<i', 1))
+
+
 if __name__ == '__main__':
     unittest.main()
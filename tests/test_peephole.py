@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.peephole import PeepholeOptimizer
+from dsrlib.compiler.interm import Label, Counter
+from dsrlib.compiler.codegen import RegAddr, RegoffAddr, ConstAddr
+from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler import asm
+
+
+SP = RegAddr(Opcodes.REGINDEX_SP)
+TH = RegAddr(Opcodes.REGINDEX_TH)
+
+
+def slot(offset, reg=Opcodes.REGINDEX_SP):
+    return RegoffAddr(reg, offset, Opcodes.ADDR_VALTYPE_INT)
+
+
+class PeepholeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.counter = Counter()
+
+    def label(self):
+        return Label(self.counter)
+
+    def optimize(self, instructions, *rules):
+        self.optimizer = PeepholeOptimizer(rules=rules or None)
+        return [str(instr) for instr in self.optimizer.optimize(instructions)]
+
+    def assertUnchanged(self, instructions, *rules):
+        self.assertEqual(self.optimize(instructions, *rules), [str(instr) for instr in instructions])
+
+
+class TestDeadCode(PeepholeTestCase):
+    def test_after_ret(self):
+        label = self.label()
+        result = self.optimize([asm.JZ(slot(-4), label), asm.Ret(), asm.Add(SP, ConstAddr(4)), label, asm.Ret()], 'deadcode')
+        self.assertEqual(result[1:], ['\tRET', str(label), '\tRET'])
+        self.assertEqual(self.optimizer.stats()['deadcode'], (1, 3))
+
+    def test_unreferenced_label(self):
+        label = self.label()
+        self.assertEqual(self.optimize([asm.Ret(), label, asm.Yield()], 'deadcode'), ['\tRET', str(label)])
+
+    def test_referenced_label(self):
+        label = self.label()
+        self.assertUnchanged([asm.JZ(slot(-4), label), asm.Ret(), label, asm.Add(SP, ConstAddr(4)), asm.Ret()], 'deadcode')
+
+
+class TestJumps(PeepholeTestCase):
+    def test_threading(self):
+        first, second, third = self.label(), self.label(), self.label()
+        result = self.optimize([asm.JZ(slot(-4), first), asm.Ret(), first, asm.Jump(second), second, third, asm.Ret()], 'jumps')
+        self.assertEqual(result[0], '\tJZ\t[%%SP-4]i, %s' % second)
+
+    def test_next(self):
+        label = self.label()
+        self.assertEqual(self.optimize([asm.Jump(label), label, asm.Ret()], 'jumps'), [str(label), '\tRET'])
+
+    def test_cycle(self):
+        first, second = self.label(), self.label()
+        # Must terminate
+        result = self.optimize([first, asm.Jump(second), second, asm.Jump(first)], 'jumps')
+        self.assertEqual(len(result), 4)
+
+
+class TestSP(PeepholeTestCase):
+    def test_cancel(self):
+        label = self.label()
+        self.assertEqual(self.optimize([asm.Add(SP, ConstAddr(4)), label, asm.Sub(SP, ConstAddr(4)), asm.Ret()], 'sp'), [str(label), '\tRET'])
+        self.assertEqual(self.optimizer.stats()['sp'], (1, 6))
+
+    def test_fold(self):
+        result = self.optimize([asm.Add(SP, ConstAddr(8)), asm.Add(SP, ConstAddr(4)), asm.Sub(SP, ConstAddr(16))], 'sp')
+        self.assertEqual(result, [str(asm.Sub(SP, ConstAddr(4)))])
+
+    def test_target(self):
+        label = self.label()
+        self.assertUnchanged([asm.Add(SP, ConstAddr(4)), label, asm.Sub(SP, ConstAddr(4)), asm.Jump(label)], 'sp')
+
+    def test_other_register(self):
+        self.assertUnchanged([asm.Add(TH, ConstAddr(4)), asm.Sub(TH, ConstAddr(4))], 'sp')
+
+
+class TestLoads(PeepholeTestCase):
+    def test_same_value(self):
+        result = self.optimize([asm.Load(slot(-4), slot(-8)), asm.Load(slot(-4), slot(-8))], 'loads')
+        self.assertEqual(len(result), 1)
+
+    def test_reverse(self):
+        result = self.optimize([asm.Load(slot(-4), slot(-8)), asm.Load(slot(-8), slot(-4))], 'loads')
+        self.assertEqual(len(result), 1)
+
+    def test_self(self):
+        self.assertEqual(self.optimize([asm.Load(slot(-4), slot(-4))], 'loads'), [])
+
+    def test_overwritten(self):
+        self.assertUnchanged([asm.Load(slot(-4), slot(-8)), asm.Add(slot(-8), ConstAddr(1)), asm.Load(slot(-4), slot(-8))], 'loads')
+
+    def test_alias(self):
+        # Globals and the stack may overlap
+        self.assertUnchanged([asm.Load(slot(-4), slot(0, Opcodes.REGINDEX_ZR)), asm.Add(slot(-8), ConstAddr(1)),
+                              asm.Load(slot(-4), slot(0, Opcodes.REGINDEX_ZR))], 'loads')
+
+    def test_sp_change(self):
+        self.assertUnchanged([asm.Load(slot(-4), ConstAddr(1)), asm.Add(SP, ConstAddr(4)), asm.Load(slot(-4), ConstAddr(1))], 'loads')
+
+    def test_register(self):
+        # Register values are clamped
+        self.assertUnchanged([asm.Load(TH, slot(-4)), asm.Load(slot(-4), TH)], 'loads')
+
+    def test_label(self):
+        label = self.label()
+        self.assertUnchanged([asm.Load(slot(-4), ConstAddr(1)), label, asm.Load(slot(-4), ConstAddr(1)), asm.Jump(label)], 'loads')
+
+    def test_float(self):
+        self.assertUnchanged([asm.Load(slot(-4), ConstAddr(1.0)), asm.Load(slot(-4), ConstAddr(1))], 'loads')
+
+
+class TestOptimizer(unittest.TestCase):
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            PeepholeOptimizer(rules=['spam'])
+
+    def test_report(self):
+        self.assertEqual(len(PeepholeOptimizer().report().splitlines()), 1 + len(PeepholeOptimizer.RULES))
+
+
+class TestSemantics(unittest.TestCase):
+    def run_frames(self, source, count, optimizer):
+        _, bytecode = compileBytecode(source, optimizer)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        results = []
+        for index in range(count):
+            report = Report()
+            report.Square = bool(index % 2)
+            while not vm.step(report):
+                pass
+            results.append((report.LPadX, report.LPadY, report.RPadX))
+        return len(bytecode), results
+
+    def check(self, source, count=4):
+        optimizer = PeepholeOptimizer()
+        size, results = self.run_frames(source, count, optimizer)
+        refsize, reference = self.run_frames(source, count, PeepholeOptimizer(rules=[]))
+        self.assertEqual(results, reference)
+        self.assertEqual(refsize - size, sum([saved for _, saved in optimizer.stats().values()]))
+        return results
+
+    def test_return(self):
+        source = 'int f(int x) { if (x > 2) { return 1; } return 2; } state idle { idle() { LPadX = f(3); LPadY = f(1); } };'
+        self.assertEqual(self.check(source)[0][:2], (1, 2))
+
+    def test_loads(self):
+        source = 'int a = 1; int b = 2; state idle { idle() { a = b; LPadX = a; b = a + 1; a = b; b = a; LPadY = b; } };'
+        self.assertEqual(self.check(source)[-1][:2], (5, 6))
+
+    def test_loop(self):
+        source = '''int n = 0;
+state idle {
+  idle() {
+    int i = 0;
+    while (i < 3) { { } i = i + 1; n = n + i; }
+    if (Square) { RPadX = 1; } else { RPadX = 2; }
+    LPadX = n;
+  }
+};'''
+        self.assertEqual([result[2] for result in self.check(source)], [2, 1, 2, 1])
+
+    def test_transition(self):
+        source = '''state other {
+  other() { LPadY = 10; }
+  enter() { LPadY = 5; }
+};
+state idle {
+  int count;
+  idle() { count += 1; LPadX = count; if (count > 2) { go other; } }
+};'''
+        self.check(source, 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
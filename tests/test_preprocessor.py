@@ -41,5 +41,33 @@ class TestPreprocessor(unittest.TestCase):
         self._expect('1')
 
 
+class TestMacros(unittest.TestCase):
+    def preprocess(self, text):
+        target = io.StringIO()
+        warnings = FilePreprocessor(target).preprocess(io.StringIO(text))
+        return [line for line in target.getvalue().split('\n') if line], [msg for msg, _ in warnings]
+
+    def test_expand(self):
+        self.assertEqual(self.preprocess('#define SPAM 42\nx = SPAM + SPAM'), (['x = 42 + 42'], []))
+
+    def test_identifiers(self):
+        self.assertEqual(self.preprocess('#define A 1\nA1 _A A_ A(A)')[0], ['A1 _A A_ 1(1)'])
+
+    def test_nested(self):
+        self.assertEqual(self.preprocess('#define B A + A\n#define A 2\nB')[0], ['2 + 2'])
+
+    def test_redefined(self):
+        lines, warnings = self.preprocess('#define A 1\n#define B A\nB\n#define A 2\nB')
+        self.assertEqual(lines, ['1', '2'])
+        self.assertEqual(warnings, ['macro "A" redefined'])
+
+    def test_empty(self):
+        self.assertEqual(self.preprocess('#define EMPTY\nx EMPTY y')[0], ['x  y'])
+
+    def test_recursive(self):
+        self.assertEqual(self.preprocess('#define A A + 1\nA')[0], ['A + 1'])
+        self.assertEqual(self.preprocess('#define A B\n#define B A\nA B')[0], ['A B'])
+
+
 if __name__ == '__main__':
     unittest.main()
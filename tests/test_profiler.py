@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.debuginfo import DebugInfoBuilder, DebugInfo
+from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler.profiler import Profile, opcodeName
+from test_vm_frames import pack_frame
+
+
+SOURCE = '''int count;
+state idle {
+  idle() {
+    int i = 0;
+    count = count + 1;
+    while (i < 10) {
+      i = i + 1;
+    }
+    LPadX = count;
+  }
+};
+'''
+
+
+def create(source=SOURCE, profile=True):
+    builder = DebugInfoBuilder()
+    _, bytecode = compileBytecode(source, debug=builder)
+    bytecode = bytecode.getvalue()
+    stacksize, = struct.unpack('<H', bytecode[:2])
+    return VM(bytecode=bytecode[2:], stacksize=stacksize, profile=profile), DebugInfo(builder.toBytes())
+
+
+def run(vm, count):
+    steps = 0
+    report = Report()
+    for _ in range(count):
+        while True:
+            steps += 1
+            if vm.step(report):
+                break
+    return steps
+
+
+class TestCounters(unittest.TestCase):
+    def test_not_profiling(self):
+        vm, _ = create(profile=False)
+        run(vm, 2)
+        self.assertIsNone(vm.opcode_counts)
+        self.assertIsNone(vm.offset_counts)
+        self.assertIsNone(vm.frame_counts)
+
+    def test_totals(self):
+        vm, _ = create()
+        steps = run(vm, 5)
+        self.assertEqual(len(vm.opcode_counts), 256)
+        self.assertEqual(sum(vm.opcode_counts), steps)
+        self.assertEqual(sum(vm.offset_counts), steps)
+        self.assertEqual(sum(vm.frame_counts), steps)
+        self.assertEqual(len(vm.frame_counts), 5)
+
+    def test_yields(self):
+        vm, _ = create()
+        run(vm, 3)
+        yields = sum([count for opcode, count in enumerate(vm.opcode_counts) if Opcodes.opcode_type(opcode) == Opcodes.OPCODE_TYPE_FLOW and Opcodes.opcode_subtype(opcode) == Opcodes.OPCODE_SUBTYPE_FLOW_YIELD])
+        self.assertEqual(yields, 3)
+
+    def test_run_frames(self):
+        vm, _ = create()
+        steps = vm.run_frames(bytearray(pack_frame() * 4))
+        self.assertEqual(sum(vm.frame_counts), steps)
+        self.assertEqual(len(vm.frame_counts), 4)
+
+    def test_reset(self):
+        vm, _ = create()
+        run(vm, 2)
+        vm.reset_profile()
+        self.assertEqual(sum(vm.opcode_counts), 0)
+        self.assertEqual(sum(vm.offset_counts), 0)
+        self.assertEqual(len(vm.frame_counts), 0)
+        steps = run(vm, 1)
+        self.assertEqual(list(vm.frame_counts), [steps])
+
+
+class TestProfile(unittest.TestCase):
+    def test_opcode_name(self):
+        self.assertEqual(opcodeName(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_BINARY, Opcodes.OPCODE_SUBTYPE_BINARY_ADD, Opcodes.OPCODE_VARIANT_C8)[0]), 'BINARY_ADD')
+        self.assertEqual(opcodeName(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_FLOW, Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT)[0]), 'FLOW_JZCLT')
+        self.assertEqual(opcodeName(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_UNARY, 0x0F)[0]), '0x7c')
+
+    def test_by_opcode(self):
+        vm, debug = create()
+        run(vm, 3)
+        counts = dict(Profile.fromVM(vm, debug).byOpcode())
+        self.assertEqual(counts['FLOW_YIELD'], 3)
+        self.assertEqual(sum(counts.values()), sum(vm.opcode_counts))
+
+    def test_by_line(self):
+        vm, debug = create()
+        run(vm, 3)
+        profile = Profile.fromVM(vm, debug)
+        lines = profile.byLine()
+        self.assertEqual(sum([count for _, count in lines]), profile.instructions())
+        # The loop body and condition
+        self.assertIn(lines[0][0], [('state idle', 6), ('state idle', 7)])
+
+    def test_frames(self):
+        vm, _ = create()
+        run(vm, 4)
+        profile = Profile.fromVM(vm)
+        stats = profile.frames()
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.total, profile.instructions())
+        self.assertEqual(stats.worst, max(vm.frame_counts))
+        self.assertEqual(profile.overBudget(stats.worst), [])
+        self.assertIn(stats.worstIndex, profile.overBudget(stats.worst - 1))
+
+    def test_empty(self):
+        profile = Profile([0] * 256, [], [])
+        self.assertEqual(profile.frames().count, 0)
+        self.assertEqual(profile.byLine(), [])
+        profile.text(budget=10)
+
+    def test_text(self):
+        vm, debug = create()
+        run(vm, 2)
+        text = Profile.fromVM(vm, debug).text(budget=1)
+        self.assertIn('FLOW_YIELD', text)
+        self.assertIn('state idle, line', text)
+        self.assertIn('frames over budget (1)', text)
+
+    def test_not_profiling(self):
+        vm, _ = create(profile=False)
+        with self.assertRaises(ValueError):
+            Profile.fromVM(vm)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+
+import os
+import io
+import codecs
+import random
+import struct
+import unittest
+
+import base
+
+from dsrlib.compiler import vm as pyvm
+from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.profiler import Profile
+
+try:
+    import vmwrapper
+except ImportError:
+    vmwrapper = None
+
+
+CODETESTS = os.path.join(os.path.dirname(__file__), '..', 'codetests')
+
+# Int and float values with their stack slots: ZR-based or SP-based
+# addresses of the same slots, SP being 24 when the instruction runs
+INTS = [0, 1, -1, 2, 7, -7, 42, 127, 128, 255, 256, -32768, 32767, 65536, 12345678, -98765432, 2**31 - 1, -2**31]
+FLOATS = [0.0, -0.0, 1.0, -1.0, 0.5, 2.5, -3.75, 1e-30, 1e30, 3.0e38, -3.0e38, 1e-45, 123.456, float('inf'), float('-inf'), float('nan')]
+# Operands of float to int conversions, whose result for out of range
+# values is platform dependent
+CASTABLE = [0.0, -0.0, 0.5, -0.5, 1.0, 42.9, -42.9, 255.5, 32767.9, -32768.9, 1e9, -1e9]
+INT_SLOTS = [(Opcodes.REGINDEX_ZR, 0), (Opcodes.REGINDEX_ZR, 4), (Opcodes.REGINDEX_ZR, 8),
+             (Opcodes.REGINDEX_SP, -24), (Opcodes.REGINDEX_SP, -20), (Opcodes.REGINDEX_SP, -16)]
+FLOAT_SLOTS = [(Opcodes.REGINDEX_ZR, 12), (Opcodes.REGINDEX_ZR, 16), (Opcodes.REGINDEX_ZR, 20),
+               (Opcodes.REGINDEX_SP, -12), (Opcodes.REGINDEX_SP, -8), (Opcodes.REGINDEX_SP, -4)]
+STACK_SIZE = 32
+# Readable int registers, and those that can also be written; SP is
+# left alone so that the stack stays in range
+INT_REGISTERS = [Opcodes.REGINDEX_SP, Opcodes.REGINDEX_ZR, Opcodes.REGINDEX_DELTA] + list(range(Opcodes.REGINDEX_TH, Opcodes.REGINDEX_R2VALUE + 1))
+WRITABLE_REGISTERS = [Opcodes.REGINDEX_TH] + list(range(Opcodes.REGINDEX_LPADX, Opcodes.REGINDEX_R2VALUE + 1))
+# Accel registers are only set by run_frames
+FLOAT_REGISTERS = [Opcodes.REGINDEX_IMUX, Opcodes.REGINDEX_IMUY, Opcodes.REGINDEX_IMUZ]
+
+
+class InstructionGenerator:
+    # Random single instructions, without the operations that are
+    # undefined in VM.cpp (int division by zero or overflow, float to int
+    # conversion of values out of range)
+    def __init__(self, rng):
+        self.rng = rng
+        self.stream = io.BytesIO()
+        self.ints = [rng.choice(INTS) for _ in range(3)]
+        self.floats = [rng.choice(FLOATS) for _ in range(3)]
+
+    def stack(self):
+        return struct.pack('<iiifff', *(self.ints + self.floats))
+
+    def opcode(self, maintype, subtype, variant):
+        self.stream.write(Opcodes.make_opcode(maintype, subtype, variant))
+
+    def slot(self, slots, values=None, accept=lambda value: True):
+        # Slot whose value (if values is given) is accepted
+        candidates = [slot for index, slot in enumerate(slots) if values is None or accept(values[index % 3])]
+        if not candidates:
+            return None
+        index, offset = self.rng.choice(candidates)
+        self.stream.write(Opcodes.make_addr_regoff(index, offset, Opcodes.ADDR_VALTYPE_INT if slots is INT_SLOTS else Opcodes.ADDR_VALTYPE_FLOAT))
+        return True
+
+    def register(self, registers):
+        self.stream.write(Opcodes.make_addr_reg(self.rng.choice(registers)))
+
+    def intOperand(self, variant, accept=lambda value: True):
+        if variant == Opcodes.OPCODE_VARIANT_A:
+            if self.rng.random() < 0.5 and self.slot(INT_SLOTS, self.ints, accept):
+                return
+            self.register(INT_REGISTERS)
+        elif variant == Opcodes.OPCODE_VARIANT_C:
+            self.stream.write(struct.pack('<i', self.rng.choice([value for value in INTS if accept(value)])))
+        elif variant == Opcodes.OPCODE_VARIANT_C8:
+            self.stream.write(struct.pack('<b', self.rng.choice([value for value in INTS if -128 <= value < 128 and accept(value)])))
+        else:
+            self.stream.write(struct.pack('<h', self.rng.choice([value for value in INTS if -32768 <= value < 32768 and accept(value)])))
+
+    def floatOperand(self, variant, castable=False):
+        if variant == Opcodes.OPCODE_VARIANT_A:
+            if self.rng.random() < 0.5 and self.slot(FLOAT_SLOTS, self.floats, lambda value: not castable or value in CASTABLE):
+                return
+            # Other registers read as 0.0
+            self.register(([Opcodes.REGINDEX_IMUX] if castable else FLOAT_REGISTERS) + [Opcodes.REGINDEX_LPADX, Opcodes.REGINDEX_TH])
+        elif variant == Opcodes.OPCODE_VARIANT_C:
+            self.stream.write(struct.pack('<f', self.rng.choice(CASTABLE if castable else FLOATS)))
+        elif variant == Opcodes.OPCODE_VARIANT_C8:
+            self.stream.write(struct.pack('<b', self.rng.choice([value for value in INTS if -128 <= value < 128])))
+        else:
+            self.stream.write(struct.pack('<h', self.rng.choice([value for value in INTS if -32768 <= value < 32768])))
+
+    def binary(self):
+        subtype = self.rng.randrange(Opcodes.OPCODE_SUBTYPE_BINARY_CAST + 1)
+        variant = self.rng.randrange(4)
+        kind = self.rng.choice(['reg', 'int', 'float'])
+        cast = subtype == Opcodes.OPCODE_SUBTYPE_BINARY_CAST
+        if cast:
+            variant = Opcodes.OPCODE_VARIANT_A
+        elif subtype == Opcodes.OPCODE_SUBTYPE_BINARY_DIV and kind != 'float':
+            # Constant divisor, neither 0 nor -1
+            variant = self.rng.choice([Opcodes.OPCODE_VARIANT_C, Opcodes.OPCODE_VARIANT_C8, Opcodes.OPCODE_VARIANT_C16])
+        self.opcode(Opcodes.OPCODE_TYPE_BINARY, subtype, variant)
+
+        if kind == 'float':
+            self.slot(FLOAT_SLOTS)
+            if cast:
+                self.intOperand(variant)
+            else:
+                self.floatOperand(variant)
+            return
+
+        if kind == 'reg':
+            self.register(WRITABLE_REGISTERS)
+        else:
+            self.slot(INT_SLOTS)
+        if cast:
+            self.floatOperand(variant, castable=True)
+        elif subtype == Opcodes.OPCODE_SUBTYPE_BINARY_DIV:
+            self.intOperand(variant, lambda value: value not in (0, -1))
+        else:
+            self.intOperand(variant)
+
+    def unary(self):
+        subtype = self.rng.choice([Opcodes.OPCODE_SUBTYPE_UNARY_NEG, Opcodes.OPCODE_SUBTYPE_UNARY_NOT, 2])
+        self.opcode(Opcodes.OPCODE_TYPE_UNARY, subtype, 0)
+        kind = self.rng.choice(['reg', 'int', 'float'])
+        if kind == 'reg':
+            self.register(WRITABLE_REGISTERS)
+        else:
+            self.slot(INT_SLOTS if kind == 'int' else FLOAT_SLOTS)
+
+    def stackop(self):
+        subtype = self.rng.choice([Opcodes.OPCODE_SUBTYPE_STACK_PUSHI, Opcodes.OPCODE_SUBTYPE_STACK_PUSHF,
+                                   Opcodes.OPCODE_SUBTYPE_STACK_PUSH, Opcodes.OPCODE_SUBTYPE_STACK_POP])
+        variant = self.rng.randrange(4)
+        if subtype == Opcodes.OPCODE_SUBTYPE_STACK_POP:
+            self.opcode(Opcodes.OPCODE_TYPE_STACK, subtype, 0)
+            self.stream.write(Opcodes.make_addr_reg(Opcodes.REGINDEX_TH))
+        elif subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSH:
+            self.opcode(Opcodes.OPCODE_TYPE_STACK, subtype, 0)
+            choice = self.rng.randrange(4)
+            if choice == 0:
+                self.register(INT_REGISTERS)
+            elif choice == 1:
+                self.register(FLOAT_REGISTERS)
+            else:
+                self.slot(INT_SLOTS if choice == 2 else FLOAT_SLOTS)
+        elif subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSHI:
+            self.opcode(Opcodes.OPCODE_TYPE_STACK, subtype, variant)
+            self.intOperand(Opcodes.OPCODE_VARIANT_C if variant == Opcodes.OPCODE_VARIANT_A else variant)
+        else:
+            self.opcode(Opcodes.OPCODE_TYPE_STACK, subtype, variant)
+            if variant in (Opcodes.OPCODE_VARIANT_A, Opcodes.OPCODE_VARIANT_C):
+                self.stream.write(struct.pack('<f' if variant == Opcodes.OPCODE_VARIANT_A else '<i', self.rng.choice(FLOATS if variant == Opcodes.OPCODE_VARIANT_A else INTS)))
+            else:
+                self.intOperand(variant)
+
+    def flow(self):
+        subtype = self.rng.choice([Opcodes.OPCODE_SUBTYPE_FLOW_CALL, Opcodes.OPCODE_SUBTYPE_FLOW_RET, Opcodes.OPCODE_SUBTYPE_FLOW_YIELD,
+                                   Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, Opcodes.OPCODE_SUBTYPE_FLOW_JZ, Opcodes.OPCODE_SUBTYPE_FLOW_JZR8,
+                                   Opcodes.OPCODE_SUBTYPE_FLOW_JZR16] + list(range(Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT, Opcodes.OPCODE_SUBTYPE_FLOW_JZCN + 1)))
+        if subtype in (Opcodes.OPCODE_SUBTYPE_FLOW_CALL, Opcodes.OPCODE_SUBTYPE_FLOW_JUMP):
+            variant = self.rng.randrange(3)
+            self.opcode(Opcodes.OPCODE_TYPE_FLOW, subtype, variant)
+            self.target(variant)
+        elif subtype in (Opcodes.OPCODE_SUBTYPE_FLOW_RET, Opcodes.OPCODE_SUBTYPE_FLOW_YIELD):
+            self.opcode(Opcodes.OPCODE_TYPE_FLOW, subtype, 0)
+        elif subtype <= Opcodes.OPCODE_SUBTYPE_FLOW_JZR16:
+            variant = self.rng.randrange(3)
+            self.opcode(Opcodes.OPCODE_TYPE_FLOW, subtype, variant)
+            if variant == Opcodes.OPCODE_VARIANT_A:
+                choice = self.rng.randrange(4)
+                if choice == 0:
+                    self.register(INT_REGISTERS)
+                elif choice == 1:
+                    self.register(FLOAT_REGISTERS)
+                else:
+                    self.slot(INT_SLOTS if choice == 2 else FLOAT_SLOTS)
+            elif variant == Opcodes.OPCODE_VARIANT_CI:
+                self.stream.write(struct.pack('<i', self.rng.choice([0, 1, -1])))
+            else:
+                self.stream.write(struct.pack('<f', self.rng.choice([0.0, -0.0, 1.0, float('nan')])))
+            self.target({Opcodes.OPCODE_SUBTYPE_FLOW_JZR8: Opcodes.OPCODE_VARIANT_REL8,
+                         Opcodes.OPCODE_SUBTYPE_FLOW_JZR16: Opcodes.OPCODE_VARIANT_REL16}.get(subtype, Opcodes.OPCODE_VARIANT_ABS16))
+        else:
+            variant = self.rng.randrange(4)
+            self.opcode(Opcodes.OPCODE_TYPE_FLOW, subtype, variant)
+            choice = self.rng.randrange(3)
+            if choice == 0:
+                self.register(INT_REGISTERS)
+                self.intOperand(variant)
+            elif choice == 1:
+                self.register(FLOAT_REGISTERS)
+                self.floatOperand(variant)
+            else:
+                float_ = self.rng.random() < 0.5
+                self.slot(FLOAT_SLOTS if float_ else INT_SLOTS)
+                if float_:
+                    self.floatOperand(variant)
+                else:
+                    self.intOperand(variant)
+            self.target(Opcodes.OPCODE_VARIANT_REL8)
+
+    def target(self, variant):
+        if variant == Opcodes.OPCODE_VARIANT_REL8:
+            self.stream.write(struct.pack('<b', self.rng.randrange(-128, 128)))
+        elif variant == Opcodes.OPCODE_VARIANT_REL16:
+            self.stream.write(struct.pack('<h', self.rng.randrange(-32768, 32768)))
+        else:
+            self.stream.write(struct.pack('<H', self.rng.randrange(65536)))
+
+    def generate(self):
+        self.rng.choice([self.binary, self.unary, self.stackop, self.flow])()
+        return self.stream.getvalue()
+
+
+def compileSource(source):
+    _, bytecode = compileBytecode(source)
+    bytecode = bytecode.getvalue()
+    stacksize, = struct.unpack('<H', bytecode[:2])
+    return bytecode[2:], stacksize
+
+
+def randomFrames(rng, count):
+    frames = []
+    for _ in range(count):
+        state = bytes([rng.randrange(256) for _ in range(4)] + [rng.randrange(9) | (rng.randrange(16) << 4), rng.randrange(256), rng.randrange(4)] + [rng.randrange(256) for _ in range(2)])
+        delta = 0 if rng.random() < 0.05 else rng.randrange(1, 20000)
+        floats = [rng.uniform(-3.2, 3.2) for _ in range(6)]
+        frames.append(struct.pack(pyvm.FRAME_FORMAT, state, delta, *floats))
+    return bytearray(b''.join(frames))
+
+
+class TestPyReport(unittest.TestCase):
+    def test_defaults(self):
+        report = pyvm.Report()
+        self.assertEqual((report.LPadX, report.LPadY, report.RPadX, report.RPadY, report.Hat), (127, 127, 127, 127, 8))
+        self.assertFalse(report.Square)
+        self.assertEqual(report.DELTA, 5000)
+        self.assertEqual(report.IMUX, 0.0)
+
+    def test_keywords(self):
+        report = pyvm.Report(LPadX=3, Cross=True, TPad=True, R2Value=200, IMUY=0.1)
+        self.assertEqual(report.LPadX, 3)
+        self.assertTrue(report.Cross)
+        self.assertTrue(report.TPad)
+        self.assertFalse(report.PS)
+        self.assertEqual(report.R2Value, 200)
+        self.assertEqual(report.IMUY, struct.unpack('<f', struct.pack('<f', 0.1))[0])
+
+    def test_invalid(self):
+        report = pyvm.Report()
+        with self.assertRaises(ValueError):
+            report.Hat = 9
+        with self.assertRaises(TypeError):
+            report.Square = 1
+        with self.assertRaises(ValueError):
+            report.DELTA = 0
+        with self.assertRaises(TypeError):
+            report.IMUX = 1
+        with self.assertRaises(TypeError):
+            pyvm.Report(Foo=1)
+
+    def test_from_buffer(self):
+        buffer = bytearray(12)
+        report = pyvm.Report.from_buffer(buffer, 1)
+        report.Cross = True
+        report.Hat = 3
+        report.R2Value = 42
+        self.assertEqual(buffer, bytearray([0, 0, 0, 0, 0, 0x23, 0, 0, 0, 42, 0, 0]))
+        buffer[1] = 17
+        self.assertEqual(report.LPadX, 17)
+
+    def test_from_buffer_invalid(self):
+        with self.assertRaises(TypeError):
+            pyvm.Report.from_buffer(bytes(9))
+        with self.assertRaises(ValueError):
+            pyvm.Report.from_buffer(bytearray(9), 1)
+
+
+class TestPyVM(unittest.TestCase):
+    def test_step(self):
+        bytecode, stacksize = compileSource('state idle { idle() { LPadX = LPadY + 2; Square = IMUX > 1.0; } };')
+        vm = pyvm.VM(bytecode=bytecode, stacksize=stacksize)
+        report = pyvm.Report(LPadY=40, IMUX=1.5)
+        while not vm.step(report):
+            pass
+        self.assertEqual(report.LPadX, 42)
+        self.assertTrue(report.Square)
+
+    def test_push(self):
+        vm = pyvm.VM(bytecode=b'', stacksize=4)
+        vm.push(b'\x01\x02')
+        self.assertEqual(vm.get_stack(), b'\x01\x02')
+        self.assertEqual(vm.SP, 2)
+        with self.assertRaises(RuntimeError):
+            vm.push(b'\x00\x00\x00')
+
+    def test_wrap(self):
+        stream = io.BytesIO()
+        stream.write(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_BINARY, Opcodes.OPCODE_SUBTYPE_BINARY_ADD, Opcodes.OPCODE_VARIANT_C))
+        stream.write(Opcodes.make_addr_regoff(Opcodes.REGINDEX_ZR, 0, Opcodes.ADDR_VALTYPE_INT))
+        stream.write(struct.pack('<i', 1))
+        vm = pyvm.VM(bytecode=stream.getvalue(), stacksize=4)
+        vm.push(struct.pack('<i', 2**31 - 1))
+        vm.step(pyvm.Report())
+        self.assertEqual(vm.get_stack(), struct.pack('<i', -2**31))
+
+    def test_float_rounding(self):
+        stream = io.BytesIO()
+        stream.write(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_BINARY, Opcodes.OPCODE_SUBTYPE_BINARY_DIV, Opcodes.OPCODE_VARIANT_C8))
+        stream.write(Opcodes.make_addr_regoff(Opcodes.REGINDEX_ZR, 0, Opcodes.ADDR_VALTYPE_FLOAT))
+        stream.write(struct.pack('<b', 3))
+        vm = pyvm.VM(bytecode=stream.getvalue(), stacksize=4)
+        vm.push(struct.pack('<f', 1.0))
+        vm.step(pyvm.Report())
+        self.assertEqual(vm.get_stack(), struct.pack('<f', 1.0 / 3))
+
+    def test_invalid_register(self):
+        stream = io.BytesIO()
+        stream.write(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_BINARY, Opcodes.OPCODE_SUBTYPE_BINARY_LOAD, Opcodes.OPCODE_VARIANT_C8))
+        stream.write(Opcodes.make_addr_reg(Opcodes.REGINDEX_DELTA))
+        stream.write(struct.pack('<b', 3))
+        vm = pyvm.VM(bytecode=stream.getvalue(), stacksize=0)
+        with self.assertRaises(RuntimeError):
+            vm.step(pyvm.Report())
+
+    def test_run_frames_limit(self):
+        bytecode, stacksize = compileSource('state idle { idle() { while (1) {} } };')
+        vm = pyvm.VM(bytecode=bytecode, stacksize=stacksize)
+        with self.assertRaises(RuntimeError):
+            vm.run_frames(randomFrames(random.Random(1), 1), max_steps=1000)
+
+    def test_profile(self):
+        bytecode, stacksize = compileSource('int n; state idle { idle() { n = n + 1; LPadX = n; } };')
+        vm = pyvm.VM(bytecode=bytecode, stacksize=stacksize, profile=True)
+        frames = randomFrames(random.Random(2), 20)
+        steps = vm.run_frames(frames)
+        profile = Profile.fromVM(vm)
+        self.assertEqual(profile.instructions(), steps)
+        self.assertEqual(sum(vm.frame_counts), steps)
+        vm.reset_profile()
+        self.assertEqual(sum(vm.opcode_counts), 0)
+        self.assertIsNone(pyvm.VM(bytecode=bytecode, stacksize=stacksize).opcode_counts)
+
+
+@unittest.skipIf(vmwrapper is None, 'vmwrapper is not built')
+class TestPyVMCrossCheck(unittest.TestCase):
+    # Same results as the C++ VM, bit for bit
+    def test_instructions(self):
+        rng = random.Random(42)
+        for count in range(4000):
+            generator = InstructionGenerator(rng)
+            bytecode = generator.generate()
+            stack = generator.stack() + bytes([rng.randrange(256) for _ in range(STACK_SIZE - 24)])
+            state = bytes([rng.randrange(256) for _ in range(4)] + [rng.randrange(9) | (rng.randrange(16) << 4), rng.randrange(256), rng.randrange(4)] + [rng.randrange(256) for _ in range(2)])
+            inputs = dict(DELTA=rng.randrange(1, 32768), IMUX=rng.choice(CASTABLE), IMUY=rng.choice(FLOATS), IMUZ=rng.choice(FLOATS))
+
+            results = []
+            for module in (vmwrapper, pyvm):
+                vm = module.VM(bytecode=bytecode, stacksize=STACK_SIZE)
+                vm.push(stack)
+                vm.SP = 24
+                buffer = bytearray(state)
+                report = module.Report.from_buffer(buffer)
+                for name, value in inputs.items():
+                    setattr(report, name, value)
+                yielded = vm.step(report)
+                vm.SP, sp = STACK_SIZE, vm.SP
+                results.append((yielded, vm.offset, sp, vm.TH, vm.get_stack(), bytes(buffer)))
+            self.assertEqual(results[0], results[1], 'instruction %d: %s' % (count, bytecode.hex()))
+
+    def test_programs(self):
+        rng = random.Random(7)
+        for name in sorted(os.listdir(CODETESTS)):
+            if not name.endswith('.gac'):
+                continue
+            with codecs.getreader('utf-8')(open(os.path.join(CODETESTS, name), 'rb')) as fileobj:
+                bytecode, stacksize = compileSource(fileobj.read())
+            frames = randomFrames(rng, 200)
+
+            results = []
+            for module in (vmwrapper, pyvm):
+                vm = module.VM(bytecode=bytecode, stacksize=stacksize, profile=True)
+                buffer = bytearray(frames)
+                steps = vm.run_frames(buffer)
+                results.append((steps, bytes(buffer), vm.offset, vm.SP, vm.TH, vm.get_stack(),
+                                vm.opcode_counts, vm.offset_counts, vm.frame_counts))
+            self.assertEqual(results[0], results[1], name)
+
+    def test_step(self):
+        bytecode, stacksize = compileSource('float x; state idle { idle() { x = x + IMUX / 3.0; LPadX = x; RPadY = DELTA / 100; } };')
+        vms = [module.VM(bytecode=bytecode, stacksize=stacksize) for module in (vmwrapper, pyvm)]
+        for index in range(50):
+            states = []
+            for module, vm in zip((vmwrapper, pyvm), vms):
+                report = module.Report(IMUX=0.7 * index, DELTA=100 + index)
+                while not vm.step(report):
+                    pass
+                states.append((report.LPadX, report.RPadY, vm.get_stack()))
+            self.assertEqual(states[0], states[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
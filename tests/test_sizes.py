@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+import unittest.mock
+
+import base
+
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.codegen import CodeGenerator
+from dsrlib.compiler.peephole import PeepholeOptimizer
+from dsrlib.compiler.sizes import SizeReport, sourceSizes
+from dsrlib.compiler.batch import Unit, compileUnit
+from dsrlib.domain.configuration import Configuration
+from dsrlib.domain.actions import CustomAction
+
+
+SOURCE = '''int g = 3;
+int h(int a, int b) {
+  return a * b + a - b;
+}
+struct S {
+  int v;
+  void set(int x) {
+    v = x * 2;
+  }
+};
+state idle {
+  S s;
+  idle() {
+    s.set(g);
+    LPadX = h(s.v, 2);
+  }
+};
+#pragma noinline
+'''
+
+
+class TestSizeReport(unittest.TestCase):
+    def test_tree(self):
+        report = SizeReport('root')
+        report.child('a').add(3)
+        report.child('a').child('x').add(2)
+        report.append(SizeReport('b', 5))
+        self.assertEqual(report.size(), 10)
+        self.assertEqual([child.name for child in report.children], ['a', 'b'])
+        self.assertEqual(report.child('a').size(), 5)
+
+    def test_json(self):
+        report = sourceSizes(SOURCE, 'test')
+        self.assertEqual(SizeReport.fromJSON(report.toJSON()).toJSON(), report.toJSON())
+
+    def test_text(self):
+        report = SizeReport('root')
+        report.child('a').add(256)
+        lines = report.text(budget=1024).splitlines()
+        self.assertEqual(lines[1].split(), ['a', '256', '25.0%'])
+        self.assertEqual(lines[-1].split(), ['budget', '1024'])
+
+
+class TestAttribution(unittest.TestCase):
+    def test_total(self):
+        report = sourceSizes(SOURCE, 'test')
+        self.assertEqual(report.size(), len(compileBytecode(SOURCE)[1].getvalue()))
+
+    def test_scopes(self):
+        report = sourceSizes(SOURCE, 'test')
+        self.assertEqual([child.name for child in report.children], ['header', 'globals', 'state idle', 'function h', 'method S.set'])
+        self.assertEqual([child.name for child in report.child('function h').children], ['line 2', 'line 3'])
+        self.assertIn('line 8', [child.name for child in report.child('method S.set').children])
+        self.assertIn('line 15', [child.name for child in report.child('state idle').children])
+
+    def test_spans(self):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(SOURCE))
+        ast, _, _ = comp.compile()
+        instructions = PeepholeOptimizer().optimize(CodeGenerator().generate(ICGenerator().generate(ast)))
+        self.assertTrue(all([instr.span is not None for instr in instructions]))
+
+    def test_batch(self):
+        result = compileUnit(Unit('test', 'test', SOURCE), sizes=True)
+        self.assertEqual(result['sizes']['size'], result['size'] + 2)
+
+
+class TestDomain(unittest.TestCase):
+    def test_configuration(self):
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            configuration = Configuration()
+            for source in (SOURCE, 'int x;'):
+                action = CustomAction()
+                action.setSource(source)
+                configuration.addAction(action)
+            report = configuration.sizeReport()
+        self.assertEqual(report.size(), configuration.bytecodeSize())
+        self.assertEqual(len(report.children), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
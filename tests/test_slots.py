@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+import io
+import struct
+import unittest
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler import Compiler, ICGenerator
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.dataflow import ControlFlowGraph, DataflowOptimizer
+from dsrlib.compiler.slots import SlotAllocator, Liveness, bits
+from dsrlib.compiler.symbols import SymbolTable
+from dsrlib.compiler.mtypes import INT
+
+
+EXPRESSIONS = '''
+int g = 3;
+int h(int a, int b) { return a * b + a - b; }
+state idle {
+  int n;
+  idle() {
+    n = n + 1;
+    int a = n * 2 + g * 3 - (n + g) * (n - g);
+    int b = h(a + 1, n * 3) + h(n, g + 1) * 2;
+    while (a > 0 && b != a) { a = a - (b + 1) / 3 - 1; if (a * 2 > b) { b = b + a * 2; } }
+    LPadX = a + b * 2 + n;
+    RPadX = -a + -b;
+  }
+};
+'''
+
+
+class Value:
+    def type(self):
+        return INT
+
+
+class TestShareSlots(unittest.TestCase):
+    def test_share(self):
+        table = SymbolTable()
+        values = [Value() for _ in range(4)]
+        for value in values:
+            table.add(value, value)
+        table.addSize(2)
+        table.shareSlots({values[1]: 0, values[2]: None, values[3]: 0})
+        self.assertEqual([table.offset(value) for value in values], [0, 4, 8, 4])
+        self.assertEqual(table.size(), 10)
+
+    def test_variables(self):
+        table = SymbolTable()
+        temp = Value()
+        table.add('x', Value())
+        table.add(temp, temp)
+        table.add('y', Value())
+        table.shareSlots({temp: None})
+        self.assertEqual((table.offset('x'), table.offset('y')), (0, 4))
+        self.assertEqual(table.size(), 8)
+
+
+class TestLiveness(unittest.TestCase):
+    def liveness(self, source):
+        comp = Compiler()
+        comp.preprocess(io.StringIO(source))
+        ast, _, errors = comp.compile()
+        self.assertEqual(errors, [])
+        return Liveness(ControlFlowGraph(ICGenerator().generate(ast)))
+
+    def test_disjoint(self):
+        liveness = self.liveness('int a = 1; state idle { idle() { LPadX = a + 1; LPadY = a * 2; } };')
+        interferences = liveness.interferences()
+        self.assertEqual(len(liveness.temps), 2)
+        self.assertEqual(interferences[0] | interferences[1], 0)
+
+    def test_overlap(self):
+        liveness = self.liveness('int a = 1; state idle { idle() { LPadX = (a + 1) * (a - 1); } };')
+        interferences = liveness.interferences()
+        first, second, _ = liveness.temps
+        self.assertIn(liveness.indexes[second], list(bits(interferences[liveness.indexes[first]])))
+
+    def test_branch(self):
+        # Reused by common subexpression elimination in the branch
+        liveness = self.liveness('int a = 1; state idle { idle() { LPadX = a + 1; if (Square) { LPadY = a + 1; } } };')
+        temp, = liveness.temps
+        self.assertEqual(set(liveness.liveOut.values()), set([0, 1 << liveness.indexes[temp]]))
+
+
+class TestSlotAllocator(unittest.TestCase):
+    def run_frames(self, source, allocator, dataflow=None):
+        _, bytecode = compileBytecode(source, dataflow=dataflow, allocator=allocator)
+        bytecode = bytecode.getvalue()
+        stacksize, = struct.unpack('<H', bytecode[:2])
+        vm = VM(bytecode=bytecode[2:], stacksize=stacksize)
+        results = []
+        for index in range(8):
+            report = Report()
+            report.Square = bool(index % 2)
+            while not vm.step(report):
+                pass
+            results.append((report.LPadX, report.RPadX))
+        return stacksize, results
+
+    def test_smaller(self):
+        for dataflow in (DataflowOptimizer(rules=[]), DataflowOptimizer()):
+            allocator = SlotAllocator()
+            size, results = self.run_frames(EXPRESSIONS, allocator, dataflow)
+            refsize, reference = self.run_frames(EXPRESSIONS, SlotAllocator(enabled=False), dataflow)
+            self.assertEqual(results, reference)
+            self.assertLess(size, refsize)
+
+    def test_stats(self):
+        allocator = SlotAllocator()
+        self.run_frames(EXPRESSIONS, allocator)
+        stats = allocator.stats()
+        self.assertEqual(list(stats.keys()), ['state idle', 'function h'])
+        for before, after in stats.values():
+            self.assertLess(after, before)
+        self.assertEqual(len(allocator.report().splitlines()), 3)
+
+    def test_disabled(self):
+        allocator = SlotAllocator(enabled=False)
+        self.run_frames(EXPRESSIONS, allocator)
+        for before, after in allocator.stats().values():
+            self.assertEqual(before, after)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import io
+import unittest
+
+import base
+
+from ptk.lexer import LexerError
+from dsrlib.compiler import Compiler
+from dsrlib.compiler.bcgen import compileBytecode
+
+
+SOURCE = '''#define VALUE 42
+int g = VALUE;
+#define VALUE 43
+
+state idle {
+  idle() {
+    LPadX = g + VALUE;
+  }
+};
+'''
+
+
+class Lines:
+    # Fails if more than count lines are read
+    def __init__(self, lines, count):
+        self.lines = lines
+        self.count = count
+        self.read = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.read += 1
+            if self.read > self.count:
+                raise AssertionError('line %d read' % self.read)
+            yield line
+
+
+class TestStreaming(unittest.TestCase):
+    def test_same_as_compile(self):
+        comp = Compiler()
+        ppwarnings = comp.preprocess(io.StringIO(SOURCE))
+        _, warnings, errors = comp.compile()
+        _, streamed, streamedErrors = Compiler().compileLines(io.StringIO(SOURCE))
+        self.assertEqual((streamed, streamedErrors), (warnings + ppwarnings, errors))
+        self.assertEqual([(msg, pos.line) for msg, pos in streamed], [('macro "VALUE" redefined', 3)])
+
+    def test_positions(self):
+        _, _, errors = Compiler().compileLines(io.StringIO('#define X 1\n\nstate idle {\n  idle() {\n    LPadX = y;\n  }\n};\n'))
+        (_, pos), = errors
+        self.assertEqual((pos.line, pos.column), (5, 13))
+
+    def test_lazy(self):
+        lines = Lines(['state idle {\n', '  idle() { $ }\n'] + ['\n'] * 100, 2)
+        with self.assertRaises(LexerError) as ctx:
+            Compiler().compileLines(lines)
+        self.assertEqual(ctx.exception.position.line, 2)
+        self.assertEqual(lines.read, 2)
+
+    def test_lines(self):
+        lines = SOURCE.splitlines(True)
+        self.assertEqual(compileBytecode(lines)[1].getvalue(), compileBytecode(SOURCE)[1].getvalue())
+
+    def test_generated(self):
+        def generate():
+            yield 'int curve(int x) {\n'
+            yield '  int y = 0;\n'
+            for index in range(200):
+                yield '  if (x == %d) { y = %d; }\n' % (index, index * index // 255)
+            yield '  return y + 0;\n'
+            yield '}\n'
+            yield 'state idle { idle() { LPadX = curve(LPadX); } };\n'
+        _, _, errors = Compiler().compileLines(generate())
+        self.assertEqual(errors, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import unittest
+
+import base
+from dsrlib.compiler.symbols import SymbolTable
+from dsrlib.compiler.mtypes import INT, FLOAT
+
+
+class Value:
+    def __init__(self, type_):
+        self._type = type_
+
+    def type(self):
+        return self._type
+
+
+class TestSymbolTable(unittest.TestCase):
+    def setUp(self):
+        self._table = SymbolTable()
+        for name in ('a', 'b', 'c'):
+            self._table.add(name, Value(INT))
+
+    def test_order(self):
+        self._table.add('d', Value(FLOAT))
+        self.assertEqual([symbol.name for symbol in self._table], ['a', 'b', 'c', 'd'])
+
+    def test_offset(self):
+        self._table.add('d', Value(FLOAT), size=0)
+        self._table.add('e', Value(FLOAT))
+        self.assertEqual([self._table.offset(name) for name in 'abcde'], [0, 4, 8, 12, 12])
+        self.assertEqual(self._table.size(), 16)
+
+    def test_offset_unknown(self):
+        self.assertEqual(self._table.offset('spam'), 0)
+
+    def test_add_size(self):
+        self._table.addSize(4)
+        self._table.add('d', Value(INT))
+        self.assertEqual(self._table.offset('d'), 12)
+        self.assertEqual(self._table.size(), 20)
+
+    def test_duplicate(self):
+        self._table.add('a', Value(FLOAT))
+        self.assertIs(self._table.get('a').value.type(), INT)
+        self.assertEqual(self._table.offset('a'), 0)
+
+    def test_object_name(self):
+        value = Value(INT)
+        self._table.add(value, value)
+        self.assertTrue(self._table.has(value))
+        self.assertEqual(self._table.offset(value), 12)
+
+    def test_parent(self):
+        child = SymbolTable(parent=self._table)
+        child.add('x', Value(INT))
+        self.assertTrue(child.has('a'))
+        self.assertFalse(child.has('a', recurse=False))
+        self.assertTrue(child.has('x', recurse=False))
+        self.assertEqual(child.get('b').name, 'b')
+        self.assertEqual(child.offset('x'), 0)
+        self.assertFalse(self._table.has('x'))
+
+    def test_shadow(self):
+        child = SymbolTable(parent=self._table)
+        child.add('a', Value(FLOAT))
+        self.assertIs(child.get('a').value.type(), FLOAT)
+        self.assertIs(self._table.get('a').value.type(), INT)
+
+    def test_missing(self):
+        child = SymbolTable(parent=self._table)
+        with self.assertRaises(KeyError):
+            child.get('spam')
+
+
+if __name__ == '__main__':
+    unittest.main()
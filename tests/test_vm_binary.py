@@ -170,6 +170,39 @@ class TestAdd(unittest.TestCase):
         self.assertEqual(vm.get_stack(), struct.pack('<ifi', 1, 2.5 + 42.5, 3))
         self.assertEqual(vm.offset, size)
 
+    def test_reg_C8(self):
+        self.add_opcode(Opcodes.OPCODE_VARIANT_C8)
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_SP))
+        self.add(struct.pack('<b', -2))
+
+        vm, size = self.create(stack=b'\x00\x00\x00\x00')
+        vm.step(Report())
+
+        self.assertEqual(vm.SP, 2)
+        self.assertEqual(vm.offset, size)
+
+    def test_regoff_C16_int(self):
+        self.add_opcode(Opcodes.OPCODE_VARIANT_C16)
+        self.add(Opcodes.make_addr_regoff(Opcodes.REGINDEX_SP, -8, Opcodes.ADDR_VALTYPE_INT))
+        self.add(struct.pack('<h', -1000))
+
+        vm, size = self.create(stack=struct.pack('<iii', 1, 2, 3))
+        vm.step(Report())
+
+        self.assertEqual(vm.get_stack(), struct.pack('<iii', 1, 2 - 1000, 3))
+        self.assertEqual(vm.offset, size)
+
+    def test_regoff_C8_float(self):
+        self.add_opcode(Opcodes.OPCODE_VARIANT_C8)
+        self.add(Opcodes.make_addr_regoff(Opcodes.REGINDEX_SP, -8, Opcodes.ADDR_VALTYPE_FLOAT))
+        self.add(struct.pack('<b', 42))
+
+        vm, size = self.create(stack=struct.pack('<ifi', 1, 2.5, 3))
+        vm.step(Report())
+
+        self.assertEqual(vm.get_stack(), struct.pack('<ifi', 1, 2.5 + 42, 3))
+        self.assertEqual(vm.offset, size)
+
     # Same source/target
 
     def test_reg_reg(self):
@@ -67,6 +67,116 @@ class TestFlow(unittest.TestCase):
         self.assertEqual(vm.offset, 42)
         self.assertFalse(ret)
 
+    def test_call_rel8(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_CALL, variant=Opcodes.OPCODE_VARIANT_REL8)
+        self.add(struct.pack('<b', 40))
+
+        vm, size = self.create(stacksize=2)
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, 42)
+        self.assertEqual(vm.get_stack(), struct.pack('<H', 2))
+
+    def test_jump_rel8_backward(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_YIELD)
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, variant=Opcodes.OPCODE_VARIANT_REL8)
+        self.add(struct.pack('<b', -3))
+
+        vm, size = self.create()
+        vm.step(Report())
+        ret = vm.step(Report())
+
+        self.assertEqual(vm.offset, 0)
+        self.assertFalse(ret)
+
+    def test_jump_rel16(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JUMP, variant=Opcodes.OPCODE_VARIANT_REL16)
+        self.add(struct.pack('<h', 1000))
+
+        vm, size = self.create()
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, 1003)
+
+    def test_jzr8_true(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZR8, variant=Opcodes.OPCODE_VARIANT_A)
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_TH))
+        self.add(struct.pack('<b', 39))
+
+        vm, size = self.create()
+        vm.TH = 0
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, 42)
+
+    def test_jzr8_false(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZR8, variant=Opcodes.OPCODE_VARIANT_A)
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_TH))
+        self.add(struct.pack('<b', 39))
+
+        vm, size = self.create()
+        vm.TH = 1
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, size)
+
+    def test_jzr16_C_int_true(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZR16, variant=Opcodes.OPCODE_VARIANT_CI)
+        self.add(struct.pack('<ih', 0, -7))
+
+        vm, size = self.create()
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, 0)
+
+    def test_jzclt_regoff_C8_true(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT, variant=Opcodes.OPCODE_VARIANT_C8)
+        self.add(Opcodes.make_addr_regoff(Opcodes.REGINDEX_ZR, 0, Opcodes.ADDR_VALTYPE_INT))
+        self.add(struct.pack('<bb', 3, 37))
+
+        vm, size = self.create(stack=struct.pack('<i', 5))
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, 42)
+        self.assertEqual(vm.get_stack(), struct.pack('<i', 5))
+
+    def test_jzclt_regoff_C8_false(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT, variant=Opcodes.OPCODE_VARIANT_C8)
+        self.add(Opcodes.make_addr_regoff(Opcodes.REGINDEX_ZR, 0, Opcodes.ADDR_VALTYPE_INT))
+        self.add(struct.pack('<bb', 6, 37))
+
+        vm, size = self.create(stack=struct.pack('<i', 5))
+        vm.step(Report())
+
+        self.assertEqual(vm.offset, size)
+
+    def test_jzce_report_A(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZCE, variant=Opcodes.OPCODE_VARIANT_A)
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_LPADX))
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_RPADX))
+        self.add(struct.pack('<b', 38))
+
+        vm, size = self.create()
+        vm.step(Report(LPadX=12, RPadX=12))
+        self.assertEqual(vm.offset, size)
+
+        vm, size = self.create()
+        vm.step(Report(LPadX=12, RPadX=13))
+        self.assertEqual(vm.offset, 42)
+
+    def test_jzcgte_float_C(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZCGTE, variant=Opcodes.OPCODE_VARIANT_C)
+        self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_IMUX))
+        self.add(struct.pack('<fb', 1.5, 35))
+
+        vm, size = self.create()
+        vm.step(Report(IMUX=1.5))
+        self.assertEqual(vm.offset, size)
+
+        vm, size = self.create()
+        vm.step(Report(IMUX=1.25))
+        self.assertEqual(vm.offset, 42)
+
     def test_jz_C_int_true(self):
         self.add_opcode(Opcodes.OPCODE_SUBTYPE_FLOW_JZ, variant=Opcodes.OPCODE_VARIANT_CI)
         self.add(struct.pack('<iH', 0, 42))
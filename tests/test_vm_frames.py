@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+
+import struct
+import threading
+import unittest
+
+import base
+
+from vmwrapper import VM, Report, FRAME_SIZE, FRAME_FORMAT
+from dsrlib.compiler.bcgen import compileBytecode
+
+
+SOURCE = '''int count;
+state idle {
+  idle() {
+    count = count + 1;
+    LPadX = count;
+    RPadX = DELTA / 1000;
+    if (IMUX > 1.0) Square = 1;
+    L2Value = LPadY + 1;
+  }
+};
+'''
+
+
+def pack_frame(lpadx=127, lpady=127, rpadx=127, rpady=127, hat=8, buttons=0, l2value=0, r2value=0, delta=5000, imu=(0.0, 0.0, 0.0), accel=(0.0, 0.0, 0.0)):
+    # buttons: Square, Cross, Circle, Triangle in bits 4..7 of the Hat byte,
+    # then L1..R3, then PS and TPad
+    state = struct.pack('<BBBBBBBBB', lpadx, lpady, rpadx, rpady, hat | ((buttons & 0x0F) << 4), (buttons >> 4) & 0xFF, (buttons >> 12) & 0x03, l2value, r2value)
+    return struct.pack(FRAME_FORMAT, state, delta, *(imu + accel))
+
+
+def unpack_state(frames, index):
+    state, = struct.unpack_from('<9s', frames, index * FRAME_SIZE)
+    return state
+
+
+def create(source=SOURCE):
+    _, bytecode = compileBytecode(source)
+    bytecode = bytecode.getvalue()
+    stacksize, = struct.unpack('<H', bytecode[:2])
+    return VM(bytecode=bytecode[2:], stacksize=stacksize)
+
+
+class TestRunFrames(unittest.TestCase):
+    def test_format(self):
+        self.assertEqual(struct.calcsize(FRAME_FORMAT), FRAME_SIZE)
+
+    def test_same_as_step(self):
+        inputs = [dict(lpady=index, delta=1000 * (index + 1), imu=(0.5 * index, 0.0, 0.0)) for index in range(5)]
+        frames = bytearray(b''.join([pack_frame(**kwargs) for kwargs in inputs]))
+        self.assertGreater(create().run_frames(frames), 0)
+
+        vm = create()
+        for index, kwargs in enumerate(inputs):
+            report = Report(LPadY=kwargs['lpady'], DELTA=kwargs['delta'], IMUX=kwargs['imu'][0])
+            while not vm.step(report):
+                pass
+            lpadx, lpady, rpadx, _, hatbyte, _, _, l2value, _ = struct.unpack('<9B', unpack_state(frames, index))
+            self.assertEqual((lpadx, lpady, rpadx, l2value), (report.LPadX, report.LPadY, report.RPadX, report.L2Value))
+            self.assertEqual(bool(hatbyte & 0x10), report.Square)
+
+    def test_no_delta(self):
+        # As VM::Run, nothing happens when the IMU has no new data
+        frames = bytearray(pack_frame(lpadx=10, delta=0) + pack_frame(lpadx=10))
+        vm = create()
+        vm.run_frames(frames)
+        self.assertEqual(unpack_state(frames, 0)[0], 10)
+        self.assertEqual(unpack_state(frames, 1)[0], 1)
+
+    def test_memoryview(self):
+        frames = bytearray(pack_frame() * 3)
+        create().run_frames(memoryview(frames)[FRAME_SIZE:])
+        self.assertEqual([unpack_state(frames, index)[0] for index in range(3)], [127, 1, 2])
+
+    def test_max_steps(self):
+        vm = create('int n;\nstate idle { idle() { n = 0; while (n < 1000) { n = n + 1; } LPadX = 1; } };')
+        with self.assertRaises(RuntimeError):
+            vm.run_frames(bytearray(pack_frame()), max_steps=100)
+        frames = bytearray(pack_frame())
+        create('int n;\nstate idle { idle() { n = 0; while (n < 1000) { n = n + 1; } LPadX = 1; } };').run_frames(frames, max_steps=0)
+        self.assertEqual(unpack_state(frames, 0)[0], 1)
+
+    def test_invalid(self):
+        vm = create()
+        self.assertRaises(ValueError, vm.run_frames, bytearray(FRAME_SIZE + 1))
+        self.assertRaises(TypeError, vm.run_frames, pack_frame())
+
+    def test_threads(self):
+        # Without the GIL
+        count = 200
+        buffers = [bytearray(pack_frame() * count) for _ in range(4)]
+        vms = [create() for _ in buffers]
+        threads = [threading.Thread(target=vm.run_frames, args=(frames,)) for vm, frames in zip(vms, buffers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for frames in buffers:
+            self.assertEqual(unpack_state(frames, count - 1)[0], count)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import struct
+import unittest
+
+import base
+
+from vmwrapper import Report
+from test_vm_frames import create, pack_frame
+
+
+class TestReportBuffer(unittest.TestCase):
+    def test_layout(self):
+        report = Report(LPadX=1, LPadY=2, RPadX=3, RPadY=4, Hat=5, Cross=True, R1=True, TPad=True, L2Value=6, R2Value=7)
+        self.assertEqual(bytes(memoryview(report)), bytes([1, 2, 3, 4, 5 | 0x20, 0x02, 0x02, 6, 7]))
+
+    def test_write_view(self):
+        report = Report()
+        view = memoryview(report)
+        view[0] = 42
+        view[4] = 0x18
+        self.assertEqual(report.LPadX, 42)
+        self.assertEqual(report.Hat, 8)
+        self.assertTrue(report.Square)
+
+    def test_from_buffer(self):
+        data = bytearray(b'\x01' + bytes([10, 20, 30, 40, 8, 0, 0, 50, 60]))
+        report = Report.from_buffer(data, 1)
+        self.assertEqual((report.LPadX, report.LPadY, report.RPadX, report.RPadY, report.Hat, report.L2Value, report.R2Value), (10, 20, 30, 40, 8, 50, 60))
+        report.Square = True
+        self.assertEqual(data[5], 0x18)
+        data[1] = 11
+        self.assertEqual(report.LPadX, 11)
+        self.assertEqual(bytes(memoryview(report)), bytes(data[1:]))
+
+    def test_memoryview(self):
+        data = bytearray(9)
+        report = Report.from_buffer(memoryview(data))
+        report.RPadY = 99
+        self.assertEqual(data[3], 99)
+
+    def test_from_buffer_defaults(self):
+        report = Report.from_buffer(bytearray(9))
+        self.assertEqual(report.DELTA, 5000)
+        self.assertEqual(report.IMUX, 0.0)
+
+    def test_locks_buffer(self):
+        data = bytearray(9)
+        report = Report.from_buffer(data)
+        with self.assertRaises(BufferError):
+            data.extend(b'\x00')
+        del report
+        data.extend(b'\x00')
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            Report.from_buffer(bytes(9))
+
+    def test_offset(self):
+        for offset in (-1, 2):
+            with self.assertRaises(ValueError):
+                Report.from_buffer(bytearray(10), offset)
+
+    def test_step(self):
+        # A report mapped in a frame is updated in place by step, as with run_frames
+        frames = bytearray(pack_frame(lpady=4, delta=3000) * 2)
+        create().run_frames(memoryview(frames)[:len(frames) // 2])
+
+        vm = create()
+        report = Report.from_buffer(frames, len(frames) // 2)
+        report.DELTA = 3000
+        while not vm.step(report):
+            pass
+        self.assertEqual(frames[:9], frames[len(frames) // 2:len(frames) // 2 + 9])
+        self.assertEqual(struct.unpack_from('<B', frames, len(frames) // 2)[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
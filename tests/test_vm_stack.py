@@ -17,8 +17,8 @@ class TestStack(unittest.TestCase):
     def add(self, data):
         self._bytecode.write(data)
 
-    def add_opcode(self, subtype):
-        self.add(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_STACK, subtype))
+    def add_opcode(self, subtype, variant=0):
+        self.add(Opcodes.make_opcode(Opcodes.OPCODE_TYPE_STACK, subtype, variant))
 
     def create(self, stack=None):
         vm = VM(bytecode=self._bytecode.getvalue(), stacksize=0 if stack is None else len(stack))
@@ -46,6 +46,36 @@ class TestStack(unittest.TestCase):
         self.assertEqual(vm.get_stack(), struct.pack('<if', 1, 42.5))
         self.assertEqual(vm.offset, size)
 
+    def test_pushi_C8(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_STACK_PUSHI, Opcodes.OPCODE_VARIANT_C8)
+        self.add(struct.pack('<b', -42))
+
+        vm, size = self.create(stack=struct.pack('<i', 1))
+        vm.step(Report())
+
+        self.assertEqual(vm.get_stack(), struct.pack('<ii', 1, -42))
+        self.assertEqual(vm.offset, size)
+
+    def test_pushi_C16(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_STACK_PUSHI, Opcodes.OPCODE_VARIANT_C16)
+        self.add(struct.pack('<h', -1000))
+
+        vm, size = self.create(stack=struct.pack('<i', 1))
+        vm.step(Report())
+
+        self.assertEqual(vm.get_stack(), struct.pack('<ii', 1, -1000))
+        self.assertEqual(vm.offset, size)
+
+    def test_pushf_C8(self):
+        self.add_opcode(Opcodes.OPCODE_SUBTYPE_STACK_PUSHF, Opcodes.OPCODE_VARIANT_C8)
+        self.add(struct.pack('<b', -42))
+
+        vm, size = self.create(stack=struct.pack('<i', 1))
+        vm.step(Report())
+
+        self.assertEqual(vm.get_stack(), struct.pack('<if', 1, -42.0))
+        self.assertEqual(vm.offset, size)
+
     def test_push_reg(self):
         self.add_opcode(Opcodes.OPCODE_SUBTYPE_STACK_PUSH)
         self.add(Opcodes.make_addr_reg(Opcodes.REGINDEX_TH))
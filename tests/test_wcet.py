@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+import struct
+import random
+import unittest
+import unittest.mock
+
+import base
+
+from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import compileBytecode, BytecodeGenError
+from dsrlib.compiler.wcet import WorstCaseAnalyzer
+from dsrlib.domain.buttons import Buttons
+from dsrlib.domain.configuration import Configuration
+from dsrlib.domain.actions import InvertPadAxisAction, SwapAxisAction, GyroAction, CustomAction, DisableButtonAction
+
+
+LOOPS = '''int total;
+int sum(int n) {
+  int s = 0;
+  int k = 0;
+  while (k < 4) {
+    int j = 0;
+    while (j <= 2) {
+      s = s + j * LPadY;
+      j++;
+      if (s > 1000) break;
+    }
+    k += 1;
+  }
+  return s + n;
+}
+void wait() {
+  yield;
+  total = total + 1;
+}
+state idle {
+  idle() {
+    total = sum(total) + 0;
+    if (Square) wait();
+    if (total > 20000) go other;
+  }
+};
+state other {
+  other() {
+    int i = 10;
+    while (i > 0) { i = i - 3; LPadX = i + 100; }
+    wait();
+    go idle;
+  }
+};
+#pragma noinline
+'''
+
+
+def analyze(source, budget=None):
+    analyzer = WorstCaseAnalyzer(budget=budget)
+    warnings, bytecode = compileBytecode(source, worstcase=analyzer)
+    return analyzer.result(), warnings, bytecode.getvalue()
+
+
+def measure(bytecode, reports):
+    stacksize, = struct.unpack('<H', bytecode[:2])
+    vm = VM(bytecode=bytecode[2:], stacksize=stacksize, profile=True)
+    for report in reports:
+        while not vm.step(report):
+            pass
+    return max(vm.frame_counts)
+
+
+class TestWorstCase(unittest.TestCase):
+    def test_straight(self):
+        result, warnings, bytecode = analyze('state idle { idle() { LPadX = RPadX + 1; if (Square) LPadY = 3; } };')
+        self.assertEqual(warnings, [])
+        self.assertEqual(result.frame.instructions, measure(bytecode, [Report(Square=True)] * 3))
+        self.assertGreater(result.frame.cycles, result.frame.instructions)
+
+    def test_counted_loop(self):
+        result, warnings, bytecode = analyze('state idle { idle() { int i = 0; while (i < 10) { RPadX = i; i++; } } };')
+        self.assertEqual(warnings, [])
+        self.assertEqual(result.frame.instructions, measure(bytecode, [Report()] * 3))
+
+    def test_upper_bound(self):
+        result, warnings, bytecode = analyze(LOOPS)
+        self.assertEqual(warnings, [])
+        reports = [Report(LPadY=index % 50, Square=index % 3 == 0) for index in range(300)]
+        self.assertLessEqual(measure(bytecode, reports), result.frame.instructions)
+
+    def test_states(self):
+        result, _, _ = analyze(LOOPS)
+        self.assertEqual(sorted(result.states.keys()), ['function wait', 'globals', 'state idle', 'state other'])
+        self.assertEqual(result.frame.instructions, max([cost.instructions for cost in result.states.values()]))
+
+    def test_yield_in_loop(self):
+        result, warnings, _ = analyze('state idle { idle() { while (Square) { LPadX = 1; yield; } } };')
+        self.assertEqual(warnings, [])
+        self.assertIsNotNone(result.frame.instructions)
+
+    def test_unbounded(self):
+        result, warnings, _ = analyze('int x;\nstate idle { idle() {\n  while (x < LPadX) { x = x + 1; } } };')
+        self.assertEqual([(msg, pos.line, pos.column) for msg, pos in warnings], [('loop without a provable bound may not yield', 3, 3)])
+        self.assertIsNone(result.frame.instructions)
+        self.assertIsNone(result.frame.cycles)
+        self.assertEqual(len(result.unbounded), 1)
+
+    def test_conditional_yield(self):
+        _, warnings, _ = analyze('state idle { idle() { while (1) { if (Square) yield; } } };')
+        self.assertEqual([msg for msg, _ in warnings], ['loop without a provable bound may not yield'])
+
+    def test_state_cycle(self):
+        _, warnings, _ = analyze('state idle { idle() { if (Cross) go other; } };\nstate other { other() { go idle; } };')
+        self.assertEqual([msg for msg, _ in warnings], ['states may go to each other without yielding'])
+
+    def test_conditional_state_cycle(self):
+        source = 'state idle { idle() { if (LPadX < 10) go other; LPadY = 1; } };\nstate other { other() { if (LPadX >= 10) go idle; LPadY = 2; } };'
+        result, warnings, bytecode = analyze(source)
+        self.assertEqual(warnings, [])
+        self.assertIsNotNone(result.frame.instructions)
+        reports = [Report(LPadX=(0, 20)[index % 2]) for index in range(20)]
+        self.assertLessEqual(measure(bytecode, reports), result.frame.instructions)
+
+    def test_yielding_loop_in_state_cycle(self):
+        # The loop is in the component of the go cycle, but yields on each iteration
+        source = 'state idle { idle() { if (Square) go other; } };\nstate other { other() { while (Square) { LPadX = 1; yield; } go idle; } };'
+        result, warnings, bytecode = analyze(source)
+        self.assertEqual(warnings, [])
+        self.assertIsNotNone(result.frame.instructions)
+        reports = [Report(Square=index % 5 != 0) for index in range(60)]
+        self.assertLessEqual(measure(bytecode, reports), result.frame.instructions)
+
+    def test_unbounded_loop_in_state_cycle(self):
+        source = 'state idle { idle() { if (Cross) go other; } };\nstate other { other() { int i = 0; while (LPadX > i) { LPadX = 1; } go idle; } };'
+        _, warnings, _ = analyze(source)
+        self.assertEqual([msg for msg, _ in warnings], ['loop without a provable bound may not yield'])
+
+    def test_budget(self):
+        result, _, _ = analyze(LOOPS)
+        analyze(LOOPS, budget=result.frame.cycles)
+        with self.assertRaises(BytecodeGenError) as cm:
+            analyze(LOOPS, budget=result.frame.cycles - 1)
+        msg, _ = cm.exception.errors[0]
+        self.assertTrue(msg.startswith('worst case per frame is %d cycles' % result.frame.cycles))
+
+    def test_budget_unbounded(self):
+        with self.assertRaises(BytecodeGenError) as cm:
+            analyze('int x;\nstate idle { idle() { while (x < LPadX) { x = x + 1; } } };', budget=100000)
+        _, pos = cm.exception.errors[0]
+        self.assertEqual(pos.line, 2)
+
+    def test_json(self):
+        result, _, _ = analyze(LOOPS)
+        data = result.toJSON()
+        self.assertEqual(data['instructions'], result.frame.instructions)
+        self.assertEqual(data['states']['state idle']['cycles'], result.states['state idle'].cycles)
+
+
+class TestBuiltinActions(unittest.TestCase):
+    def actions(self):
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            for buttons in ([], [Buttons.L2], [Buttons.L2, Buttons.R2]):
+                action = GyroAction()
+                action.setButtons(buttons)
+                yield action
+            yield InvertPadAxisAction()
+            yield SwapAxisAction()
+            yield DisableButtonAction()
+
+    def test_no_warnings(self):
+        for action in self.actions():
+            result, warnings, _ = analyze(action.source())
+            self.assertEqual(warnings, [], action.source())
+            self.assertIsNotNone(result.frame.cycles)
+
+    def test_gyro(self):
+        action = GyroAction()
+        result, _, bytecode = analyze(action.source())
+        rng = random.Random(0)
+        reports = [Report(L2=rng.random() < 0.8, R2=rng.random() < 0.8, RPadX=rng.choice([128, 129, 200]), RPadY=128) for _ in range(500)]
+        self.assertLessEqual(measure(bytecode, reports), result.frame.instructions)
+
+
+class TestConfigurationWorstCase(unittest.TestCase):
+    SOURCES = ('state idle { idle() { LPadX = RPadX + 1; } };',
+               'state idle { idle() { int i = 0; while (i < 4) { RPadY = i; i++; } } };')
+
+    def configuration(self, *sources):
+        with unittest.mock.patch('builtins._', create=True, side_effect=lambda text: text):
+            configuration = Configuration()
+            for source in sources:
+                action = CustomAction()
+                action.setSource(source)
+                configuration.addAction(action)
+        return configuration
+
+    def test_sum(self):
+        configuration = self.configuration(*self.SOURCES)
+        costs = [analyze(source)[0].frame for source in self.SOURCES]
+        cost = configuration.worstCase()
+        self.assertEqual(cost.instructions, sum([item.instructions for item in costs]))
+        self.assertEqual(cost.cycles, sum([item.cycles for item in costs]))
+
+    def test_linked(self):
+        configuration = self.configuration(*self.SOURCES)
+        unlinked = configuration.worstCase()
+        configuration.setLinked(True)
+        self.assertEqual(configuration.worstCase(), unlinked)
+
+    def test_budget(self):
+        configuration = self.configuration(*self.SOURCES)
+        cycles = configuration.worstCase().cycles
+        self.assertFalse(configuration.overFrameBudget(cycles))
+        self.assertTrue(configuration.overFrameBudget(cycles - 1))
+
+    def test_unbounded(self):
+        configuration = self.configuration(self.SOURCES[0], 'int x;\nstate idle { idle() { while (x < LPadX) { x = x + 1; } } };')
+        self.assertIsNone(configuration.worstCase().cycles)
+        self.assertTrue(configuration.overFrameBudget(10 ** 9))
+
+
+if __name__ == '__main__':
+    unittest.main()
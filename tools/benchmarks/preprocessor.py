@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+
+# Scaling benchmark for macro expansion: preprocesses generated button tables
+# with many #defines, some of them defined in terms of others, and a body
+# that uses all of them.
+
+import io
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from dsrlib.compiler import FilePreprocessor
+
+
+BUTTONS = ('Square', 'Cross', 'Circle', 'Triangle', 'L1', 'R1', 'L2', 'R2', 'Share', 'Options', 'L3', 'R3', 'PS', 'TPad')
+
+
+def buttonTable(count):
+    lines = []
+    for index in range(count):
+        lines.append('#define BUTTON_%d %s' % (index, BUTTONS[index % len(BUTTONS)]))
+        lines.append('#define PRESSED_%d (BUTTON_%d && !BUTTON_%d)' % (index, index, (index + 1) % count))
+    lines.append('state idle { idle() {')
+    lines.extend(['  if (PRESSED_%d) { LPadX = BUTTON_%d; }' % (index, index) for index in range(count)])
+    lines.append('} };')
+    return '\n'.join(lines)
+
+
+def measure(source):
+    start = time.perf_counter()
+    FilePreprocessor(io.StringIO(), comment='//').preprocess(io.StringIO(source))
+    return time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Macro expansion scaling benchmark')
+    parser.add_argument('-s', '--sizes', default='100,200,400,800', help='Comma-separated numbers of table entries')
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print('%-10s %s' % ('entries', ' '.join(['%10d' % size for size in sizes])))
+    timings = [measure(buttonTable(size)) * 1000 for size in sizes]
+    print('%-10s %s' % ('time', ' '.join(['%8.1fms' % timing for timing in timings])))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
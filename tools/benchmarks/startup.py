@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+# Measures the cost of importing dsrlib.compiler.bcgen and compiling a first
+# source, with and without the precomputed LR tables. Each sample runs in a
+# fresh interpreter.
+
+import os
+import sys
+import argparse
+import subprocess
+import statistics
+
+SRCDIR = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+SAMPLE = r'''
+import sys
+import time
+sys.path.insert(0, %(srcdir)r)
+
+start = time.perf_counter()
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler import Compiler
+imported = time.perf_counter()
+
+if not %(tables)r:
+    Compiler.tablesFilename = None
+compileBytecode('state idle { idle() { Square = Cross; } };')
+compiled = time.perf_counter()
+
+print(imported - start, compiled - imported)
+'''
+
+
+def sample(tables):
+    code = SAMPLE % {'srcdir': SRCDIR, 'tables': tables}
+    output = subprocess.run([sys.executable, '-c', code], check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    return [float(value) for value in output.decode('ascii').split()]
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Compiler startup benchmark')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='Number of runs for each configuration')
+    args = parser.parse_args(argv)
+
+    print('%-16s %12s %16s %12s' % ('', 'import (ms)', 'compile (ms)', 'total (ms)'))
+    for label, tables in (('without tables', False), ('with tables', True)):
+        samples = [sample(tables) for _ in range(args.runs)]
+        imported = statistics.median([value for value, _ in samples]) * 1000
+        compiled = statistics.median([value for _, value in samples]) * 1000
+        print('%-16s %12.1f %16.1f %12.1f' % (label, imported, compiled, imported + compiled))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+# Scaling benchmark for symbol lookups: compiles programs with many globals,
+# struct members or locals. Only the stages that resolve symbols are timed
+# (parsing, intermediate code and code generation); such programs do not
+# fit in the 10 bits of a stack offset so they cannot be assembled anyway.
+
+import io
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+
+from dsrlib.compiler import Compiler, ICGenerator, CodeGenerator, StackSize
+
+
+def manyGlobals(count):
+    lines = ['int g%d = %d;' % (index, index) for index in range(count)]
+    lines.append('state idle { idle() {')
+    lines.extend(['g%d = g%d + g%d;' % (index, index, (index + 1) % count) for index in range(count)])
+    lines.append('} };')
+    return '\n'.join(lines)
+
+
+def manyMembers(count):
+    lines = ['struct ST {']
+    lines.extend(['int m%d;' % index for index in range(count)])
+    lines.append('void update() {')
+    lines.extend(['m%d = m%d + m%d;' % (index, index, (index + 1) % count) for index in range(count)])
+    lines.append('} };')
+    lines.append('state idle { ST st; idle() { st.update(); } };')
+    return '\n'.join(lines)
+
+
+def manyLocals(count):
+    lines = ['state idle { idle() {']
+    lines.extend(['int l%d = %d;' % (index, index) for index in range(count)])
+    lines.extend(['l%d = l%d + l%d;' % (index, index, (index + 1) % count) for index in range(count)])
+    lines.append('} };')
+    return '\n'.join(lines)
+
+
+def measure(source):
+    start = time.perf_counter()
+    comp = Compiler()
+    comp.preprocess(io.StringIO(source))
+    ast, _, errors = comp.compile()
+    if errors:
+        raise RuntimeError(errors)
+    ops = ICGenerator().generate(ast)
+    CodeGenerator().generate(ops)
+    StackSize().visit(ast)
+    return time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Symbol table scaling benchmark')
+    parser.add_argument('-s', '--sizes', default='250,500,1000,2000,4000', help='Comma-separated symbol counts')
+    args = parser.parse_args(argv)
+
+    Compiler() # LR tables
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print('%-10s %s' % ('symbols', ' '.join(['%10d' % size for size in sizes])))
+    for name, generator in (('globals', manyGlobals), ('members', manyMembers), ('locals', manyLocals)):
+        timings = [measure(generator(size)) * 1000 for size in sizes]
+        print('%-10s %s' % (name, ' '.join(['%8.0fms' % timing for timing in timings])))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
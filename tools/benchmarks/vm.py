@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+# Instructions per second of the pure Python VM, and of the vmwrapper
+# extension when it is built, running the same frames through a compiled
+# source.
+
+import os
+import sys
+import time
+import codecs
+import random
+import struct
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'src', 'ext'))
+
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler import vm as pyvm
+
+try:
+    import vmwrapper
+except ImportError:
+    vmwrapper = None
+
+
+SOURCE = '''
+int count;
+float angle;
+
+int clamp(int value) {
+  if (value < 0) return 0;
+  if (value > 255) return 255;
+  return value;
+}
+
+state idle {
+  idle() {
+    int i = 0;
+    while (i < 8) {
+      count = count + i;
+      i = i + 1;
+    }
+    angle = angle + IMUX * 0.5;
+    LPadX = clamp(LPadY + count / 100);
+    if (Square && angle > 1.0) Cross = 1;
+    RPadX = DELTA / 100;
+  }
+};
+'''
+
+
+def frames(count):
+    rng = random.Random(0)
+    data = []
+    for _ in range(count):
+        state = bytes([rng.randrange(256) for _ in range(4)] + [rng.randrange(256), rng.randrange(256), rng.randrange(4), 0, 0])
+        data.append(struct.pack(pyvm.FRAME_FORMAT, state, rng.randrange(1, 20000), *[rng.uniform(-1.0, 1.0) for _ in range(6)]))
+    return bytearray(b''.join(data))
+
+
+def measure(module, bytecode, stacksize, data):
+    vm = module.VM(bytecode=bytecode, stacksize=stacksize)
+    start = time.perf_counter()
+    steps = vm.run_frames(data)
+    return steps, time.perf_counter() - start
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='VM throughput benchmark')
+    parser.add_argument('-n', '--frames', type=int, default=10000, help='Number of frames')
+    parser.add_argument('filename', nargs='?', help='Source to run instead of the default one')
+    args = parser.parse_args(argv)
+
+    source = SOURCE
+    if args.filename is not None:
+        with codecs.getreader('utf-8')(open(args.filename, 'rb')) as fileobj:
+            source = fileobj.read()
+    _, bytecode = compileBytecode(source)
+    bytecode = bytecode.getvalue()
+    stacksize, = struct.unpack('<H', bytecode[:2])
+
+    data = frames(args.frames)
+    for name, module in (('python', pyvm), ('vmwrapper', vmwrapper)):
+        if module is None:
+            print('%-10s %s' % (name, 'not built'))
+            continue
+        steps, elapsed = measure(module, bytecode[2:], stacksize, bytearray(data))
+        print('%-10s %10d instructions %8.1fms %12.0f/s' % (name, steps, elapsed * 1000, steps / elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -8,6 +8,8 @@ import getopt
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'ext'))
 from dsrlib.compiler.opcodes import Opcodes
+from dsrlib.compiler.debuginfo import DebugInfo
+from dsrlib.compiler.linker import LINKED_MARKER
 from vmwrapper import VM, Report
 
 
@@ -26,6 +28,14 @@ def read_configuration(stream):
 
     while conflen:
         actionlen, = struct.unpack('<H', stream.read(2))
+        if actionlen == LINKED_MARKER:
+            count, = struct.unpack('<B', stream.read(1))
+            entries = [struct.unpack('<HH', stream.read(4)) for _ in range(count)]
+            for entry, stacksize in entries:
+                print('!! Linked action at 0x%04x, stack size: %d bytes' % (entry, stacksize))
+            bytecode = stream.read(conflen - 3 - 4 * count)
+            disasm(bytecode)
+            break
         print('!! Action size: %d bytes' % actionlen)
         stacksize, = struct.unpack('<H', stream.read(2))
         print('!! Stack size: %d bytes' % stacksize)
@@ -37,6 +47,32 @@ def read_configuration(stream):
     return stacksize, bytecode
 
 
+def read_immediate(bytecode, offset, variant, type_):
+    # Returns (value, size)
+    if variant == Opcodes.OPCODE_VARIANT_C8:
+        fmt = '<b'
+    elif variant == Opcodes.OPCODE_VARIANT_C16:
+        fmt = '<h'
+    else:
+        fmt = '<%s' % type_
+    size = struct.calcsize(fmt)
+    val, = struct.unpack(fmt, bytecode[offset:offset+size])
+    return val, size
+
+
+def read_target(bytecode, offset, variant):
+    # Returns (absolute target, size); displacements are relative to the
+    # end of the instruction
+    if variant == Opcodes.OPCODE_VARIANT_REL8:
+        delta, = struct.unpack('<b', bytecode[offset:offset+1])
+        return offset + 1 + delta, 1
+    if variant == Opcodes.OPCODE_VARIANT_REL16:
+        delta, = struct.unpack('<h', bytecode[offset:offset+2])
+        return offset + 2 + delta, 2
+    jumpto, = struct.unpack('<H', bytecode[offset:offset+2])
+    return jumpto, 2
+
+
 def disasm_one(bytecode, offset):
     label = '0x%04x' % offset
     opcode = bytecode[offset]
@@ -50,9 +86,9 @@ def disasm_one(bytecode, offset):
         dst = Opcodes.make_addr_str(bytecode[offset:])
         offset += dst.size
 
-        if variant == Opcodes.OPCODE_VARIANT_C:
-            src, = struct.unpack('<%s' % dst.type, bytecode[offset:offset+4])
-            offset += 4
+        if variant in (Opcodes.OPCODE_VARIANT_C, Opcodes.OPCODE_VARIANT_C8, Opcodes.OPCODE_VARIANT_C16):
+            src, size = read_immediate(bytecode, offset, variant, dst.type)
+            offset += size
         elif variant == Opcodes.OPCODE_VARIANT_A:
             src = Opcodes.make_addr_str(bytecode[offset:])
             offset += src.size
@@ -88,13 +124,13 @@ def disasm_one(bytecode, offset):
         instr = '%- 10s %s' % (name, dst)
     elif maintype == Opcodes.OPCODE_TYPE_STACK:
         if subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSHI:
-            val, = struct.unpack('<i', bytecode[offset:offset+4])
-            offset += 4
+            val, size = read_immediate(bytecode, offset, variant, 'i')
+            offset += size
             instr = '%- 10s %s' % ('PUSH', val)
         elif subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSHF:
-            val, = struct.unpack('<f', bytecode[offset:offset+4])
-            offset += 4
-            instr = '%- 10s %s' % ('PUSH', val)
+            val, size = read_immediate(bytecode, offset, variant, 'f')
+            offset += size
+            instr = '%- 10s %s' % ('PUSH', float(val))
         elif subtype == Opcodes.OPCODE_SUBTYPE_STACK_PUSH:
             src = Opcodes.make_addr_str(bytecode[offset:])
             offset += src.size
@@ -104,32 +140,56 @@ def disasm_one(bytecode, offset):
             offset += src.size
             instr = '%- 10s %s' % ('POP', src)
     elif maintype == Opcodes.OPCODE_TYPE_FLOW:
-        if subtype == Opcodes.OPCODE_SUBTYPE_FLOW_JZ:
+        if subtype in (Opcodes.OPCODE_SUBTYPE_FLOW_JZ, Opcodes.OPCODE_SUBTYPE_FLOW_JZR8, Opcodes.OPCODE_SUBTYPE_FLOW_JZR16):
             if variant == Opcodes.OPCODE_VARIANT_A:
                 cond = Opcodes.make_addr_str(bytecode[offset:])
                 offset += cond.size
-            elif variant == Opcode.OPCODE_VARIANT_CI:
-                cond = struct.unpack('<i', bytecode[offset:offset+2])
-                offset += 2
-            elif variant == Opcode.OPCODE_VARIANT_CF:
-                cond = struct.unpack('<f', bytecode[offset:offset+4])
+            elif variant == Opcodes.OPCODE_VARIANT_CI:
+                cond, = struct.unpack('<i', bytecode[offset:offset+4])
+                offset += 4
+            elif variant == Opcodes.OPCODE_VARIANT_CF:
+                cond, = struct.unpack('<f', bytecode[offset:offset+4])
                 offset += 4
             else:
                 raise NotImplementedError
-            jumpto, = struct.unpack('<H', bytecode[offset:offset+2])
-            offset += 2
+            target = {
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZR8: Opcodes.OPCODE_VARIANT_REL8,
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZR16: Opcodes.OPCODE_VARIANT_REL16,
+                }.get(subtype, Opcodes.OPCODE_VARIANT_ABS16)
+            jumpto, size = read_target(bytecode, offset, target)
+            offset += size
             instr = '%- 10s %s, 0x%04x' % ('JZ', cond, jumpto)
+        elif Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT <= subtype <= Opcodes.OPCODE_SUBTYPE_FLOW_JZCN:
+            op1 = Opcodes.make_addr_str(bytecode[offset:])
+            offset += op1.size
+            if variant == Opcodes.OPCODE_VARIANT_A:
+                op2 = Opcodes.make_addr_str(bytecode[offset:])
+                offset += op2.size
+            else:
+                op2, size = read_immediate(bytecode, offset, variant, op1.type)
+                offset += size
+            jumpto, size = read_target(bytecode, offset, Opcodes.OPCODE_VARIANT_REL8)
+            offset += size
+            name = {
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCLT: 'JZCLT',
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCGT: 'JZCGT',
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCLTE: 'JZCLTE',
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCGTE: 'JZCGTE',
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCE: 'JZCE',
+                Opcodes.OPCODE_SUBTYPE_FLOW_JZCN: 'JZCN',
+                }[subtype]
+            instr = '%- 10s %s, %s, 0x%04x' % (name, op1, op2, jumpto)
         elif subtype == Opcodes.OPCODE_SUBTYPE_FLOW_JUMP:
-            jumpto, = struct.unpack('<H', bytecode[offset:offset+2])
-            offset += 2
+            jumpto, size = read_target(bytecode, offset, variant)
+            offset += size
             instr = '%- 10s 0x%04x' % ('JUMP', jumpto)
         elif subtype == Opcodes.OPCODE_SUBTYPE_FLOW_YIELD:
             instr = '%- 10s' % 'YIELD'
         elif subtype == Opcodes.OPCODE_SUBTYPE_FLOW_RET:
             instr = '%- 10s' % 'RET'
         elif subtype == Opcodes.OPCODE_SUBTYPE_FLOW_CALL:
-            jumpto, = struct.unpack('<H', bytecode[offset:offset+2])
-            offset += 2
+            jumpto, size = read_target(bytecode, offset, variant)
+            offset += size
             instr = '%- 10s 0x%04x' % ('CALL', jumpto)
         else:
             raise NotImplementedError
@@ -141,15 +201,38 @@ def disasm_one(bytecode, offset):
     return offset
 
 
-def disasm(bytecode):
+def source_position(debug, offset):
+    position = None if debug is None else debug.lookup(offset)
+    if position is None:
+        return None
+    line, column, symbol = position
+    return '%s, line %d, column %d' % (symbol or 'globals', line, column)
+
+
+def disasm(bytecode, debug=None):
     offset = 0
+    current = None
     while offset < len(bytecode):
+        position = source_position(debug, offset)
+        if position is not None and position != current:
+            print('; %s' % position)
+            current = position
         offset = disasm_one(bytecode, offset)
 
 
-def execute(stacksize, bytecode):
+def read_action(stream):
+    # Stack size and bytecode, as written by dsremap-compile -o
+    stacksize, = struct.unpack('<H', stream.read(2))
+    print('!! Stack size: %d bytes' % stacksize)
+    return stacksize, stream.read()
+
+
+def execute(stacksize, bytecode, debug=None):
     vm = VM(bytecode=bytecode, stacksize=stacksize)
     while True:
+        position = source_position(debug, vm.offset)
+        if position is not None:
+            print('; %s' % position)
         disasm_one(bytecode, vm.offset)
         print('Stack: %s' % vm.get_stack())
         input('...')
@@ -157,19 +240,32 @@ def execute(stacksize, bytecode):
 
 
 def main(argv):
-    opts, args = getopt.getopt(argv, 'e', ['execute'])
+    # -a: the files are single actions instead of EEPROM images. -g: debug
+    # info for the action, see dsrlib.compiler.debuginfo
+    opts, args = getopt.getopt(argv, 'eag:', ['execute', 'action', 'debug='])
 
     exe = False
+    action = False
+    debug = None
     for opt, val in opts:
         if opt in ('-e', '--execute'):
             exe = True
+        if opt in ('-a', '--action'):
+            action = True
+        if opt in ('-g', '--debug'):
+            with open(val, 'rb') as fileobj:
+                debug = DebugInfo(fileobj.read())
 
     for name in args:
         with open(name, 'rb') as fileobj:
             print('!! File: %s' % name)
-            stacksize, bytecode = read_bytecode(fileobj)
+            if action:
+                stacksize, bytecode = read_action(fileobj)
+                disasm(bytecode, debug)
+            else:
+                stacksize, bytecode = read_bytecode(fileobj)
             if exe:
-                execute(stacksize, bytecode)
+                execute(stacksize, bytecode, debug)
 
 
 if __name__ == '__main__':
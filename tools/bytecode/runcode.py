@@ -4,19 +4,44 @@ import os
 import sys
 import codecs
 import struct
+import getopt
 
 sys.path.insert(0, os.path.join('..', 'src'))
 sys.path.insert(0, os.path.join('..', 'src', 'ext'))
 
-from dsrlib.compiler.bcgen import generateBytecode
-from vmwrapper import VM, Report
+from dsrlib.compiler.bcgen import generateBytecode, compileBytecode
+from dsrlib.compiler.slots import SlotAllocator
+from dsrlib.compiler.debuginfo import DebugInfoBuilder, DebugInfo
+try:
+    from vmwrapper import VM, Report
+except ImportError:
+    from dsrlib.compiler.vm import VM, Report
 
 
 def main(argv):
-    filename, = argv
+    opts, args = getopt.getopt(argv, 'ist', ['dump-ir', 'stack-report', 'trace'])
+
+    dump = False
+    allocator = None
+    trace = None
+    for opt, val in opts:
+        if opt in ('-t', '--trace'):
+            trace = DebugInfoBuilder()
+        if opt in ('-i', '--dump-ir'):
+            dump = True
+        if opt in ('-s', '--stack-report'):
+            allocator = SlotAllocator()
+
+    filename, = args
     with codecs.getreader('utf-8')(open(filename, 'rb')) as fileobj:
         source = fileobj.read()
-    _, bytecode = generateBytecode(source)
+    if dump or allocator is not None or trace is not None:
+        _, bytecode = compileBytecode(source, allocator=allocator, dumpIR=sys.stdout if dump else None, debug=trace)
+    else:
+        _, bytecode = generateBytecode(source)
+    if allocator is not None:
+        print(allocator.report())
+    debug = None if trace is None else DebugInfo(trace.toBytes())
     bytecode = bytecode.getvalue()
 
     stacksize, = struct.unpack('<H', bytecode[:2])
@@ -29,8 +54,16 @@ def main(argv):
         report.L2 = report.R2 = True
 
         print('!! RUN')
-        while not vm.step(report):
-            pass
+        current = None
+        while True:
+            if debug is not None:
+                position = debug.lookup(vm.offset)
+                if position is not None and position != current:
+                    line, column, symbol = position
+                    print('!! %s, line %d, column %d' % (symbol or 'globals', line, column))
+                    current = position
+            if vm.step(report):
+                break
 
 
 if __name__ == '__main__':
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import codecs
+import struct
+import getopt
+
+sys.path.insert(0, os.path.join('..', 'src'))
+sys.path.insert(0, os.path.join('..', 'src', 'ext'))
+
+from dsrlib.compiler.bcgen import compileBytecode
+from dsrlib.compiler.debuginfo import DebugInfoBuilder, DebugInfo
+from dsrlib.compiler.profiler import Profile
+try:
+    from vmwrapper import VM, Report, FRAME_SIZE
+except ImportError:
+    from dsrlib.compiler.vm import VM, Report, FRAME_SIZE
+
+
+def main(argv):
+    # -f: recorded frames, FRAME_SIZE bytes each (see vmwrapper.FRAME_FORMAT);
+    # default reports otherwise. -b: instructions allowed per frame.
+    opts, args = getopt.getopt(argv, 'n:f:b:l:', ['reports=', 'frames=', 'budget=', 'limit='])
+
+    reports = 100
+    frames = None
+    budget = None
+    limit = 10
+    for opt, val in opts:
+        if opt in ('-n', '--reports'):
+            reports = int(val)
+        if opt in ('-f', '--frames'):
+            with open(val, 'rb') as fileobj:
+                frames = bytearray(fileobj.read())
+        if opt in ('-b', '--budget'):
+            budget = int(val)
+        if opt in ('-l', '--limit'):
+            limit = int(val)
+
+    filename, = args
+    with codecs.getreader('utf-8')(open(filename, 'rb')) as fileobj:
+        source = fileobj.read()
+    builder = DebugInfoBuilder()
+    _, bytecode = compileBytecode(source, debug=builder)
+    bytecode = bytecode.getvalue()
+
+    stacksize, = struct.unpack('<H', bytecode[:2])
+    vm = VM(bytecode=bytecode[2:], stacksize=stacksize, profile=True)
+
+    if frames is None:
+        for _ in range(reports):
+            report = Report()
+            while not vm.step(report):
+                pass
+    else:
+        print('!! %d frames' % (len(frames) // FRAME_SIZE))
+        vm.run_frames(frames)
+
+    print(Profile.fromVM(vm, DebugInfo(builder.toBytes())).text(budget=budget, limit=limit))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])